@@ -79,6 +79,9 @@ class InstanceConfig(BaseModel):
     read_timeout: Optional[float]
     request_size: Optional[float]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     skip_proxy: Optional[bool]
     suppress_errors: Optional[bool]
     tags: Optional[Sequence[str]]
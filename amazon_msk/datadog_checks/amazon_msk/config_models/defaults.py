@@ -18,6 +18,10 @@ def shared_service(field, value):
     return get_default_field_value(field, value)
 
 
+def shared_shared_connection_pool(field, value):
+    return False
+
+
 def shared_skip_proxy(field, value):
     return False
 
@@ -170,6 +174,18 @@ def instance_log_requests(field, value):
     return False
 
 
+def instance_max_concurrent_scrapes(field, value):
+    return 1
+
+
+def instance_max_payload_size(field, value):
+    return 0
+
+
+def instance_max_samples(field, value):
+    return 0
+
+
 def instance_metric_patterns(field, value):
     return get_default_field_value(field, value)
 
@@ -250,10 +266,26 @@ def instance_share_labels(field, value):
     return get_default_field_value(field, value)
 
 
+def instance_shared_connection_pool(field, value):
+    return False
+
+
+def instance_shared_connection_pool_idle_timeout(field, value):
+    return 300
+
+
+def instance_shared_connection_pool_size(field, value):
+    return 10
+
+
 def instance_skip_proxy(field, value):
     return False
 
 
+def instance_skip_unchanged_payload(field, value):
+    return False
+
+
 def instance_tag_by_endpoint(field, value):
     return True
 
@@ -298,6 +330,14 @@ def instance_tls_verify(field, value):
     return False
 
 
+def instance_use_conditional_requests(field, value):
+    return False
+
+
+def instance_use_fast_parser(field, value):
+    return False
+
+
 def instance_use_latest_spec(field, value):
     return False
 
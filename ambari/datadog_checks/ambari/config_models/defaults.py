@@ -26,6 +26,10 @@ def shared_service(field, value):
     return get_default_field_value(field, value)
 
 
+def shared_shared_connection_pool(field, value):
+    return False
+
+
 def shared_skip_proxy(field, value):
     return False
 
@@ -150,6 +154,18 @@ def instance_services(field, value):
     return get_default_field_value(field, value)
 
 
+def instance_shared_connection_pool(field, value):
+    return False
+
+
+def instance_shared_connection_pool_idle_timeout(field, value):
+    return 300
+
+
+def instance_shared_connection_pool_size(field, value):
+    return 10
+
+
 def instance_skip_proxy(field, value):
     return False
 
@@ -77,6 +77,9 @@ class InstanceConfig(BaseModel):
     request_size: Optional[float]
     service: Optional[str]
     services: Optional[Mapping[str, Any]]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     skip_proxy: Optional[bool]
     tags: Optional[Sequence[str]]
     timeout: Optional[float]
@@ -36,6 +36,7 @@ class SharedConfig(BaseModel):
     collect_service_status: Optional[bool]
     proxy: Optional[Proxy]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
     skip_proxy: Optional[bool]
     timeout: Optional[float]
 
@@ -109,6 +109,9 @@ class InstanceConfig(BaseModel):
     kerberos_keytab: Optional[str]
     kerberos_principal: Optional[str]
     log_requests: Optional[bool]
+    max_concurrent_scrapes: Optional[int]
+    max_payload_size: Optional[int]
+    max_samples: Optional[int]
     metric_patterns: Optional[MetricPatterns]
     metrics: Optional[Sequence[Union[str, Mapping[str, Union[str, Metric]]]]]
     min_collection_interval: Optional[float]
@@ -127,7 +130,11 @@ class InstanceConfig(BaseModel):
     request_size: Optional[float]
     service: Optional[str]
     share_labels: Optional[Mapping[str, Union[bool, ShareLabel]]]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     skip_proxy: Optional[bool]
+    skip_unchanged_payload: Optional[bool]
     tag_by_endpoint: Optional[bool]
     tags: Optional[Sequence[str]]
     telemetry: Optional[bool]
@@ -139,6 +146,8 @@ class InstanceConfig(BaseModel):
     tls_protocols_allowed: Optional[Sequence[str]]
     tls_use_host_header: Optional[bool]
     tls_verify: Optional[bool]
+    use_conditional_requests: Optional[bool]
+    use_fast_parser: Optional[bool]
     use_latest_spec: Optional[bool]
     use_legacy_auth_encoding: Optional[bool]
     use_process_start_time: Optional[bool]
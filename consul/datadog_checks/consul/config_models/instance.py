@@ -85,6 +85,9 @@ class InstanceConfig(BaseModel):
     service: Optional[str]
     services_exclude: Optional[Sequence[str]]
     services_include: Optional[Sequence[str]]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     single_node_install: Optional[bool]
     skip_proxy: Optional[bool]
     tags: Optional[Sequence[str]]
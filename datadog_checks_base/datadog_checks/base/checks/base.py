@@ -12,7 +12,21 @@ import traceback
 import unicodedata
 from collections import deque
 from os.path import basename
-from typing import TYPE_CHECKING, Any, AnyStr, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AnyStr,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import yaml
 from six import PY2, binary_type, iteritems, raise_from, text_type
@@ -29,13 +43,14 @@ from ..types import (
     ProxySettings,
     ServiceCheckStatus,
 )
+from ..utils.agent.common import METRIC_NAMESPACE_METRICS
 from ..utils.agent.utils import should_profile_memory
 from ..utils.common import ensure_bytes, to_native_string
 from ..utils.http import RequestsWrapper
 from ..utils.limiter import Limiter
 from ..utils.metadata import MetadataManager
 from ..utils.secrets import SecretsSanitizer
-from ..utils.tagging import GENERIC_TAGS
+from ..utils.tagging import GENERIC_TAGS, NormalizedTags
 from ..utils.tls import TlsContextWrapper
 from ..utils.tracing import traced_class
 
@@ -72,8 +87,20 @@ if not PY2:
 if TYPE_CHECKING:
     import ssl
 
+    from ..utils.http_async import AsyncRequestsWrapper
+
 # Metric types for which it's only useful to submit once per set of tags
 ONE_PER_CONTEXT_METRIC_TYPES = [aggregator.GAUGE, aggregator.RATE, aggregator.MONOTONIC_COUNT]
+
+# Metric types accepted by `AgentCheck.submit_batch`, named after their submission method
+BATCH_METRIC_TYPES = {
+    'gauge': aggregator.GAUGE,
+    'count': aggregator.COUNT,
+    'monotonic_count': aggregator.MONOTONIC_COUNT,
+    'rate': aggregator.RATE,
+    'histogram': aggregator.HISTOGRAM,
+    'historate': aggregator.HISTORATE,
+}
 TYPO_SIMILARITY_THRESHOLD = 0.95
 
 
@@ -147,6 +174,9 @@ class AgentCheck(object):
     # See https://github.com/DataDog/integrations-core/pull/2093 for more information.
     DEFAULT_METRIC_LIMIT = 0
 
+    # The maximum number of metric names for which the result of `metric_patterns` filtering is remembered
+    METRIC_FILTER_CACHE_SIZE = 10000
+
     # Allow tracing for classic integrations
     def __init_subclass__(cls, *args, **kwargs):
         try:
@@ -216,6 +246,14 @@ class AgentCheck(object):
         if not isinstance(metric_patterns, dict):
             raise ConfigurationError('Setting `metric_patterns` must be a mapping')
 
+        # Decisions of `should_send_metric`, reset whenever either pattern changes
+        self._metric_filter_cache = {}  # type: Dict[str, bool]
+        self._metric_filter_cache_hits = 0
+        self._metric_filter_cache_misses = 0
+
+        # Formatted metric names for batched submissions keyed by namespace and `raw`, `None` meaning filtered out
+        self._batch_metric_names = {}  # type: Dict[Tuple[str, bool], Dict[str, Optional[str]]]
+
         self.exclude_metrics_pattern = self._create_metrics_pattern(metric_patterns, 'exclude')
         self.include_metrics_pattern = self._create_metrics_pattern(metric_patterns, 'include')
 
@@ -276,6 +314,10 @@ class AgentCheck(object):
         # Setup metric limits
         self.metric_limiter = self._get_metric_limiter(self.name, instance=self.instance)
 
+        # Normalized tag sets for batched submissions, referenced by the identifiers returned from `register_tags`
+        self._batch_tags = []  # type: List[List[str]]
+        self._batch_tags_ids = {}  # type: Dict[Tuple[Any, ...], int]
+
         # Lazily load and validate config
         self._config_model_instance = None  # type: Any
         self._config_model_shared = None  # type: Any
@@ -283,6 +325,9 @@ class AgentCheck(object):
         # Functions that will be called exactly once (if successful) before the first check run
         self.check_initializations = deque()  # type: Deque[Callable[[], None]]
 
+        # Functions that will be called when the check is unscheduled, to release resources like threads
+        self.check_cancellations = []  # type: List[Callable[[], None]]
+
         if not PY2:
             self.check_initializations.append(self.load_configuration_models)
 
@@ -375,6 +420,26 @@ class AgentCheck(object):
 
         return self._http
 
+    @property
+    def http_async(self):
+        # type: () -> AsyncRequestsWrapper
+        """
+        Provides an asyncio interface to `http` for sending many requests concurrently. The number of
+        requests in flight is bounded by the `max_concurrent_requests` setting.
+
+        Only available on Python 3.
+        """
+        if not hasattr(self, '_http_async'):
+            from ..utils import http_async
+
+            max_concurrent_requests = (self.instance or {}).get(
+                'max_concurrent_requests',
+                (self.init_config or {}).get('max_concurrent_requests', http_async.DEFAULT_MAX_CONCURRENT_REQUESTS),
+            )
+            self._http_async = http_async.AsyncRequestsWrapper(self.http, max_concurrent_requests)
+
+        return self._http_async
+
     def get_tls_context(self, refresh=False, overrides=None):
         # type: (bool, Dict[AnyStr, Any]) -> ssl.SSLContext
         """
@@ -614,6 +679,86 @@ class AgentCheck(object):
             flush_first_value,
         )
 
+    def submit_histogram_buckets(
+        self, name, values, lower_bounds, upper_bounds, monotonic, hostnames, tags, raw=False, flush_first_value=False
+    ):
+        # type: (str, Sequence[float], Sequence[float], Sequence[float], bool, Sequence[str], Sequence[Sequence[str]], bool, bool) -> None  # noqa: E501
+        """Submit many buckets of the same histogram at once.
+
+        Every argument but `name`, `monotonic`, `raw` and `flush_first_value` is a column, the bucket at
+        index `i` being described by the `i`-th entry of each. The name is formatted only once.
+        """
+        metric_name = self._format_namespace(name, raw)
+
+        submission_values = []  # type: List[int]
+        submission_lower_bounds = []  # type: List[float]
+        submission_upper_bounds = []  # type: List[float]
+        submission_hostnames = []  # type: List[str]
+        submission_tags = []  # type: List[List[str]]
+
+        for value, lower_bound, upper_bound, hostname, bucket_tags in zip(
+            values, lower_bounds, upper_bounds, hostnames, tags
+        ):
+            if value is None:
+                # ignore metric sample
+                continue
+
+            # make sure the value (bucket count) is an integer
+            try:
+                value = int(value)
+            except ValueError:
+                err_msg = (
+                    'Histogram: {} has non integer value: {}. Only integer are valid bucket values (count).'.format(
+                        repr(name), repr(value)
+                    )
+                )
+                if using_stub_aggregator:
+                    raise ValueError(err_msg)
+                self.warning(err_msg)
+                continue
+
+            submission_values.append(value)
+            submission_lower_bounds.append(lower_bound)
+            submission_upper_bounds.append(upper_bound)
+            submission_hostnames.append('' if hostname is None else hostname)
+            submission_tags.append(self._normalize_tags_type(bucket_tags, metric_name=name))
+
+        # Forward everything in one call when the aggregator supports it
+        submit_histogram_buckets = getattr(aggregator, 'submit_histogram_buckets', None)
+        if submit_histogram_buckets is not None:
+            submit_histogram_buckets(
+                self,
+                self.check_id,
+                metric_name,
+                submission_values,
+                submission_lower_bounds,
+                submission_upper_bounds,
+                monotonic,
+                submission_hostnames,
+                submission_tags,
+                flush_first_value,
+            )
+        else:
+            for value, lower_bound, upper_bound, hostname, bucket_tags in zip(
+                submission_values,
+                submission_lower_bounds,
+                submission_upper_bounds,
+                submission_hostnames,
+                submission_tags,
+            ):
+                aggregator.submit_histogram_bucket(
+                    self,
+                    self.check_id,
+                    metric_name,
+                    value,
+                    lower_bound,
+                    upper_bound,
+                    monotonic,
+                    hostname,
+                    bucket_tags,
+                    flush_first_value,
+                )
+
     def database_monitoring_query_sample(self, raw_event):
         # type: (str) -> None
         if raw_event is None:
@@ -635,20 +780,64 @@ class AgentCheck(object):
 
         aggregator.submit_event_platform_event(self, self.check_id, to_native_string(raw_event), "dbm-activity")
 
+    @property
+    def exclude_metrics_pattern(self):
+        # type: () -> Optional[Pattern]
+        return self._exclude_metrics_pattern
+
+    @exclude_metrics_pattern.setter
+    def exclude_metrics_pattern(self, pattern):
+        # type: (Optional[Pattern]) -> None
+        self._exclude_metrics_pattern = pattern
+        self._clear_metric_filter_cache()
+
+    @property
+    def include_metrics_pattern(self):
+        # type: () -> Optional[Pattern]
+        return self._include_metrics_pattern
+
+    @include_metrics_pattern.setter
+    def include_metrics_pattern(self, pattern):
+        # type: (Optional[Pattern]) -> None
+        self._include_metrics_pattern = pattern
+        self._clear_metric_filter_cache()
+
     def should_send_metric(self, metric_name):
-        return not self._metric_excluded(metric_name) and self._metric_included(metric_name)
+        if self._exclude_metrics_pattern is None and self._include_metrics_pattern is None:
+            return True
+
+        try:
+            send_metric = self._metric_filter_cache[metric_name]
+        except KeyError:
+            self._metric_filter_cache_misses += 1
+            send_metric = not self._metric_excluded(metric_name) and self._metric_included(metric_name)
+
+            if len(self._metric_filter_cache) >= self.METRIC_FILTER_CACHE_SIZE:
+                self._clear_metric_filter_cache()
+
+            self._metric_filter_cache[metric_name] = send_metric
+        else:
+            self._metric_filter_cache_hits += 1
+
+        return send_metric
+
+    def _clear_metric_filter_cache(self):
+        # type: () -> None
+        # Batched submissions cache the same decisions alongside the formatted metric names
+        self._metric_filter_cache.clear()
+        self._batch_metric_names.clear()
 
     def _metric_included(self, metric_name):
-        if self.include_metrics_pattern is None:
+        if self._include_metrics_pattern is None:
             return True
 
-        return self.include_metrics_pattern.search(metric_name) is not None
+        return self._include_metrics_pattern.search(metric_name) is not None
 
     def _metric_excluded(self, metric_name):
-        if self.exclude_metrics_pattern is None:
+        if self._exclude_metrics_pattern is None:
             return False
 
-        return self.exclude_metrics_pattern.search(metric_name) is not None
+        return self._exclude_metrics_pattern.search(metric_name) is not None
 
     def _submit_metric(
         self, mtype, name, value, tags=None, hostname=None, device_name=None, raw=False, flush_first_value=False
@@ -690,6 +879,122 @@ class AgentCheck(object):
 
         aggregator.submit_metric(self, self.check_id, mtype, name, value, tags, hostname, flush_first_value)
 
+    def register_tags(self, tags):
+        # type: (Sequence[Union[None, str, bytes]]) -> int
+        """Normalize a set of tags once and return the identifier to reference it with in `submit_batch`.
+
+        Registering the same tags again returns the same identifier. Identifiers are only valid until the end
+        of the current check run, so that tags of short-lived contexts do not accumulate.
+
+        **Parameters:**
+
+        - **tags** (_List[str]_) - a list of tags
+        """
+        key = tuple(tags)
+        tags_id = self._batch_tags_ids.get(key)
+        if tags_id is None:
+            tags_id = self._batch_tags_ids[key] = len(self._batch_tags)
+            self._batch_tags.append(self._normalize_tags_type(key))
+
+        return tags_id
+
+    def submit_batch(self, types, names, values, tags_ids, hostnames, raw=False, flush_first_value=False):
+        # type: (Sequence[str], Sequence[str], Sequence[float], Sequence[int], Sequence[str], bool, bool) -> None
+        """Sample many metrics at once.
+
+        Every argument but `raw` and `flush_first_value` is a column, the metric at index `i` being described
+        by the `i`-th entry of each. Tags were normalized when registered and the namespace formatting and
+        metric filtering decisions are cached per metric name, so per-metric overhead is minimal.
+
+        **Parameters:**
+
+        - **types** (_List[str]_) - the metric types, named after their submission method e.g. `monotonic_count`
+        - **names** (_List[str]_) - the names of the metrics
+        - **values** (_List[float]_) - the values for the metrics
+        - **tags_ids** (_List[int]_) - the identifiers of the tags to associate with the metrics,
+            as returned by `register_tags`
+        - **hostnames** (_List[str]_) - the hostnames to associate with the metrics, an empty string or `None`
+            meaning the current host
+        - **raw** (_bool_) - whether to ignore any defined namespace prefix
+        - **flush_first_value** (_bool_) - whether to sample the first value of monotonic counts
+        """
+        metric_names = self._batch_metric_names.setdefault((self.__NAMESPACE__, raw), {})
+        batch_tags = self._batch_tags
+        metric_limiter = self.metric_limiter
+
+        submission_types = []  # type: List[int]
+        submission_names = []  # type: List[str]
+        submission_values = []  # type: List[float]
+        submission_tags = []  # type: List[List[str]]
+        submission_hostnames = []  # type: List[str]
+
+        for metric_type, name, value, tags_id, hostname in zip(types, names, values, tags_ids, hostnames):
+            if value is None:
+                # ignore metric sample
+                continue
+
+            try:
+                metric_name = metric_names[name]
+            except KeyError:
+                metric_name = self._format_namespace(name, raw)
+                if not self.should_send_metric(metric_name):
+                    metric_name = None
+
+                metric_names[name] = metric_name
+
+            if metric_name is None:
+                continue
+
+            mtype = BATCH_METRIC_TYPES[metric_type]
+            tags = batch_tags[tags_id]
+            if hostname is None:
+                hostname = ''
+
+            if metric_limiter:
+                if mtype in ONE_PER_CONTEXT_METRIC_TYPES:
+                    if metric_limiter.is_reached():
+                        continue
+                elif metric_limiter.is_reached(self._context_uid(mtype, metric_name, tags, hostname)):
+                    continue
+
+            try:
+                value = float(value)
+            except ValueError:
+                err_msg = 'Metric: {} has non float value: {}. Only float values can be submitted as metrics.'.format(
+                    repr(metric_name), repr(value)
+                )
+                if using_stub_aggregator:
+                    raise ValueError(err_msg)
+                self.warning(err_msg)
+                continue
+
+            submission_types.append(mtype)
+            submission_names.append(metric_name)
+            submission_values.append(value)
+            submission_tags.append(tags)
+            submission_hostnames.append(hostname)
+
+        # Forward everything in one call when the aggregator supports it
+        submit_metrics = getattr(aggregator, 'submit_metrics', None)
+        if submit_metrics is not None:
+            submit_metrics(
+                self,
+                self.check_id,
+                submission_types,
+                submission_names,
+                submission_values,
+                submission_tags,
+                submission_hostnames,
+                flush_first_value,
+            )
+        else:
+            for mtype, metric_name, value, tags, hostname in zip(
+                submission_types, submission_names, submission_values, submission_tags, submission_hostnames
+            ):
+                aggregator.submit_metric(
+                    self, self.check_id, mtype, metric_name, value, tags, hostname, flush_first_value
+                )
+
     def gauge(self, name, value, tags=None, hostname=None, device_name=None, raw=False):
         # type: (str, float, Sequence[str], str, str, bool) -> None
         """Sample a gauge metric.
@@ -1080,7 +1385,17 @@ class AgentCheck(object):
         the check is running. It's up to the python implementation to make sure
         cancel is thread safe and won't block.
         """
-        pass
+        if hasattr(self, '_http_async'):
+            self._http_async.close()
+
+        if hasattr(self, '_isolated_worker'):
+            self._isolated_worker.close()
+
+        for cancellation in self.check_cancellations:
+            try:
+                cancellation()
+            except Exception as e:
+                self.log.debug('Error while releasing resources of the check: %s', e)
 
     def run(self):
         # type: () -> str
@@ -1127,6 +1442,22 @@ class AgentCheck(object):
             tb = self.sanitize(traceback.format_exc())
             error_report = json.dumps([{'message': message, 'traceback': tb}])
         finally:
+            if is_affirmative(self.debug_metrics.get('metric_filter_cache', False)):
+                self._submit_metric_filter_cache_debug_metrics()
+
+            if is_affirmative(self.debug_metrics.get('shared_connection_pool', False)) and hasattr(self, '_http'):
+                self._submit_shared_connection_pool_debug_metrics()
+
+            if is_affirmative(self.debug_metrics.get('aia_chasing', False)) and hasattr(self, '_http'):
+                self._submit_aia_chasing_debug_metrics()
+
+            if is_affirmative(self.debug_metrics.get('process_isolation', False)) and hasattr(self, '_isolated_worker'):
+                self._submit_process_isolation_debug_metrics()
+
+            # Registered tags are only valid for a run, otherwise churning tags would accumulate
+            self._batch_tags = []
+            self._batch_tags_ids = {}
+
             if self.metric_limiter:
                 if is_affirmative(self.debug_metrics.get('metric_contexts', False)):
                     debug_metrics = self.metric_limiter.get_debug_metrics()
@@ -1198,7 +1529,11 @@ class AgentCheck(object):
         - append `device_name` as `device:` tag
         - normalize tags type
         - doesn't mutate the passed list, returns a new list
+        - returns tags that were already normalized as is
         """
+        if tags.__class__ is NormalizedTags and not device_name:
+            return tags
+
         normalized_tags = []
 
         if device_name:
@@ -1241,6 +1576,63 @@ class AgentCheck(object):
         else:
             return tag
 
+    def _submit_metric_filter_cache_debug_metrics(self):
+        # type: () -> None
+        # Take a snapshot first as the submissions themselves are filtered
+        debug_metrics = (
+            ('{}.filter_cache.hits'.format(METRIC_NAMESPACE_METRICS), self._metric_filter_cache_hits),
+            ('{}.filter_cache.misses'.format(METRIC_NAMESPACE_METRICS), self._metric_filter_cache_misses),
+            ('{}.filter_cache.size'.format(METRIC_NAMESPACE_METRICS), len(self._metric_filter_cache)),
+        )
+        self._metric_filter_cache_hits = 0
+        self._metric_filter_cache_misses = 0
+
+        tags = self.get_debug_metric_tags()
+        for metric_name, value in debug_metrics:
+            self.gauge(metric_name, value, tags=tags, raw=True)
+
+    def _submit_shared_connection_pool_debug_metrics(self):
+        # type: () -> None
+        hits, misses, size = self._http.get_shared_connection_pool_stats()
+        debug_metrics = (
+            ('{}.http.connection_pool.hits'.format(METRIC_NAMESPACE_METRICS), hits),
+            ('{}.http.connection_pool.misses'.format(METRIC_NAMESPACE_METRICS), misses),
+            ('{}.http.connection_pool.size'.format(METRIC_NAMESPACE_METRICS), size),
+        )
+
+        tags = self.get_debug_metric_tags()
+        for metric_name, value in debug_metrics:
+            self.gauge(metric_name, value, tags=tags, raw=True)
+
+    def _submit_aia_chasing_debug_metrics(self):
+        # type: () -> None
+        attempts, cache_hits, cache_size = self._http.get_aia_chasing_stats()
+        debug_metrics = (
+            ('{}.http.aia_chasing.attempts'.format(METRIC_NAMESPACE_METRICS), attempts),
+            ('{}.http.aia_chasing.cache_hits'.format(METRIC_NAMESPACE_METRICS), cache_hits),
+            ('{}.http.aia_chasing.cache_size'.format(METRIC_NAMESPACE_METRICS), cache_size),
+        )
+
+        tags = self.get_debug_metric_tags()
+        for metric_name, value in debug_metrics:
+            self.gauge(metric_name, value, tags=tags, raw=True)
+
+    def _submit_process_isolation_debug_metrics(self):
+        # type: () -> None
+        worker = self._isolated_worker
+        debug_metrics = [
+            ('{}.process_isolation.startup_time'.format(METRIC_NAMESPACE_METRICS), worker.startup_time),
+            ('{}.process_isolation.run_time'.format(METRIC_NAMESPACE_METRICS), worker.run_time),
+            ('{}.process_isolation.memory'.format(METRIC_NAMESPACE_METRICS), worker.memory),
+            ('{}.process_isolation.runs'.format(METRIC_NAMESPACE_METRICS), worker.runs),
+        ]
+
+        tags = self.get_debug_metric_tags()
+        for metric_name, value in debug_metrics:
+            # The startup time is only known for runs that started a process and the memory usage only on Unix
+            if value is not None:
+                self.gauge(metric_name, value, tags=tags, raw=True)
+
     def get_debug_metric_tags(self):
         tags = ['check_name:{}'.format(self.name), 'check_version:{}'.format(self.check_version)]
         tags.extend(self.instance.get('tags', []))
@@ -4,6 +4,7 @@
 # TODO: remove ignore when we stop invoking Mypy with --py2
 # type: ignore
 from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 
 from requests.exceptions import RequestException
@@ -30,6 +31,8 @@ class OpenMetricsBaseCheckV2(AgentCheck):
       - foo
     ```
 
+    When multiple endpoints are configured, setting `max_concurrent_scrapes` to a value greater than 1 fetches
+    them concurrently. Parsing and submission still happen sequentially in the order of `scrapers`.
     """
 
     DEFAULT_METRIC_LIMIT = 2000
@@ -51,20 +54,64 @@ class OpenMetricsBaseCheckV2(AgentCheck):
         # All configured scrapers keyed by the endpoint
         self.scrapers = {}
 
+        # The maximum number of endpoints fetched at the same time
+        self.max_concurrent_scrapes = self.instance.get('max_concurrent_scrapes', 1) if self.instance else 1
+        if (
+            not isinstance(self.max_concurrent_scrapes, int)
+            or isinstance(self.max_concurrent_scrapes, bool)
+            or self.max_concurrent_scrapes < 1
+        ):
+            raise ConfigurationError('Setting `max_concurrent_scrapes` must be a positive integer')
+
         self.check_initializations.append(self.configure_scrapers)
 
     def check(self, _):
         self.refresh_scrapers()
 
+        if self.max_concurrent_scrapes > 1 and len(self.scrapers) > 1:
+            self.scrape_concurrently()
+            return
+
         for endpoint, scraper in self.scrapers.items():
-            self.log.info('Scraping OpenMetrics endpoint: %s', endpoint)
+            self.scrape_endpoint(endpoint, scraper)
+
+    def scrape_concurrently(self):
+        """
+        Fetch every endpoint on a bounded thread pool, then process the responses in order.
+
+        Unlike sequential scraping, an error with one endpoint does not prevent the others from being processed.
+        The first error is raised once all endpoints have been handled.
+        """
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrent_scrapes, len(self.scrapers))) as executor:
+            futures = [
+                (endpoint, scraper, executor.submit(scraper.fetch)) for endpoint, scraper in self.scrapers.items()
+            ]
 
-            with self.adopt_namespace(scraper.namespace):
+            for endpoint, scraper, future in futures:
+                scraper.response_future = future
                 try:
-                    scraper.scrape()
-                except (ConnectionError, RequestException) as e:
-                    self.log.error("There was an error scraping endpoint %s: %s", endpoint, str(e))
-                    raise_from(type(e)("There was an error scraping endpoint {}: {}".format(endpoint, e)), None)
+                    self.scrape_endpoint(endpoint, scraper)
+                except Exception as e:
+                    errors.append(e)
+                    if not isinstance(e, (ConnectionError, RequestException)):
+                        self.log.exception('There was an error scraping endpoint %s', endpoint)
+                finally:
+                    scraper.response_future = None
+
+        if errors:
+            raise errors[0]
+
+    def scrape_endpoint(self, endpoint, scraper):
+        self.log.info('Scraping OpenMetrics endpoint: %s', endpoint)
+
+        with self.adopt_namespace(scraper.namespace):
+            try:
+                scraper.scrape()
+            except (ConnectionError, RequestException) as e:
+                self.log.error("There was an error scraping endpoint %s: %s", endpoint, str(e))
+                raise_from(type(e)("There was an error scraping endpoint {}: {}".format(endpoint, e)), None)
 
     def configure_scrapers(self):
         """
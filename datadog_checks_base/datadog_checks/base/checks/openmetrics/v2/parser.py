@@ -0,0 +1,390 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import re
+from decimal import Decimal
+from math import isinf, isnan
+
+from google.protobuf.internal.decoder import _DecodeVarint, _DecodeVarint32  # pylint: disable=E0611,E0401
+from prometheus_client.metrics_core import Metric
+from prometheus_client.samples import Sample
+
+from ....utils.prometheus import metrics_pb2
+
+LABEL_PATTERN = re.compile(r'\s*([^=\s,]+)\s*=\s*"((?:[^"\\]|\\.)*)"\s*,?')
+LABEL_ESCAPE_PATTERN = re.compile(r'\\[\\n"]')
+HELP_ESCAPE_PATTERN = re.compile(r'\\[\\n]')
+ESCAPE_SEQUENCES = {'\\\\': '\\', '\\n': '\n', '\\"': '"'}
+
+# https://github.com/prometheus/client_model/blob/v0.3.0/io/prometheus/client/metrics.proto#L27-L33
+PROTOBUF_METRIC_TYPES = {
+    metrics_pb2.COUNTER: 'counter',
+    metrics_pb2.GAUGE: 'gauge',
+    metrics_pb2.SUMMARY: 'summary',
+    metrics_pb2.UNTYPED: 'untyped',
+    metrics_pb2.HISTOGRAM: 'histogram',
+}
+INF = float('inf')
+
+# Fixed lengths of wire types other than varints and length-delimited fields
+WIRE_TYPE_LENGTHS = {1: 8, 5: 4}
+
+ALLOWED_SUFFIXES = {
+    'counter': (b'',),
+    'gauge': (b'',),
+    'summary': (b'_count', b'_sum', b''),
+    'histogram': (b'_count', b'_sum', b'_bucket'),
+}
+
+
+def replace_escape_sequence(match):
+    return ESCAPE_SEQUENCES[match.group(0)]
+
+
+def parse_labels(labels_string):
+    labels = {}
+    if '\\' in labels_string:
+        for label_name, label_value in LABEL_PATTERN.findall(labels_string):
+            labels[label_name] = LABEL_ESCAPE_PATTERN.sub(replace_escape_sequence, label_value)
+    else:
+        for label_name, label_value in LABEL_PATTERN.findall(labels_string):
+            labels[label_name] = label_value
+
+    return labels
+
+
+def get_sample_name(line):
+    label_start = line.find(b'{')
+    if label_start != -1:
+        return line[:label_start].strip()
+
+    return line.split(None, 1)[0]
+
+
+def parse_sample(line, name):
+    label_start = line.find(b'{')
+    if label_start == -1:
+        labels = {}
+        values = line.split()[1:]
+    else:
+        label_end = line.rindex(b'}')
+        labels = parse_labels(line[label_start + 1 : label_end].decode('utf-8'))
+        values = line[label_end + 1 :].split()
+
+    # If we have multiple values only consider the first
+    timestamp = float(values[-1]) / 1000 if len(values) > 1 else None
+    return Sample(name, labels, float(values[0]), timestamp)
+
+
+def build_metric(name, documentation, metric_type, samples):
+    # Munge counters into the OpenMetrics representation used internally
+    if metric_type == 'counter' and name.endswith('_total'):
+        name = name[:-6]
+
+    metric = Metric(name, documentation, metric_type)
+    metric.samples = samples
+    return metric
+
+
+def get_final_metric_name(name, metric_type):
+    if metric_type == 'counter' and name.endswith('_total'):
+        return name[:-6]
+
+    return name
+
+
+def text_fd_to_metric_families(lines, skip_metric=None, on_skip=None):
+    """
+    Parse the Prometheus text exposition format from an iterable of raw byte lines.
+
+    This produces the same metrics as `prometheus_client.parser.text_fd_to_metric_families` but tokenizes
+    the raw bytes directly. When `skip_metric` is provided, it is called once per metric family with the
+    name the metric would be yielded with and if it returns `True` none of the family's samples are decoded,
+    nor are their labels and values parsed. `on_skip` is then called with that name and the number of
+    samples that were skipped.
+    """
+    name = ''
+    raw_name = b''
+    documentation = ''
+    metric_type = 'untyped'
+    samples = []
+    allowed_names = ()
+
+    # Whether or not the current family is skipped is decided upon encountering its first sample
+    skip = None
+    skipped_samples = 0
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith(b'#'):
+            parts = line.split(None, 3)
+            if len(parts) < 3:
+                continue
+
+            directive = parts[1]
+            if directive == b'HELP':
+                if parts[2] != raw_name:
+                    if skip:
+                        on_skip(get_final_metric_name(name, metric_type), skipped_samples)
+                    elif name:
+                        yield build_metric(name, documentation, metric_type, samples)
+
+                    raw_name = parts[2]
+                    name = raw_name.decode('utf-8')
+                    metric_type = 'untyped'
+                    samples = []
+                    allowed_names = (raw_name,)
+                    skip = None
+                    skipped_samples = 0
+
+                if len(parts) == 4:
+                    documentation = HELP_ESCAPE_PATTERN.sub(replace_escape_sequence, parts[3].decode('utf-8'))
+                else:
+                    documentation = ''
+            elif directive == b'TYPE':
+                if parts[2] != raw_name:
+                    if skip:
+                        on_skip(get_final_metric_name(name, metric_type), skipped_samples)
+                    elif name:
+                        yield build_metric(name, documentation, metric_type, samples)
+
+                    raw_name = parts[2]
+                    name = raw_name.decode('utf-8')
+                    documentation = ''
+                    samples = []
+                    skip = None
+                    skipped_samples = 0
+
+                metric_type = parts[3].decode('utf-8') if len(parts) == 4 else 'untyped'
+                allowed_names = tuple(raw_name + suffix for suffix in ALLOWED_SUFFIXES.get(metric_type, (b'',)))
+
+            continue
+
+        sample_name = get_sample_name(line)
+        if sample_name in allowed_names:
+            if skip is None:
+                skip = skip_metric is not None and skip_metric(get_final_metric_name(name, metric_type))
+
+            if skip:
+                skipped_samples += 1
+                continue
+
+            sample_name = sample_name.decode('utf-8')
+            if metric_type == 'counter' and not sample_name.endswith('_total'):
+                sample_name += '_total'
+
+            samples.append(parse_sample(line, sample_name))
+        else:
+            if skip:
+                on_skip(get_final_metric_name(name, metric_type), skipped_samples)
+            elif name:
+                yield build_metric(name, documentation, metric_type, samples)
+
+            # New metric, yield immediately as untyped singleton
+            name = ''
+            raw_name = b''
+            documentation = ''
+            metric_type = 'untyped'
+            samples = []
+            allowed_names = ()
+            skip = None
+            skipped_samples = 0
+
+            sample_name = sample_name.decode('utf-8')
+            if skip_metric is not None and skip_metric(sample_name):
+                on_skip(sample_name, 1)
+                continue
+
+            yield build_metric(sample_name, documentation, metric_type, [parse_sample(line, sample_name)])
+
+    if skip:
+        on_skip(get_final_metric_name(name, metric_type), skipped_samples)
+    elif name:
+        yield build_metric(name, documentation, metric_type, samples)
+
+
+def format_float(value):
+    """
+    Format a float like Go's `strconv.FormatFloat(value, 'g', -1, 64)`, which is how bucket
+    bounds and quantiles are rendered by the text exposition format of the Go client.
+    """
+    if isnan(value):
+        return 'NaN'
+    elif isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+
+    sign, digits, exponent = Decimal(repr(value)).normalize().as_tuple()
+    if not any(digits):
+        return '-0' if sign else '0'
+
+    exponent10 = len(digits) + exponent - 1
+    if -4 <= exponent10 < 6:
+        return '{}{:f}'.format('-' if sign else '', abs(Decimal(repr(value)).normalize()))
+
+    mantissa = str(digits[0])
+    if len(digits) > 1:
+        mantissa += '.' + ''.join(map(str, digits[1:]))
+
+    return '{}{}e{}{:02d}'.format('-' if sign else '', mantissa, '-' if exponent10 < 0 else '+', abs(exponent10))
+
+
+def decode_protobuf_family(message):
+    family = metrics_pb2.MetricFamily()
+    family.ParseFromString(message)
+    return family
+
+
+def scan_protobuf_family(message):
+    """
+    Return the name, type and number of metrics of a serialized `MetricFamily` without decoding its metrics,
+    or `None` if the message contains unsupported wire types.
+    """
+    name = ''
+    metric_type = metrics_pb2.COUNTER
+    num_metrics = 0
+    position = 0
+    end = len(message)
+
+    while position < end:
+        tag, position = _DecodeVarint(message, position)
+        field_number = tag >> 3
+        wire_type = tag & 0x7
+
+        if wire_type == 0:
+            value, position = _DecodeVarint(message, position)
+            if field_number == 3:
+                metric_type = value
+        elif wire_type == 2:
+            length, position = _DecodeVarint(message, position)
+            if field_number == 1:
+                name = bytes(message[position : position + length]).decode('utf-8')
+            elif field_number == 4:
+                num_metrics += 1
+
+            position += length
+        elif wire_type in WIRE_TYPE_LENGTHS:
+            position += WIRE_TYPE_LENGTHS[wire_type]
+        else:
+            return None
+
+    return name, metric_type, num_metrics
+
+
+def get_protobuf_sample_count(family, metric_type):
+    if metric_type == 'summary':
+        return sum(len(metric.summary.quantile) + 2 for metric in family.metric)
+    elif metric_type == 'histogram':
+        return sum(len(metric.histogram.bucket) + 3 for metric in family.metric) - sum(
+            1 for metric in family.metric if metric.histogram.bucket and metric.histogram.bucket[-1].upper_bound == INF
+        )
+
+    return len(family.metric)
+
+
+def build_protobuf_samples(family, name, metric_type):
+    samples = []
+    for metric in family.metric:
+        labels = {label.name: label.value for label in metric.label}
+        timestamp = metric.timestamp_ms / 1000 if metric.HasField('timestamp_ms') else None
+
+        if metric_type == 'counter':
+            samples.append(Sample(name + '_total', labels, metric.counter.value, timestamp))
+        elif metric_type == 'gauge':
+            samples.append(Sample(name, labels, metric.gauge.value, timestamp))
+        elif metric_type == 'summary':
+            summary = metric.summary
+            for quantile in summary.quantile:
+                quantile_labels = labels.copy()
+                quantile_labels['quantile'] = format_float(quantile.quantile)
+                samples.append(Sample(name, quantile_labels, quantile.value, timestamp))
+
+            samples.append(Sample(name + '_sum', labels, summary.sample_sum, timestamp))
+            samples.append(Sample(name + '_count', labels, float(summary.sample_count), timestamp))
+        elif metric_type == 'histogram':
+            histogram = metric.histogram
+            bucket_name = name + '_bucket'
+            upper_bound = None
+            for bucket in histogram.bucket:
+                upper_bound = bucket.upper_bound
+                bucket_labels = labels.copy()
+                bucket_labels['le'] = format_float(upper_bound)
+                samples.append(Sample(bucket_name, bucket_labels, float(bucket.cumulative_count), timestamp))
+
+            # The text exposition format always includes the implicit +Inf bucket
+            if upper_bound != INF:
+                bucket_labels = labels.copy()
+                bucket_labels['le'] = '+Inf'
+                samples.append(Sample(bucket_name, bucket_labels, float(histogram.sample_count), timestamp))
+
+            samples.append(Sample(name + '_sum', labels, histogram.sample_sum, timestamp))
+            samples.append(Sample(name + '_count', labels, float(histogram.sample_count), timestamp))
+        else:
+            samples.append(Sample(name, labels, metric.untyped.value, timestamp))
+
+    return samples
+
+
+def protobuf_to_metric_families(buf, skip_metric=None, on_skip=None, partial=False):
+    """
+    Parse messages of type `MetricFamily` delimited by a varint32 from a binary buffer, also known as the
+    `application/vnd.google.protobuf; proto=io.prometheus.client.MetricFamily; encoding=delimited` format.
+
+    This produces the same metrics as parsing the equivalent text exposition format with
+    `text_fd_to_metric_families`. `skip_metric` and `on_skip` behave the same as well, and skipped counters,
+    gauges and untyped metrics are never decoded.
+
+    If `partial` is set, the buffer is assumed to have been truncated and an incomplete last message is ignored.
+    """
+    buf = memoryview(buf)
+    position = 0
+    end = len(buf)
+
+    while position < end:
+        try:
+            message_length, position = _DecodeVarint32(buf, position)
+        except IndexError:
+            if partial:
+                break
+
+            raise
+
+        if partial and position + message_length > end:
+            break
+
+        message = buf[position : position + message_length]
+        position += message_length
+
+        family = None
+        if skip_metric is not None:
+            header = scan_protobuf_family(message)
+            if header is None:
+                family = decode_protobuf_family(message)
+                header = (family.name, family.type, len(family.metric))
+
+            family_name, family_type, num_metrics = header
+            metric_type = PROTOBUF_METRIC_TYPES.get(family_type, 'untyped')
+            name = get_final_metric_name(family_name, metric_type)
+            if skip_metric(name):
+                # Only summaries and histograms have a variable number of samples per metric
+                if metric_type in ('summary', 'histogram'):
+                    if family is None:
+                        family = decode_protobuf_family(message)
+
+                    on_skip(name, get_protobuf_sample_count(family, metric_type))
+                else:
+                    on_skip(name, num_metrics)
+
+                continue
+
+        if family is None:
+            family = decode_protobuf_family(message)
+
+        metric_type = PROTOBUF_METRIC_TYPES.get(family.type, 'untyped')
+        name = get_final_metric_name(family.name, metric_type)
+
+        metric = Metric(name, family.help, metric_type)
+        metric.samples = build_protobuf_samples(family, name, metric_type)
+        yield metric
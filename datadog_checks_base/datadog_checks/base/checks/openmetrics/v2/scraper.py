@@ -2,8 +2,10 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import fnmatch
+import hashlib
 import inspect
 import re
+import time
 from copy import copy, deepcopy
 from itertools import chain
 from math import isinf, isnan
@@ -11,21 +13,35 @@ from typing import List
 
 from prometheus_client.openmetrics.parser import text_fd_to_metric_families as parse_metric_families_strict
 from prometheus_client.parser import text_fd_to_metric_families as parse_metric_families
+from requests.models import ITER_CHUNK_SIZE
+from requests.utils import stream_decode_response_unicode
 
 from ....config import is_affirmative
 from ....constants import ServiceCheck
 from ....errors import ConfigurationError
 from ....utils.functions import no_op, return_true
 from ....utils.http import RequestsWrapper
+from ....utils.tagging import NormalizedTags
 from .first_scrape_handler import first_scrape_handler
 from .labels import LabelAggregator, get_label_normalizer
+from .parser import protobuf_to_metric_families as parse_metric_families_protobuf
+from .parser import text_fd_to_metric_families as parse_metric_families_fast
 from .transform import MetricTransformer
+from .utils import SubmissionRecorder, TagCache
 
 try:
     import datadog_agent
 except ImportError:
     from datadog_checks.base.stubs import datadog_agent
 
+PROTOBUF_CONTENT_TYPE = 'application/vnd.google.protobuf'
+
+# Prefer the delimited protobuf format but accept text from endpoints that do not support it, like Prometheus does
+PROTOBUF_ACCEPT_HEADER = (
+    'application/vnd.google.protobuf;proto=io.prometheus.client.MetricFamily;encoding=delimited;q=0.7,'
+    'text/plain;version=0.0.4;q=0.3'
+)
+
 
 class OpenMetricsScraper:
     """
@@ -61,7 +77,27 @@ class OpenMetricsScraper:
         # Parse the configuration
         self.endpoint = config['openmetrics_endpoint']
 
-        self.metric_transformer = MetricTransformer(self.check, config)
+        # Endpoints that rarely change may avoid processing the same payload again, in which case
+        # the gauges and service checks of the last processed payload are submitted instead
+        self.use_conditional_requests = is_affirmative(config.get('use_conditional_requests', False))
+        self.skip_unchanged_payload = is_affirmative(config.get('skip_unchanged_payload', False))
+        if self.use_conditional_requests or self.skip_unchanged_payload:
+            self.submission_recorder = SubmissionRecorder(self.check)
+            self.metric_transformer = MetricTransformer(self.submission_recorder, config)
+        else:
+            self.submission_recorder = None
+            self.metric_transformer = MetricTransformer(self.check, config)
+
+        # The state of the last processed payload
+        self.etag = None
+        self.payload_hash = None
+        self.cached_submissions = None
+
+        # The state of the current payload, which only replaces the above once it has been fully processed
+        self.payload_unchanged = False
+        self.pending_etag = None
+        self.pending_payload_hash = None
+
         self.label_aggregator = LabelAggregator(self.check, config)
 
         self.enable_telemetry = is_affirmative(config.get('telemetry', False))
@@ -150,6 +186,9 @@ class OpenMetricsScraper:
         if exclude_metrics_patterns:
             self.exclude_metrics_pattern = re.compile('|'.join(exclude_metrics_patterns))
 
+        # Decisions are cached per metric name so patterns are only evaluated once for every exposed metric
+        self.excluded_metrics = {}
+
         self.exclude_metrics_by_labels = {}
         exclude_metrics_by_labels = config.get('exclude_metrics_by_labels', {})
         if not isinstance(exclude_metrics_by_labels, dict):
@@ -202,6 +241,22 @@ class OpenMetricsScraper:
         # These will be applied to everything except service checks
         self.tags = self.static_tags
 
+        # Label sets rarely change between scrapes, so the resulting tags and hostname may be reused
+        tag_cache_size = config.get('tag_cache_size', 0)
+        if not isinstance(tag_cache_size, int) or tag_cache_size < 0:
+            raise ConfigurationError('Setting `tag_cache_size` must be a non-negative integer')
+
+        self.tag_cache = TagCache(tag_cache_size) if tag_cache_size else None
+
+        # Bound the memory used by misbehaving endpoints, anything beyond these limits is not processed
+        self.max_payload_size = config.get('max_payload_size', 0)
+        if not isinstance(self.max_payload_size, int) or self.max_payload_size < 0:
+            raise ConfigurationError('Setting `max_payload_size` must be a non-negative integer')
+
+        self.max_samples = config.get('max_samples', 0)
+        if not isinstance(self.max_samples, int) or self.max_samples < 0:
+            raise ConfigurationError('Setting `max_samples` must be a non-negative integer')
+
         self.raw_line_filter = None
         raw_line_filters = config.get('raw_line_filters', [])
         if not isinstance(raw_line_filters, list):
@@ -216,6 +271,8 @@ class OpenMetricsScraper:
         self.http = RequestsWrapper(config, self.check.init_config, self.check.HTTP_CONFIG_REMAPPER, self.check.log)
 
         # Decide how strictly we will adhere to the latest version of the specification
+        self.use_fast_parser = False
+        self.use_protobuf = False
         if is_affirmative(config.get('use_latest_spec', False)):
             self.parse_metric_families = parse_metric_families_strict
             # https://github.com/prometheus/client_python/blob/v0.9.0/prometheus_client/openmetrics/exposition.py#L7
@@ -224,6 +281,18 @@ class OpenMetricsScraper:
             self.parse_metric_families = parse_metric_families
             accept_header = 'text/plain'
 
+            # The fast parser operates on raw bytes and skips unwanted metrics before parsing their samples
+            if is_affirmative(config.get('use_fast_parser', False)):
+                self.use_fast_parser = True
+                self.parse_metric_families = self.parse_metric_families_fast
+                if self.raw_line_filter is not None:
+                    self.raw_line_filter = re.compile(self.raw_line_filter.pattern.encode('utf-8'))
+
+            # The response's content type then decides which parser is used
+            if is_affirmative(config.get('use_protobuf', False)):
+                self.use_protobuf = True
+                accept_header = PROTOBUF_ACCEPT_HEADER
+
         # Request the appropriate exposition format
         if self.http.options['headers'].get('Accept') == '*/*':
             self.http.options['headers']['Accept'] = accept_header
@@ -233,21 +302,107 @@ class OpenMetricsScraper:
         # Used for monotonic counts
         self.flush_first_value = False
 
+        # Set by the check when the response was already fetched by `fetch`, see `max_concurrent_scrapes`
+        self.response_future = None
+
+        # The time spent by `fetch` for the current scrape
+        self.fetch_duration = 0
+
+        # The state of the current scrape, used for telemetry and for reporting truncated payloads
+        self.request_duration = 0
+        self.bytes_read = 0
+        self.families_parsed = 0
+        self.peak_families = 0
+        self.payload_truncated = None
+
     def scrape(self):
         """
         Execute a scrape, and for each metric collected, transform the metric.
         """
+        start_time = time.perf_counter()
         runtime_data = {'flush_first_value': self.flush_first_value, 'static_tags': self.static_tags}
 
-        for metric in self.consume_metrics(runtime_data):
-            transformer = self.metric_transformer.get(metric)
-            if transformer is None:
-                continue
+        self.request_duration = 0
+        self.bytes_read = 0
+        self.families_parsed = 0
+        self.peak_families = 0
+        self.payload_truncated = None
 
-            transformer(metric, self.generate_sample_data(metric), runtime_data)
+        if self.submission_recorder is not None:
+            self.payload_unchanged = False
+            self.submission_recorder.recording = []
+
+        # Only measure the time spent by transformers when it is reported
+        enable_telemetry = self.enable_telemetry
+        transform_duration = 0
+
+        try:
+            for metric in self.consume_metrics(runtime_data):
+                transformer = self.metric_transformer.get(metric)
+                if transformer is None:
+                    continue
+
+                if enable_telemetry:
+                    transform_start_time = time.perf_counter()
+                    transformer(metric, self.generate_sample_data(metric), runtime_data)
+                    transform_duration += time.perf_counter() - transform_start_time
+                else:
+                    transformer(metric, self.generate_sample_data(metric), runtime_data)
+        finally:
+            if self.submission_recorder is not None:
+                recording = self.submission_recorder.recording
+                self.submission_recorder.recording = None
+
+        if self.submission_recorder is not None:
+            if self.payload_unchanged:
+                self.submit_cached_submissions()
+            else:
+                self.etag = self.pending_etag
+                self.payload_hash = self.pending_payload_hash
+                self.cached_submissions = recording
 
         self.flush_first_value = True
 
+        if self.payload_truncated is not None:
+            self.log.warning('Truncated the payload of endpoint %s: %s', self.endpoint, self.payload_truncated)
+            self.submit_health_check(ServiceCheck.WARNING, message=self.payload_truncated)
+            self.submit_telemetry_truncated_payload()
+
+        if self.tag_cache is not None:
+            self.submit_telemetry_tag_cache()
+            self.tag_cache.reset_stats()
+
+        if self.http.shared_connection_pool:
+            self.submit_telemetry_shared_connection_pool()
+
+        duration = time.perf_counter() - start_time
+        self.submit_telemetry_scrape_duration(duration)
+        self.submit_telemetry_scrape_stats(duration - self.request_duration - transform_duration, transform_duration)
+
+    def fetch(self):
+        """
+        Send the request and read the entire response body, possibly from another thread. The response
+        is then consumed by the next `scrape` using `response_future`.
+        """
+        start_time = time.perf_counter()
+        try:
+            response = self.send_request()
+
+            # The body is streamed instead so that `max_payload_size` bounds memory usage
+            if self.max_payload_size:
+                return response
+
+            try:
+                # Buffer the body so that parsing does not wait on the network
+                response.content
+            except Exception:
+                response.close()
+                raise
+
+            return response
+        finally:
+            self.fetch_duration = time.perf_counter() - start_time
+
     def consume_metrics(self, runtime_data):
         """
         Yield the processed metrics and filter out excluded metrics.
@@ -259,25 +414,61 @@ class OpenMetricsScraper:
         if self.label_aggregator.configured:
             metric_parser = self.label_aggregator(metric_parser)
 
+        families_consumed = 0
         for metric in metric_parser:
-            if metric.name in self.exclude_metrics or (
-                self.exclude_metrics_pattern is not None and self.exclude_metrics_pattern.search(metric.name)
-            ):
+            # Metrics may be buffered before reaching this point, for example by the label aggregator
+            families_held = self.families_parsed - families_consumed
+            families_consumed += 1
+            if families_held > self.peak_families:
+                self.peak_families = families_held
+
+            if self.is_excluded_metric(metric.name):
                 self.submit_telemetry_number_of_ignored_metric_samples(metric)
                 continue
 
             yield metric
 
+    def is_excluded_metric(self, metric_name):
+        """
+        Return whether or not the metric is excluded by the `exclude_metrics` setting.
+        """
+
+        excluded = self.excluded_metrics.get(metric_name)
+        if excluded is None:
+            excluded = self.excluded_metrics[metric_name] = metric_name in self.exclude_metrics or (
+                self.exclude_metrics_pattern is not None
+                and self.exclude_metrics_pattern.search(metric_name) is not None
+            )
+
+        return excluded
+
     def parse_metrics(self):
         """
         Get the line streamer and yield processed metrics.
         """
 
-        line_streamer = self.stream_connection_lines()
-        if self.raw_line_filter is not None:
-            line_streamer = self.filter_connection_lines(line_streamer)
+        if self.use_protobuf:
+            metric_families = self.parse_negotiated_metric_families()
+        else:
+            line_streamer = self.stream_connection_lines()
+            if self.raw_line_filter is not None:
+                line_streamer = self.filter_connection_lines(line_streamer)
+
+            metric_families = self.parse_metric_families(line_streamer)
+
+        max_samples = self.max_samples
+        num_samples = 0
+        for metric in metric_families:
+            if max_samples:
+                num_samples += len(metric.samples)
+                if num_samples > max_samples:
+                    self.payload_truncated = (
+                        f'Stopped processing metric `{metric.name}` as it exceeds the '
+                        f'`max_samples` limit of {max_samples} samples'
+                    )
+                    return
 
-        for metric in self.parse_metric_families(line_streamer):
+            self.families_parsed += 1
             self.submit_telemetry_number_of_total_metric_samples(metric)
 
             # It is critical that the prefix is removed immediately so that
@@ -287,12 +478,65 @@ class OpenMetricsScraper:
 
             yield metric
 
+    def parse_negotiated_metric_families(self):
+        """
+        Parse the response using the exposition format that the endpoint chose based on the Accept header.
+        """
+
+        with self.get_connection() as connection:
+            if PROTOBUF_CONTENT_TYPE in connection.headers.get('Content-Type', ''):
+                payload = b''.join(self.iter_connection_chunks(connection))
+                if self.payload_unchanged:
+                    return
+
+                # Lines do not exist in this format so `raw_line_filters` does not apply
+                yield from parse_metric_families_protobuf(
+                    payload,
+                    skip_metric=self.skip_metric,
+                    on_skip=self.submit_telemetry_number_of_skipped_metric_samples,
+                    partial=self.payload_truncated is not None,
+                )
+                return
+
+            line_streamer = self.iter_connection_lines(connection)
+            if self.raw_line_filter is not None:
+                line_streamer = self.filter_connection_lines(line_streamer)
+
+            yield from self.parse_metric_families(line_streamer)
+
+    def parse_metric_families_fast(self, line_streamer):
+        """
+        Parse raw lines with the fast parser, skipping the samples of excluded metrics entirely.
+        """
+
+        return parse_metric_families_fast(
+            line_streamer, skip_metric=self.skip_metric, on_skip=self.submit_telemetry_number_of_skipped_metric_samples
+        )
+
+    def skip_metric(self, metric_name):
+        """
+        Return whether or not a metric may be discarded before its samples are parsed, either because
+        it is excluded or because no transformer is configured for it.
+        """
+
+        if self.raw_metric_prefix and metric_name.startswith(self.raw_metric_prefix):
+            metric_name = metric_name[len(self.raw_metric_prefix) :]
+
+        # Metrics used for label sharing or process start time detection must be seen even when excluded
+        if self.label_aggregator.configured and metric_name in self.label_aggregator.metric_config:
+            return False
+        elif self.use_process_start_time and metric_name == 'process_start_time_seconds':
+            return False
+
+        return self.is_excluded_metric(metric_name) or not self.metric_transformer.is_configured(metric_name)
+
     def generate_sample_data(self, metric):
         """
         Yield a sample of processed data.
         """
 
         label_normalizer = get_label_normalizer(metric.type)
+        tag_cache = self.tag_cache
 
         for sample in metric.samples:
             value = sample.value
@@ -300,38 +544,66 @@ class OpenMetricsScraper:
                 self.log.debug('Ignoring sample for metric `%s` as it has an invalid value: %s', metric.name, value)
                 continue
 
-            tags = []
-            skip_sample = False
             labels = sample.labels
             self.label_aggregator.populate(labels)
             label_normalizer(labels)
 
-            for label_name, label_value in labels.items():
-                sample_excluder = self.exclude_metrics_by_labels.get(label_name)
-                if sample_excluder is not None and sample_excluder(label_value):
-                    skip_sample = True
-                    break
-                elif label_name in self.exclude_labels:
-                    continue
-                elif self.include_labels and label_name not in self.include_labels:
-                    continue
+            if tag_cache is None:
+                sample_tags = self.get_sample_tags(labels)
+            else:
+                key = (metric.type, tuple(labels.items()))
+                sample_tags = tag_cache.get(key)
+                if sample_tags is None:
+                    tag_cache.misses += 1
+                    sample_tags = tag_cache[key] = self.get_shared_sample_tags(labels)
+                else:
+                    tag_cache.hits += 1
 
-                label_name = self.rename_labels.get(label_name, label_name)
-                tags.append(f'{label_name}:{label_value}')
+            tags, hostname = sample_tags
+            if tags is None:
+                continue
 
-            if skip_sample:
+            self.submit_telemetry_number_of_processed_metric_samples()
+            yield sample, tags, hostname
+
+    def get_shared_sample_tags(self, labels):
+        """
+        Like `get_sample_tags`, but the tags are normalized and immutable so that every sample with the same
+        labels may share them.
+        """
+        tags, hostname = self.get_sample_tags(labels)
+        if tags is None:
+            return None, hostname
+
+        return NormalizedTags(self.check._normalize_tags_type(tags)), hostname
+
+    def get_sample_tags(self, labels):
+        """
+        Return the tags and hostname for a sample's labels, with tags set to `None` if the sample is excluded.
+        """
+
+        tags = []
+        for label_name, label_value in labels.items():
+            sample_excluder = self.exclude_metrics_by_labels.get(label_name)
+            if sample_excluder is not None and sample_excluder(label_value):
+                return None, ''
+            elif label_name in self.exclude_labels:
+                continue
+            elif self.include_labels and label_name not in self.include_labels:
                 continue
 
-            tags.extend(self.tags)
+            label_name = self.rename_labels.get(label_name, label_name)
+            tags.append(f'{label_name}:{label_value}')
 
-            hostname = ""
-            if self.hostname_label and self.hostname_label in labels:
-                hostname = labels[self.hostname_label]
-                if self.hostname_formatter is not None:
-                    hostname = self.hostname_formatter(hostname)
+        tags.extend(self.tags)
 
-            self.submit_telemetry_number_of_processed_metric_samples()
-            yield sample, tags, hostname
+        hostname = ""
+        if self.hostname_label and self.hostname_label in labels:
+            hostname = labels[self.hostname_label]
+            if self.hostname_formatter is not None:
+                hostname = self.hostname_formatter(hostname)
+
+        return tags, hostname
 
     def stream_connection_lines(self):
         """
@@ -339,8 +611,103 @@ class OpenMetricsScraper:
         """
 
         with self.get_connection() as connection:
-            for line in connection.iter_lines(decode_unicode=True):
-                yield line
+            yield from self.iter_connection_lines(connection)
+
+    def iter_connection_lines(self, connection):
+        """
+        Yield the lines of the response body, like `Response.iter_lines`.
+        """
+
+        chunks = self.iter_connection_chunks(connection)
+
+        # The fast parser tokenizes raw bytes and only decodes what it needs
+        if not self.use_fast_parser:
+            chunks = stream_decode_response_unicode(chunks, connection)
+
+        pending = None
+        for chunk in chunks:
+            if pending is not None:
+                chunk = pending + chunk
+
+            lines = chunk.splitlines()
+
+            # The last line may continue in the next chunk
+            if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
+                pending = lines.pop()
+            else:
+                pending = None
+
+            yield from lines
+
+        # The last line of a truncated payload may be incomplete
+        if pending is not None and self.payload_truncated is None:
+            yield pending
+
+    def iter_connection_chunks(self, connection):
+        """
+        Yield the chunks of the response body, keeping track of its size and, if `skip_unchanged_payload` is
+        enabled, its hash. Nothing is yielded if the payload did not change since the last processed scrape.
+        """
+
+        if self.use_conditional_requests:
+            if connection.status_code == 304:
+                self.payload_unchanged = self.cached_submissions is not None
+                return
+
+            self.pending_etag = connection.headers.get('ETag')
+
+        content = connection.iter_content(ITER_CHUNK_SIZE)
+        if self.max_payload_size:
+            content = self.limit_payload_size(content)
+
+        if not self.skip_unchanged_payload:
+            size = 0
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+
+            self.bytes_read = size
+            self.submit_telemetry_streamed_response_size(connection, size)
+            return
+
+        # The whole body must be read before deciding whether or not to process it
+        payload_hash = hashlib.sha256()
+        chunks = []
+        size = 0
+        for chunk in content:
+            payload_hash.update(chunk)
+            chunks.append(chunk)
+            size += len(chunk)
+
+        self.bytes_read = size
+        self.submit_telemetry_streamed_response_size(connection, size)
+
+        self.pending_payload_hash = payload_hash.digest()
+        if self.pending_payload_hash == self.payload_hash and self.cached_submissions is not None:
+            self.payload_unchanged = True
+            return
+
+        yield from chunks
+
+    def limit_payload_size(self, chunks):
+        """
+        Yield chunks until the `max_payload_size` limit is reached, after which the rest of the body is never read.
+        """
+
+        remaining = self.max_payload_size
+        for chunk in chunks:
+            if len(chunk) > remaining:
+                if remaining:
+                    yield chunk[:remaining]
+
+                self.payload_truncated = (
+                    f'Stopped reading the payload as it exceeds the `max_payload_size` limit of '
+                    f'{self.max_payload_size} bytes'
+                )
+                return
+
+            remaining -= len(chunk)
+            yield chunk
 
     def filter_connection_lines(self, line_streamer):
         """
@@ -358,8 +725,9 @@ class OpenMetricsScraper:
         Send a request to scrape metrics. Return the response or throw an exception.
         """
 
+        start_time = time.perf_counter()
         try:
-            response = self.send_request()
+            response = self.send_request() if self.response_future is None else self.response_future.result()
         except Exception as e:
             self.submit_health_check(ServiceCheck.CRITICAL, message=str(e))
             raise
@@ -379,6 +747,8 @@ class OpenMetricsScraper:
 
                 self.submit_telemetry_endpoint_response_size(response)
                 return response
+        finally:
+            self.request_duration = time.perf_counter() - start_time
 
     def send_request(self, **kwargs):
         """
@@ -386,6 +756,9 @@ class OpenMetricsScraper:
         """
 
         kwargs['stream'] = True
+        if self.use_conditional_requests and self.etag is not None and self.cached_submissions is not None:
+            kwargs.setdefault('extra_headers', {})['If-None-Match'] = self.etag
+
         return self.http.get(self.endpoint, **kwargs)
 
     def set_dynamic_tags(self, *tags):
@@ -395,6 +768,10 @@ class OpenMetricsScraper:
 
         self.tags = tuple(chain(self.static_tags, tags))
 
+        # Cached tags embed the previous dynamic tags
+        if self.tag_cache is not None:
+            self.tag_cache.clear()
+
     def submit_health_check(self, status, **kwargs):
         """
         If health service check is enabled, send an `openmetrics.health` service check.
@@ -409,20 +786,71 @@ class OpenMetricsScraper:
     def submit_telemetry_number_of_ignored_metric_samples(self, metric):
         self.count('telemetry.metrics.ignored.count', len(metric.samples), tags=self.tags)
 
+    def submit_telemetry_number_of_skipped_metric_samples(self, metric_name, num_samples):
+        self.count('telemetry.metrics.input.count', num_samples, tags=self.tags)
+
+        if self.raw_metric_prefix and metric_name.startswith(self.raw_metric_prefix):
+            metric_name = metric_name[len(self.raw_metric_prefix) :]
+
+        # Metrics without a transformer are not reported as ignored by the default parser either
+        if self.is_excluded_metric(metric_name):
+            self.count('telemetry.metrics.ignored.count', num_samples, tags=self.tags)
+
     def submit_telemetry_number_of_processed_metric_samples(self):
         self.count('telemetry.metrics.processed.count', 1, tags=self.tags)
 
     def submit_telemetry_number_of_ignored_lines(self):
         self.count('telemetry.metrics.blacklist.count', 1, tags=self.tags)
 
+    def submit_cached_submissions(self):
+        """
+        Submit the gauges and service checks of the last processed payload again.
+        """
+
+        self.submit_telemetry_unchanged_payload()
+        for method, args in self.cached_submissions:
+            method(*args)
+
     def submit_telemetry_endpoint_response_size(self, response):
+        # Without a Content-Length the size is only known once the body has been read, see `iter_connection_chunks`
         content_length = response.headers.get('Content-Length')
         if content_length is not None:
-            content_length = int(content_length)
-        else:
-            content_length = len(response.content)
-
-        self.gauge('telemetry.payload.size', content_length, tags=self.tags)
+            self.gauge('telemetry.payload.size', int(content_length), tags=self.tags)
+
+    def submit_telemetry_streamed_response_size(self, response, size):
+        if 'Content-Length' not in response.headers:
+            self.gauge('telemetry.payload.size', size, tags=self.tags)
+
+    def submit_telemetry_unchanged_payload(self):
+        self.count('telemetry.payload.unchanged', 1, tags=self.tags)
+
+    def submit_telemetry_scrape_duration(self, duration):
+        # Requests sent by `fetch` happen before the scrape begins
+        if self.response_future is not None:
+            duration += self.fetch_duration
+
+        self.gauge('telemetry.scrape.duration', duration, tags=self.tags)
+
+    def submit_telemetry_scrape_stats(self, parse_duration, transform_duration):
+        self.gauge('telemetry.scrape.bytes_read', self.bytes_read, tags=self.tags)
+        self.gauge('telemetry.scrape.parse_time', parse_duration, tags=self.tags)
+        self.gauge('telemetry.scrape.transform_time', transform_duration, tags=self.tags)
+        self.gauge('telemetry.scrape.peak_families', self.peak_families, tags=self.tags)
+
+    def submit_telemetry_truncated_payload(self):
+        self.count('telemetry.payload.truncated', 1, tags=self.tags)
+
+    def submit_telemetry_tag_cache(self):
+        self.gauge('telemetry.tag_cache.size', self.tag_cache.currsize, tags=self.tags)
+        self.count('telemetry.tag_cache.hits', self.tag_cache.hits, tags=self.tags)
+        self.count('telemetry.tag_cache.misses', self.tag_cache.misses, tags=self.tags)
+        self.count('telemetry.tag_cache.evictions', self.tag_cache.evictions, tags=self.tags)
+
+    def submit_telemetry_shared_connection_pool(self):
+        hits, misses, size = self.http.get_shared_connection_pool_stats()
+        self.count('telemetry.connection_pool.hits', hits, tags=self.tags)
+        self.count('telemetry.connection_pool.misses', misses, tags=self.tags)
+        self.gauge('telemetry.connection_pool.size', size, tags=self.tags)
 
     def __getattr__(self, name):
         # Forward all unknown attribute lookups to the check instance for access to submission methods, hostname, etc.
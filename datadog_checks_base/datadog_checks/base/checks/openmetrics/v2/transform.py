@@ -17,6 +17,8 @@ class MetricTransformer:
         self.check = check
         self.logger = check.log
         self.cache_metric_wildcards = is_affirmative(config.get('cache_metric_wildcards', True))
+        # Samples of the same label set share immutable tags when they are cached
+        self.shared_sample_tags = bool(config.get('tag_cache_size', 0))
         self.collect_counters_with_distributions = is_affirmative(
             config.get('collect_counters_with_distributions', False)
         )
@@ -40,6 +42,10 @@ class MetricTransformer:
 
         metrics_config = deepcopy(self.normalize_metric_config(config))
 
+        # Whether or not metric names have an associated transformer, which allows
+        # scrapers to skip unwanted metrics before parsing their samples
+        self.configured_metrics = {}
+
         self.transformer_data = {}
         self.metric_patterns = []
         for raw_metric_name, config in metrics_config.items():
@@ -63,6 +69,8 @@ class MetricTransformer:
             metric_type, transformer = transformer_data
             if metric_type == DEFAULT_METRIC_TYPE and self.skip_native_metric(metric):
                 return
+            elif metric_type is None and self.shared_sample_tags:
+                return copy_sample_tags(transformer)
 
             return transformer
         elif self.metric_patterns:
@@ -74,15 +82,28 @@ class MetricTransformer:
 
                     if metric_type == DEFAULT_METRIC_TYPE and self.skip_native_metric(metric):
                         return
+                    elif metric_type is None and self.shared_sample_tags:
+                        return copy_sample_tags(transformer)
 
                     return transformer
 
         self.logger.debug('Skipping metric `%s` as it is not defined in `metrics`', metric_name)
 
+    def is_configured(self, metric_name):
+        configured = self.configured_metrics.get(metric_name)
+        if configured is None:
+            configured = metric_name in self.transformer_data or any(
+                metric_pattern.search(metric_name) for metric_pattern, _ in self.metric_patterns
+            )
+            self.configured_metrics[metric_name] = configured
+
+        return configured
+
     def add_custom_transformer(self, name, transformer, pattern=False):
         if not pattern:
             name = '^{}$'.format(name)
         self.metric_patterns.append((re.compile(name), {'__transformer__': transformer}))
+        self.configured_metrics.clear()
 
     def compile_transformer(self, config):
         custom_transformer = config.pop('__transformer__', None)
@@ -146,6 +167,19 @@ class MetricTransformer:
         return config
 
 
+def copy_sample_tags(transformer):
+    """
+    Give custom transformers their own copy of the tags of every sample, which they are free to modify.
+    """
+
+    def transform(metric, sample_data, runtime_data):
+        return transformer(
+            metric, ((sample, list(tags), hostname) for sample, tags, hostname in sample_data), runtime_data
+        )
+
+    return transform
+
+
 def get_native_transformer(check, metric_name, modifiers, global_options):
     """
     Uses whatever the endpoint describes as the metric type in the first occurrence.
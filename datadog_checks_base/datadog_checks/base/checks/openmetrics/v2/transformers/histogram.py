@@ -1,8 +1,7 @@
 # (C) Datadog, Inc. 2020-present
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
-from ..labels import canonicalize_numeric_label
-from ..utils import decumulate_histogram_buckets
+from ..utils import decumulate_histogram_bucket_samples, decumulate_histogram_buckets
 
 
 def get_histogram(check, metric_name, modifiers, global_options):
@@ -11,19 +10,44 @@ def get_histogram(check, metric_name, modifiers, global_options):
     https://github.com/OpenObservability/OpenMetrics/blob/master/specification/OpenMetrics.md#histogram-1
     """
     if global_options['collect_histogram_buckets']:
+        # Every distinct bucket boundary is only parsed once
+        bounds = {}
+
         if global_options['histogram_buckets_as_distributions']:
             logger = check.log
-            submit_histogram_bucket_method = check.submit_histogram_bucket
-
-            if global_options['collect_counters_with_distributions']:
+            submit_histogram_buckets_method = check.submit_histogram_buckets
+            collect_counters = global_options['collect_counters_with_distributions']
+            if collect_counters:
                 monotonic_count_method = check.monotonic_count
                 sum_metric = f'{metric_name}.sum'
                 count_metric = f'{metric_name}.count'
 
-                def histogram(metric, sample_data, runtime_data):
-                    flush_first_value = runtime_data['flush_first_value']
+            def histogram(metric, sample_data, runtime_data):
+                flush_first_value = runtime_data['flush_first_value']
+
+                values = []
+                lower_bounds = []
+                upper_bounds = []
+                hostnames = []
+                tags_list = []
+
+                for sample, tags, hostname, lower_bound, upper_bound in decumulate_histogram_bucket_samples(
+                    sample_data, bounds
+                ):
+                    if upper_bound is not None:
+                        if lower_bound == upper_bound:
+                            # this can happen for -inf/-inf bucket that we don't want to send (always 0)
+                            logger.warning(
+                                'Metric: %s has bucket boundaries equal, skipping: %s', metric_name, sample.labels
+                            )
+                            continue
 
-                    for sample, tags, hostname in decumulate_histogram_buckets(sample_data):
+                        values.append(sample.value)
+                        lower_bounds.append(lower_bound)
+                        upper_bounds.append(upper_bound)
+                        hostnames.append(hostname)
+                        tags_list.append(tags)
+                    elif collect_counters:
                         sample_name = sample.name
                         if sample_name.endswith('_sum'):
                             monotonic_count_method(
@@ -41,57 +65,18 @@ def get_histogram(check, metric_name, modifiers, global_options):
                                 hostname=hostname,
                                 flush_first_value=flush_first_value,
                             )
-                        elif sample_name.endswith('_bucket'):
-                            lower_bound = canonicalize_numeric_label(sample.labels['lower_bound'])
-                            upper_bound = canonicalize_numeric_label(sample.labels['upper_bound'])
-
-                            if lower_bound == upper_bound:
-                                # this can happen for -inf/-inf bucket that we don't want to send (always 0)
-                                logger.warning(
-                                    'Metric: %s has bucket boundaries equal, skipping: %s', metric_name, sample.labels
-                                )
-                                continue
-
-                            submit_histogram_bucket_method(
-                                metric_name,
-                                sample.value,
-                                lower_bound,
-                                upper_bound,
-                                True,
-                                hostname,
-                                tags,
-                                flush_first_value=flush_first_value,
-                            )
-
-            else:
-
-                def histogram(metric, sample_data, runtime_data):
-                    flush_first_value = runtime_data['flush_first_value']
-
-                    for sample, tags, hostname in decumulate_histogram_buckets(sample_data):
-                        if not sample.name.endswith('_bucket'):
-                            continue
-
-                        lower_bound = canonicalize_numeric_label(sample.labels['lower_bound'])
-                        upper_bound = canonicalize_numeric_label(sample.labels['upper_bound'])
-
-                        if lower_bound == upper_bound:
-                            # this can happen for -inf/-inf bucket that we don't want to send (always 0)
-                            logger.warning(
-                                'Metric: %s has bucket boundaries equal, skipping: %s', metric_name, sample.labels
-                            )
-                            continue
 
-                        submit_histogram_bucket_method(
-                            metric_name,
-                            sample.value,
-                            lower_bound,
-                            upper_bound,
-                            True,
-                            hostname,
-                            tags,
-                            flush_first_value=flush_first_value,
-                        )
+                if values:
+                    submit_histogram_buckets_method(
+                        metric_name,
+                        values,
+                        lower_bounds,
+                        upper_bounds,
+                        True,
+                        hostnames,
+                        tags_list,
+                        flush_first_value=flush_first_value,
+                    )
 
         else:
             monotonic_count_method = check.monotonic_count
@@ -104,7 +89,7 @@ def get_histogram(check, metric_name, modifiers, global_options):
                 def histogram(metric, sample_data, runtime_data):
                     flush_first_value = runtime_data['flush_first_value']
 
-                    for sample, tags, hostname in decumulate_histogram_buckets(sample_data):
+                    for sample, tags, hostname in decumulate_histogram_buckets(sample_data, bounds):
                         sample_name = sample.name
                         if sample_name.endswith('_sum'):
                             monotonic_count_method(
@@ -1,82 +1,171 @@
 # (C) Datadog, Inc. 2020-present
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+from cachetools import LRUCache
 from prometheus_client.samples import Sample
 
+from .labels import canonicalize_numeric_label
+
 NEGATIVE_INFINITY = float('-inf')
 
 
-def decumulate_histogram_buckets(sample_data):
+def decumulate_histogram_buckets(sample_data, bounds=None):
     """
     Decumulate buckets in a given histogram metric and adds the lower_bound label (le being upper_bound)
     """
-    # TODO: investigate performance optimizations
+    for sample, tags, hostname, _, _ in decumulate_histogram_bucket_samples(sample_data, bounds):
+        yield sample, tags, hostname
+
+
+def decumulate_histogram_bucket_samples(sample_data, bounds=None):
+    """
+    Like `decumulate_histogram_buckets` but also return the numeric lower and upper bounds of every
+    bucket, or `None` for other samples.
+
+    The `bounds` mapping of `upper_bound` label values to their parsed representation may be
+    kept across calls so that every distinct bucket boundary is only ever parsed once.
+    """
+    if bounds is None:
+        bounds = {}
+
     new_sample_data = []
-    bucket_values_by_context_upper_bound = {}
+
+    # The positions of the buckets of every series, along with their parsed upper bounds
+    series_positions = {}
+    series_bounds = {}
+
     for sample, tags, hostname in sample_data:
         if sample.name.endswith('_bucket'):
-            context_key = compute_bucket_hash(sample.labels)
-            if context_key not in bucket_values_by_context_upper_bound:
-                bucket_values_by_context_upper_bound[context_key] = {}
-            bucket_values_by_context_upper_bound[context_key][float(sample.labels['upper_bound'])] = sample.value
-
-        new_sample_data.append([sample, tags, hostname])
-
-    sorted_buckets_by_context = {}
-    for context in bucket_values_by_context_upper_bound:
-        sorted_buckets_by_context[context] = sorted(bucket_values_by_context_upper_bound[context])
-
-    # Tuples (lower_bound, upper_bound, value)
-    bucket_tuples_by_context_upper_bound = {}
-    for context in sorted_buckets_by_context:
-        for i, upper_b in enumerate(sorted_buckets_by_context[context]):
-            if i == 0:
-                if context not in bucket_tuples_by_context_upper_bound:
-                    bucket_tuples_by_context_upper_bound[context] = {}
-                if upper_b > 0:
-                    # positive buckets start at zero
-                    bucket_tuples_by_context_upper_bound[context][upper_b] = (
-                        0,
-                        upper_b,
-                        bucket_values_by_context_upper_bound[context][upper_b],
-                    )
+            labels = sample.labels
+            upper_bound_label = labels['upper_bound']
+            upper_bound = bounds.get(upper_bound_label)
+            if upper_bound is None:
+                upper_bound = bounds[upper_bound_label] = parse_bucket_bound(upper_bound_label)
+
+            context_key = compute_bucket_hash(labels)
+            positions = series_positions.get(context_key)
+            if positions is None:
+                positions = series_positions[context_key] = []
+                series_bounds[context_key] = []
+
+            positions.append(len(new_sample_data))
+            series_bounds[context_key].append(upper_bound)
+
+        new_sample_data.append([sample, tags, hostname, None, None])
+
+    for context_key, positions in series_positions.items():
+        upper_bounds = series_bounds[context_key]
+
+        # Exposed buckets are almost always already sorted
+        if any(upper_bounds[i][0] > upper_bounds[i + 1][0] for i in range(len(upper_bounds) - 1)):
+            order = sorted(range(len(positions)), key=lambda i: upper_bounds[i][0])
+            positions = [positions[i] for i in order]
+            upper_bounds = [upper_bounds[i] for i in order]
+
+        previous_upper_bound = None
+        previous_value = 0
+        for position, upper_bound in zip(positions, upper_bounds):
+            entry = new_sample_data[position]
+            sample = entry[0]
+            upper_bound_value, _, canonical_upper_bound = upper_bound
+
+            if previous_upper_bound is None:
+                # positive buckets start at zero, negative buckets start at -inf
+                if upper_bound_value > 0:
+                    lower_bound_label = '0'
+                    canonical_lower_bound = 0
                 else:
-                    # negative buckets start at -inf
-                    bucket_tuples_by_context_upper_bound[context][upper_b] = (
-                        NEGATIVE_INFINITY,
-                        upper_b,
-                        bucket_values_by_context_upper_bound[context][upper_b],
-                    )
-                continue
-            tmp = (
-                bucket_values_by_context_upper_bound[context][upper_b]
-                - bucket_values_by_context_upper_bound[context][sorted_buckets_by_context[context][i - 1]]
-            )
-            bucket_tuples_by_context_upper_bound[context][upper_b] = (
-                sorted_buckets_by_context[context][i - 1],
-                upper_b,
-                tmp,
-            )
-
-    # modify original metric to inject lower_bound & modified value
-    for sample, tags, hostname in new_sample_data:
-        if not sample.name.endswith('_bucket'):
-            yield sample, tags, hostname
-        else:
-            context_key = compute_bucket_hash(sample.labels)
-            matching_bucket_tuple = bucket_tuples_by_context_upper_bound[context_key][
-                float(sample.labels['upper_bound'])
-            ]
-
-            # Prevent 0.0
-            lower_bound = str(matching_bucket_tuple[0] or 0)
-            sample.labels['lower_bound'] = lower_bound
-            tags.append(f'lower_bound:{lower_bound}')
-
-            yield Sample(sample.name, sample.labels, matching_bucket_tuple[2]), tags, hostname
+                    lower_bound_label = '-inf'
+                    canonical_lower_bound = NEGATIVE_INFINITY
+
+                value = sample.value
+            else:
+                _, lower_bound_label, canonical_lower_bound = previous_upper_bound
+                value = sample.value - previous_value
+
+            previous_upper_bound = upper_bound
+            previous_value = sample.value
+
+            # modify original metric to inject lower_bound & modified value
+            sample.labels['lower_bound'] = lower_bound_label
+            tags = entry[1]
+            if isinstance(tags, tuple):
+                # Tags shared by every sample of a label set must not be modified
+                entry[1] = tags.__class__(tags + (f'lower_bound:{lower_bound_label}',))
+            else:
+                tags.append(f'lower_bound:{lower_bound_label}')
+            entry[0] = Sample(sample.name, sample.labels, value)
+            entry[3] = canonical_lower_bound
+            entry[4] = canonical_upper_bound
+
+    return new_sample_data
+
+
+def parse_bucket_bound(label):
+    """
+    Return a bucket boundary as a float, the label used when it is the lower bound of the next bucket,
+    and its canonical form as expected by `submit_histogram_bucket`.
+    """
+    value = float(label)
+
+    # Prevent 0.0
+    return value, str(value or 0), canonicalize_numeric_label(label)
 
 
 def compute_bucket_hash(labels):
     # we need the unique context for all the buckets
     # hence we remove the `upper_bound` label
-    return hash(frozenset(sorted((k, v) for k, v in labels.items() if k != 'upper_bound')))
+    return hash(frozenset([item for item in labels.items() if item[0] != 'upper_bound']))
+
+
+class TagCache(LRUCache):
+    """
+    A bounded LRU cache that keeps track of its hits, misses and evictions.
+    """
+
+    def __init__(self, maxsize):
+        super(TagCache, self).__init__(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super(TagCache, self).popitem()
+
+    def clear(self):
+        # Explicitly clearing the cache is not considered eviction
+        evictions = self.evictions
+        super(TagCache, self).clear()
+        self.evictions = evictions
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class SubmissionRecorder:
+    """
+    A proxy for the check that records the gauges and service checks being submitted while `recording` is set,
+    so that they may be submitted again later without processing the same payload.
+    """
+
+    def __init__(self, check):
+        self.check = check
+        self.recording = None
+
+    def gauge(self, name, value, tags=None, hostname=None, device_name=None, raw=False):
+        if self.recording is not None:
+            self.recording.append((self.check.gauge, (name, value, tags, hostname, device_name, raw)))
+
+        self.check.gauge(name, value, tags=tags, hostname=hostname, device_name=device_name, raw=raw)
+
+    def service_check(self, name, status, tags=None, hostname=None, message=None, raw=False):
+        if self.recording is not None:
+            self.recording.append((self.check.service_check, (name, status, tags, hostname, message, raw)))
+
+        self.check.service_check(name, status, tags=tags, hostname=hostname, message=message, raw=raw)
+
+    def __getattr__(self, name):
+        return getattr(self.check, name)
@@ -150,6 +150,7 @@ class PerfCountersBaseCheck(AgentCheck):
                 perf_object.clear()
 
         self._connection.disconnect()
+        super().cancel()
 
 
 class PerfCountersBaseCheckWithLegacySupport(PerfCountersBaseCheck):
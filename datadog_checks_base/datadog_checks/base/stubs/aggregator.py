@@ -107,7 +107,12 @@ class AggregatorStub(object):
     def submit_metric(self, check, check_id, mtype, name, value, tags, hostname, flush_first_value):
         check_tag_names(name, tags)
         if not self.ignore_metric(name):
-            self._metrics[name].append(MetricStub(name, mtype, value, tags, hostname, None, flush_first_value))
+            # Like the Agent, keep a copy as checks may submit the same immutable tags many times
+            self._metrics[name].append(MetricStub(name, mtype, value, list(tags), hostname, None, flush_first_value))
+
+    def submit_metrics(self, check, check_id, mtypes, names, values, tags, hostnames, flush_first_value):
+        for mtype, name, value, metric_tags, hostname in zip(mtypes, names, values, tags, hostnames):
+            self.submit_metric(check, check_id, mtype, name, value, metric_tags, hostname, flush_first_value)
 
     def submit_metric_e2e(
         self, check, check_id, mtype, name, value, tags, hostname, device=None, flush_first_value=False
@@ -145,9 +150,40 @@ class AggregatorStub(object):
     ):
         check_tag_names(name, tags)
         self._histogram_buckets[name].append(
-            HistogramBucketStub(name, value, lower_bound, upper_bound, monotonic, hostname, tags, flush_first_value)
+            HistogramBucketStub(
+                name, value, lower_bound, upper_bound, monotonic, hostname, list(tags), flush_first_value
+            )
         )
 
+    def submit_histogram_buckets(
+        self,
+        check,
+        check_id,
+        name,
+        values,
+        lower_bounds,
+        upper_bounds,
+        monotonic,
+        hostnames,
+        tags,
+        flush_first_value=False,
+    ):
+        for value, lower_bound, upper_bound, hostname, bucket_tags in zip(
+            values, lower_bounds, upper_bounds, hostnames, tags
+        ):
+            self.submit_histogram_bucket(
+                check,
+                check_id,
+                name,
+                value,
+                lower_bound,
+                upper_bound,
+                monotonic,
+                hostname,
+                bucket_tags,
+                flush_first_value,
+            )
+
     def metrics(self, name):
         """
         Return the metrics received under the given name
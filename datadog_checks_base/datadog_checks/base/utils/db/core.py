@@ -2,17 +2,32 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import logging
-from itertools import chain
-from typing import Any, Callable, Dict, List, Tuple
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from typing import Any, Callable, Dict, List, Set, Tuple
 
 from datadog_checks.base import AgentCheck
 from datadog_checks.base.utils.db.types import QueriesExecutor, QueriesSubmitter, Transformer
 
 from ...config import is_affirmative
+from ..agent.common import METRIC_NAMESPACE_METRICS
 from ..containers import iter_unique
+from ..time import get_precise_time
 from .query import Query
 from .transform import COLUMN_TRANSFORMERS, EXTRA_TRANSFORMERS
-from .utils import SUBMISSION_METHODS, create_submission_transformer
+from .utils import BATCH_SUBMISSION_METHODS, SUBMISSION_METHODS, create_submission_transformer
+
+# The number of rows fetched and processed at once in columnar mode
+DEFAULT_BATCH_SIZE = 1000
+
+# The maximum number of queries run at once in parallel mode
+DEFAULT_MAX_WORKERS = 4
+
+# The maximum fraction of a query's collection interval by which its next execution is randomly brought forward,
+# so that the same expensive queries of many instances do not stay aligned
+COLLECTION_INTERVAL_JITTER = 0.1
 
 
 class QueryExecutor(object):
@@ -31,6 +46,10 @@ class QueryExecutor(object):
         error_handler=None,  # type: Callable[[str], str]
         hostname=None,  # type: str
         logger=None,
+        columnar=False,  # type: bool
+        batch_size=DEFAULT_BATCH_SIZE,  # type: int
+        executor_factory=None,  # type: Callable[[], QueriesExecutor]
+        max_workers=DEFAULT_MAX_WORKERS,  # type: int
     ):  # type: (...) -> QueryExecutor
         self.executor = executor  # type: QueriesExecutor
         self.submitter = submitter  # type: QueriesSubmitter
@@ -46,14 +65,47 @@ class QueryExecutor(object):
         self.hostname = hostname  # type: str
         self.logger = logger or logging.getLogger(__name__)
 
+        if not isinstance(batch_size, int) or isinstance(batch_size, bool) or batch_size < 1:
+            raise ValueError('QueryExecutor batch size must be a positive integer')
+
+        self.columnar = columnar  # type: bool
+        self.batch_size = batch_size  # type: int
+
+        if not isinstance(max_workers, int) or isinstance(max_workers, bool) or max_workers < 1:
+            raise ValueError('QueryExecutor max workers must be a positive integer')
+
+        # Queries marked as `parallel` are only run concurrently when there is a way to create more executors
+        self.executor_factory = executor_factory  # type: Callable[[], QueriesExecutor]
+        self.max_workers = max_workers  # type: int
+        self._pool = None  # type: ThreadPoolExecutor
+        self._thread_state = threading.local()
+        self._thread_executors = []  # type: List[QueriesExecutor]
+        self._thread_executors_lock = threading.Lock()
+
+        # The time spent running each query during the last execution
+        self.query_execution_times = []  # type: List[Tuple[str, float]]
+
+        # Queries with a collection interval are mapped to the time they are next due and their last gauges
+        self._query_results = {}  # type: Dict[Query, Tuple[float, List[Tuple[Tuple, Dict[str, Any]]]]]
+        self._recorded_gauges = None  # type: List[Tuple[Tuple, Dict[str, Any]]]
+
+        # Metrics can only be submitted in batches by submitters that support it, like `AgentCheck`
+        self.batch_submission = hasattr(self.submitter, 'submit_batch') and hasattr(
+            self.submitter, 'register_tags'
+        )  # type: bool
+
     def compile_queries(self):
         """This method compiles every `Query` object."""
         column_transformers = COLUMN_TRANSFORMERS.copy()  # type: Dict[str, Transformer]
 
         for submission_method, transformer_name in SUBMISSION_METHODS.items():
             method = getattr(self.submitter, submission_method)
+            if submission_method == 'gauge':
+                method = self._create_recorded_gauge(method)
+
+            batch_type = submission_method if submission_method in BATCH_SUBMISSION_METHODS else None
             # Save each method in the initializer -> callable format
-            column_transformers[transformer_name] = create_submission_transformer(method)
+            column_transformers[transformer_name] = create_submission_transformer(method, batch_type)
 
         for query in self.queries:
             query.compile(column_transformers, EXTRA_TRANSFORMERS.copy())
@@ -65,63 +117,293 @@ class QueryExecutor(object):
         if extra_tags:
             global_tags.extend(list(extra_tags))
 
+        now = get_precise_time()
+        due_queries = {query for query in self.queries if self._is_query_due(query, now)}
+
+        # Results of queries run in parallel are still processed in order on the current thread
+        futures = self._dispatch_parallel_queries(due_queries)
+        self.query_execution_times = []
+
         for query in self.queries:
             query_name = query.name
             query_columns = query.column_transformers
             extra_transformers = query.extra_transformers
             query_tags = query.base_tags
 
+            if query.collection_interval:
+                if query not in due_queries:
+                    for args, kwargs in self._query_results[query][1]:
+                        self.submitter.gauge(*args, **kwargs)
+
+                    continue
+
+                self._recorded_gauges = []
+
+            start_time = get_precise_time()
+            future = futures.get(query)
             try:
-                rows = self.execute_query(query.query)
+                if future is not None:
+                    rows, execution_time = future.result()
+                    if self.columnar:
+                        chunks = iter_chunks(rows, self.batch_size)
+                elif self.columnar:
+                    chunks = self.execute_query_in_chunks(query.query)
+                else:
+                    rows = self.execute_query(query.query)
             except Exception as e:
                 if self.error_handler:
                     self.logger.error('Error querying %s: %s', query_name, self.error_handler(str(e)))
                 else:
                     self.logger.error('Error querying %s: %s', query_name, e)
 
+                # Failed queries are retried on the next run
+                self._recorded_gauges = None
                 continue
 
-            for row in rows:
-                if not self._is_row_valid(query, row):
-                    continue
+            if self.columnar:
+                for chunk in chunks:
+                    self._execute_columnar(query, chunk, global_tags + query_tags)
+            else:
+                for row in rows:
+                    if not self._is_row_valid(query, row):
+                        continue
 
-                # It holds the query results
-                sources = {}  # type: Dict[str, str]
-                # It holds the transformers defined in query_columns along with the column value
-                submission_queue = []  # type: List[Tuple[Transformer, Any]]
-                tags = global_tags + query_tags
+                    # It holds the query results
+                    sources = {}  # type: Dict[str, str]
+                    # It holds the transformers defined in query_columns along with the column value
+                    submission_queue = []  # type: List[Tuple[Transformer, Any]]
+                    tags = global_tags + query_tags
+
+                    for (column_name, type_transformer), column_value in zip(query_columns, row):
+                        # Columns can be ignored via configuration
+                        if not column_name:
+                            continue
+
+                        sources[column_name] = column_value
+                        column_type, transformer = type_transformer
+
+                        # The transformer can be None for `source` types. Those such columns do not submit
+                        # anything but are collected into the row values for other columns to reference.
+                        if transformer is None:
+                            continue
+                        elif column_type == 'tag':
+                            tags.append(transformer(None, column_value))  # get_tag transformer
+                        elif column_type == 'tag_list':
+                            tags.extend(transformer(None, column_value))  # get_tag_list transformer
+                        else:
+                            submission_queue.append((transformer, column_value))
+
+                    for transformer, value in submission_queue:
+                        transformer(sources, value, tags=tags, hostname=self.hostname)
+
+                    for name, transformer in extra_transformers:
+                        try:
+                            result = transformer(sources, tags=tags, hostname=self.hostname)
+                        except Exception as e:
+                            self.logger.error('Error transforming %s: %s', name, e)
+                            continue
+                        else:
+                            if result is not None:
+                                sources[name] = result
+
+            # Queries run in parallel are only timed until their results are fetched
+            if future is None:
+                execution_time = get_precise_time() - start_time
+
+            self.query_execution_times.append((query_name, execution_time))
+
+            if query.collection_interval:
+                interval = query.collection_interval * (1 - COLLECTION_INTERVAL_JITTER * random.random())
+                self._query_results[query] = (start_time + interval, self._recorded_gauges)
+                self._recorded_gauges = None
+
+    def _create_recorded_gauge(self, submit_method):
+        # type: (Callable) -> Callable
+        # Gauges of queries with a collection interval are recorded to be submitted again until the next execution
+        def gauge(*args, **kwargs):
+            if self._recorded_gauges is not None:
+                self._recorded_gauges.append((args, kwargs))
+
+            submit_method(*args, **kwargs)
+
+        return gauge
+
+    def _is_query_due(self, query, now):
+        # type: (Query, float) -> bool
+        if not query.collection_interval or query not in self._query_results:
+            return True
+
+        return now >= self._query_results[query][0]
+
+    def _dispatch_parallel_queries(self, queries):
+        # type: (Set[Query]) -> Dict[Query, Any]
+        if self.executor_factory is None:
+            return {}
+
+        parallel_queries = [query for query in self.queries if query in queries and query.parallel]
+        if not parallel_queries:
+            return {}
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        return {query: self._pool.submit(self._execute_query_in_thread, query.query) for query in parallel_queries}
+
+    def _execute_query_in_thread(self, query):
+        # type: (str) -> Tuple[List, float]
+        # Every thread gets its own executor since connections usually cannot be shared across threads
+        executor = getattr(self._thread_state, 'executor', None)
+        if executor is None:
+            executor = self._thread_state.executor = self.executor_factory()
+            with self._thread_executors_lock:
+                self._thread_executors.append(executor)
+
+        start_time = get_precise_time()
+        try:
+            rows = executor(query)
+            rows = [] if rows is None else list(rows)
+        except Exception:
+            # The connection may be broken, so the next query on this thread starts over with a new executor
+            self._thread_state.executor = None
+            with self._thread_executors_lock:
+                self._thread_executors.remove(executor)
 
-                for (column_name, type_transformer), column_value in zip(query_columns, row):
-                    # Columns can be ignored via configuration
-                    if not column_name:
-                        continue
+            self._close_executor(executor)
+            raise
 
-                    sources[column_name] = column_value
-                    column_type, transformer = type_transformer
+        return rows, get_precise_time() - start_time
 
-                    # The transformer can be None for `source` types. Those such columns do not submit
-                    # anything but are collected into the row values for other columns to reference.
-                    if transformer is None:
-                        continue
-                    elif column_type == 'tag':
-                        tags.append(transformer(None, column_value))  # get_tag transformer
-                    elif column_type == 'tag_list':
-                        tags.extend(transformer(None, column_value))  # get_tag_list transformer
-                    else:
-                        submission_queue.append((transformer, column_value))
+    def close(self):
+        """
+        Stop the threads used for running queries in parallel, if any, and close their executors.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+        # Executors of the threads that were stopped can no longer be reached through the thread state
+        self._thread_state = threading.local()
+        with self._thread_executors_lock:
+            executors, self._thread_executors = self._thread_executors, []
 
-                for transformer, value in submission_queue:
-                    transformer(sources, value, tags=tags, hostname=self.hostname)
+        for executor in executors:
+            self._close_executor(executor)
 
-                for name, transformer in extra_transformers:
+    def _close_executor(self, executor):
+        # type: (QueriesExecutor) -> None
+        close = getattr(executor, 'close', None)
+        if close is None:
+            return
+
+        try:
+            close()
+        except Exception as e:
+            self.logger.debug('Unable to close query executor: %s', e)
+
+    def _execute_columnar(self, query, rows, base_tags):
+        # type: (Query, List, List[str]) -> None
+        rows = [row for row in rows if self._is_row_valid(query, row)]
+        if not rows:
+            return
+
+        num_rows = len(rows)
+        columns = list(zip(*rows))
+        column_names = []  # type: List[str]
+        tag_columns = []  # type: List[Tuple[int, str, Transformer]]
+        batch_columns = []  # type: List[Tuple[int, str, str, bool]]
+        submission_columns = []  # type: List[Tuple[int, Transformer]]
+        for index, (column_name, type_transformer) in enumerate(query.column_transformers):
+            column_names.append(column_name)
+
+            # Columns can be ignored via configuration
+            if not column_name:
+                continue
+
+            column_type, transformer = type_transformer
+            if transformer is None:
+                continue
+            elif column_type == 'tag' or column_type == 'tag_list':
+                tag_columns.append((index, column_type, transformer))
+            elif self.batch_submission and hasattr(transformer, 'batch_submission'):
+                batch_columns.append((index,) + transformer.batch_submission)
+            else:
+                submission_columns.append((index, transformer))
+
+        # Compute the tags once per distinct combination of tag column values, rather than once per row
+        row_tags = []  # type: List[List[str]]
+        row_tags_ids = []  # type: List[int]
+        if tag_columns:
+            tags_cache = {}  # type: Dict[Tuple, Tuple[List[str], int]]
+            for values in zip(*(columns[index] for index, _, _ in tag_columns)):
+                try:
+                    tags, tags_id = tags_cache[values]
+                except (KeyError, TypeError):
+                    tags = list(base_tags)
+                    for (_, column_type, transformer), value in zip(tag_columns, values):
+                        if column_type == 'tag':
+                            tags.append(transformer(None, value))
+                        else:
+                            tags.extend(transformer(None, value))
+
+                    tags_id = self.submitter.register_tags(tags) if batch_columns else None
                     try:
-                        result = transformer(sources, tags=tags, hostname=self.hostname)
-                    except Exception as e:
-                        self.logger.error('Error transforming %s: %s', name, e)
-                        continue
-                    else:
-                        if result is not None:
-                            sources[name] = result
+                        tags_cache[values] = (tags, tags_id)
+                    except TypeError:
+                        # Tag lists may be given as lists
+                        pass
+
+                row_tags.append(tags)
+                row_tags_ids.append(tags_id)
+        else:
+            row_tags = [base_tags] * num_rows
+            if batch_columns:
+                row_tags_ids = [self.submitter.register_tags(base_tags)] * num_rows
+
+        # Submit every plain metric column at once, which is only split by the `raw` option
+        if batch_columns:
+            batches = {}  # type: Dict[bool, Tuple[List[str], List[str], List[Any], List[int]]]
+            for index, metric_type, name, raw in batch_columns:
+                if raw not in batches:
+                    batches[raw] = ([], [], [], [])
+
+                types, names, values, tags_ids = batches[raw]
+                types.extend([metric_type] * num_rows)
+                names.extend([name] * num_rows)
+                values.extend(columns[index])
+                tags_ids.extend(row_tags_ids)
+
+            # Batches bypass the recorded `gauge` submission method
+            if self._recorded_gauges is not None:
+                for index, metric_type, name, raw in batch_columns:
+                    if metric_type == 'gauge':
+                        for value, tags in zip(columns[index], row_tags):
+                            self._recorded_gauges.append(
+                                ((name, value), {'tags': tags, 'hostname': self.hostname, 'raw': raw})
+                            )
+
+            for raw, (types, names, values, tags_ids) in batches.items():
+                self.submitter.submit_batch(types, names, values, tags_ids, [self.hostname] * len(types), raw=raw)
+
+        # Every other transformer may reference the query results so those are still processed row by row
+        extra_transformers = query.extra_transformers
+        if not submission_columns and not extra_transformers:
+            return
+
+        for row, tags in zip(rows, row_tags):
+            sources = {column_name: value for column_name, value in zip(column_names, row) if column_name}
+
+            for index, transformer in submission_columns:
+                transformer(sources, row[index], tags=tags, hostname=self.hostname)
+
+            for name, transformer in extra_transformers:
+                try:
+                    result = transformer(sources, tags=tags, hostname=self.hostname)
+                except Exception as e:
+                    self.logger.error('Error transforming %s: %s', name, e)
+                    continue
+                else:
+                    if result is not None:
+                        sources[name] = result
 
     def _is_row_valid(self, query, row):
         # type: (Query, List) -> bool
@@ -160,6 +442,40 @@ class QueryExecutor(object):
 
         return chain((first_row,), rows)
 
+    def execute_query_in_chunks(self, query):
+        """
+        Like `execute_query` but returns an iterator over lists of at most `batch_size` rows. Results that
+        provide a `fetchmany` method, like database cursors, are fetched in chunks of that size.
+        """
+        result = self.executor(query)
+        if result is None:
+            return iter([])
+
+        chunks = iter_chunks(result, self.batch_size)
+
+        # Ensure we trigger query execution
+        try:
+            first_chunk = next(chunks)
+        except StopIteration:
+            return iter([])
+
+        return chain((first_chunk,), chunks)
+
+
+def iter_chunks(result, size):
+    fetchmany = getattr(result, 'fetchmany', None)
+    if fetchmany is not None:
+        chunk = fetchmany(size)
+        while chunk:
+            yield chunk
+            chunk = fetchmany(size)
+    else:
+        rows = iter(result)
+        chunk = list(islice(rows, size))
+        while chunk:
+            yield chunk
+            chunk = list(islice(rows, size))
+
 
 class QueryManager(QueryExecutor):
     """
@@ -195,6 +511,10 @@ class QueryManager(QueryExecutor):
         tags=None,  # type: List[str]
         error_handler=None,  # type: Callable[[str], str]
         hostname=None,  # type: str
+        columnar=False,  # type: bool
+        batch_size=DEFAULT_BATCH_SIZE,  # type: int
+        executor_factory=None,  # type: Callable[[], QueriesExecutor]
+        max_workers=DEFAULT_MAX_WORKERS,  # type: int
     ):  # type: (...) -> QueryManager
         """
         - **check** (_AgentCheck_) - an instance of a Check
@@ -204,6 +524,14 @@ class QueryManager(QueryExecutor):
         - **tags** (_List[str]_) - a list of tags to associate with every submission
         - **error_handler** (_callable_) - a callable accepting a `str` error as its sole argument and returning
           a sanitized string, useful for scrubbing potentially sensitive information libraries emit
+        - **columnar** (_bool_) - whether to process results in chunks of `batch_size` rows column by column,
+          submitting plain metric columns in batches, which is much faster for queries returning many rows
+        - **batch_size** (_int_) - the number of rows fetched at once in columnar mode
+        - **executor_factory** (_callable_) - a callable accepting no arguments and returning a new `executor`,
+          usually with its own connection. When set, queries marked as `parallel` are run concurrently on
+          separate threads, each of which creates its own executor once and again after a query fails.
+          Executors with a `close` method are closed when discarded and when the check is unscheduled.
+        - **max_workers** (_int_) - the maximum number of queries run at once in parallel
         """
         super(QueryManager, self).__init__(
             executor=executor,
@@ -213,8 +541,14 @@ class QueryManager(QueryExecutor):
             error_handler=error_handler,
             hostname=hostname,
             logger=check.log,
+            columnar=columnar,
+            batch_size=batch_size,
+            executor_factory=executor_factory,
+            max_workers=max_workers,
         )
         self.check = check  # type: AgentCheck
+        if executor_factory is not None:
+            self.check.check_cancellations.append(self.close)
 
         only_custom_queries = is_affirmative(self.check.instance.get('only_custom_queries', False))  # type: bool
         custom_queries = list(self.check.instance.get('custom_queries', []))  # type: List[str]
@@ -248,4 +582,14 @@ class QueryManager(QueryExecutor):
         # there is no check ID at that point
         self.logger = self.check.log
 
-        return super(QueryManager, self).execute(extra_tags)
+        super(QueryManager, self).execute(extra_tags)
+
+        if is_affirmative(self.check.debug_metrics.get('query_execution_time', False)):
+            tags = self.check.get_debug_metric_tags()
+            for query_name, execution_time in self.query_execution_times:
+                self.check.gauge(
+                    '{}.query.execution_time'.format(METRIC_NAMESPACE_METRICS),
+                    execution_time,
+                    tags=tags + ['query:{}'.format(query_name)],
+                    raw=True,
+                )
@@ -19,6 +19,10 @@ class Query(object):
     It is now part of all our database integrations and
     [other](https://cloud.google.com/solutions/sap/docs/sap-hana-monitoring-agent-planning-guide#defining_custom_queries)
     products have since adopted this format.
+
+    Expensive queries whose results change slowly may define a `collection_interval` in seconds. They then only
+    run about once per interval, with some jitter, and the gauges of their last results are submitted again on
+    every run in between. Every other type of submission only happens when the query actually runs.
     """
 
     def __init__(self, query_data):
@@ -34,6 +38,10 @@ class Query(object):
         self.extra_transformers = None  # type: List[Tuple[str, Transformer]]
         # Contains the tags defined in query_data, more tags can be added later from the query result
         self.base_tags = None  # type: List[str]
+        # Whether the query does not depend on others and may therefore run concurrently with them
+        self.parallel = False  # type: bool
+        # The minimum number of seconds between executions, gauges being resubmitted from the last results in between
+        self.collection_interval = None  # type: float
 
     def compile(
         self,
@@ -72,6 +80,18 @@ class Query(object):
         if tags is not None and not isinstance(tags, list):
             raise ValueError('field `tags` for {} must be a list'.format(query_name))
 
+        parallel = self.query_data.get('parallel', False)
+        if not isinstance(parallel, bool):
+            raise ValueError('field `parallel` for {} must be a boolean'.format(query_name))
+
+        collection_interval = self.query_data.get('collection_interval')
+        if collection_interval is not None and (
+            not isinstance(collection_interval, (int, float))
+            or isinstance(collection_interval, bool)
+            or collection_interval <= 0
+        ):
+            raise ValueError('field `collection_interval` for {} must be a positive number'.format(query_name))
+
         # Keep track of all defined names
         sources = {}
 
@@ -200,4 +220,6 @@ class Query(object):
         self.column_transformers = tuple(column_data)
         self.extra_transformers = tuple(extra_data)
         self.base_tags = tags
+        self.parallel = parallel
+        self.collection_interval = collection_interval
         del self.query_data
@@ -2,9 +2,14 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import logging
+import sys
+from array import array
 
 logger = logging.getLogger(__name__)
 
+# Metric columns of these types are stored in typed arrays between runs, which use far less memory than lists
+ARRAY_TYPECODES = {int: 'q', float: 'd'}
+
 
 class StatementMetrics:
     """
@@ -22,7 +27,10 @@ class StatementMetrics:
     """
 
     def __init__(self):
-        self._previous_statements = {}
+        # The state of the previous run is kept column by column: the position of every row by key and,
+        # for every metric column, the values of all rows at those positions
+        self._previous_keys = {}
+        self._previous_columns = {}
 
     def compute_derivative_rows(self, rows, metrics, key):
         """
@@ -38,72 +46,122 @@ class StatementMetrics:
 
         This function resets the statement cache so it should only be called once per check run.
 
-        - **rows** (_List[dict]_) - rows from current check run
+        - **rows** (_List[dict]_) - rows from current check run, which all have the same columns
         - **metrics** (_List[str]_) - the metrics to compute for each row
         - **key** (_callable_) - function for an ID which uniquely identifies a row across runs
         """
         result = []
-        new_cache = {}
         metrics = set(metrics)
 
-        rows = _merge_duplicate_rows(rows, metrics, key)
-        if len(rows) > 0:
-            dropped_metrics = metrics - set(rows[0].keys())
-            if dropped_metrics:
-                logger.warning(
-                    'Some statement metrics are not available from the table: %s', ','.join(m for m in dropped_metrics)
-                )
-
-        for row in rows:
-            row_key = key(row)
-            if row_key in new_cache:
-                logger.error(
-                    'Unexpected collision in cached query metrics. Dropping existing row, row_key=%s new=%s dropped=%s',
-                    row_key,
-                    row,
-                    new_cache[row_key],
-                )
-
-            # Set the row on the new cache to be checked the next run. This should happen for every row, regardless of
-            # whether a metric is submitted for the row during this run or not.
-            new_cache[row_key] = row
-
-            prev = self._previous_statements.get(row_key)
-            if prev is None:
-                continue
-
-            metric_columns = metrics & set(row.keys())
-
-            # Take the diff of all metric values between the current row and the previous run's row.
-            # There are a couple of edge cases to be aware of:
-            #
-            # 1. Table truncation or stats reset: Because the table values are always increasing, a negative value
-            #    suggests truncation or a stats reset. In this case, the row difference is discarded and the row should.
-            #    be tracked from this run forward.
-            #
-            # 2. No changes since the previous run: There is no need to store metrics of 0, since that is implied by
-            #    the absence of metrics. On any given check run, most rows will have no difference so this optimization
-            #    avoids having to send a lot of unnecessary metrics.
-
-            diffed_row = {k: row[k] - prev[k] if k in metric_columns else row[k] for k in row.keys()}
-
-            # Check for negative values, but only in the columns used for metrics
-            if any(diffed_row[k] < 0 for k in metric_columns):
-                # A "break" might be expected here instead of "continue," but there are cases where a subset of rows
-                # are removed. To avoid situations where all results are discarded every check run, we err on the side
-                # of potentially including truncated rows that exceed previous run counts.
-                continue
-
-            # No changes to the query; no metric needed
-            if all(diffed_row[k] == 0 for k in metric_columns):
-                continue
-
-            result.append(diffed_row)
-
-        self._previous_statements = new_cache
+        rows_by_key = _merge_duplicate_rows(rows, metrics, key)
+        if not rows_by_key:
+            self._previous_keys = {}
+            self._previous_columns = {}
+            return result
+
+        row_keys = list(rows_by_key.keys())
+        rows = list(rows_by_key.values())
+
+        available_columns = set(rows[0].keys())
+        dropped_metrics = metrics - available_columns
+        if dropped_metrics:
+            logger.warning(
+                'Some statement metrics are not available from the table: %s', ','.join(m for m in dropped_metrics)
+            )
+
+        metric_columns = metrics & available_columns
+        columns = {column: [row[column] for row in rows] for column in metric_columns}
+
+        # Every row must be kept for the next run, regardless of whether a metric is submitted for it during this run
+        previous_keys = self._previous_keys
+        previous_columns = self._previous_columns
+        self._previous_keys = {row_key: i for i, row_key in enumerate(row_keys)}
+        self._previous_columns = {column: _compact(values) for column, values in columns.items()}
+
+        # The positions of the rows that were present during the previous run, in this run and the previous one
+        matches = [(i, previous_keys[row_key]) for i, row_key in enumerate(row_keys) if row_key in previous_keys]
+        if not matches or not metric_columns.issubset(previous_columns):
+            return result
+
+        # Take the diff of all metric values between the current rows and the previous run's rows, one column at a time.
+        # There are a couple of edge cases to be aware of:
+        #
+        # 1. Table truncation or stats reset: Because the table values are always increasing, a negative value
+        #    suggests truncation or a stats reset. In this case, the row difference is discarded and the row should.
+        #    be tracked from this run forward.
+        #
+        # 2. No changes since the previous run: There is no need to store metrics of 0, since that is implied by
+        #    the absence of metrics. On any given check run, most rows will have no difference so this optimization
+        #    avoids having to send a lot of unnecessary metrics.
+        valid = [True] * len(matches)
+        changed = [False] * len(matches)
+        diffs = {}
+        for column in metric_columns:
+            current = columns[column]
+            previous = previous_columns[column]
+            column_diffs = diffs[column] = [current[i] - previous[j] for i, j in matches]
+            for m, diff in enumerate(column_diffs):
+                # A "break" might be expected here instead of discarding the row, but there are cases where a subset
+                # of rows are removed. To avoid situations where all results are discarded every check run, we err on
+                # the side of potentially including truncated rows that exceed previous run counts.
+                if diff < 0:
+                    valid[m] = False
+                elif diff != 0:
+                    changed[m] = True
+
+        for m, (i, _) in enumerate(matches):
+            if valid[m] and changed[m]:
+                diffed_row = dict(rows[i])
+                for column in metric_columns:
+                    diffed_row[column] = diffs[column][m]
+
+                result.append(diffed_row)
 
         return result
 
+    def memory_usage(self):
+        """
+        Return the approximate number of bytes used to keep the state of the previous run.
+        """
+        size = sys.getsizeof(self._previous_keys) + sys.getsizeof(self._previous_columns)
+        for row_key, position in self._previous_keys.items():
+            size += _sizeof(row_key) + sys.getsizeof(position)
+
+        for values in self._previous_columns.values():
+            size += sys.getsizeof(values)
+            if isinstance(values, list):
+                size += sum(sys.getsizeof(value) for value in values)
+
+        return size
+
+
+def _sizeof(value):
+    """
+    Return the size of a value along with its items if it is a tuple, like the keys of rows usually are.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, tuple):
+        size += sum(_sizeof(item) for item in value)
+
+    return size
+
+
+def _compact(values):
+    """
+    Store a column of metric values in a typed array when they all are of the same supported type, so that
+    subtracting them gives the same results.
+    """
+    if values:
+        value_type = type(values[0])
+        typecode = ARRAY_TYPECODES.get(value_type)
+        if typecode is not None and all(type(value) is value_type for value in values):
+            try:
+                return array(typecode, values)
+            except (OverflowError, ValueError):
+                pass
+
+    return values
+
 
 def _merge_duplicate_rows(rows, metrics, key):
     """
@@ -111,6 +169,8 @@ def _merge_duplicate_rows(rows, metrics, key):
     with the sum of the stats of all duplicates. This is motivated by database integrations such as postgres
     that can report many instances of a query that are considered the same after the agent normalization.
 
+    Returns the rows by key, in order of appearance. Rows without duplicates are not copied.
+
     - **rows** (_List[dict]_) - rows from current check run
     - **metrics** (_List[str]_) - the metrics to compute for each row
     - **key** (_callable_) - function for an ID which uniquely identifies a query row across runs
@@ -118,16 +178,14 @@ def _merge_duplicate_rows(rows, metrics, key):
 
     queries_by_key = {}
     for row in rows:
-        merged_row = dict(row)
-
-        query_key = key(merged_row)
+        query_key = key(row)
 
-        if query_key in queries_by_key:
-            merged_state = queries_by_key[query_key]
+        merged_state = queries_by_key.get(query_key)
+        if merged_state is None:
+            queries_by_key[query_key] = row
+        else:
             queries_by_key[query_key] = {
-                k: merged_row[k] + merged_state[k] if k in metrics else merged_state[k] for k in merged_state.keys()
+                k: row[k] + merged_state[k] if k in metrics else merged_state[k] for k in merged_state.keys()
             }
-        else:
-            queries_by_key[query_key] = merged_row
 
-    return list(queries_by_key.values())
+    return queries_by_key
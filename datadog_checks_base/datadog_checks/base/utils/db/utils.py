@@ -9,6 +9,7 @@ import os
 import socket
 import threading
 import time
+from collections import OrderedDict
 from concurrent.futures.thread import ThreadPoolExecutor
 from itertools import chain
 from typing import Any, Callable, Dict, List, Tuple
@@ -21,7 +22,7 @@ from datadog_checks.base.utils.db.types import Transformer
 from datadog_checks.base.utils.serialization import json
 from datadog_checks.base.utils.tracing import INTEGRATION_TRACING_SERVICE_NAME, tracing_enabled
 
-from ..common import to_native_string
+from ..common import ensure_bytes, to_native_string
 
 try:
     import datadog_agent
@@ -44,6 +45,15 @@ SUBMISSION_METHODS = {
     'service_check': '__service_check',
 }
 
+# Submission methods whose transformers may be replaced by `AgentCheck.submit_batch`
+BATCH_SUBMISSION_METHODS = frozenset({'gauge', 'count', 'monotonic_count', 'rate', 'histogram', 'historate'})
+
+# The default memory budget of a `StatementCache`, in bytes
+DEFAULT_STATEMENT_CACHE_MAX_BYTES = 10 * 1024 * 1024
+
+# The approximate memory used by a cache entry besides its strings: the key, the dictionaries and the list links
+STATEMENT_CACHE_ENTRY_OVERHEAD = 400
+
 
 def _traced_dbm_async_job_method(f):
     integration_tracing, _ = tracing_enabled()
@@ -69,8 +79,8 @@ def _traced_dbm_async_job_method(f):
     return f
 
 
-def create_submission_transformer(submit_method):
-    # type: (Any) -> Callable[[Any, Any, Any], Callable[[Any, List, Dict], Callable[[Any, Any, Any], Transformer]]]
+def create_submission_transformer(submit_method, batch_type=None):
+    # type: (Any, str) -> Callable[[Any, Any, Any], Callable[[Any, List, Dict], Callable[[Any, Any, Any], Transformer]]]
     # During the compilation phase every transformer will have access to all the others and may be
     # passed the first arguments (e.g. name) that will be forwarded the actual AgentCheck methods.
     def get_transformer(_transformers, *creation_args, **modifiers):
@@ -84,6 +94,10 @@ def create_submission_transformer(submit_method):
             # submit_method(*creation_args, *call_args, **kwargs)
             submit_method(*chain(creation_args, call_args), **kwargs)
 
+        # Expose what plain metric submissions consist of so that they may be submitted in batches
+        if batch_type is not None and len(creation_args) == 1 and set(modifiers).issubset({'raw'}):
+            transformer.batch_submission = (batch_type, creation_args[0], bool(modifiers.get('raw', False)))
+
         return transformer
 
     return get_transformer
@@ -212,6 +226,152 @@ def obfuscate_sql_with_metadata(query, options=None):
     return statement_with_metadata
 
 
+class StatementCache(object):
+    """
+    Thread-safe cache shared by the jobs of a check, e.g. statement metrics, samples and activity, that:
+
+    - memoizes the result of `obfuscate_sql_with_metadata` by a hash of the raw statement and the obfuscator options
+    - limits the ingestion rate of full query text events with `acquire_fqt`, like a `RateLimitingTTLCache`
+
+    Obfuscated statements share a budget of `max_bytes`, based on the size of their strings, and the least
+    recently used ones are evicted first when it is exceeded. Full query text keys are kept apart, in a
+    `TTLCache` of at most `fqt_max_size` entries, so that obfuscating many statements never lets their
+    events be sent again before `fqt_ttl`.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_STATEMENT_CACHE_MAX_BYTES, fqt_ttl=3600, fqt_max_size=10000):
+        """
+        :param max_bytes: the approximate maximum memory used by the obfuscated statements, in bytes
+        :param fqt_ttl: the number of seconds before the full query text of a statement may be sent again
+        :param fqt_max_size: the maximum number of full query texts whose rate is limited
+        """
+        if not isinstance(max_bytes, int) or isinstance(max_bytes, bool) or max_bytes < 0:
+            raise ValueError('StatementCache max bytes must be a non-negative integer')
+
+        self.max_bytes = max_bytes
+        self.fqt_ttl = fqt_ttl
+
+        # key -> (statement, size), from the least to the most recently used
+        self._entries = OrderedDict()
+        # full query text key -> True, until it may be sent again
+        self._fqt_entries = TTLCache(maxsize=fqt_max_size, ttl=fqt_ttl)
+        self._lock = threading.Lock()
+
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted_bytes = 0
+        self._submitted = (0, 0, 0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def fqt_entries(self):
+        """
+        The number of full query texts sent in the last `fqt_ttl` seconds.
+        """
+        with self._lock:
+            return len(self._fqt_entries)
+
+    def obfuscate(self, query, options=None):
+        """
+        Return the result of `obfuscate_sql_with_metadata`, which must not be modified as it is shared by every
+        caller. Failures are not cached.
+        """
+        if not query:
+            return obfuscate_sql_with_metadata(query, options)
+
+        # Only checks with the `db` extra obfuscate statements
+        import mmh3
+
+        key = (options, mmh3.hash128(ensure_bytes(query)))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = self._entries.pop(key)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+
+        # Obfuscation calls the Agent so the lock is released in the meantime, concurrent misses of the
+        # same statement simply store the same result twice
+        statement = obfuscate_sql_with_metadata(query, options)
+        self._store(key, statement, get_statement_size(statement))
+        return statement
+
+    def acquire_fqt(self, key):
+        """
+        :param key: a tuple of strings identifying the full query text e.g. the query signature and the database
+        :return: True if the full query text identified by `key` has not been sent in the last `fqt_ttl` seconds
+        """
+        key = tuple(key)
+        with self._lock:
+            if key in self._fqt_entries:
+                return False
+
+            self._fqt_entries[key] = True
+            return True
+
+    def _store(self, key, value, size):
+        size += STATEMENT_CACHE_ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evicted_bytes += evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._fqt_entries.clear()
+            self.size = 0
+
+    def submit_telemetry(self, check, dbms, tags=None, hostname=None):
+        """
+        Submit the hits, misses and evicted bytes since the last submission, and the current size of the cache,
+        as `dd.<dbms>.statement_cache.*` metrics.
+        """
+        with self._lock:
+            totals = (self.hits, self.misses, self.evicted_bytes)
+            size = self.size
+            entries = len(self._entries)
+            fqt_entries = len(self._fqt_entries)
+
+        prefix = 'dd.{}.statement_cache.'.format(dbms)
+        for name, total, submitted in zip(('hits', 'misses', 'evicted_bytes'), totals, self._submitted):
+            check.count(prefix + name, total - submitted, tags=tags, hostname=hostname, raw=True)
+
+        check.gauge(prefix + 'size', size, tags=tags, hostname=hostname, raw=True)
+        check.gauge(prefix + 'entries', entries, tags=tags, hostname=hostname, raw=True)
+        check.gauge(prefix + 'fqt_entries', fqt_entries, tags=tags, hostname=hostname, raw=True)
+        self._submitted = totals
+
+
+def get_statement_size(statement):
+    """
+    Return the approximate size in bytes of the strings of an `obfuscate_sql_with_metadata` result.
+    """
+    size = len(statement['query'])
+    for value in statement['metadata'].values():
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, list):
+            size += sum(len(item) for item in value if isinstance(item, str))
+
+    return size
+
+
 class DBMAsyncJob(object):
     # Set an arbitrary high limit so that dbm async jobs (which aren't CPU bound) don't
     # get artificially limited by the default max_workers count. Note that since threads are
@@ -1,10 +1,13 @@
 # (C) Datadog, Inc. 2019-present
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import hashlib
+import json
 import logging
 import os
 import re
 import ssl
+import threading
 from contextlib import contextmanager
 from copy import deepcopy
 from io import open
@@ -17,6 +20,7 @@ from cryptography.x509 import load_der_x509_certificate
 from cryptography.x509.extensions import ExtensionNotFound
 from cryptography.x509.oid import AuthorityInformationAccessOID, ExtensionOID
 from requests import auth as requests_auth
+from requests.adapters import HTTPAdapter
 from requests.exceptions import SSLError
 from requests_toolbelt.adapters import host_header_ssl
 from six import PY2, iteritems, string_types
@@ -28,7 +32,7 @@ from ..errors import ConfigurationError
 from .common import ensure_bytes, ensure_unicode
 from .headers import get_default_headers, update_headers
 from .network import CertAdapter, closing, create_socket_connection
-from .time import get_timestamp
+from .time import get_precise_time, get_timestamp
 
 try:
     from contextlib import ExitStack
@@ -60,6 +64,16 @@ DEFAULT_TIMEOUT = 10
 # https://www.bittorrent.org/beps/bep_0003.html
 DEFAULT_CHUNK_SIZE = 16
 
+# The number of connections kept per host and the number of seconds after which an unused pool
+# is closed, for pools shared by every instance with the `shared_connection_pool` option enabled
+DEFAULT_SHARED_CONNECTION_POOL_SIZE = 10
+DEFAULT_SHARED_CONNECTION_POOL_IDLE_TIMEOUT = 300
+
+# The number of seconds for which the intermediate certificates discovered for a host are reused, and after
+# which the discovery is attempted again for a host for which none could be found
+DEFAULT_INTERMEDIATE_CERTS_TTL = 3600
+DEFAULT_INTERMEDIATE_CERTS_NEGATIVE_TTL = 60
+
 # https://github.com/python/cpython/blob/ef516d11c1a0f885dba0aba8cf5366502077cdd4/Lib/ssl.py#L158-L165
 DEFAULT_PROTOCOL_VERSIONS = {'SSLv3', 'TLSv1.2', 'TLSv1.3'}
 SUPPORTED_PROTOCOL_VERSIONS = {'SSLv3', 'TLSv1', 'TLSv1.1', 'TLSv1.2', 'TLSv1.3'}
@@ -88,6 +102,9 @@ STANDARD_FIELDS = {
     'proxy': None,
     'read_timeout': None,
     'request_size': DEFAULT_CHUNK_SIZE,
+    'shared_connection_pool': False,
+    'shared_connection_pool_idle_timeout': DEFAULT_SHARED_CONNECTION_POOL_IDLE_TIMEOUT,
+    'shared_connection_pool_size': DEFAULT_SHARED_CONNECTION_POOL_SIZE,
     'skip_proxy': False,
     'tls_ca_cert': None,
     'tls_cert': None,
@@ -100,6 +117,25 @@ STANDARD_FIELDS = {
     'use_legacy_auth_encoding': True,
     'username': None,
 }
+# The settings that determine the credentials of requests, connections of shared pools are never reused
+# by wrappers that differ in any of them because auth schemes like NTLM and Kerberos authenticate connections
+AUTH_FIELDS = (
+    'auth_token',
+    'aws_host',
+    'aws_region',
+    'aws_service',
+    'kerberos_auth',
+    'kerberos_cache',
+    'kerberos_delegate',
+    'kerberos_force_initiate',
+    'kerberos_hostname',
+    'kerberos_keytab',
+    'kerberos_principal',
+    'ntlm_domain',
+    'password',
+    'use_legacy_auth_encoding',
+    'username',
+)
 # For any known legacy fields that may be widespread
 DEFAULT_REMAPPED_FIELDS = {
     'kerberos': {'name': 'kerberos_auth'},
@@ -143,9 +179,145 @@ class ResponseWrapper(ObjectProxy):
         return self
 
 
+class SharedHTTPAdapter(HTTPAdapter):
+    """
+    A transport adapter owned by a `ConnectionPoolRegistry` that is mounted on the sessions of many wrappers.
+    """
+
+    def close(self):
+        # Closing any session must not close the connections used by the others
+        pass
+
+    def evict(self):
+        super(SharedHTTPAdapter, self).close()
+
+
+class ConnectionPoolRegistry(object):
+    """
+    A process-wide registry of connection pools, so that wrappers sending requests to the same origin
+    with the same TLS settings and credentials reuse connections rather than each performing new handshakes.
+    """
+
+    # The minimum number of seconds between searches for idle pools
+    EVICTION_INTERVAL = 1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # key -> [adapter, idle timeout, last used]
+        self._pools = {}
+        self._next_eviction = 0
+
+        self.evictions = 0
+
+    def get(self, key, size, idle_timeout):
+        """
+        Return the adapter for the given key and whether or not it already existed.
+        """
+        now = get_precise_time()
+
+        with self._lock:
+            if now >= self._next_eviction:
+                self._evict_idle(now)
+
+            entry = self._pools.get(key)
+            if entry is not None:
+                entry[2] = now
+                return entry[0], True
+
+            adapter = SharedHTTPAdapter(pool_maxsize=size)
+            self._pools[key] = [adapter, idle_timeout, now]
+            return adapter, False
+
+    def clear(self):
+        with self._lock:
+            for adapter, _, _ in self._pools.values():
+                adapter.evict()
+
+            self._pools.clear()
+            self._next_eviction = 0
+
+    def _evict_idle(self, now):
+        self._next_eviction = now + self.EVICTION_INTERVAL
+
+        for key, (adapter, idle_timeout, last_used) in list(iteritems(self._pools)):
+            if now - last_used >= idle_timeout:
+                del self._pools[key]
+                adapter.evict()
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._pools)
+
+
+SHARED_CONNECTION_POOLS = ConnectionPoolRegistry()
+
+
+class IntermediateCertCache(object):
+    """
+    A process-wide cache of the intermediate certificates discovered by AIA chasing, so that hosts serving
+    an incomplete chain are only inspected once per TTL rather than on every request.
+
+    Only the certificates are shared, every wrapper trusts them through its own `CertAdapter` so that
+    the TLS settings of an instance never apply to the requests of another.
+    """
+
+    def __init__(self, ttl=DEFAULT_INTERMEDIATE_CERTS_TTL, negative_ttl=DEFAULT_INTERMEDIATE_CERTS_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+
+        # hostname -> (certs, expiration), the certs are `None` if none could be discovered
+        self._entries = {}
+
+    def get(self, hostname):
+        """
+        Return whether or not the host was inspected recently, and its intermediate certificates.
+        """
+        with self._lock:
+            entry = self._entries.get(hostname)
+            if entry is None:
+                return False, None
+
+            certs, expiration = entry
+            if get_precise_time() >= expiration:
+                del self._entries[hostname]
+                return False, None
+
+            return True, certs
+
+    def set(self, hostname, certs):
+        # A failure to download the certificates may be transient
+        certs = tuple(certs) if certs else None
+        now = get_precise_time()
+        with self._lock:
+            # Hosts that are no longer queried would otherwise never be evicted
+            for cached_hostname, (_, expiration) in list(iteritems(self._entries)):
+                if now >= expiration:
+                    del self._entries[cached_hostname]
+
+            self._entries[hostname] = (certs, now + (self.ttl if certs else self.negative_ttl))
+
+        return certs
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+INTERMEDIATE_CERTS = IntermediateCertCache()
+
+
 class RequestsWrapper(object):
     __slots__ = (
+        '_auth_identity',
+        '_cert_adapters',
         '_session',
+        'aia_chasing_attempts',
+        'aia_chasing_cache_hits',
         'tls_use_host_header',
         'ignore_tls_warning',
         'log_requests',
@@ -156,6 +328,11 @@ class RequestsWrapper(object):
         'request_hooks',
         'auth_token_handler',
         'request_size',
+        'shared_connection_pool',
+        'shared_connection_pool_hits',
+        'shared_connection_pool_idle_timeout',
+        'shared_connection_pool_misses',
+        'shared_connection_pool_size',
         'tls_protocols_allowed',
     )
 
@@ -170,6 +347,9 @@ class RequestsWrapper(object):
         default_fields['tls_ignore_warning'] = init_config.get(
             'tls_ignore_warning', default_fields['tls_ignore_warning']
         )
+        default_fields['shared_connection_pool'] = init_config.get(
+            'shared_connection_pool', default_fields['shared_connection_pool']
+        )
 
         # Populate with the default values
         config = {field: instance.get(field, value) for field, value in iteritems(default_fields)}
@@ -255,6 +435,7 @@ class RequestsWrapper(object):
                 auth_type = 'ntlm'
 
         auth = AUTH_TYPES[auth_type](config)
+        self._auth_identity = get_auth_identity(auth_type, {field: config[field] for field in AUTH_FIELDS})
 
         allow_redirects = is_affirmative(config['allow_redirects'])
 
@@ -334,6 +515,28 @@ class RequestsWrapper(object):
         self.persist_connections = self.tls_use_host_header or is_affirmative(config['persist_connections'])
         self._session = None
 
+        # Reuse the connections of every other wrapper that has this enabled, see `ConnectionPoolRegistry`.
+        # Requests are then sent using the session, which also persists cookies.
+        self.shared_connection_pool = is_affirmative(config['shared_connection_pool']) and not self.tls_use_host_header
+
+        self.shared_connection_pool_size = int(config['shared_connection_pool_size'])
+        if self.shared_connection_pool_size < 1:
+            raise ConfigurationError('The `shared_connection_pool_size` setting must be a positive integer')
+
+        self.shared_connection_pool_idle_timeout = float(config['shared_connection_pool_idle_timeout'])
+        if self.shared_connection_pool_idle_timeout <= 0:
+            raise ConfigurationError('The `shared_connection_pool_idle_timeout` setting must be a positive number')
+
+        self.shared_connection_pool_hits = 0
+        self.shared_connection_pool_misses = 0
+
+        # The number of times intermediate certificates were discovered or reused, see `INTERMEDIATE_CERTS`
+        self.aia_chasing_attempts = 0
+        self.aia_chasing_cache_hits = 0
+
+        # hostname -> adapter trusting the intermediate certificates of the host
+        self._cert_adapters = {}
+
         # Whether or not to log request information like method and url
         self.log_requests = is_affirmative(config['log_requests'])
 
@@ -393,9 +596,13 @@ class RequestsWrapper(object):
             new_options['headers'] = new_options['headers'].copy()
             new_options['headers'].update(extra_headers)
 
+        shared_connection_pool = self.shared_connection_pool
         if is_uds_url(url):
             persist = True  # UDS support is only enabled on the shared session.
+            shared_connection_pool = False
             url = quote_uds_url(url)
+        elif shared_connection_pool:
+            persist = True
 
         self.handle_auth_token(method=method, url=url, default_options=self.options)
 
@@ -403,6 +610,9 @@ class RequestsWrapper(object):
             for hook in self.request_hooks:
                 stack.enter_context(hook())
             if persist:
+                if shared_connection_pool:
+                    self.mount_shared_connection_pool(url, new_options)
+
                 request_method = getattr(self.session, method)
             else:
                 request_method = getattr(requests, method)
@@ -421,28 +631,123 @@ class RequestsWrapper(object):
             return ResponseWrapper(response, self.request_size)
 
     def make_request_aia_chasing(self, request_method, method, url, new_options, persist):
+        # Skip the failing handshake if the host is already known to serve an incomplete chain
+        if new_options['verify'] and url.startswith('https'):
+            inspected, certs = INTERMEDIATE_CERTS.get(urlparse(url).hostname)
+            if certs is not None:
+                self.aia_chasing_cache_hits += 1
+                return self.make_request_cert_adapter(certs, method, url, new_options, persist)
+        else:
+            inspected = False
+
         try:
             response = request_method(url, **new_options)
         except SSLError as e:
+            # No intermediate certificate could be discovered recently
+            if inspected:
+                self.aia_chasing_cache_hits += 1
+                raise e
+
             # fetch the intermediate certs
-            parsed_url = urlparse(url)
-            hostname = parsed_url.hostname
-            certs = self.fetch_intermediate_certs(hostname)
-            if not certs:
+            self.aia_chasing_attempts += 1
+            hostname = urlparse(url).hostname
+            certs = INTERMEDIATE_CERTS.set(hostname, self.fetch_intermediate_certs(hostname))
+            if certs is None:
                 raise e
-            # retry the connection via session object
-            certadapter = CertAdapter(certs=certs)
-            if not persist:
-                session = requests.Session()
-                for option, value in iteritems(self.options):
-                    setattr(session, option, value)
-            else:
-                session = self.session
-            request_method = getattr(session, method)
-            session.mount(url, certadapter)
-            response = request_method(url, **new_options)
+
+            response = self.make_request_cert_adapter(certs, method, url, new_options, persist)
         return response
 
+    def make_request_cert_adapter(self, certs, method, url, new_options, persist):
+        # The adapter is shared by every request of this wrapper to the host
+        parsed_url = urlparse(url)
+        prefix = '{}://{}/'.format(parsed_url.scheme, parsed_url.netloc)
+
+        certadapter = self._cert_adapters.get(parsed_url.hostname)
+        if certadapter is None or certadapter.certs != certs:
+            if certadapter is not None:
+                certadapter.close()
+            certadapter = self._cert_adapters[parsed_url.hostname] = CertAdapter(certs=certs)
+
+        if persist:
+            self.session.mount(prefix, certadapter)
+            return getattr(self.session, method)(url, **new_options)
+
+        # retry the connection via a temporary session object
+        session = requests.Session()
+        for option, value in iteritems(self.options):
+            setattr(session, option, value)
+
+        session.mount(prefix, certadapter)
+        try:
+            return getattr(session, method)(url, **new_options)
+        finally:
+            # Closing the session must not close the connections of the adapter, which are reused
+            del session.adapters[prefix]
+            session.close()
+
+    def mount_shared_connection_pool(self, url, options):
+        parsed_url = urlparse(url)
+        scheme = parsed_url.scheme.lower()
+        netloc = parsed_url.netloc.lower()
+
+        # Connection-based authentication like NTLM must never be shared between different credentials
+        auth = options['auth']
+        if auth is self.options['auth']:
+            auth_identity = self._auth_identity
+        elif auth is None:
+            auth_identity = None
+        elif isinstance(auth, tuple):
+            auth_identity = get_auth_identity('basic', auth)
+        else:
+            auth_identity = get_auth_identity(type(auth).__name__, getattr(auth, '__dict__', auth))
+
+        cert = options['cert']
+        if isinstance(cert, list):
+            cert = tuple(cert)
+
+        # Pools are only shared by wrappers that would manage them identically
+        key = (
+            scheme,
+            netloc,
+            options['verify'],
+            cert,
+            auth_identity,
+            self.shared_connection_pool_size,
+            self.shared_connection_pool_idle_timeout,
+        )
+        adapter, hit = SHARED_CONNECTION_POOLS.get(
+            key, self.shared_connection_pool_size, self.shared_connection_pool_idle_timeout
+        )
+        if hit:
+            self.shared_connection_pool_hits += 1
+        else:
+            self.shared_connection_pool_misses += 1
+
+        self.session.mount('{}://{}/'.format(scheme, netloc), adapter)
+
+    def get_aia_chasing_stats(self):
+        """
+        Return the number of times intermediate certificates were discovered or reused since the last call,
+        along with the number of hosts for which the result of the discovery is cached in this process.
+        """
+        stats = (self.aia_chasing_attempts, self.aia_chasing_cache_hits, len(INTERMEDIATE_CERTS))
+        self.aia_chasing_attempts = 0
+        self.aia_chasing_cache_hits = 0
+
+        return stats
+
+    def get_shared_connection_pool_stats(self):
+        """
+        Return the number of requests that reused or created a shared connection pool since the last call,
+        along with the number of shared connection pools in this process.
+        """
+        stats = (self.shared_connection_pool_hits, self.shared_connection_pool_misses, len(SHARED_CONNECTION_POOLS))
+        self.shared_connection_pool_hits = 0
+        self.shared_connection_pool_misses = 0
+
+        return stats
+
     def populate_options(self, options):
         # Avoid needless dictionary update if there are no options
         if not options:
@@ -548,6 +853,9 @@ class RequestsWrapper(object):
 
     def __del__(self):  # no cov
         try:
+            for certadapter in self._cert_adapters.values():
+                certadapter.close()
+
             self._session.close()
         except AttributeError:
             # A persistent connection was never used or an error occurred during instantiation
@@ -690,6 +998,12 @@ def create_aws_auth(config):
     )
 
 
+def get_auth_identity(auth_type, settings):
+    # Only a digest is kept so that credentials are not stored in the keys of shared connection pools
+    data = json.dumps([auth_type, settings], sort_keys=True, default=repr)
+    return hashlib.sha256(ensure_bytes(data)).hexdigest()
+
+
 AUTH_TYPES = {
     'basic': create_basic_auth,
     'digest': create_digest_auth,
@@ -0,0 +1,233 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import asyncio
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from ..errors import ConfigurationError
+
+DEFAULT_MAX_CONCURRENT_REQUESTS = 10
+
+# Counters of `RequestsWrapper` that are accumulated by the copies used in worker threads
+WRAPPER_COUNTERS = (
+    'aia_chasing_attempts',
+    'aia_chasing_cache_hits',
+    'shared_connection_pool_hits',
+    'shared_connection_pool_misses',
+)
+
+
+class RequestResult:
+    """
+    The outcome of a request sent by `AsyncRequestsWrapper.gather`.
+
+    - `response` is the response, or `None` if an error occurred
+    - `error` is the exception that was raised, if any
+    - `elapsed` is the number of seconds spent sending the request and reading the response
+    - `queued` is the number of seconds spent waiting for a free slot because of `max_concurrent_requests`
+    """
+
+    __slots__ = ('method', 'url', 'response', 'error', 'elapsed', 'queued')
+
+    def __init__(self, method, url, response=None, error=None, elapsed=0.0, queued=0.0):
+        self.method = method
+        self.url = url
+        self.response = response
+        self.error = error
+        self.elapsed = elapsed
+        self.queued = queued
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        outcome = repr(self.error) if self.error is not None else self.response.status_code
+        return f'RequestResult({self.method.upper()} {self.url}: {outcome}, elapsed={self.elapsed:.6f})'
+
+
+class AsyncRequestsWrapper:
+    """
+    An asyncio interface to a `RequestsWrapper` for sending many requests concurrently, for example:
+
+    ```python
+    results = self.http_async.bulk_get(urls)
+    for result in results:
+        if not result.ok:
+            self.log.warning('Unable to reach %s: %s', result.url, result.error)
+            continue
+
+        self.gauge('response_time', result.elapsed, tags=[f'url:{result.url}'])
+    ```
+
+    This is not an asynchronous HTTP client: the event loop only coordinates a pool of `max_concurrent_requests`
+    threads that send blocking requests with `requests`. As `RequestsWrapper` is not thread-safe, every thread
+    uses its own copy of the wrapper with its own session, so every option like authentication, TLS, proxies,
+    UDS and auth token handlers behaves exactly the same.
+    """
+
+    def __init__(self, http, max_concurrent_requests=DEFAULT_MAX_CONCURRENT_REQUESTS):
+        if not isinstance(max_concurrent_requests, int) or max_concurrent_requests < 1:
+            raise ConfigurationError('Setting `max_concurrent_requests` must be a positive integer')
+
+        self.http = http
+        self.max_concurrent_requests = max_concurrent_requests
+        self._executor = None
+        self._local = threading.local()
+        self._wrappers = []
+        self._lock = threading.Lock()
+        self._auth_token_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_requests, thread_name_prefix='http-requests'
+            )
+
+        return self._executor
+
+    async def request(self, method, url, **options):
+        """
+        Send a request without blocking the event loop and return the response, like the methods of `RequestsWrapper`.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(self._send_request, method, url, options))
+
+    async def get(self, url, **options):
+        return await self.request('get', url, **options)
+
+    async def post(self, url, **options):
+        return await self.request('post', url, **options)
+
+    async def head(self, url, **options):
+        return await self.request('head', url, **options)
+
+    async def put(self, url, **options):
+        return await self.request('put', url, **options)
+
+    async def patch(self, url, **options):
+        return await self.request('patch', url, **options)
+
+    async def delete(self, url, **options):
+        return await self.request('delete', url, **options)
+
+    async def options_method(self, url, **options):
+        return await self.request('options', url, **options)
+
+    async def gather(self, requests):
+        """
+        Send every request concurrently and return a `RequestResult` for each, in the same order. A request is
+        either a URL, sent with the GET method, or a tuple of a method, a URL and optionally a mapping of options.
+        Errors never interrupt the other requests and are available as the `error` of their result instead.
+        """
+        loop = asyncio.get_running_loop()
+        results = [self._create_result(request) for request in requests]
+
+        await asyncio.gather(*(self._send(loop, result, options) for result, options in results))
+        return [result for result, _ in results]
+
+    def bulk_request(self, requests):
+        """
+        The synchronous form of `gather`, for use in the `check` method.
+        """
+        return asyncio.run(self.gather(requests))
+
+    def bulk_get(self, urls, **options):
+        """
+        Send a GET request with the same options to every URL, see `bulk_request`.
+        """
+        return self.bulk_request([('get', url, options) for url in urls])
+
+    def close(self):
+        """
+        Stop the worker threads and close their sessions, which are created again when needed.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+        with self._lock:
+            wrappers, self._wrappers = self._wrappers, []
+            self._local = threading.local()
+
+        for wrapper in wrappers:
+            if wrapper._session is not None:
+                wrapper._session.close()
+
+    def _get_wrapper(self):
+        wrapper = getattr(self._local, 'wrapper', None)
+        if wrapper is None:
+            wrapper = copy.copy(self.http)
+            wrapper._session = None
+            for counter in WRAPPER_COUNTERS:
+                setattr(wrapper, counter, 0)
+
+            if wrapper.auth_token_handler is not None:
+                wrapper.auth_token_handler = LockedAuthTokenHandler(self.http.auth_token_handler, self._auth_token_lock)
+
+            with self._lock:
+                self._wrappers.append(wrapper)
+
+            self._local.wrapper = wrapper
+
+        return wrapper
+
+    def _send_request(self, method, url, options):
+        wrapper = self._get_wrapper()
+        try:
+            return wrapper._request(method, url, options)
+        finally:
+            with self._lock:
+                for counter in WRAPPER_COUNTERS:
+                    value = getattr(wrapper, counter)
+                    if value:
+                        setattr(self.http, counter, getattr(self.http, counter) + value)
+                        setattr(wrapper, counter, 0)
+
+    @staticmethod
+    def _create_result(request):
+        if isinstance(request, str):
+            return RequestResult('get', request), {}
+
+        method, url, *options = request
+        return RequestResult(method, url), dict(options[0]) if options else {}
+
+    async def _send(self, loop, result, options):
+        submitted = time.perf_counter()
+        started = None
+
+        def send():
+            nonlocal started
+            started = time.perf_counter()
+            return self._send_request(result.method, result.url, options)
+
+        try:
+            result.response = await loop.run_in_executor(self.executor, send)
+        except Exception as e:
+            result.error = e
+        finally:
+            finished = time.perf_counter()
+            if started is None:
+                started = finished
+
+            result.queued = started - submitted
+            result.elapsed = finished - started
+
+
+class LockedAuthTokenHandler:
+    """
+    Serializes the token renewals of an auth token handler shared by several threads.
+    """
+
+    def __init__(self, handler, lock):
+        self.handler = handler
+        self.lock = lock
+
+    def poll(self, **request):
+        with self.lock:
+            self.handler.poll(**request)
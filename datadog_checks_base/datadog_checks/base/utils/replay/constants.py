@@ -6,9 +6,13 @@
 # Until then, assume methods are getters by default since there are few setters.
 KNOWN_DATADOG_AGENT_SETTER_METHODS = frozenset({'set_check_metadata', 'write_persistent_cache', 'set_external_tags'})
 
+# Getters whose values never change during the lifetime of the Agent, which are therefore only requested once
+CACHEABLE_DATADOG_AGENT_GETTER_METHODS = frozenset(
+    {'get_config', 'get_hostname', 'get_process_start_time', 'get_version', 'tracemalloc_enabled'}
+)
+
 
 class EnvVars(object):
-    MESSAGE_INDICATOR = 'DD_REPLAY_MESSAGE_INDICATOR'
     CHECK_NAME = 'DD_REPLAY_CHECK_NAME'
     CHECK_ID = 'DD_REPLAY_CHECK_ID'
     INIT_CONFIG = 'DD_REPLAY_INIT_CONFIG'
@@ -4,75 +4,301 @@
 import os
 import subprocess
 import sys
+import threading
+import time
 
-from ..common import ensure_bytes, to_native_string
+from ...config import is_affirmative
+from ...errors import ConfigurationError
+from ..common import to_native_string
 from ..serialization import json
+from ..time import get_precise_time
 from .constants import KNOWN_DATADOG_AGENT_SETTER_METHODS, EnvVars
+from .protocol import read_frame, write_frame
+
+# The maximum number of seconds to wait for an isolated process to exit before killing it
+PROCESS_EXIT_TIMEOUT = 10
+
+
+def log_output(log, stream):
+    # To avoid blocking never use a pipe's file descriptor iterator. See https://bugs.python.org/issue3907
+    for line in iter(stream.readline, b''):
+        log.debug(line.rstrip().decode('utf-8', errors='replace'))
+
+
+def get_option(check, name, default):
+    return check.instance.get(name, check.init_config.get(name, default))
 
 
 def run_with_isolation(check, aggregator, datadog_agent):
-    message_indicator = os.urandom(8).hex()
-    instance = dict(check.instance)
-    init_config = dict(check.init_config)
-
-    # Prevent fork bomb
-    instance.pop('process_isolation', None)
-    init_config.pop('process_isolation', None)
-
-    env_vars = dict(os.environ)
-    env_vars[EnvVars.MESSAGE_INDICATOR] = message_indicator
-    env_vars[EnvVars.CHECK_NAME] = check.name
-    env_vars[EnvVars.CHECK_ID] = check.check_id
-    env_vars[EnvVars.INIT_CONFIG] = to_native_string(json.dumps(init_config))
-    env_vars[EnvVars.INSTANCE] = to_native_string(json.dumps(instance))
-
-    check_module = check.__module__
-    check_class = check.__class__.__name__
-    process = subprocess.Popen(
-        [
+    worker = getattr(check, '_isolated_worker', None)
+    if worker is None:
+        persistent = is_affirmative(get_option(check, 'process_isolation_persistent', False))
+
+        # In MiB
+        max_memory = get_option(check, 'process_isolation_max_memory', 0)
+        if not isinstance(max_memory, (int, float)) or isinstance(max_memory, bool) or max_memory < 0:
+            raise ConfigurationError('Setting `process_isolation_max_memory` must be a non-negative number')
+
+        max_age = get_option(check, 'process_isolation_max_age', 0)
+        if not isinstance(max_age, (int, float)) or isinstance(max_age, bool) or max_age < 0:
+            raise ConfigurationError('Setting `process_isolation_max_age` must be a non-negative number')
+
+        worker = IsolatedWorker(check, persistent=persistent, max_memory=max_memory * 1024 * 1024, max_age=max_age)
+        check._isolated_worker = worker
+
+    worker.run(check, aggregator, datadog_agent)
+
+
+class IsolatedWorker(object):
+    """
+    Runs a check in a separate process. When persistent, the process and therefore the instantiated check
+    are kept alive across runs until either the maximum age or memory usage is reached.
+
+    No reference to the check is kept so that once the check is unscheduled and garbage collected, the pipes
+    of the process are closed and a persistent process exits on its own.
+    """
+
+    def __init__(self, check, persistent=False, max_memory=0, max_age=0):
+        self.persistent = persistent
+        self.max_memory = max_memory
+        self.max_age = max_age
+
+        self.process = None
+        self.process_exit_code = None
+        self.output_logger = None
+        self.started = 0
+        self.runs = 0
+        self.closed = False
+        self.run_lock = threading.Lock()
+
+        # Telemetry of the last run
+        self.startup_time = None
+        self.run_time = None
+        self.memory = None
+
+        instance = dict(check.instance)
+        init_config = dict(check.init_config)
+
+        # Prevent fork bomb
+        instance.pop('process_isolation', None)
+        init_config.pop('process_isolation', None)
+
+        self.env_vars = dict(os.environ)
+        self.env_vars[EnvVars.CHECK_NAME] = check.name
+        self.env_vars[EnvVars.CHECK_ID] = check.check_id
+        self.env_vars[EnvVars.INIT_CONFIG] = to_native_string(json.dumps(init_config))
+        self.env_vars[EnvVars.INSTANCE] = to_native_string(json.dumps(instance))
+
+        self.command = [
             sys.executable,
             '-u',
             '-c',
             'from {check_module} import {check_class};'
-            'from datadog_checks.base.utils.replay.redirect import run_check;'
-            'run_check({check_class})'.format(check_module=check_module, check_class=check_class),
-        ],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        env=env_vars,
-    )
-    with process:
+            'from datadog_checks.base.utils.replay.redirect import {entrypoint};'
+            '{entrypoint}({check_class})'.format(
+                check_module=check.__module__,
+                check_class=check.__class__.__name__,
+                entrypoint='run_worker' if persistent else 'run_check',
+            ),
+        ]
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, check, aggregator, datadog_agent):
+        check.log.info('Starting a separate process to run the check')
+
+        start_time = get_precise_time()
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self.env_vars,
+        )
+        self.started = time.time()
+        self.runs = 0
+
+        # Anything the process writes outside of messages is redirected to the standard error
+        self.output_logger = threading.Thread(target=log_output, args=(check.log, self.process.stderr))
+        self.output_logger.daemon = True
+        self.output_logger.start()
+
+        message = process_messages(check, aggregator, datadog_agent, self.process)
+        if message is None or message[0] != 'ready':
+            self.stop()
+            raise Exception(
+                'The isolated process exited with code {} before the check could be created'.format(
+                    self.process_exit_code
+                )
+            )
+
+        self.startup_time = get_precise_time() - start_time
+
+    def stop(self):
+        process = self.process
+        if process is None:
+            return
+
+        self.process = None
+        self.process_exit_code = None
+
+        # An idle persistent process exits once its standard input is closed
+        process.stdin.close()
+
+        # Never let the process block on a full pipe if messages are no longer read
+        process.stdout.close()
+
+        try:
+            process.wait(PROCESS_EXIT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+        self.process_exit_code = process.returncode
+        self.output_logger.join()
+        process.stderr.close()
+
+    def close(self):
+        """
+        Stop the process for good. This is called when the check is unscheduled, possibly during a run in which
+        case the process is terminated and the run fails.
+        """
+        self.closed = True
+        if self.run_lock.acquire(False):
+            try:
+                self.stop()
+            finally:
+                self.run_lock.release()
+        else:
+            process = self.process
+            if process is not None and process.poll() is None:
+                process.terminate()
+
+    def run(self, check, aggregator, datadog_agent):
+        with self.run_lock:
+            if self.closed:
+                raise Exception('The isolated process was stopped because the check was unscheduled')
+
+            self._run(check, aggregator, datadog_agent)
+
+    def _run(self, check, aggregator, datadog_agent):
+        self.startup_time = None
+        self.run_time = None
+
+        if self.process is not None and not self.running:
+            check.log.warning('The isolated process exited unexpectedly, starting a new one')
+            self.stop()
+
+        if self.process is None:
+            self.start(check, aggregator, datadog_agent)
+
         check.log.info('Running check in a separate process')
+        start_time = get_precise_time()
+        if self.persistent:
+            write_frame(self.process.stdin, 'run')
+
+        message = process_messages(check, aggregator, datadog_agent, self.process)
+        self.run_time = get_precise_time() - start_time
+        self.runs += 1
+
+        if message is None or message[0] != 'done':
+            self.stop()
+            raise Exception(
+                'The isolated process exited with code {} during the check run'.format(self.process_exit_code)
+            )
+
+        self.memory = message[1]
+
+        if not self.persistent:
+            self.stop()
+            return
+
+        reason = self.recycle_reason()
+        if reason:
+            check.log.info('Recycling the isolated process after %d runs: %s', self.runs, reason)
+            self.stop()
+
+    def recycle_reason(self):
+        if self.max_age and time.time() - self.started >= self.max_age:
+            return 'reached the maximum age of {} seconds'.format(self.max_age)
+        elif self.max_memory and self.memory is not None and self.memory >= self.max_memory:
+            return 'reached the maximum memory usage of {} bytes'.format(self.max_memory)
+
+        return ''
+
 
-        # To avoid blocking never use a pipe's file descriptor iterator. See https://bugs.python.org/issue3907
-        for line in iter(process.stdout.readline, b''):
-            line = line.rstrip().decode('utf-8')
-            indicator, _, procedure = line.partition(':')
-            if indicator != message_indicator:
-                check.log.debug(line)
-                continue
+def process_messages(check, aggregator, datadog_agent, process):
+    """
+    Process messages until the isolated process is ready for a check run or has finished one, returning the
+    message that signaled it, or `None` if the process exited or failed in a way it cannot recover from.
+    """
+    while True:
+        messages = read_frame(process.stdout)
+        if messages is None:
+            return
 
-            check.log.trace(line)
+        check.log.trace('Received %d messages from the isolated process', len(messages))
 
-            message_type, _, message = procedure.partition(':')
-            message = json.loads(message)
+        for message in messages:
+            message_type = message[0]
             if message_type == 'aggregator':
-                getattr(aggregator, message['method'])(check, *message['args'], **message['kwargs'])
+                _, method, args, kwargs = message
+                if method == 'submit_metrics' and not hasattr(aggregator, method):
+                    # Batches are submitted one metric at a time to aggregators without support for them
+                    check_id, mtypes, names, values, tags, hostnames, flush_first_value = args
+                    for mtype, name, value, metric_tags, hostname in zip(mtypes, names, values, tags, hostnames):
+                        aggregator.submit_metric(
+                            check, check_id, mtype, name, value, metric_tags, hostname, flush_first_value
+                        )
+                elif method == 'submit_histogram_buckets' and not hasattr(aggregator, method):
+                    (
+                        check_id,
+                        name,
+                        values,
+                        lower_bounds,
+                        upper_bounds,
+                        monotonic,
+                        hostnames,
+                        tags,
+                        flush_first_value,
+                    ) = args
+                    for value, lower_bound, upper_bound, hostname, bucket_tags in zip(
+                        values, lower_bounds, upper_bounds, hostnames, tags
+                    ):
+                        aggregator.submit_histogram_bucket(
+                            check,
+                            check_id,
+                            name,
+                            value,
+                            lower_bound,
+                            upper_bound,
+                            monotonic,
+                            hostname,
+                            bucket_tags,
+                            flush_first_value,
+                        )
+                else:
+                    getattr(aggregator, method)(check, *args, **kwargs)
             elif message_type == 'log':
-                getattr(check.log, message['method'])(*message['args'])
+                _, method, args = message
+                getattr(check.log, method)(*args)
             elif message_type == 'datadog_agent':
-                method = message['method']
-                value = getattr(datadog_agent, method)(*message['args'], **message['kwargs'])
+                _, method, args, kwargs = message
+                value = getattr(datadog_agent, method)(*args, **kwargs)
                 if method not in KNOWN_DATADOG_AGENT_SETTER_METHODS:
-                    process.stdin.write(b'%s\n' % ensure_bytes(json.dumps({'value': value})))
-                    process.stdin.flush()
+                    write_frame(process.stdin, value)
             elif message_type == 'error':
-                check.log.error(message[0]['traceback'])
-                break
+                _, errors, fatal = message
+                check.log.error(errors[0]['traceback'])
+                if fatal:
+                    return
+            elif message_type == 'ready' or message_type == 'done':
+                return message
             else:
                 check.log.error(
                     'Unknown message type encountered during communication with the isolated process: %s',
                     message_type,
                 )
-                break
+                return
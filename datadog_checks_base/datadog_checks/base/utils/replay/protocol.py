@@ -0,0 +1,56 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import pickle
+import struct
+
+# Every frame is a pickled list of messages prefixed by its size. Both ends run the same integration code
+# as the same user, so unpickling grants nothing that the isolated process could not already do.
+FRAME_HEADER = struct.Struct('>I')
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+# The maximum number of messages buffered by the isolated process before they are sent
+DEFAULT_BATCH_SIZE = 1000
+
+
+def write_frame(stream, messages):
+    payload = pickle.dumps(messages, PICKLE_PROTOCOL)
+    stream.write(FRAME_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def read_frame(stream):
+    """
+    Return the messages of the next frame, or `None` if the stream was closed.
+    """
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+
+    (size,) = FRAME_HEADER.unpack(header)
+    payload = stream.read(size)
+    if len(payload) < size:
+        raise EOFError('Expected a frame of {} bytes but only {} could be read'.format(size, len(payload)))
+
+    return pickle.loads(payload)
+
+
+class MessageWriter(object):
+    """
+    Buffers messages and sends them in batches.
+    """
+
+    def __init__(self, stream, batch_size=DEFAULT_BATCH_SIZE):
+        self.stream = stream
+        self.batch_size = batch_size
+        self.messages = []
+
+    def send(self, *message):
+        self.messages.append(message)
+        if len(self.messages) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.messages:
+            write_frame(self.stream, self.messages)
+            self.messages = []
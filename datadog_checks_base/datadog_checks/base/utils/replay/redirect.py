@@ -4,17 +4,28 @@
 import logging
 import os
 import sys
+import traceback
+from contextlib import contextmanager
 
 from ...checks import base
 from ...log import LOG_LEVEL_MAP, TRACE_LEVEL, _get_py_loglevel
-from ...utils.common import to_native_string
 from ...utils.metadata import core
-from ...utils.replay.constants import KNOWN_DATADOG_AGENT_SETTER_METHODS, EnvVars
+from ...utils.replay.constants import (
+    CACHEABLE_DATADOG_AGENT_GETTER_METHODS,
+    KNOWN_DATADOG_AGENT_SETTER_METHODS,
+    EnvVars,
+)
+from ...utils.replay.protocol import MessageWriter, read_frame
 from ...utils.serialization import json
 
-MESSAGE_INDICATOR = os.environ[EnvVars.MESSAGE_INDICATOR]
 LOG_METHODS = {log_level: log_method.lower() for log_method, log_level in LOG_LEVEL_MAP.items()}
 
+# Reserve the original standard output for messages so that anything else written to it, even by
+# extension modules, ends up in the standard error rather than corrupting the frames
+MESSAGE_WRITER = MessageWriter(os.fdopen(os.dup(sys.stdout.fileno()), 'wb'))
+os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+MESSAGE_READER = sys.stdin.buffer
+
 
 class ReplayAggregator(object):
     GAUGE, RATE, COUNT, MONOTONIC_COUNT, COUNTER, HISTOGRAM, HISTORATE = range(7)
@@ -27,45 +38,49 @@ class ReplayAggregator(object):
     @staticmethod
     def method_generator(method_name):
         def method(*args, **kwargs):
-            print(
-                '{}:aggregator:{}'.format(
-                    MESSAGE_INDICATOR,
-                    to_native_string(json.dumps({'method': method_name, 'args': list(args)[1:], 'kwargs': kwargs})),
-                )
-            )
+            MESSAGE_WRITER.send('aggregator', method_name, args[1:], kwargs)
 
         return method
 
 
 class ReplayDatadogAgent(object):
+    def __init__(self):
+        self._cache = {}
+
     def __getattr__(self, name):
-        method = self.method_generator(name, name not in KNOWN_DATADOG_AGENT_SETTER_METHODS)
+        method = self.method_generator(
+            name, name not in KNOWN_DATADOG_AGENT_SETTER_METHODS, name in CACHEABLE_DATADOG_AGENT_GETTER_METHODS
+        )
         setattr(self, name, method)
         return method
 
-    @staticmethod
-    def method_generator(method_name, read):
+    def method_generator(self, method_name, read, cacheable):
+        cache = self._cache
+
         def method(*args, **kwargs):
-            print(
-                '{}:datadog_agent:{}'.format(
-                    MESSAGE_INDICATOR,
-                    to_native_string(json.dumps({'method': method_name, 'args': list(args), 'kwargs': kwargs})),
-                )
-            )
-            if read:
-                return json.loads(sys.stdin.readline())['value']
+            if cacheable:
+                key = (method_name, args, tuple(sorted(kwargs.items())))
+                if key in cache:
+                    return cache[key]
+
+            MESSAGE_WRITER.send('datadog_agent', method_name, args, kwargs)
+            if not read:
+                return
+
+            # Every buffered message must be processed before the response is sent
+            MESSAGE_WRITER.flush()
+            value = read_frame(MESSAGE_READER)
+            if cacheable:
+                cache[key] = value
+
+            return value
 
         return method
 
 
 class ReplayLogger(logging.Logger):
     def log(self, level, *args, **kwargs):
-        print(
-            '{}:log:{}'.format(
-                MESSAGE_INDICATOR,
-                to_native_string(json.dumps({'method': LOG_METHODS[level], 'args': [str(a) for a in args]})),
-            )
-        )
+        MESSAGE_WRITER.send('log', LOG_METHODS[level], [str(a) for a in args])
 
 
 base.using_stub_aggregator = False
@@ -77,7 +92,18 @@ logging.setLoggerClass(ReplayLogger)
 logging.getLogger().setLevel(_get_py_loglevel(base.datadog_agent.get_config('log_level')))
 
 
-def run_check(check_class):
+def get_memory_usage():
+    # The peak resident set size in bytes, which is only available on Unix
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def create_check(check_class):
     check = check_class(
         os.environ[EnvVars.CHECK_NAME],
         json.loads(os.environ[EnvVars.INIT_CONFIG]),
@@ -85,6 +111,44 @@ def run_check(check_class):
     )
     check.check_id = os.environ[EnvVars.CHECK_ID]
 
-    result = check.run()
-    if result:
-        print('{}:error:{}'.format(MESSAGE_INDICATOR, result))
+    # Startup ends here, the rest of the frame must not be mixed with messages of the check run
+    MESSAGE_WRITER.send('ready')
+    MESSAGE_WRITER.flush()
+
+    return check
+
+
+def execute_check(check):
+    try:
+        result = check.run()
+        if result:
+            MESSAGE_WRITER.send('error', json.loads(result), False)
+    finally:
+        MESSAGE_WRITER.send('done', get_memory_usage())
+        MESSAGE_WRITER.flush()
+
+
+@contextmanager
+def report_fatal_errors():
+    # Let the parent know right away instead of having it wait for messages that will never come
+    try:
+        yield
+    except Exception as e:
+        MESSAGE_WRITER.send('error', [{'message': str(e), 'traceback': traceback.format_exc()}], True)
+        MESSAGE_WRITER.flush()
+        raise
+
+
+def run_check(check_class):
+    with report_fatal_errors():
+        execute_check(create_check(check_class))
+
+
+def run_worker(check_class):
+    """
+    Keep the check alive across runs, running it whenever asked until the standard input is closed.
+    """
+    with report_fatal_errors():
+        check = create_check(check_class)
+        while read_frame(MESSAGE_READER) is not None:
+            execute_check(check)
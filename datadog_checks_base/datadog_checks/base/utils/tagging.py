@@ -21,3 +21,12 @@ GENERIC_TAGS = {
     'service',
     'version',
 }
+
+
+class NormalizedTags(tuple):
+    """
+    Tags that were already normalized by the check submitting them, so that submissions reusing them
+    for many samples, like the ones of an OpenMetrics label set, skip the normalization.
+    """
+
+    __slots__ = ()
@@ -10,6 +10,7 @@ from datadog_checks.dev import get_here
 from datadog_checks.dev.testing import requires_py3
 
 from ..bench_utils import AMAZON_MSK_JMX_METRICS_MAP, AMAZON_MSK_JMX_METRICS_OVERRIDES
+from .utils import text_to_protobuf
 
 pytestmark = [requires_py3]
 
@@ -37,6 +38,72 @@ def test_ksm_new(benchmark, dd_run_check, mock_http_response, fixture_ksm):
     benchmark(c.check, None)
 
 
+@pytest.mark.parametrize('exposition_format', ['text', 'protobuf'])
+def test_ksm_exposition_format(benchmark, dd_run_check, mock_http_response, fixture_ksm, tmp_path, exposition_format):
+    if exposition_format == 'protobuf':
+        with open(fixture_ksm, 'r', encoding='utf-8') as f:
+            payload = text_to_protobuf(f.read())
+
+        fixture_ksm = str(tmp_path / 'ksm.bin')
+        with open(fixture_ksm, 'wb') as f:
+            f.write(payload)
+
+        headers = {'Content-Type': 'application/vnd.google.protobuf; encoding=delimited'}
+    else:
+        headers = {'Content-Type': 'text/plain; version=0.0.4'}
+
+    mock_http_response(file_path=fixture_ksm, headers=headers)
+    c = OpenMetricsBaseCheckV2(
+        'test', {}, [{'openmetrics_endpoint': 'foo', 'namespace': 'bar', 'metrics': ['.+'], 'use_protobuf': True}]
+    )
+
+    # Run once to get initialization steps out of the way.
+    dd_run_check(c)
+
+    benchmark(c.check, None)
+
+
+@pytest.fixture
+def fixture_histograms(tmp_path):
+    lines = [
+        '# HELP apiserver_request_duration_seconds Response latency distribution.',
+        '# TYPE apiserver_request_duration_seconds histogram',
+    ]
+    bounds = ['0.005', '0.01', '0.025', '0.05', '0.1', '0.25', '0.5', '1', '2.5', '5', '10', '30', '60', '+Inf']
+    for resource in range(50):
+        for verb in ('GET', 'LIST', 'PATCH', 'POST', 'PUT', 'DELETE', 'WATCH', 'APPLY', 'CONNECT', 'PROXY'):
+            labels = 'resource="resource{}",verb="{}"'.format(resource, verb)
+            for i, bound in enumerate(bounds):
+                lines.append('apiserver_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, bound, i * 10))
+
+            lines.append('apiserver_request_duration_seconds_sum{{{}}} 42.5'.format(labels))
+            lines.append('apiserver_request_duration_seconds_count{{{}}} {}'.format(labels, (len(bounds) - 1) * 10))
+
+    fixture_file = tmp_path / 'histograms.txt'
+    fixture_file.write_text('\n'.join(lines))
+    return str(fixture_file)
+
+
+@pytest.mark.parametrize(
+    'options',
+    [
+        pytest.param({}, id='default'),
+        pytest.param({'non_cumulative_histogram_buckets': True}, id='non_cumulative'),
+        pytest.param({'histogram_buckets_as_distributions': True}, id='distributions'),
+    ],
+)
+def test_histograms(benchmark, dd_run_check, mock_http_response, fixture_histograms, options):
+    mock_http_response(file_path=fixture_histograms)
+    c = OpenMetricsBaseCheckV2(
+        'test', {}, [{'openmetrics_endpoint': 'foo', 'namespace': 'bar', 'metrics': ['.+'], **options}]
+    )
+
+    # Run once to get initialization steps out of the way.
+    dd_run_check(c)
+
+    benchmark(c.check, None)
+
+
 def test_amazon_msk_jmx_metrics_new(benchmark, dd_run_check, mock_http_response, fixture_amazon_msk_jmx_metrics):
     mock_http_response(file_path=fixture_amazon_msk_jmx_metrics)
 
@@ -82,3 +149,35 @@ def test_label_joins_new(benchmark, dd_run_check, mock_http_response, fixture_ks
     dd_run_check(c)
 
     benchmark(c.check, None)
+
+
+def test_ksm_fast_parser(benchmark, dd_run_check, mock_http_response, fixture_ksm):
+    mock_http_response(file_path=fixture_ksm)
+    c = OpenMetricsBaseCheckV2(
+        'test', {}, [{'openmetrics_endpoint': 'foo', 'namespace': 'bar', 'metrics': ['.+'], 'use_fast_parser': True}]
+    )
+
+    # Run once to get initialization steps out of the way.
+    dd_run_check(c)
+
+    benchmark(c.check, None)
+
+
+@pytest.mark.parametrize('use_fast_parser', [False, True], ids=['default_parser', 'fast_parser'])
+def test_amazon_msk_jmx_metrics_excluded(
+    benchmark, dd_run_check, mock_http_response, fixture_amazon_msk_jmx_metrics, use_fast_parser
+):
+    mock_http_response(file_path=fixture_amazon_msk_jmx_metrics)
+    instance = {
+        'openmetrics_endpoint': 'foo',
+        'namespace': 'bar',
+        'metrics': ['.+'],
+        'exclude_metrics': ['^kafka_server_'],
+        'use_fast_parser': use_fast_parser,
+    }
+    c = OpenMetricsBaseCheckV2('test', {}, [instance])
+
+    # Run once to get initialization steps out of the way.
+    dd_run_check(c)
+
+    benchmark(c.check, None)
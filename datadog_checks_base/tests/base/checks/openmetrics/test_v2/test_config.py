@@ -428,3 +428,30 @@ class TestUseLatestSpec:
         check.configure_scrapers()
         scraper = check.scrapers['test']
         assert scraper.http.options['headers']['Accept'] == 'text/plain'
+
+
+class TestTagCacheSize:
+    @pytest.mark.parametrize('tag_cache_size', ['10', -1])
+    def test_invalid(self, dd_run_check, tag_cache_size):
+        check = get_check({'tag_cache_size': tag_cache_size})
+
+        with pytest.raises(Exception, match='^Setting `tag_cache_size` must be a non-negative integer$'):
+            dd_run_check(check, extract_message=True)
+
+
+class TestMaxPayloadSize:
+    @pytest.mark.parametrize('max_payload_size', ['10', -1])
+    def test_invalid(self, dd_run_check, max_payload_size):
+        check = get_check({'max_payload_size': max_payload_size})
+
+        with pytest.raises(Exception, match='^Setting `max_payload_size` must be a non-negative integer$'):
+            dd_run_check(check, extract_message=True)
+
+
+class TestMaxSamples:
+    @pytest.mark.parametrize('max_samples', ['10', -1])
+    def test_invalid(self, dd_run_check, max_samples):
+        check = get_check({'max_samples': max_samples})
+
+        with pytest.raises(Exception, match='^Setting `max_samples` must be a non-negative integer$'):
+            dd_run_check(check, extract_message=True)
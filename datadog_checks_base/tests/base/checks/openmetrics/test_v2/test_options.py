@@ -1,13 +1,17 @@
 # (C) Datadog, Inc. 2020-present
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import time
+from textwrap import dedent
+
 import pytest
 from mock import Mock
 
 from datadog_checks.base.constants import ServiceCheck
+from datadog_checks.base.utils.tagging import NormalizedTags
 from datadog_checks.dev.testing import requires_py3
 
-from .utils import get_check
+from .utils import get_check, text_to_protobuf
 
 pytestmark = [requires_py3]
 
@@ -745,3 +749,467 @@ class TestIgnoreTags:
         )
 
         aggregator.assert_all_metrics_covered()
+
+
+class TestTagCache:
+    def test(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar",node="a"} 6.396288e+06
+            go_memstats_alloc_bytes{foo="baz",node="b"} 6.396288e+06
+            go_memstats_alloc_bytes{foo="bat",node="c"} 6.396288e+06
+            """
+        )
+        check = get_check(
+            {
+                'metrics': ['.+'],
+                'exclude_metrics_by_labels': {'foo': ['bat']},
+                'hostname_label': 'node',
+                'tag_cache_size': 10,
+                'telemetry': True,
+            }
+        )
+        dd_run_check(check)
+        dd_run_check(check)
+
+        for foo, node in (('bar', 'a'), ('baz', 'b')):
+            aggregator.assert_metric(
+                'test.go_memstats_alloc_bytes',
+                6396288,
+                metric_type=aggregator.GAUGE,
+                tags=['endpoint:test', 'foo:{}'.format(foo), 'node:{}'.format(node)],
+                hostname=node,
+                count=2,
+            )
+
+        aggregator.assert_metric('test.telemetry.tag_cache.size', 3, count=2, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.tag_cache.misses', 3, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.tag_cache.hits', 3, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.tag_cache.evictions', 0, tags=['endpoint:test'])
+
+    def test_eviction(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            go_memstats_alloc_bytes{foo="baz"} 6.396288e+06
+            """
+        )
+        check = get_check({'metrics': ['.+'], 'tag_cache_size': 1, 'telemetry': True})
+        dd_run_check(check)
+
+        aggregator.assert_metric('test.telemetry.tag_cache.size', 1, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.tag_cache.misses', 2, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.tag_cache.evictions', 1, tags=['endpoint:test'])
+
+    def test_dynamic_tags(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            """
+        )
+        check = get_check({'metrics': ['.+'], 'tag_cache_size': 10})
+        dd_run_check(check)
+        check.set_dynamic_tags('baz:qux')
+        dd_run_check(check)
+
+        aggregator.assert_metric(
+            'test.go_memstats_alloc_bytes', 6396288, metric_type=aggregator.GAUGE, tags=['endpoint:test', 'foo:bar']
+        )
+        aggregator.assert_metric(
+            'test.go_memstats_alloc_bytes',
+            6396288,
+            metric_type=aggregator.GAUGE,
+            tags=['endpoint:test', 'foo:bar', 'baz:qux'],
+        )
+
+    def test_normalized_tags_shared(self, aggregator, dd_run_check, mock_http_response, mocker):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            """
+        )
+        check = get_check({'metrics': ['.+'], 'tag_cache_size': 10})
+        gauge = mocker.patch.object(check, 'gauge', wraps=check.gauge)
+        dd_run_check(check)
+        dd_run_check(check)
+
+        first_tags, second_tags = [call.kwargs['tags'] for call in gauge.call_args_list]
+        assert isinstance(first_tags, NormalizedTags)
+        assert first_tags is second_tags
+        aggregator.assert_metric('test.go_memstats_alloc_bytes', tags=['endpoint:test', 'foo:bar'], count=2)
+
+    def test_custom_transformer_tags_copied(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            """
+        )
+        check = get_check({'metrics': ['go_memstats_frees_total'], 'tag_cache_size': 10})
+
+        def transform(metric, sample_data, runtime_data):
+            for sample, tags, hostname in sample_data:
+                tags.append('baz:qux')
+                check.gauge('custom', sample.value, tags=tags, hostname=hostname)
+
+        check.check_initializations.append(
+            lambda: check.scrapers['test'].metric_transformer.add_custom_transformer(
+                'go_memstats_alloc_bytes', transform
+            )
+        )
+        dd_run_check(check)
+        dd_run_check(check)
+
+        aggregator.assert_metric('test.custom', tags=['endpoint:test', 'foo:bar', 'baz:qux'], count=2)
+
+    def test_tags_not_shared_without_cache(self, aggregator, dd_run_check, mock_http_response, mocker):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            """
+        )
+        check = get_check({'metrics': ['.+']})
+        gauge = mocker.patch.object(check, 'gauge', wraps=check.gauge)
+        dd_run_check(check)
+        dd_run_check(check)
+
+        first_tags, second_tags = [call.kwargs['tags'] for call in gauge.call_args_list]
+        assert type(first_tags) is list
+        assert first_tags is not second_tags
+        assert check.scrapers['test'].metric_transformer.shared_sample_tags is False
+
+
+class TestMaxConcurrentScrapes:
+    @staticmethod
+    def get_check(instance, payloads, mocker, delays=None):
+        from datadog_checks.base import OpenMetricsBaseCheckV2
+        from datadog_checks.dev.http import MockResponse
+
+        delays = delays or {}
+
+        def get(url, **kwargs):
+            time.sleep(delays.get(url, 0))
+            return MockResponse(payloads[url] or '', status_code=500 if payloads[url] is None else 200)
+
+        mocker.patch('requests.get', side_effect=get)
+
+        class Check(OpenMetricsBaseCheckV2):
+            __NAMESPACE__ = 'test'
+
+            def __init__(self, name, init_config, instances):
+                super().__init__(name, init_config, instances)
+                self.scraper_configs = [dict(self.instance, openmetrics_endpoint=endpoint) for endpoint in payloads]
+
+        return Check('test', {}, [instance])
+
+    def test(self, aggregator, dd_run_check, mocker):
+        payloads = {
+            'endpoint1': '# TYPE go_memstats_alloc_bytes gauge\ngo_memstats_alloc_bytes{foo="bar"} 1\n',
+            'endpoint2': '# TYPE go_memstats_alloc_bytes gauge\ngo_memstats_alloc_bytes{foo="bar"} 2\n',
+            'endpoint3': '# TYPE go_memstats_alloc_bytes gauge\ngo_memstats_alloc_bytes{foo="bar"} 3\n',
+        }
+        # The first endpoint responds last
+        check = self.get_check(
+            {'metrics': ['.+'], 'max_concurrent_scrapes': 3, 'telemetry': True},
+            payloads,
+            mocker,
+            delays={'endpoint1': 0.2},
+        )
+        dd_run_check(check)
+
+        # Submission order matches the order of the scrapers
+        assert [metric.value for metric in aggregator.metrics('test.go_memstats_alloc_bytes')] == [1, 2, 3]
+        for endpoint in payloads:
+            aggregator.assert_service_check(
+                'test.openmetrics.health', ServiceCheck.OK, tags=['endpoint:{}'.format(endpoint)]
+            )
+            aggregator.assert_metric('test.telemetry.scrape.duration', tags=['endpoint:{}'.format(endpoint)])
+
+        assert aggregator.metrics('test.telemetry.scrape.duration')[0].value >= 0.2
+
+    def test_error_isolation(self, aggregator, dd_run_check, mocker):
+        payloads = {
+            'endpoint1': None,
+            'endpoint2': '# TYPE go_memstats_alloc_bytes gauge\ngo_memstats_alloc_bytes{foo="bar"} 2\n',
+        }
+        check = self.get_check({'metrics': ['.+'], 'max_concurrent_scrapes': 2}, payloads, mocker)
+
+        with pytest.raises(Exception, match='^There was an error scraping endpoint endpoint1: 500 Server Error'):
+            dd_run_check(check, extract_message=True)
+
+        aggregator.assert_service_check('test.openmetrics.health', ServiceCheck.CRITICAL, tags=['endpoint:endpoint1'])
+        aggregator.assert_service_check('test.openmetrics.health', ServiceCheck.OK, tags=['endpoint:endpoint2'])
+        aggregator.assert_metric(
+            'test.go_memstats_alloc_bytes', 2, metric_type=aggregator.GAUGE, tags=['endpoint:endpoint2', 'foo:bar']
+        )
+        aggregator.assert_all_metrics_covered()
+
+    def test_sequential_by_default(self, aggregator, dd_run_check, mocker):
+        payloads = {
+            'endpoint1': None,
+            'endpoint2': '# TYPE go_memstats_alloc_bytes gauge\ngo_memstats_alloc_bytes{foo="bar"} 2\n',
+        }
+        check = self.get_check({'metrics': ['.+']}, payloads, mocker)
+
+        with pytest.raises(Exception, match='^There was an error scraping endpoint endpoint1'):
+            dd_run_check(check, extract_message=True)
+
+        aggregator.assert_all_metrics_covered()
+
+    @pytest.mark.parametrize('max_concurrent_scrapes', ['2', 0, True])
+    def test_invalid(self, max_concurrent_scrapes):
+        with pytest.raises(Exception, match='^Setting `max_concurrent_scrapes` must be a positive integer$'):
+            get_check({'max_concurrent_scrapes': max_concurrent_scrapes})
+
+
+class TestPayloadCaching:
+    PAYLOAD = """
+        # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+        # TYPE go_memstats_alloc_bytes gauge
+        go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+        # HELP go_memstats_frees_total Total number of frees.
+        # TYPE go_memstats_frees_total counter
+        go_memstats_frees_total{foo="bar"} 3
+        # HELP state Node state
+        # TYPE state gauge
+        state{bar="baz"} 3
+        """
+
+    @staticmethod
+    def mock_responses(mocker, responses):
+        from datadog_checks.dev.http import MockResponse
+
+        return mocker.patch('requests.get', side_effect=[MockResponse(*args, **kwargs) for args, kwargs in responses])
+
+    def get_check(self, instance):
+        instance.update(
+            {
+                'metrics': ['.+', {'state': {'type': 'service_check', 'status_map': {'3': 'ok'}}}],
+                'telemetry': True,
+            }
+        )
+        return get_check(instance)
+
+    def test_conditional_requests(self, aggregator, dd_run_check, mocker):
+        get = self.mock_responses(
+            mocker,
+            [
+                ((self.PAYLOAD,), {'headers': {'ETag': '"foo"'}}),
+                (('',), {'status_code': 304, 'headers': {'ETag': '"foo"'}}),
+            ],
+        )
+        check = self.get_check({'use_conditional_requests': True})
+
+        dd_run_check(check)
+        assert 'If-None-Match' not in get.call_args.kwargs['headers']
+        aggregator.assert_metric('test.go_memstats_frees.count', 3, count=1)
+
+        dd_run_check(check)
+        assert get.call_args.kwargs['headers']['If-None-Match'] == '"foo"'
+
+        aggregator.assert_metric(
+            'test.go_memstats_alloc_bytes',
+            6396288,
+            count=2,
+            tags=['endpoint:test', 'foo:bar'],
+            metric_type=aggregator.GAUGE,
+        )
+        aggregator.assert_service_check('test.state', ServiceCheck.OK, count=2, tags=['endpoint:test'])
+        aggregator.assert_service_check('test.openmetrics.health', ServiceCheck.OK, count=2, tags=['endpoint:test'])
+        aggregator.assert_metric('test.go_memstats_frees.count', 3, count=1)
+        aggregator.assert_metric('test.telemetry.payload.unchanged', 1, count=1, tags=['endpoint:test'])
+
+    def test_conditional_requests_without_etag(self, aggregator, dd_run_check, mocker):
+        get = self.mock_responses(mocker, [((self.PAYLOAD,), {}), ((self.PAYLOAD,), {})])
+        check = self.get_check({'use_conditional_requests': True})
+
+        dd_run_check(check)
+        dd_run_check(check)
+
+        assert 'If-None-Match' not in get.call_args.kwargs['headers']
+        aggregator.assert_metric('test.go_memstats_frees.count', 3, count=2)
+        aggregator.assert_metric('test.telemetry.payload.unchanged', count=0)
+
+    def test_skip_unchanged_payload(self, aggregator, dd_run_check, mocker):
+        changed_payload = self.PAYLOAD.replace('6.396288e+06', '42')
+        self.mock_responses(
+            mocker, [((self.PAYLOAD,), {}), ((self.PAYLOAD,), {}), ((changed_payload,), {}), ((changed_payload,), {})]
+        )
+        check = self.get_check({'skip_unchanged_payload': True})
+
+        for _ in range(2):
+            dd_run_check(check)
+
+        scraper = check.scrapers['test']
+        generate_sample_data = mocker.spy(scraper, 'generate_sample_data')
+
+        aggregator.assert_metric('test.go_memstats_alloc_bytes', 6396288, count=2)
+        aggregator.assert_metric('test.go_memstats_frees.count', 3, count=1)
+        aggregator.assert_metric('test.telemetry.payload.unchanged', 1, count=1, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.payload.size', len(dedent(self.PAYLOAD[1:])), count=2)
+
+        dd_run_check(check)
+        aggregator.assert_metric('test.go_memstats_alloc_bytes', 42, count=1)
+        assert generate_sample_data.call_count == 3
+
+        dd_run_check(check)
+        aggregator.assert_metric('test.go_memstats_alloc_bytes', 42, count=2)
+        aggregator.assert_metric('test.telemetry.payload.unchanged', 2, tags=['endpoint:test'])
+        assert generate_sample_data.call_count == 3
+
+    def test_failed_scrape_is_not_cached(self, aggregator, dd_run_check, mocker):
+        self.mock_responses(
+            mocker, [((self.PAYLOAD,), {}), ((self.PAYLOAD,), {'status_code': 500}), ((self.PAYLOAD,), {})]
+        )
+        check = self.get_check({'skip_unchanged_payload': True})
+
+        dd_run_check(check)
+        with pytest.raises(Exception):
+            dd_run_check(check)
+        dd_run_check(check)
+
+        aggregator.assert_metric('test.go_memstats_alloc_bytes', 6396288, count=2)
+        aggregator.assert_metric('test.telemetry.payload.unchanged', 1, count=1, tags=['endpoint:test'])
+
+
+class TestPayloadLimits:
+    PAYLOAD = dedent(
+        """
+        # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+        # TYPE go_memstats_alloc_bytes gauge
+        go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+        # HELP go_memstats_frees_total Total number of frees.
+        # TYPE go_memstats_frees_total counter
+        go_memstats_frees_total{foo="bar"} 3
+        # HELP go_memstats_gc_sys_bytes Number of bytes used for garbage collection system metadata.
+        # TYPE go_memstats_gc_sys_bytes gauge
+        go_memstats_gc_sys_bytes{bar="foo"} 901120
+        """
+    )[1:]
+
+    def assert_truncated(self, aggregator, limit):
+        aggregator.assert_service_check('test.openmetrics.health', ServiceCheck.OK, count=1)
+        aggregator.assert_service_check(
+            'test.openmetrics.health',
+            ServiceCheck.WARNING,
+            count=1,
+            tags=['endpoint:test'],
+            message='Stopped reading the payload as it exceeds the `max_payload_size` limit of {} bytes'.format(limit),
+        )
+        aggregator.assert_metric('test.telemetry.payload.truncated', 1, count=1, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.bytes_read', limit, count=1, tags=['endpoint:test'])
+
+    @pytest.mark.parametrize('use_fast_parser', [False, True])
+    def test_max_payload_size(self, aggregator, dd_run_check, mock_http_response, use_fast_parser):
+        mock_http_response(self.PAYLOAD)
+
+        # Stop in the middle of the last sample, which must not be parsed as `go_memstats_gc_sys_bytes 9`
+        limit = len(self.PAYLOAD) - 6
+        check = get_check(
+            {'metrics': ['.+'], 'max_payload_size': limit, 'use_fast_parser': use_fast_parser, 'telemetry': True}
+        )
+        dd_run_check(check)
+
+        aggregator.assert_metric('test.go_memstats_alloc_bytes', 6396288, count=1)
+        aggregator.assert_metric('test.go_memstats_frees.count', 3, count=1)
+        aggregator.assert_metric('test.go_memstats_gc_sys_bytes', count=0)
+        self.assert_truncated(aggregator, limit)
+
+    def test_max_payload_size_protobuf(self, aggregator, dd_run_check, mock_http_response, tmp_path):
+        payload = text_to_protobuf(self.PAYLOAD)
+        payload_file = tmp_path / 'payload.bin'
+        payload_file.write_bytes(payload)
+        mock_http_response(
+            file_path=str(payload_file),
+            headers={'Content-Type': 'application/vnd.google.protobuf; encoding=delimited'},
+        )
+
+        limit = len(payload) - 10
+        check = get_check({'metrics': ['.+'], 'max_payload_size': limit, 'use_protobuf': True, 'telemetry': True})
+        dd_run_check(check)
+
+        aggregator.assert_metric('test.go_memstats_alloc_bytes', 6396288, count=1)
+        aggregator.assert_metric('test.go_memstats_frees.count', 3, count=1)
+        aggregator.assert_metric('test.go_memstats_gc_sys_bytes', count=0)
+        self.assert_truncated(aggregator, limit)
+
+    def test_max_payload_size_not_reached(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(self.PAYLOAD)
+        check = get_check({'metrics': ['.+'], 'max_payload_size': len(self.PAYLOAD), 'telemetry': True})
+        dd_run_check(check)
+
+        aggregator.assert_metric('test.go_memstats_gc_sys_bytes', 901120, count=1)
+        aggregator.assert_service_check('test.openmetrics.health', ServiceCheck.WARNING, count=0)
+        aggregator.assert_metric('test.telemetry.payload.truncated', count=0)
+        aggregator.assert_metric('test.telemetry.scrape.bytes_read', len(self.PAYLOAD), count=1)
+
+    def test_max_payload_size_concurrent_scrapes(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(self.PAYLOAD)
+        limit = len(self.PAYLOAD) - 6
+        check = get_check(
+            {'metrics': ['.+'], 'max_payload_size': limit, 'max_concurrent_scrapes': 2, 'telemetry': True}
+        )
+        dd_run_check(check)
+
+        aggregator.assert_metric('test.go_memstats_frees.count', 3, count=1)
+        aggregator.assert_metric('test.go_memstats_gc_sys_bytes', count=0)
+        self.assert_truncated(aggregator, limit)
+
+    def test_max_samples(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(self.PAYLOAD)
+        check = get_check({'metrics': ['.+'], 'max_samples': 2, 'telemetry': True})
+        dd_run_check(check)
+
+        aggregator.assert_metric('test.go_memstats_alloc_bytes', 6396288, count=1)
+        aggregator.assert_metric('test.go_memstats_frees.count', 3, count=1)
+        aggregator.assert_metric('test.go_memstats_gc_sys_bytes', count=0)
+        aggregator.assert_service_check(
+            'test.openmetrics.health',
+            ServiceCheck.WARNING,
+            count=1,
+            message=(
+                'Stopped processing metric `go_memstats_gc_sys_bytes` as it exceeds the '
+                '`max_samples` limit of 2 samples'
+            ),
+        )
+        aggregator.assert_metric('test.telemetry.payload.truncated', 1, count=1)
+        aggregator.assert_metric('test.telemetry.metrics.input.count', 2)
+
+    def test_scrape_telemetry(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(self.PAYLOAD)
+        check = get_check({'metrics': ['.+'], 'telemetry': True})
+        dd_run_check(check)
+
+        aggregator.assert_metric('test.telemetry.scrape.bytes_read', len(self.PAYLOAD), count=1, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.peak_families', 1, count=1, tags=['endpoint:test'])
+        for name in ('parse_time', 'transform_time'):
+            metrics = aggregator.metrics('test.telemetry.scrape.{}'.format(name))
+            assert len(metrics) == 1
+            assert metrics[0].value >= 0
+
+    def test_peak_families_with_buffered_metrics(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(self.PAYLOAD)
+        check = get_check(
+            {
+                'metrics': ['.+'],
+                'share_labels': {'go_memstats_gc_sys_bytes': {'labels': ['bar']}},
+                'cache_shared_labels': False,
+                'telemetry': True,
+            }
+        )
+        dd_run_check(check)
+
+        # Every metric is held until the one sharing its labels is found
+        aggregator.assert_metric('test.telemetry.scrape.peak_families', 3, count=1)
+        aggregator.assert_metric('test.go_memstats_alloc_bytes', 6396288, tags=['endpoint:test', 'foo:bar', 'bar:foo'])
@@ -0,0 +1,407 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import os
+
+import pytest
+from prometheus_client.parser import text_fd_to_metric_families as parse_metric_families
+
+from datadog_checks.base.checks.openmetrics.v2 import parser
+from datadog_checks.base.checks.openmetrics.v2.parser import (
+    format_float,
+    protobuf_to_metric_families,
+    text_fd_to_metric_families,
+)
+from datadog_checks.dev.testing import requires_py3
+
+from .utils import get_check, text_to_protobuf
+
+pytestmark = [requires_py3]
+
+FIXTURE_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', 'fixtures', 'prometheus')
+)
+
+TEST_DATA = r"""
+# HELP go_memstats_alloc_bytes_total Total number of bytes allocated, even if freed.
+# TYPE go_memstats_alloc_bytes_total counter
+go_memstats_alloc_bytes_total 9.339544592e+09
+# HELP requests Number of requests.
+# TYPE requests counter
+requests{code="200",path="/"} 10 1395066363000
+requests{code="500" , path="/"} 2
+# HELP skydns_skydns_dns_request_duration_seconds Histogram of the time (in seconds) each request took to resolve.
+# TYPE skydns_skydns_dns_request_duration_seconds histogram
+skydns_skydns_dns_request_duration_seconds_bucket{system="auth",le="10"} 1.359194e+06
+skydns_skydns_dns_request_duration_seconds_bucket{system="auth",le="+Inf"} 1.359194e+06
+skydns_skydns_dns_request_duration_seconds_sum{system="auth"} 44.31446715499896
+skydns_skydns_dns_request_duration_seconds_count{system="auth"} 1.359194e+06
+# HELP go_gc_duration_seconds A summary of the GC invocation durations.\nWith an escaped \\ newline.
+# TYPE go_gc_duration_seconds summary
+go_gc_duration_seconds{quantile="0"} 0.00036825700000000004
+go_gc_duration_seconds{quantile="1"} NaN
+go_gc_duration_seconds_sum 1.154763349
+go_gc_duration_seconds_count 2351
+
+untyped_metric{escaped="quote \" backslash \\ newline \n",empty=""} -Inf
+# TYPE untyped_family untyped
+untyped_family{foo="bar",} 1
+"""
+
+
+def parse(text, **kwargs):
+    return list(text_fd_to_metric_families(text.encode('utf-8').splitlines(), **kwargs))
+
+
+def assert_equivalent(text, **kwargs):
+    expected = list(parse_metric_families(text.splitlines()))
+    actual = parse(text, **kwargs)
+
+    # NaN never compares equal
+    assert repr(actual) == repr(expected)
+
+
+def test_equivalent():
+    assert_equivalent(TEST_DATA)
+
+
+@pytest.mark.parametrize('fixture', ['ksm.txt', 'metrics.txt', 'deprecated.txt'])
+def test_equivalent_fixtures(fixture):
+    with open(os.path.join(FIXTURE_PATH, fixture), 'r', encoding='utf-8') as f:
+        assert_equivalent(f.read())
+
+
+def test_skip_metric():
+    skipped = []
+    metrics = parse(
+        TEST_DATA,
+        skip_metric=lambda name: name in ('go_memstats_alloc_bytes', 'requests', 'untyped_metric'),
+        on_skip=lambda name, num_samples: skipped.append((name, num_samples)),
+    )
+
+    assert [metric.name for metric in metrics] == [
+        'skydns_skydns_dns_request_duration_seconds',
+        'go_gc_duration_seconds',
+        'untyped_family',
+    ]
+    assert skipped == [('go_memstats_alloc_bytes', 1), ('requests', 2), ('untyped_metric', 1)]
+
+
+def test_skip_metric_does_not_parse_samples():
+    skipped = []
+    metrics = parse(
+        """
+        # TYPE foo gauge
+        foo{bar="baz"} not_a_number
+        # TYPE bar gauge
+        bar 1
+        """,
+        skip_metric=lambda name: name == 'foo',
+        on_skip=lambda name, num_samples: skipped.append((name, num_samples)),
+    )
+
+    assert [(metric.name, metric.samples[0].value) for metric in metrics] == [('bar', 1)]
+    assert skipped == [('foo', 1)]
+
+
+def assert_protobuf_equivalent(text):
+    expected = list(parse_metric_families(text.splitlines()))
+    actual = list(protobuf_to_metric_families(text_to_protobuf(text)))
+
+    assert repr(actual) == repr(expected)
+
+
+def test_protobuf_equivalent():
+    # Untyped singletons become families of their own
+    assert_protobuf_equivalent(TEST_DATA.replace(',empty=""', ''))
+
+
+@pytest.mark.parametrize('fixture', ['ksm.txt', 'metrics.txt', 'deprecated.txt'])
+def test_protobuf_equivalent_fixtures(fixture):
+    with open(os.path.join(FIXTURE_PATH, fixture), 'r', encoding='utf-8') as f:
+        assert_protobuf_equivalent(f.read())
+
+
+def test_protobuf_implicit_inf_bucket():
+    text = '''
+# TYPE foo histogram
+foo_bucket{le="1"} 2
+foo_bucket{le="+Inf"} 3
+foo_sum 4
+foo_count 3
+'''
+    # Go clients omit the +Inf bucket
+    payload = text_to_protobuf(text.replace('foo_bucket{le="+Inf"} 3\n', ''))
+
+    assert repr(list(protobuf_to_metric_families(payload))) == repr(list(parse_metric_families(text.splitlines())))
+
+
+def test_protobuf_skip_metric():
+    skipped = []
+    metrics = protobuf_to_metric_families(
+        text_to_protobuf(TEST_DATA),
+        skip_metric=lambda name: name in ('go_memstats_alloc_bytes', 'skydns_skydns_dns_request_duration_seconds'),
+        on_skip=lambda name, num_samples: skipped.append((name, num_samples)),
+    )
+
+    assert [metric.name for metric in metrics] == [
+        'requests',
+        'go_gc_duration_seconds',
+        'untyped_metric',
+        'untyped_family',
+    ]
+    assert skipped == [('go_memstats_alloc_bytes', 1), ('skydns_skydns_dns_request_duration_seconds', 4)]
+
+
+@pytest.mark.parametrize(
+    'value, expected',
+    [
+        (0.0, '0'),
+        (1.0, '1'),
+        (0.25, '0.25'),
+        (0.0001, '0.0001'),
+        (0.00001, '1e-05'),
+        (123456.0, '123456'),
+        (1e6, '1e+06'),
+        (-1234567.0, '-1.234567e+06'),
+        (float('inf'), '+Inf'),
+        (float('-inf'), '-Inf'),
+        (float('nan'), 'NaN'),
+    ],
+)
+def test_format_float(value, expected):
+    assert format_float(value) == expected
+
+
+class TestScraper:
+    def test_exclude_metrics(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            # HELP go_memstats_gc_sys_bytes Number of bytes used for garbage collection system metadata.
+            # TYPE go_memstats_gc_sys_bytes gauge
+            go_memstats_gc_sys_bytes{bar="foo"} 901120
+            # HELP go_memstats_free_bytes Number of bytes free and available for use.
+            # TYPE go_memstats_free_bytes gauge
+            go_memstats_free_bytes{foo="bar"} 6.396288e+06
+            """
+        )
+        check = get_check(
+            {
+                'metrics': ['.+'],
+                'exclude_metrics': ['^go_memstats_(alloc|free)_bytes$'],
+                'use_fast_parser': True,
+                'telemetry': True,
+            }
+        )
+        dd_run_check(check)
+
+        aggregator.assert_metric(
+            'test.go_memstats_gc_sys_bytes', 901120, metric_type=aggregator.GAUGE, tags=['endpoint:test', 'bar:foo']
+        )
+        aggregator.assert_metric('test.telemetry.metrics.input.count', 3, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.metrics.ignored.count', 2, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.metrics.processed.count', 1, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.payload.size')
+        aggregator.assert_metric('test.telemetry.scrape.duration', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.bytes_read', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.parse_time', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.transform_time', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.peak_families', 1, tags=['endpoint:test'])
+
+        aggregator.assert_all_metrics_covered()
+
+    def test_raw_prefix_and_line_filters(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(
+            """
+            # HELP foo_go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE foo_go_memstats_alloc_bytes gauge
+            foo_go_memstats_alloc_bytes{bar=""} 6.396288e+06
+            # HELP foo_go_memstats_gc_sys_bytes Number of bytes used for garbage collection system metadata.
+            # TYPE foo_go_memstats_gc_sys_bytes gauge
+            foo_go_memstats_gc_sys_bytes{foo="bar"} 901120
+            # HELP foo_go_memstats_free_bytes Number of bytes free and available for use.
+            # TYPE foo_go_memstats_free_bytes gauge
+            foo_go_memstats_free_bytes{foo="bar"} 6.396288e+06
+            """
+        )
+        check = get_check(
+            {
+                'metrics': ['.+'],
+                'raw_metric_prefix': 'foo_',
+                'raw_line_filters': ['=""'],
+                'exclude_metrics': ['go_memstats_free_bytes'],
+                'use_fast_parser': True,
+            }
+        )
+        dd_run_check(check)
+
+        aggregator.assert_metric(
+            'test.go_memstats_gc_sys_bytes', 901120, metric_type=aggregator.GAUGE, tags=['endpoint:test', 'foo:bar']
+        )
+
+        aggregator.assert_all_metrics_covered()
+
+    def test_excluded_shared_labels(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            # HELP go_memstats_gc_sys_bytes Number of bytes used for garbage collection system metadata.
+            # TYPE go_memstats_gc_sys_bytes gauge
+            go_memstats_gc_sys_bytes{bar="foo"} 901120
+            """
+        )
+        check = get_check(
+            {
+                'metrics': ['.+'],
+                'share_labels': {'go_memstats_alloc_bytes': True},
+                'exclude_metrics': ['go_memstats_alloc_bytes'],
+                'use_fast_parser': True,
+            }
+        )
+        dd_run_check(check)
+
+        aggregator.assert_metric(
+            'test.go_memstats_gc_sys_bytes',
+            901120,
+            metric_type=aggregator.GAUGE,
+            tags=['endpoint:test', 'bar:foo', 'foo:bar'],
+        )
+
+        aggregator.assert_all_metrics_covered()
+
+    def test_unconfigured_metrics(self, aggregator, dd_run_check, mock_http_response, mocker):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            # HELP go_memstats_gc_sys_bytes Number of bytes used for garbage collection system metadata.
+            # TYPE go_memstats_gc_sys_bytes gauge
+            go_memstats_gc_sys_bytes{bar="foo"} 901120
+            # HELP go_memstats_free_bytes Number of bytes free and available for use.
+            # TYPE go_memstats_free_bytes gauge
+            go_memstats_free_bytes{foo="bar"} 6.396288e+06
+            """
+        )
+        check = get_check(
+            {
+                'metrics': ['go_memstats_gc_sys_bytes', '^go_memstats_f'],
+                'use_fast_parser': True,
+                'telemetry': True,
+            }
+        )
+        parse_sample = mocker.spy(parser, 'parse_sample')
+        dd_run_check(check)
+
+        aggregator.assert_metric(
+            'test.go_memstats_gc_sys_bytes', 901120, metric_type=aggregator.GAUGE, tags=['endpoint:test', 'bar:foo']
+        )
+        aggregator.assert_metric(
+            'test.go_memstats_free_bytes', 6396288, metric_type=aggregator.GAUGE, tags=['endpoint:test', 'foo:bar']
+        )
+        aggregator.assert_metric('test.telemetry.metrics.input.count', 3, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.metrics.processed.count', 2, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.payload.size')
+        aggregator.assert_metric('test.telemetry.scrape.duration', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.bytes_read', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.parse_time', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.transform_time', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.peak_families', 1, tags=['endpoint:test'])
+        aggregator.assert_all_metrics_covered()
+        assert parse_sample.call_count == 2
+
+    def test_custom_transformer(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            """
+        )
+        check = get_check({'metrics': [], 'use_fast_parser': True})
+        dd_run_check(check)
+        aggregator.assert_all_metrics_covered()
+
+        def transformer(metric, sample_data, runtime_data):
+            for sample, tags, hostname in sample_data:
+                check.gauge('custom', sample.value, tags=tags, hostname=hostname)
+
+        check.scrapers['test'].metric_transformer.add_custom_transformer('go_memstats_alloc_bytes', transformer)
+        dd_run_check(check)
+
+        aggregator.assert_metric(
+            'test.custom', 6396288, metric_type=aggregator.GAUGE, tags=['endpoint:test', 'foo:bar']
+        )
+        aggregator.assert_all_metrics_covered()
+
+    def test_protobuf(self, aggregator, dd_run_check, mock_http_response, tmp_path):
+        payload_file = tmp_path / 'payload.bin'
+        payload_file.write_bytes(
+            text_to_protobuf(
+                """
+# HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+# TYPE go_memstats_alloc_bytes gauge
+go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+# HELP go_memstats_frees_total Total number of frees.
+# TYPE go_memstats_frees_total counter
+go_memstats_frees_total{foo="bar"} 3
+# HELP go_memstats_gc_sys_bytes Number of bytes used for garbage collection system metadata.
+# TYPE go_memstats_gc_sys_bytes gauge
+go_memstats_gc_sys_bytes{bar="foo"} 901120
+"""
+            )
+        )
+        get = mock_http_response(
+            file_path=str(payload_file),
+            headers={'Content-Type': 'application/vnd.google.protobuf; encoding=delimited'},
+        )
+        check = get_check(
+            {
+                'metrics': ['.+'],
+                'exclude_metrics': ['go_memstats_gc_sys_bytes'],
+                'use_protobuf': True,
+                'telemetry': True,
+            }
+        )
+        dd_run_check(check)
+
+        assert get.call_args.kwargs['headers']['Accept'].startswith('application/vnd.google.protobuf;')
+        aggregator.assert_metric(
+            'test.go_memstats_alloc_bytes', 6396288, metric_type=aggregator.GAUGE, tags=['endpoint:test', 'foo:bar']
+        )
+        aggregator.assert_metric(
+            'test.go_memstats_frees.count', 3, metric_type=aggregator.MONOTONIC_COUNT, tags=['endpoint:test', 'foo:bar']
+        )
+        aggregator.assert_metric('test.telemetry.metrics.input.count', 3, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.metrics.ignored.count', 1, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.metrics.processed.count', 2, tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.payload.size')
+        aggregator.assert_metric('test.telemetry.scrape.duration', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.bytes_read', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.parse_time', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.transform_time', tags=['endpoint:test'])
+        aggregator.assert_metric('test.telemetry.scrape.peak_families', 1, tags=['endpoint:test'])
+        aggregator.assert_all_metrics_covered()
+
+    def test_protobuf_text_fallback(self, aggregator, dd_run_check, mock_http_response):
+        mock_http_response(
+            """
+            # HELP go_memstats_alloc_bytes Number of bytes allocated and still in use.
+            # TYPE go_memstats_alloc_bytes gauge
+            go_memstats_alloc_bytes{foo="bar"} 6.396288e+06
+            go_memstats_alloc_bytes{foo=""} 6.396288e+06
+            """,
+            headers={'Content-Type': 'text/plain; version=0.0.4'},
+        )
+        check = get_check({'metrics': ['.+'], 'raw_line_filters': ['=""'], 'use_protobuf': True})
+        dd_run_check(check)
+
+        aggregator.assert_metric(
+            'test.go_memstats_alloc_bytes', 6396288, metric_type=aggregator.GAUGE, tags=['endpoint:test', 'foo:bar']
+        )
+        aggregator.assert_all_metrics_covered()
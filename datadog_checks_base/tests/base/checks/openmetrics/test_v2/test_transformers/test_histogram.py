@@ -594,3 +594,59 @@ def test_histogram_buckets_as_distributions_with_counters(aggregator, dd_run_che
     )
 
     aggregator.assert_all_metrics_covered()
+
+
+def test_histogram_buckets_as_distributions_multiple_series(aggregator, dd_run_check, mock_http_response, mocker):
+    payload = """
+        # HELP temperature_celsius Temperature.
+        # TYPE temperature_celsius histogram
+        temperature_celsius_bucket{room="a",le="-10"} 1
+        temperature_celsius_bucket{room="b",le="-10"} 0
+        temperature_celsius_bucket{room="a",le="0"} 3
+        temperature_celsius_bucket{room="b",le="0"} 2
+        temperature_celsius_bucket{room="a",le="10"} 6
+        temperature_celsius_bucket{room="b",le="10"} 7
+        temperature_celsius_bucket{room="a",le="+Inf"} 6
+        temperature_celsius_bucket{room="b",le="+Inf"} 9
+        temperature_celsius_sum{room="a"} 5
+        temperature_celsius_count{room="a"} 6
+        temperature_celsius_sum{room="b"} 50
+        temperature_celsius_count{room="b"} 9
+        """
+    mock_http_response(payload)
+    check = get_check({'metrics': ['.+'], 'histogram_buckets_as_distributions': True})
+
+    from datadog_checks.base.checks.openmetrics.v2 import utils
+
+    parse_bucket_bound = mocker.spy(utils, 'parse_bucket_bound')
+    dd_run_check(check)
+    dd_run_check(check)
+
+    # Every distinct boundary is parsed only once across scrapes
+    assert parse_bucket_bound.call_count == 4
+
+    expected_buckets = {
+        'a': [(1, float('-inf'), -10.0), (2, -10.0, 0), (3, 0, 10.0), (0, 10.0, float('inf'))],
+        'b': [(0, float('-inf'), -10.0), (2, -10.0, 0), (5, 0, 10.0), (2, 10.0, float('inf'))],
+    }
+    lower_bound_labels = {float('-inf'): '-inf', -10.0: '-10.0', 0: '0', 10.0: '10.0'}
+    upper_bound_labels = {-10.0: '-10.0', 0: '0', 10.0: '10.0', float('inf'): 'inf'}
+    for room, buckets in expected_buckets.items():
+        for value, lower_bound, upper_bound in buckets:
+            aggregator.assert_histogram_bucket(
+                'test.temperature_celsius',
+                value,
+                lower_bound,
+                upper_bound,
+                True,
+                '',
+                [
+                    'endpoint:test',
+                    'room:{}'.format(room),
+                    'upper_bound:{}'.format(upper_bound_labels[upper_bound]),
+                    'lower_bound:{}'.format(lower_bound_labels[lower_bound]),
+                ],
+                count=2,
+            )
+
+    aggregator.assert_all_metrics_covered()
@@ -19,3 +19,70 @@ def _get_check(cls, instance, init_config):
     check.__NAMESPACE__ = 'test'
 
     return check
+
+
+def text_to_protobuf(text):
+    """
+    Convert the text exposition format to the delimited protobuf format.
+    """
+    from google.protobuf.internal.encoder import _VarintBytes
+    from prometheus_client.parser import text_string_to_metric_families
+
+    from datadog_checks.base.utils.prometheus import metrics_pb2
+
+    metric_types = {
+        'counter': metrics_pb2.COUNTER,
+        'gauge': metrics_pb2.GAUGE,
+        'summary': metrics_pb2.SUMMARY,
+        'histogram': metrics_pb2.HISTOGRAM,
+    }
+
+    payload = bytearray()
+    for family in text_string_to_metric_families(text):
+        metric_type = metric_types.get(family.type, metrics_pb2.UNTYPED)
+        name = '{}_total'.format(family.name) if family.type == 'counter' else family.name
+        message = metrics_pb2.MetricFamily(name=name, help=family.documentation, type=metric_type)
+
+        # Samples of the same label set belong to the same metric
+        metrics = {}
+        for sample in family.samples:
+            labels = {key: value for key, value in sample.labels.items() if key not in ('le', 'quantile')}
+            key = tuple(labels.items()) if family.type in ('summary', 'histogram') else len(metrics)
+
+            metric = metrics.get(key)
+            if metric is None:
+                metric = metrics[key] = message.metric.add()
+                for label_name, label_value in labels.items():
+                    metric.label.add(name=label_name, value=label_value)
+
+                if sample.timestamp is not None:
+                    metric.timestamp_ms = int(sample.timestamp * 1000)
+
+            if family.type == 'counter':
+                metric.counter.value = sample.value
+            elif family.type == 'gauge':
+                metric.gauge.value = sample.value
+            elif family.type == 'summary':
+                if sample.name.endswith('_sum'):
+                    metric.summary.sample_sum = sample.value
+                elif sample.name.endswith('_count'):
+                    metric.summary.sample_count = int(sample.value)
+                else:
+                    metric.summary.quantile.add(quantile=float(sample.labels['quantile']), value=sample.value)
+            elif family.type == 'histogram':
+                if sample.name.endswith('_sum'):
+                    metric.histogram.sample_sum = sample.value
+                elif sample.name.endswith('_count'):
+                    metric.histogram.sample_count = int(sample.value)
+                else:
+                    metric.histogram.bucket.add(
+                        upper_bound=float(sample.labels['le']), cumulative_count=int(sample.value)
+                    )
+            else:
+                metric.untyped.value = sample.value
+
+        serialized = message.SerializeToString()
+        payload += _VarintBytes(len(serialized))
+        payload += serialized
+
+    return bytes(payload)
@@ -5,6 +5,7 @@
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import json
 import logging
+import re
 from typing import Any
 
 import mock
@@ -773,6 +774,60 @@ class TestTags:
         AgentCheck('myintegration', {}, [instance])
         assert expected_log in caplog.text
 
+    def test_metrics_filter_cache(self, aggregator):
+        instance = {'metric_patterns': {'exclude': ['^ns\\.bar'], 'include': ['^ns\\.ba']}}
+        check = AgentCheck('myintegration', {}, [instance])
+        check.__NAMESPACE__ = 'ns'
+
+        for _ in range(2):
+            for metric_name in ('foo', 'bar', 'baz'):
+                check.gauge(metric_name, 0)
+
+        aggregator.assert_metric('ns.baz', count=2)
+        aggregator.assert_all_metrics_covered()
+        assert check._metric_filter_cache == {'ns.foo': False, 'ns.bar': False, 'ns.baz': True}
+        assert check._metric_filter_cache_hits == 3
+        assert check._metric_filter_cache_misses == 3
+
+        # Changing the patterns must invalidate previous decisions
+        check.exclude_metrics_pattern = None
+        assert check._metric_filter_cache == {}
+
+        check.gauge('bar', 0)
+        aggregator.assert_metric('ns.bar', count=1)
+
+    def test_metrics_filter_cache_size(self):
+        instance = {'metric_patterns': {'exclude': ['^bar']}}
+        check = AgentCheck('myintegration', {}, [instance])
+        check.METRIC_FILTER_CACHE_SIZE = 2
+
+        for metric_name in ('foo1', 'foo2', 'foo3'):
+            assert check.should_send_metric(metric_name)
+
+        assert check._metric_filter_cache == {'foo3': True}
+
+    def test_metrics_filter_no_patterns(self):
+        check = AgentCheck('myintegration', {}, [{}])
+
+        assert check.should_send_metric('foo')
+        assert check._metric_filter_cache == {}
+
+    def test_metrics_filter_debug_metrics(self, aggregator, dd_run_check):
+        class FilteredCheck(AgentCheck):
+            def check(self, _):
+                for metric_name in ('foo', 'bar', 'foo'):
+                    self.gauge(metric_name, 0)
+
+        instance = {'metric_patterns': {'exclude': ['^bar']}, 'debug_metrics': {'metric_filter_cache': True}}
+        check = FilteredCheck('test', {}, [instance])
+        dd_run_check(check)
+
+        aggregator.assert_metric('foo', count=2)
+        aggregator.assert_metric('datadog.agent.metrics.filter_cache.hits', 1)
+        aggregator.assert_metric('datadog.agent.metrics.filter_cache.misses', 2)
+        aggregator.assert_metric('datadog.agent.metrics.filter_cache.size', 2)
+        aggregator.assert_all_metrics_covered()
+
 
 class LimitedCheck(AgentCheck):
     DEFAULT_METRIC_LIMIT = 10
@@ -915,6 +970,161 @@ class TestLimits:
         aggregator.assert_metric('datadog.agent.metrics.contexts.total', 5)
 
 
+class TestBatchSubmission:
+    def test_submit(self, aggregator):
+        check = AgentCheck()
+        check.__NAMESPACE__ = 'test'
+
+        tags_id = check.register_tags(['foo:bar', None, b'baz:qux'])
+        other_tags_id = check.register_tags([])
+        check.submit_batch(
+            ['gauge', 'count', 'monotonic_count', 'rate', 'histogram', 'historate', 'gauge'],
+            ['gauge', 'count', 'monotonic_count', 'rate', 'histogram', 'historate', 'none'],
+            [1, 2, 3, 4, 5, 6, None],
+            [tags_id, tags_id, tags_id, tags_id, tags_id, tags_id, other_tags_id],
+            ['', None, 'host', '', '', '', ''],
+        )
+
+        tags = ['foo:bar', 'baz:qux']
+        aggregator.assert_metric('test.gauge', 1, metric_type=aggregator.GAUGE, tags=tags, hostname='')
+        aggregator.assert_metric('test.count', 2, metric_type=aggregator.COUNT, tags=tags, hostname='')
+        aggregator.assert_metric(
+            'test.monotonic_count', 3, metric_type=aggregator.MONOTONIC_COUNT, tags=tags, hostname='host'
+        )
+        aggregator.assert_metric('test.rate', 4, metric_type=aggregator.RATE, tags=tags)
+        aggregator.assert_metric('test.histogram', 5, metric_type=aggregator.HISTOGRAM, tags=tags)
+        aggregator.assert_metric('test.historate', 6, metric_type=aggregator.HISTORATE, tags=tags)
+        aggregator.assert_all_metrics_covered()
+
+    def test_register_tags(self):
+        check = AgentCheck('test', {}, [{'disable_generic_tags': True}])
+
+        tags_id = check.register_tags(['host:foo', 'bar:baz'])
+        assert check.register_tags(['host:foo', 'bar:baz']) == tags_id
+        assert check.register_tags(['bar:baz']) != tags_id
+        assert check._batch_tags[tags_id] == ['test_host:foo', 'bar:baz']
+
+    def test_register_tags_reset_after_run(self, dd_run_check):
+        class TestCheck(AgentCheck):
+            def check(self, _):
+                for i in range(3):
+                    self.register_tags(['pod:{}'.format(i)])
+
+        check = TestCheck('test', {}, [{}])
+        dd_run_check(check)
+        dd_run_check(check)
+
+        assert check._batch_tags == []
+        assert check._batch_tags_ids == {}
+
+    def test_namespace(self, aggregator):
+        check = AgentCheck()
+        tags_id = check.register_tags([])
+
+        check.__NAMESPACE__ = 'foo'
+        check.submit_batch(['gauge'], ['metric'], [0], [tags_id], [''])
+        check.__NAMESPACE__ = 'bar'
+        check.submit_batch(['gauge'], ['metric'], [0], [tags_id], [''])
+        check.submit_batch(['gauge'], ['metric'], [0], [tags_id], [''], raw=True)
+
+        aggregator.assert_metric('foo.metric', count=1)
+        aggregator.assert_metric('bar.metric', count=1)
+        aggregator.assert_metric('metric', count=1)
+        aggregator.assert_all_metrics_covered()
+
+    def test_metrics_filters(self, aggregator):
+        instance = {'metric_patterns': {'exclude': ['^ns\\.bar'], 'include': ['^ns\\.ba']}}
+        check = AgentCheck('myintegration', {}, [instance])
+        check.__NAMESPACE__ = 'ns'
+        tags_id = check.register_tags([])
+
+        for _ in range(2):
+            check.submit_batch(['gauge'] * 3, ['foo', 'bar', 'baz'], [0] * 3, [tags_id] * 3, [''] * 3)
+
+        aggregator.assert_metric('ns.baz', count=2)
+        aggregator.assert_all_metrics_covered()
+
+    def test_metrics_filters_changed(self, aggregator):
+        check = AgentCheck('myintegration', {}, [{}])
+        tags_id = check.register_tags([])
+
+        check.submit_batch(['gauge'], ['metric'], [1], [tags_id], [''])
+        check.exclude_metrics_pattern = re.compile('^metric$')
+        check.submit_batch(['gauge'], ['metric'], [3], [tags_id], [''])
+
+        assert [metric.value for metric in aggregator.metrics('metric')] == [1.0]
+
+        check.exclude_metrics_pattern = None
+        check.include_metrics_pattern = re.compile('^other$')
+        check.submit_batch(['gauge'], ['metric'], [5], [tags_id], [''])
+
+        assert [metric.value for metric in aggregator.metrics('metric')] == [1.0]
+
+    def test_non_float_metric(self, aggregator):
+        check = AgentCheck()
+        tags_id = check.register_tags([])
+
+        with pytest.raises(ValueError):
+            check.submit_batch(['gauge'], ['metric'], ['85k'], [tags_id], [''])
+
+        aggregator.assert_metric('metric', count=0)
+
+    def test_histogram_buckets(self, aggregator):
+        check = AgentCheck()
+        check.__NAMESPACE__ = 'test'
+
+        check.submit_histogram_buckets(
+            'histogram',
+            [1, None, 2.0],
+            [0, 1, 2],
+            [1, 2, float('inf')],
+            True,
+            [None, 'host', 'host'],
+            [['foo:bar'], [], [b'baz:qux']],
+            flush_first_value=True,
+        )
+
+        aggregator.assert_histogram_bucket('test.histogram', 1, 0, 1, True, '', ['foo:bar'], flush_first_value=True)
+        aggregator.assert_histogram_bucket(
+            'test.histogram', 2, 2, float('inf'), True, 'host', ['baz:qux'], flush_first_value=True
+        )
+        assert len(aggregator.histogram_bucket('test.histogram')) == 2
+
+    def test_histogram_buckets_non_integer_value(self, aggregator):
+        check = AgentCheck()
+
+        with pytest.raises(ValueError):
+            check.submit_histogram_buckets('histogram', ['85k'], [0], [1], True, [''], [[]])
+
+        assert not aggregator.histogram_bucket('histogram')
+
+    def test_metric_limit(self, aggregator):
+        check = LimitedCheck()
+        tags_id = check.register_tags([])
+
+        check.submit_batch(['gauge'] * 20, ['metric'] * 20, [0] * 20, [tags_id] * 20, [''] * 20)
+        assert len(check.get_warnings()) == 1
+        assert len(aggregator.metrics('metric')) == 10
+
+    def test_flush_first_value(self, aggregator):
+        check = AgentCheck()
+        tags_id = check.register_tags([])
+
+        check.submit_batch(['monotonic_count'], ['metric'], [0], [tags_id], [''], flush_first_value=True)
+
+        aggregator.assert_metric('metric', flush_first_value=True)
+
+    def test_without_aggregator_support(self, aggregator, mocker):
+        mocker.patch.object(type(aggregator), 'submit_metrics', new=None)
+        check = AgentCheck()
+        tags_id = check.register_tags(['foo:bar'])
+
+        check.submit_batch(['gauge', 'count'], ['foo', 'bar'], [1, 2], [tags_id] * 2, [''] * 2)
+
+        aggregator.assert_metric('foo', 1, metric_type=aggregator.GAUGE, tags=['foo:bar'])
+        aggregator.assert_metric('bar', 2, metric_type=aggregator.COUNT, tags=['foo:bar'])
+
+
 class TestCheckInitializations:
     def test_success_only_once(self):
         class TestCheck(AgentCheck):
@@ -0,0 +1,75 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import pytest
+
+from datadog_checks.base import AgentCheck
+from datadog_checks.base.utils.db import QueryExecutor
+from datadog_checks.base.utils.db.statement_metrics import StatementMetrics
+
+from .common import mock_executor
+
+# Per-table metrics of a large database
+NUM_ROWS = 10000
+QUERY = {
+    'name': 'tables',
+    'query': 'select ...',
+    'columns': [
+        {'name': 'schema', 'type': 'tag'},
+        {'name': 'table', 'type': 'tag'},
+        {'name': 'table.rows', 'type': 'gauge'},
+        {'name': 'table.size', 'type': 'gauge'},
+        {'name': 'table.seq_scans', 'type': 'monotonic_count'},
+        {'name': 'table.idx_scans', 'type': 'monotonic_count'},
+        {'name': 'table.inserts', 'type': 'monotonic_count'},
+        {'name': 'table.deletes', 'type': 'monotonic_count'},
+    ],
+}
+
+
+@pytest.mark.parametrize('columnar', [False, True], ids=['rows', 'columns'])
+def test_query_executor(benchmark, aggregator, columnar):
+    rows = [['schema{}'.format(i % 10), 'table{}'.format(i), i, i * 8192, i, i, i, i] for i in range(NUM_ROWS)]
+    check = AgentCheck('test', {}, [{}])
+    qe = QueryExecutor(mock_executor(rows), check, [QUERY], tags=['test:bench'], columnar=columnar)
+    qe.compile_queries()
+
+    benchmark(qe.execute)
+
+    aggregator.assert_metric('table.rows', NUM_ROWS - 1, tags=['test:bench', 'schema:schema9', 'table:table9999'])
+
+
+def test_statement_metrics(benchmark):
+    metrics = ['calls', 'total_time', 'rows', 'shared_blks_hit', 'shared_blks_read']
+
+    def get_rows(run):
+        # Only a tenth of the statements are executed between runs
+        return [
+            {
+                'query_signature': 'signature{}'.format(i),
+                'datname': 'db{}'.format(i % 10),
+                'rolname': 'user',
+                'query': 'SELECT * FROM table{} WHERE id = ?'.format(i),
+                'calls': i + run * (i % 10 == 0),
+                'total_time': i * 1.5 + run * (i % 10 == 0),
+                'rows': i,
+                'shared_blks_hit': i,
+                'shared_blks_read': i,
+            }
+            for i in range(NUM_ROWS)
+        ]
+
+    def key(row):
+        return row['query_signature'], row['datname'], row['rolname']
+
+    runs = [get_rows(run) for run in range(2)]
+    state = StatementMetrics()
+
+    def compute():
+        for rows in runs:
+            state.compute_derivative_rows(rows, metrics, key=key)
+
+    benchmark(compute)
+
+    state.compute_derivative_rows(runs[0], metrics, key=key)
+    assert len(state.compute_derivative_rows(runs[1], metrics, key=key)) == NUM_ROWS // 10
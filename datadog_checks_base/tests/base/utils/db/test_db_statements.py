@@ -3,6 +3,9 @@
 # Licensed under a 3-clause BSD style license (see LICENSE)
 
 import copy
+import sys
+from array import array
+from decimal import Decimal
 
 import pytest
 
@@ -181,3 +184,87 @@ class TestStatementMetrics:
         ]
 
         assert expected_merged_metrics == metrics
+
+    def test_compute_derivative_rows_value_types(self):
+        sm = StatementMetrics()
+
+        def key(row):
+            return row['query']
+
+        metrics = ['count', 'time', 'rows', 'blocks']
+
+        rows1 = [
+            {'count': 1, 'time': 1.5, 'rows': Decimal('1'), 'blocks': 1, 'query': 'q1'},
+            {'count': 2, 'time': 2.5, 'rows': Decimal('2'), 'blocks': 2.5, 'query': 'q2'},
+        ]
+        rows2 = [
+            {'count': 2, 'time': 2.0, 'rows': Decimal('3'), 'blocks': 2, 'query': 'q1'},
+            {'count': 2, 'time': 3.0, 'rows': Decimal('2'), 'blocks': 3, 'query': 'q2'},
+        ]
+
+        assert [] == sm.compute_derivative_rows(rows1, metrics, key=key)
+        assert isinstance(sm._previous_columns['count'], array)
+        assert isinstance(sm._previous_columns['time'], array)
+        assert isinstance(sm._previous_columns['rows'], list)
+        assert isinstance(sm._previous_columns['blocks'], list)
+
+        derived_rows = sm.compute_derivative_rows(rows2, metrics, key=key)
+        assert derived_rows == [
+            {'count': 1, 'time': 0.5, 'rows': Decimal('2'), 'blocks': 1, 'query': 'q1'},
+            {'count': 0, 'time': 0.5, 'rows': Decimal('0'), 'blocks': 0.5, 'query': 'q2'},
+        ]
+        assert [[type(v) for v in row.values()] for row in derived_rows] == [
+            [int, float, Decimal, int, str],
+            [int, float, Decimal, float, str],
+        ]
+
+    def test_compute_derivative_rows_new_metrics(self):
+        sm = StatementMetrics()
+
+        def key(row):
+            return row['query']
+
+        assert [] == sm.compute_derivative_rows([{'count': 1, 'query': 'q1'}], ['count'], key=key)
+        assert [] == sm.compute_derivative_rows([{'count': 2, 'time': 1, 'query': 'q1'}], ['count', 'time'], key=key)
+        assert [{'count': 1, 'time': 1, 'query': 'q1'}] == sm.compute_derivative_rows(
+            [{'count': 3, 'time': 2, 'query': 'q1'}], ['count', 'time'], key=key
+        )
+
+    def test_compute_derivative_rows_does_not_modify_input(self):
+        sm = StatementMetrics()
+
+        def key(row):
+            return row['query']
+
+        rows1 = [{'count': 1, 'query': 'q1'}, {'count': 1, 'query': 'q1'}, {'count': 1, 'query': 'q2'}]
+        rows2 = [{'count': 2, 'query': 'q1'}, {'count': 2, 'query': 'q1'}, {'count': 2, 'query': 'q2'}]
+        expected_rows2 = copy.deepcopy(rows2)
+
+        sm.compute_derivative_rows(rows1, ['count'], key=key)
+        assert sm.compute_derivative_rows(rows2, ['count'], key=key) == [
+            {'count': 2, 'query': 'q1'},
+            {'count': 1, 'query': 'q2'},
+        ]
+        assert rows2 == expected_rows2
+
+    def test_memory_usage(self):
+        sm = StatementMetrics()
+
+        def key(row):
+            return row['query']
+
+        empty_size = sm.memory_usage()
+        rows = [{'count': i, 'time': float(i), 'query': 'q{}'.format(i)} for i in range(10000)]
+        sm.compute_derivative_rows(rows, ['count', 'time'], key=key)
+
+        # Both metric columns are stored in arrays of 8 bytes per value, along with the key of every row
+        key_size = sum(sys.getsizeof(key(row)) for row in rows)
+        assert sm.memory_usage() > empty_size + 2 * 8 * len(rows) + key_size
+        assert sm.memory_usage() < sum(sys.getsizeof(row) for row in rows) + key_size * 2
+
+        # Keys made of several columns are counted with their items
+        sm.compute_derivative_rows(rows, ['count', 'time'], key=lambda row: (row['query'], 'user'))
+        assert sm.memory_usage() > empty_size + 2 * 8 * len(rows) + key_size + 56 * len(rows)
+
+        sm.compute_derivative_rows([], ['count', 'time'], key=key)
+        assert sm.memory_usage() == empty_size
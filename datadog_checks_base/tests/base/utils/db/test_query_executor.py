@@ -1,10 +1,16 @@
 # (C) Datadog, Inc. 2022-present
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import threading
+import time
+
+import mock
+import pytest
+
 from datadog_checks.base import AgentCheck
 from datadog_checks.base.utils.db import QueryExecutor
 
-from .common import mock_executor
+from .common import create_query_manager, mock_executor
 
 
 class TestQueryExecutor:
@@ -149,3 +155,532 @@ class TestQueryExecutor:
 
         for i in range(num_queries):
             aggregator.assert_metric('test.metric.{}'.format(i), i, metric_type=aggregator.GAUGE, tags=tags)
+
+
+class MockCursor(object):
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fetched = []
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        self.fetched.append(len(chunk))
+        return tuple(chunk)
+
+
+def get_table_queries():
+    return [
+        {
+            'name': 'tables',
+            'query': 'select ...',
+            'columns': [
+                {'name': 'db', 'type': 'tag'},
+                {'name': 'table', 'type': 'tag', 'boolean': False},
+                None,
+                {'name': 'table.rows', 'type': 'gauge'},
+                {'name': 'table.reads', 'type': 'monotonic_count'},
+                {'name': 'table.size', 'type': 'gauge', 'raw': True},
+                {'name': 'table.scans', 'type': 'monotonic_gauge'},
+                {'name': 'state', 'type': 'source'},
+                {'name': 'table.status', 'type': 'service_check', 'status_map': {'up': 'OK', 'down': 'CRITICAL'}},
+            ],
+            'extras': [
+                {'name': 'table.rows_per_read', 'expression': 'table.rows / table.reads', 'submit_type': 'gauge'}
+            ],
+            'tags': ['query:tables'],
+        }
+    ]
+
+
+def get_table_rows(num_rows):
+    return [
+        [
+            'db{}'.format(i % 3),
+            'table{}'.format(i),
+            'ignored',
+            i,
+            i + 1,
+            i * 2,
+            i * 3,
+            'state',
+            'up' if i % 2 else 'down',
+        ]
+        for i in range(num_rows)
+    ]
+
+
+class TestColumnar:
+    @pytest.mark.parametrize('columnar', [False, True], ids=['rows', 'columns'])
+    def test_equivalent_submissions(self, aggregator, columnar):
+        check = AgentCheck('test', {}, [{}])
+        check.__NAMESPACE__ = 'ns'
+        qe = QueryExecutor(
+            mock_executor(get_table_rows(25)),
+            check,
+            get_table_queries(),
+            tags=['foo:bar'],
+            hostname='db-host',
+            columnar=columnar,
+            batch_size=10,
+        )
+        qe.compile_queries()
+        qe.execute(extra_tags=['baz:qux'])
+
+        for i in range(25):
+            tags = ['foo:bar', 'baz:qux', 'query:tables', 'db:db{}'.format(i % 3), 'table:table{}'.format(i)]
+            aggregator.assert_metric('ns.table.rows', i, metric_type=aggregator.GAUGE, tags=tags, hostname='db-host')
+            aggregator.assert_metric(
+                'ns.table.reads', i + 1, metric_type=aggregator.MONOTONIC_COUNT, tags=tags, hostname='db-host'
+            )
+            aggregator.assert_metric('table.size', i * 2, metric_type=aggregator.GAUGE, tags=tags, hostname='db-host')
+            aggregator.assert_metric('ns.table.scans.total', i * 3, tags=tags, hostname='db-host')
+            aggregator.assert_metric('ns.table.scans.count', i * 3, tags=tags, hostname='db-host')
+            aggregator.assert_metric('ns.table.rows_per_read', i / (i + 1), tags=tags, hostname='db-host')
+            aggregator.assert_service_check(
+                'ns.table.status', AgentCheck.OK if i % 2 else AgentCheck.CRITICAL, tags=tags, hostname='db-host'
+            )
+
+        aggregator.assert_all_metrics_covered()
+
+    def test_batch_submission(self, aggregator):
+        check = AgentCheck('test', {}, [{}])
+        qe = QueryExecutor(mock_executor(get_table_rows(25)), check, get_table_queries(), columnar=True, batch_size=10)
+        qe.compile_queries()
+
+        with mock.patch.object(check, 'submit_batch', wraps=check.submit_batch) as submit_batch:
+            qe.execute()
+
+        # One call per chunk for the namespaced metrics and another for the raw one
+        assert submit_batch.call_count == 6
+        assert [len(call.args[0]) for call in submit_batch.call_args_list] == [20, 10, 20, 10, 10, 5]
+
+    def test_fetchmany(self, aggregator):
+        check = AgentCheck('test', {}, [{}])
+        cursor = MockCursor([[i] for i in range(5)])
+        qe = QueryExecutor(
+            lambda _: cursor,
+            check,
+            [{'name': 'q', 'query': 'select ...', 'columns': [{'name': 'metric', 'type': 'gauge'}]}],
+            columnar=True,
+            batch_size=2,
+        )
+        qe.compile_queries()
+        qe.execute()
+
+        assert cursor.fetched == [2, 2, 1, 0]
+        for i in range(5):
+            aggregator.assert_metric('metric', i, count=1)
+
+    def test_invalid_rows(self, aggregator):
+        check = AgentCheck('test', {}, [{}])
+        qe = QueryExecutor(
+            mock_executor([[1, 'foo'], [], [2], [3, 'bar']]),
+            check,
+            [
+                {
+                    'name': 'q',
+                    'query': 'select ...',
+                    'columns': [{'name': 'metric', 'type': 'gauge'}, {'name': 'tag', 'type': 'tag'}],
+                }
+            ],
+            columnar=True,
+        )
+        qe.compile_queries()
+        qe.execute()
+
+        aggregator.assert_metric('metric', 1, count=1, tags=['tag:foo'])
+        aggregator.assert_metric('metric', 3, count=1, tags=['tag:bar'])
+        aggregator.assert_all_metrics_covered()
+
+    def test_tag_list_values(self, aggregator):
+        check = AgentCheck('test', {}, [{}])
+        qe = QueryExecutor(
+            mock_executor([[1, ['a', 'b']], [2, ['a', 'b']], [3, 'c,d']]),
+            check,
+            [
+                {
+                    'name': 'q',
+                    'query': 'select ...',
+                    'columns': [{'name': 'metric', 'type': 'gauge'}, {'name': 'tags', 'type': 'tag_list'}],
+                }
+            ],
+            columnar=True,
+        )
+        qe.compile_queries()
+        qe.execute()
+
+        aggregator.assert_metric('metric', 1, count=1, tags=['tags:a', 'tags:b'])
+        aggregator.assert_metric('metric', 2, count=1, tags=['tags:a', 'tags:b'])
+        aggregator.assert_metric('metric', 3, count=1, tags=['tags:c', 'tags:d'])
+
+    def test_submitter_without_batches(self):
+        submitter = mock.MagicMock(
+            spec=[
+                'gauge',
+                'count',
+                'monotonic_count',
+                'rate',
+                'histogram',
+                'historate',
+                'set_metadata',
+                'service_check',
+            ]
+        )
+        qe = QueryExecutor(
+            mock_executor([[1, 'foo'], [2, 'bar']]),
+            submitter,
+            [
+                {
+                    'name': 'q',
+                    'query': 'select ...',
+                    'columns': [{'name': 'metric', 'type': 'gauge'}, {'name': 'tag', 'type': 'tag'}],
+                }
+            ],
+            columnar=True,
+        )
+        qe.compile_queries()
+        qe.execute()
+
+        assert submitter.gauge.call_args_list == [
+            mock.call('metric', 1, tags=['tag:foo'], hostname=None),
+            mock.call('metric', 2, tags=['tag:bar'], hostname=None),
+        ]
+
+    @pytest.mark.parametrize('batch_size', [0, '10', None])
+    def test_invalid_batch_size(self, batch_size):
+        with pytest.raises(ValueError, match='^QueryExecutor batch size must be a positive integer$'):
+            QueryExecutor(mock_executor(), AgentCheck('test', {}, [{}]), batch_size=batch_size)
+
+
+class SlowExecutorFactory(object):
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.executors = 0
+        self.closed = 0
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.executors += 1
+
+        def executor(query):
+            self.threads.add(threading.current_thread().ident)
+            time.sleep(self.delay)
+            if query == 'error':
+                raise Exception('Unable to run query')
+
+            return [[int(query)]]
+
+        def close():
+            with self.lock:
+                self.closed += 1
+
+        executor.close = close
+        return executor
+
+
+def get_parallel_queries(num_queries, **extra):
+    queries = []
+    for i in range(num_queries):
+        query = {'name': 'q{}'.format(i), 'query': str(i), 'columns': [{'name': 'metric', 'type': 'gauge'}]}
+        query['tags'] = ['query:{}'.format(i)]
+        query.update(extra)
+        queries.append(query)
+
+    return queries
+
+
+class TestParallel:
+    @pytest.mark.parametrize('columnar', [False, True], ids=['rows', 'columns'])
+    def test_concurrent(self, aggregator, columnar):
+        factory = SlowExecutorFactory()
+        qe = QueryExecutor(
+            None,
+            AgentCheck('test', {}, [{}]),
+            get_parallel_queries(4, parallel=True),
+            executor_factory=factory,
+            max_workers=4,
+            columnar=columnar,
+        )
+        qe.compile_queries()
+
+        try:
+            start_time = time.time()
+            qe.execute()
+            duration = time.time() - start_time
+        finally:
+            qe.close()
+
+        assert duration < factory.delay * 4
+        assert factory.executors == 4
+        for i in range(4):
+            aggregator.assert_metric('metric', i, count=1, tags=['query:{}'.format(i)])
+
+        assert [name for name, _ in qe.query_execution_times] == ['q0', 'q1', 'q2', 'q3']
+        for _, execution_time in qe.query_execution_times:
+            assert execution_time >= factory.delay
+
+    def test_bounded_workers(self, aggregator):
+        factory = SlowExecutorFactory(0.05)
+        qe = QueryExecutor(
+            None,
+            AgentCheck('test', {}, [{}]),
+            get_parallel_queries(6, parallel=True),
+            executor_factory=factory,
+            max_workers=2,
+        )
+        qe.compile_queries()
+
+        try:
+            qe.execute()
+            qe.execute()
+        finally:
+            qe.close()
+
+        # Executors are created once per thread and reused across runs
+        assert factory.executors == 2
+        assert len(factory.threads) == 2
+        for i in range(6):
+            aggregator.assert_metric('metric', i, count=2, tags=['query:{}'.format(i)])
+
+    def test_mixed(self, aggregator):
+        queries = get_parallel_queries(2, parallel=True)
+        queries.append({'name': 'main', 'query': '100', 'columns': [{'name': 'metric', 'type': 'gauge'}]})
+        factory = SlowExecutorFactory(0)
+        qe = QueryExecutor(
+            lambda query: [[int(query) + 1]],
+            AgentCheck('test', {}, [{}]),
+            queries,
+            executor_factory=factory,
+        )
+        qe.compile_queries()
+
+        try:
+            qe.execute()
+        finally:
+            qe.close()
+
+        assert threading.current_thread().ident not in factory.threads
+        aggregator.assert_metric('metric', 0, count=1, tags=['query:0'])
+        aggregator.assert_metric('metric', 1, count=1, tags=['query:1'])
+        aggregator.assert_metric('metric', 101, count=1, tags=[])
+
+    def test_error_isolation(self, aggregator, caplog):
+        queries = get_parallel_queries(2, parallel=True)
+        queries.insert(
+            1, {'name': 'broken', 'query': 'error', 'columns': [{'name': 'metric', 'type': 'gauge'}], 'parallel': True}
+        )
+        qe = QueryExecutor(
+            None,
+            AgentCheck('test', {}, [{}]),
+            queries,
+            executor_factory=SlowExecutorFactory(0),
+            error_handler=lambda error: error.replace('query', '***'),
+        )
+        qe.compile_queries()
+
+        try:
+            qe.execute()
+        finally:
+            qe.close()
+
+        aggregator.assert_metric('metric', 0, count=1, tags=['query:0'])
+        aggregator.assert_metric('metric', 1, count=1, tags=['query:1'])
+        aggregator.assert_all_metrics_covered()
+        assert 'Error querying broken: Unable to run ***' in caplog.text
+        assert [name for name, _ in qe.query_execution_times] == ['q0', 'q1']
+
+    def test_executor_replaced_after_error(self, aggregator):
+        factory = SlowExecutorFactory(0)
+        queries = get_parallel_queries(1, parallel=True)
+        queries.insert(
+            0, {'name': 'broken', 'query': 'error', 'columns': [{'name': 'metric', 'type': 'gauge'}], 'parallel': True}
+        )
+        qe = QueryExecutor(None, AgentCheck('test', {}, [{}]), queries, executor_factory=factory, max_workers=1)
+        qe.compile_queries()
+
+        try:
+            qe.execute()
+
+            assert factory.executors == 2
+            assert factory.closed == 1
+        finally:
+            qe.close()
+
+        assert factory.closed == 2
+        aggregator.assert_metric('metric', 0, count=1, tags=['query:0'])
+
+    def test_close_executors(self):
+        factory = SlowExecutorFactory(0.05)
+        qe = QueryExecutor(
+            None,
+            AgentCheck('test', {}, [{}]),
+            get_parallel_queries(4, parallel=True),
+            executor_factory=factory,
+            max_workers=4,
+        )
+        qe.compile_queries()
+        qe.execute()
+        qe.close()
+
+        assert factory.executors == 4
+        assert factory.closed == 4
+
+        # Closed executors are not reused by the next run
+        qe.execute()
+        qe.close()
+
+        assert factory.executors == 8
+        assert factory.closed == 8
+
+    def test_cancel(self):
+        factory = SlowExecutorFactory(0)
+        check = AgentCheck('test', {}, [{}])
+        query_manager = create_query_manager(
+            *get_parallel_queries(2, parallel=True), check=check, executor_factory=factory, max_workers=2
+        )
+        query_manager.compile_queries()
+        query_manager.execute()
+        check.cancel()
+
+        assert query_manager._pool is None
+        assert factory.closed == factory.executors
+
+    def test_no_factory(self, aggregator):
+        qe = QueryExecutor(
+            lambda query: [[int(query)]], AgentCheck('test', {}, [{}]), get_parallel_queries(2, parallel=True)
+        )
+        qe.compile_queries()
+        qe.execute()
+
+        assert qe._pool is None
+        aggregator.assert_metric('metric', 0, count=1, tags=['query:0'])
+        aggregator.assert_metric('metric', 1, count=1, tags=['query:1'])
+
+    def test_debug_metrics(self, aggregator):
+        check = AgentCheck('test', {}, [{'debug_metrics': {'query_execution_time': True}}])
+        query_manager = create_query_manager(
+            *get_parallel_queries(2), check=check, executor=lambda query: [[int(query)]]
+        )
+        query_manager.compile_queries()
+        query_manager.execute()
+
+        for i in range(2):
+            aggregator.assert_metric(
+                'datadog.agent.metrics.query.execution_time',
+                count=1,
+                tags=check.get_debug_metric_tags() + ['query:q{}'.format(i)],
+            )
+
+    @pytest.mark.parametrize('max_workers', [0, '4', None])
+    def test_invalid_max_workers(self, max_workers):
+        with pytest.raises(ValueError, match='^QueryExecutor max workers must be a positive integer$'):
+            QueryExecutor(mock_executor(), AgentCheck('test', {}, [{}]), max_workers=max_workers)
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCollectionInterval:
+    @staticmethod
+    def get_query_executor(executor, columnar=False):
+        queries = [
+            {
+                'name': 'sizes',
+                'query': 'sizes',
+                'columns': [
+                    {'name': 'table', 'type': 'tag'},
+                    {'name': 'table.size', 'type': 'gauge'},
+                    {'name': 'table.vacuums', 'type': 'monotonic_count'},
+                ],
+                'collection_interval': 60,
+            },
+            {'name': 'connections', 'query': 'connections', 'columns': [{'name': 'connections', 'type': 'gauge'}]},
+        ]
+        qe = QueryExecutor(executor, AgentCheck('test', {}, [{}]), queries, tags=['foo:bar'], columnar=columnar)
+        qe.compile_queries()
+        return qe
+
+    @pytest.mark.parametrize('columnar', [False, True], ids=['rows', 'columns'])
+    def test_replay(self, aggregator, columnar):
+        executor = mock.MagicMock(
+            side_effect=lambda query: [['t1', 10, 1], ['t2', 20, 2]] if query == 'sizes' else [[5]]
+        )
+        qe = self.get_query_executor(executor, columnar)
+        clock = Clock()
+
+        with mock.patch('datadog_checks.base.utils.db.core.get_precise_time', clock):
+            qe.execute()
+            clock.now = 30
+            qe.execute()
+
+        assert [call.args[0] for call in executor.call_args_list] == ['sizes', 'connections', 'connections']
+        aggregator.assert_metric('table.size', 10, count=2, tags=['foo:bar', 'table:t1'])
+        aggregator.assert_metric('table.size', 20, count=2, tags=['foo:bar', 'table:t2'])
+        aggregator.assert_metric('table.vacuums', 1, count=1, tags=['foo:bar', 'table:t1'])
+        aggregator.assert_metric('table.vacuums', 2, count=1, tags=['foo:bar', 'table:t2'])
+        aggregator.assert_metric('connections', 5, count=2, tags=['foo:bar'])
+        aggregator.assert_all_metrics_covered()
+
+    def test_refresh(self, aggregator):
+        results = iter([[['t1', 10, 1]], [['t1', 15, 2]]])
+        executor = mock.MagicMock(side_effect=lambda query: next(results) if query == 'sizes' else [[5]])
+        qe = self.get_query_executor(executor)
+        clock = Clock()
+
+        with mock.patch('datadog_checks.base.utils.db.core.get_precise_time', clock):
+            with mock.patch('datadog_checks.base.utils.db.core.random.random', return_value=0):
+                qe.execute()
+                clock.now = 59
+                qe.execute()
+                clock.now = 60
+                qe.execute()
+
+        assert [call.args[0] for call in executor.call_args_list].count('sizes') == 2
+        aggregator.assert_metric('table.size', 10, count=2)
+        aggregator.assert_metric('table.size', 15, count=1)
+
+    def test_jitter(self):
+        executor = mock.MagicMock(side_effect=lambda query: [['t1', 10, 1]] if query == 'sizes' else [[5]])
+        qe = self.get_query_executor(executor)
+        clock = Clock()
+
+        with mock.patch('datadog_checks.base.utils.db.core.get_precise_time', clock):
+            with mock.patch('datadog_checks.base.utils.db.core.random.random', return_value=1):
+                qe.execute()
+                clock.now = 54
+                qe.execute()
+
+        # At most 10% of the interval earlier
+        assert [call.args[0] for call in executor.call_args_list].count('sizes') == 2
+
+    def test_retry_after_error(self, aggregator):
+        results = iter([Exception('timeout'), [['t1', 10, 1]]])
+
+        def executor(query):
+            if query != 'sizes':
+                return [[5]]
+
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+
+            return result
+
+        qe = self.get_query_executor(executor)
+        clock = Clock()
+
+        with mock.patch('datadog_checks.base.utils.db.core.get_precise_time', clock):
+            qe.execute()
+            clock.now = 1
+            qe.execute()
+            clock.now = 2
+            qe.execute()
+
+        aggregator.assert_metric('table.size', 10, count=2)
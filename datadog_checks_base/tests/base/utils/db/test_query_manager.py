@@ -57,6 +57,23 @@ class TestQueryCompilation:
         with pytest.raises(ValueError, match='^field `tags` for test query must be a list$'):
             query_manager.compile_queries()
 
+    def test_parallel_not_boolean(self):
+        query_manager = create_query_manager(
+            {'name': 'test query', 'query': 'foo', 'columns': [{}], 'parallel': 'true'}
+        )
+
+        with pytest.raises(ValueError, match='^field `parallel` for test query must be a boolean$'):
+            query_manager.compile_queries()
+
+    @pytest.mark.parametrize('collection_interval', [0, -1, '60', True])
+    def test_collection_interval_not_positive_number(self, collection_interval):
+        query_manager = create_query_manager(
+            {'name': 'test query', 'query': 'foo', 'columns': [{}], 'collection_interval': collection_interval}
+        )
+
+        with pytest.raises(ValueError, match='^field `collection_interval` for test query must be a positive number$'):
+            query_manager.compile_queries()
+
     def test_column_not_dict(self):
         query_manager = create_query_manager(
             {'name': 'test query', 'query': 'foo', 'columns': [['column']], 'tags': ['test:bar']}
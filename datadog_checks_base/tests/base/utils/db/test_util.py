@@ -14,6 +14,7 @@ from datadog_checks.base.utils.db.utils import (
     ConstantRateLimiter,
     DBMAsyncJob,
     RateLimitingTTLCache,
+    StatementCache,
     obfuscate_sql_with_metadata,
     resolve_db_host,
 )
@@ -164,6 +165,146 @@ def test_obfuscate_sql_with_metadata(obfuscator_return_value, expected_value):
     assert statement['metadata'] == {}
 
 
+class TestStatementCache:
+    def test_obfuscate(self):
+        cache = StatementCache()
+
+        with mock.patch.object(datadog_agent, 'obfuscate_sql', passthrough=True) as obfuscate_sql:
+            obfuscate_sql.side_effect = lambda query, options=None: json.dumps(
+                {'query': query.upper(), 'metadata': {'tables_csv': 'foo', 'commands': ['SELECT'], 'comments': None}}
+            )
+            first = cache.obfuscate('select * from foo', '{}')
+            second = cache.obfuscate('select * from foo', '{}')
+            cache.obfuscate('select * from foo', '{"replace_digits": true}')
+
+        assert first == {
+            'query': 'SELECT * FROM FOO',
+            'metadata': {'tables': ['foo'], 'commands': ['SELECT'], 'comments': None},
+        }
+        assert second is first
+        assert obfuscate_sql.call_count == 2
+        assert (cache.hits, cache.misses) == (1, 2)
+        assert len(cache) == 2
+
+    def test_obfuscate_empty(self):
+        cache = StatementCache()
+
+        assert cache.obfuscate(None) == {'query': '', 'metadata': {}}
+        assert len(cache) == 0
+
+    def test_obfuscate_error_not_cached(self):
+        cache = StatementCache()
+
+        with mock.patch.object(datadog_agent, 'obfuscate_sql', passthrough=True) as obfuscate_sql:
+            obfuscate_sql.side_effect = Exception('foo')
+            for _ in range(2):
+                with pytest.raises(Exception, match='^foo$'):
+                    cache.obfuscate('select 1')
+
+        assert obfuscate_sql.call_count == 2
+        assert len(cache) == 0
+
+    def test_acquire_fqt(self):
+        cache = StatementCache(fqt_ttl=0.1)
+
+        assert cache.acquire_fqt(('abc', 'db'))
+        assert not cache.acquire_fqt(('abc', 'db'))
+        assert cache.acquire_fqt(('abc', 'other_db'))
+
+        time.sleep(0.2)
+        assert cache.acquire_fqt(('abc', 'db'))
+        assert cache.fqt_entries == 1
+
+    def test_acquire_fqt_max_size(self):
+        cache = StatementCache(fqt_max_size=2)
+
+        for key in ('a', 'b', 'c'):
+            assert cache.acquire_fqt((key,))
+
+        assert cache.fqt_entries == 2
+
+    def test_acquire_fqt_not_evicted_by_statements(self):
+        cache = StatementCache(max_bytes=2000)
+        assert cache.acquire_fqt(('abc', 'db'))
+
+        with mock.patch.object(datadog_agent, 'obfuscate_sql', passthrough=True) as obfuscate_sql:
+            obfuscate_sql.side_effect = lambda query, options=None: query
+            for i in range(10):
+                cache.obfuscate('SELECT {} FROM {}'.format(i, 'x' * 500))
+
+        assert cache.evicted_bytes > 0
+        assert not cache.acquire_fqt(('abc', 'db'))
+
+    def test_acquire_fqt_across_threads(self):
+        cache = StatementCache()
+
+        with ThreadPoolExecutor(8) as executor:
+            acquired = list(executor.map(cache.acquire_fqt, [('abc', 'db')] * 1000))
+
+        assert acquired.count(True) == 1
+
+    def test_bounded_by_bytes(self):
+        cache = StatementCache(max_bytes=2000)
+
+        with mock.patch.object(datadog_agent, 'obfuscate_sql', passthrough=True) as obfuscate_sql:
+            obfuscate_sql.side_effect = lambda query, options=None: query
+            for i in range(10):
+                cache.obfuscate('SELECT {} FROM {}'.format(i, 'x' * 500))
+
+            assert cache.size <= 2000
+            assert len(cache) == 2
+            assert cache.evicted_bytes > 0
+
+            # The least recently used entries are evicted first
+            cache.obfuscate('SELECT 8 FROM {}'.format('x' * 500))
+            cache.obfuscate('SELECT 10 FROM {}'.format('x' * 500))
+            hits = cache.hits
+            cache.obfuscate('SELECT 8 FROM {}'.format('x' * 500))
+            assert cache.hits == hits + 1
+
+            # Entries larger than the whole cache are never stored
+            cache.obfuscate('x' * 5000)
+            assert len(cache) == 2
+
+    def test_shared_across_threads(self):
+        cache = StatementCache()
+        queries = ['SELECT {}'.format(i % 10) for i in range(1000)]
+
+        with mock.patch.object(datadog_agent, 'obfuscate_sql', passthrough=True) as obfuscate_sql:
+            obfuscate_sql.side_effect = lambda query, options=None: query
+            with ThreadPoolExecutor(4) as executor:
+                results = list(executor.map(cache.obfuscate, queries))
+
+        assert [result['query'] for result in results] == queries
+        assert cache.hits + cache.misses == len(queries)
+        assert len(cache) == 10
+
+    def test_submit_telemetry(self, aggregator):
+        check = AgentCheck('test', {}, [{}])
+        cache = StatementCache()
+        cache.acquire_fqt(('abc',))
+        with mock.patch.object(datadog_agent, 'obfuscate_sql', passthrough=True) as obfuscate_sql:
+            obfuscate_sql.side_effect = lambda query, options=None: query
+            cache.obfuscate('SELECT 1')
+            cache.obfuscate('SELECT 1')
+            cache.submit_telemetry(check, 'postgres', tags=['foo:bar'])
+            cache.obfuscate('SELECT 1')
+            cache.submit_telemetry(check, 'postgres', tags=['foo:bar'])
+
+        for name, values in (('hits', [1, 1]), ('misses', [1, 0]), ('evicted_bytes', [0, 0])):
+            metrics = aggregator.metrics('dd.postgres.statement_cache.{}'.format(name))
+            assert [metric.value for metric in metrics] == values
+            assert all(metric.tags == ['foo:bar'] for metric in metrics)
+
+        aggregator.assert_metric('dd.postgres.statement_cache.size', cache.size)
+        aggregator.assert_metric('dd.postgres.statement_cache.entries', 1)
+        aggregator.assert_metric('dd.postgres.statement_cache.fqt_entries', 1)
+
+    def test_invalid_max_bytes(self):
+        with pytest.raises(ValueError, match='^StatementCache max bytes must be a non-negative integer$'):
+            StatementCache(max_bytes=-1)
+
+
 class TestJob(DBMAsyncJob):
     def __init__(self, check, run_sync=False, enabled=True, rate_limit=10, min_collection_interval=15):
         super(TestJob, self).__init__(
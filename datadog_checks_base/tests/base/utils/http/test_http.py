@@ -2,6 +2,7 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import logging
+import time
 
 import mock
 import pytest
@@ -10,8 +11,14 @@ import requests_unixsocket
 from flaky import flaky
 from six import PY2, iteritems
 
-from datadog_checks.base import AgentCheck
-from datadog_checks.base.utils.http import RequestsWrapper, is_uds_url, quote_uds_url
+from datadog_checks.base import AgentCheck, ConfigurationError
+from datadog_checks.base.utils.http import (
+    SHARED_CONNECTION_POOLS,
+    RequestsWrapper,
+    SharedHTTPAdapter,
+    is_uds_url,
+    quote_uds_url,
+)
 from datadog_checks.dev.utils import ON_WINDOWS
 
 
@@ -119,6 +126,198 @@ class TestSession:
             assert getattr(http.session, key) == value
 
 
+class TestSharedConnectionPool:
+    @staticmethod
+    def fake_send(adapter, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b''
+        response.request = request
+        response.url = request.url
+        return response
+
+    @pytest.fixture(autouse=True)
+    def send(self):
+        with mock.patch.object(SharedHTTPAdapter, 'send', autospec=True, side_effect=self.fake_send) as send:
+            yield send
+
+        SHARED_CONNECTION_POOLS.clear()
+
+    def test_disabled_by_default(self, send):
+        http = RequestsWrapper({}, {})
+
+        with mock.patch('requests.get') as get:
+            http.get('http://localhost:8080/metrics')
+
+        get.assert_called_once()
+        send.assert_not_called()
+        assert len(SHARED_CONNECTION_POOLS) == 0
+
+    @pytest.mark.parametrize(
+        'instance, init_config',
+        [
+            pytest.param({'shared_connection_pool': True}, {}, id='instance'),
+            pytest.param({}, {'shared_connection_pool': True}, id='init_config'),
+        ],
+    )
+    def test_shared_between_wrappers(self, send, instance, init_config):
+        http1 = RequestsWrapper(instance, init_config)
+        http2 = RequestsWrapper(instance, init_config)
+
+        http1.get('http://localhost:8080/metrics')
+        http1.get('http://localhost:8080/metrics')
+        http2.get('http://LOCALHOST:8080/stats')
+
+        assert send.call_count == 3
+        assert len({call.args[0] for call in send.call_args_list}) == 1
+        assert http1.session.get_adapter('http://localhost:8080/') is http2.session.get_adapter(
+            'http://localhost:8080/'
+        )
+        assert http1.get_shared_connection_pool_stats() == (1, 1, 1)
+        assert http2.get_shared_connection_pool_stats() == (1, 0, 1)
+        assert http1.get_shared_connection_pool_stats() == (0, 0, 1)
+
+    @pytest.mark.parametrize(
+        'other_instance, other_url',
+        [
+            pytest.param({}, 'http://localhost:8081/metrics', id='port'),
+            pytest.param({}, 'https://localhost:8080/metrics', id='scheme'),
+            pytest.param({'tls_verify': False}, 'http://localhost:8080/metrics', id='tls'),
+            pytest.param({'username': 'bar', 'password': 'baz'}, 'http://localhost:8080/metrics', id='credentials'),
+            pytest.param({'password': 'bar'}, 'http://localhost:8080/metrics', id='password'),
+            pytest.param(
+                {'auth_type': 'ntlm', 'ntlm_domain': 'domain\\foo'}, 'http://localhost:8080/metrics', id='auth type'
+            ),
+            pytest.param({'kerberos_keytab': '/etc/foo.keytab'}, 'http://localhost:8080/metrics', id='auth setting'),
+            pytest.param(
+                {'shared_connection_pool_idle_timeout': 10}, 'http://localhost:8080/metrics', id='idle timeout'
+            ),
+            pytest.param({'shared_connection_pool_size': 3}, 'http://localhost:8080/metrics', id='pool size'),
+        ],
+    )
+    def test_not_shared(self, send, other_instance, other_url):
+        http1 = RequestsWrapper({'shared_connection_pool': True, 'username': 'foo', 'password': 'baz'}, {})
+        other_instance = dict({'shared_connection_pool': True, 'username': 'foo', 'password': 'baz'}, **other_instance)
+        http2 = RequestsWrapper(other_instance, {})
+
+        http1.get('http://localhost:8080/metrics')
+        http2.get(other_url)
+
+        assert send.call_args_list[0].args[0] is not send.call_args_list[1].args[0]
+        assert len(SHARED_CONNECTION_POOLS) == 2
+
+    def test_ntlm_credentials(self, send):
+        instance = {'shared_connection_pool': True, 'auth_type': 'ntlm', 'ntlm_domain': 'domain\\foo'}
+        http1 = RequestsWrapper(dict(instance, password='bar'), {})
+        http2 = RequestsWrapper(dict(instance, password='baz'), {})
+        http3 = RequestsWrapper(dict(instance, password='bar'), {})
+
+        for http in (http1, http2, http3):
+            http.get('http://localhost:8080/metrics')
+
+        adapters = [call.args[0] for call in send.call_args_list]
+        assert adapters[0] is not adapters[1]
+        assert adapters[0] is adapters[2]
+
+    def test_request_auth(self, send):
+        http = RequestsWrapper({'shared_connection_pool': True}, {})
+        http.get('http://localhost:8080/metrics', auth=('foo', 'bar'))
+        http.get('http://localhost:8080/metrics', auth=('foo', 'baz'))
+        http.get('http://localhost:8080/metrics', auth=('foo', 'bar'))
+
+        adapters = [call.args[0] for call in send.call_args_list]
+        assert adapters[0] is not adapters[1]
+        assert adapters[0] is adapters[2]
+
+    def test_pool_size(self, send):
+        http = RequestsWrapper({'shared_connection_pool': True, 'shared_connection_pool_size': 3}, {})
+        http.get('http://localhost:8080/metrics')
+
+        assert send.call_args.args[0]._pool_maxsize == 3
+
+    def test_idle_eviction(self, send):
+        http1 = RequestsWrapper({'shared_connection_pool': True, 'shared_connection_pool_idle_timeout': 0.01}, {})
+        http2 = RequestsWrapper({'shared_connection_pool': True}, {})
+
+        evictions = SHARED_CONNECTION_POOLS.evictions
+
+        with mock.patch.object(SHARED_CONNECTION_POOLS, 'EVICTION_INTERVAL', 0):
+            http1.get('http://localhost:8080/metrics')
+            http2.get('http://localhost:8081/metrics')
+            adapter = send.call_args_list[0].args[0]
+
+            with mock.patch.object(adapter.poolmanager, 'clear') as clear:
+                time.sleep(0.02)
+                http2.get('http://localhost:8081/metrics')
+
+                clear.assert_called_once()
+
+            assert SHARED_CONNECTION_POOLS.evictions == evictions + 1
+            assert len(SHARED_CONNECTION_POOLS) == 1
+
+            http1.get('http://localhost:8080/metrics')
+            assert send.call_args.args[0] is not adapter
+            assert http1.get_shared_connection_pool_stats() == (0, 2, 2)
+
+    def test_session_close_keeps_connections(self, send):
+        http = RequestsWrapper({'shared_connection_pool': True}, {})
+        http.get('http://localhost:8080/metrics')
+        adapter = send.call_args.args[0]
+
+        with mock.patch.object(adapter.poolmanager, 'clear') as clear:
+            http.session.close()
+
+        clear.assert_not_called()
+
+    def test_uds_not_shared(self, send):
+        http = RequestsWrapper({'shared_connection_pool': True}, {})
+
+        with mock.patch.object(
+            requests_unixsocket.UnixAdapter, 'send', autospec=True, side_effect=self.fake_send
+        ) as uds_send:
+            http.get('unix:///var/run/test.sock/metrics')
+
+        uds_send.assert_called_once()
+        send.assert_not_called()
+
+    def test_debug_metrics(self, aggregator, dd_run_check):
+        class HTTPCheck(AgentCheck):
+            def check(self, _):
+                self.http.get('http://localhost:8080/metrics')
+                self.http.get('http://localhost:8080/metrics')
+
+        instance = {'shared_connection_pool': True, 'debug_metrics': {'shared_connection_pool': True}}
+        check = HTTPCheck('test', {}, [instance])
+        dd_run_check(check)
+
+        tags = ['check_name:test', 'check_version:0.0.0']
+        aggregator.assert_metric('datadog.agent.metrics.http.connection_pool.hits', 1, tags=tags)
+        aggregator.assert_metric('datadog.agent.metrics.http.connection_pool.misses', 1, tags=tags)
+        aggregator.assert_metric('datadog.agent.metrics.http.connection_pool.size', 1, tags=tags)
+        aggregator.assert_all_metrics_covered()
+
+    @pytest.mark.parametrize(
+        'option, value, message',
+        [
+            pytest.param(
+                'shared_connection_pool_size',
+                0,
+                'The `shared_connection_pool_size` setting must be a positive integer',
+                id='size',
+            ),
+            pytest.param(
+                'shared_connection_pool_idle_timeout',
+                -1,
+                'The `shared_connection_pool_idle_timeout` setting must be a positive number',
+                id='idle timeout',
+            ),
+        ],
+    )
+    def test_invalid(self, option, value, message):
+        with pytest.raises(ConfigurationError, match='^{}$'.format(message)):
+            RequestsWrapper({option: value}, {})
+
+
 class TestLogger:
     def test_default(self, caplog):
         check = AgentCheck('test', {}, [{}])
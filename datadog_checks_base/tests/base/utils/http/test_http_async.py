@@ -0,0 +1,213 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import threading
+import time
+
+import mock
+import pytest
+
+from datadog_checks.base import AgentCheck, ConfigurationError
+from datadog_checks.base.utils.http import RequestsWrapper
+from datadog_checks.dev.http import MockResponse
+from datadog_checks.dev.testing import requires_py3
+
+pytestmark = [requires_py3]
+
+
+class ConcurrencyTracker(object):
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def __call__(self, url, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+        try:
+            time.sleep(self.delay)
+            if 'error' in url:
+                raise Exception('Unable to connect to {}'.format(url))
+
+            return MockResponse(url)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def get_async_http(instance=None, init_config=None):
+    check = AgentCheck('test', init_config or {}, [instance or {}])
+    return check.http_async
+
+
+class TestGather:
+    def test_concurrent(self):
+        http_async = get_async_http()
+        urls = ['http://localhost:{}/metrics'.format(port) for port in range(8000, 8008)]
+        tracker = ConcurrencyTracker()
+
+        with mock.patch('requests.get', side_effect=tracker):
+            start_time = time.perf_counter()
+            results = http_async.bulk_get(urls)
+            duration = time.perf_counter() - start_time
+
+        assert [result.url for result in results] == urls
+        assert [result.response.content.decode('utf-8') for result in results] == urls
+        assert all(result.ok for result in results)
+        assert tracker.max_active == len(urls)
+        assert duration < tracker.delay * len(urls)
+
+    def test_bounded_concurrency(self):
+        http_async = get_async_http({'max_concurrent_requests': 2})
+        tracker = ConcurrencyTracker()
+
+        with mock.patch('requests.get', side_effect=tracker):
+            results = http_async.bulk_get(['http://localhost:{}'.format(port) for port in range(8000, 8006)])
+
+        assert tracker.max_active == 2
+        assert max(result.queued for result in results) >= tracker.delay
+        for result in results:
+            assert result.elapsed >= tracker.delay
+
+    def test_errors_do_not_interrupt(self):
+        http_async = get_async_http()
+
+        with mock.patch('requests.get', side_effect=ConcurrencyTracker(0)):
+            results = http_async.bulk_get(['http://localhost:8000', 'http://error:8000', 'http://localhost:8001'])
+
+        assert [result.ok for result in results] == [True, False, True]
+        assert results[1].response is None
+        assert str(results[1].error) == 'Unable to connect to http://error:8000'
+
+    def test_request_types(self):
+        http_async = get_async_http()
+
+        with mock.patch('requests.get', return_value=MockResponse('foo')) as get, mock.patch(
+            'requests.post', return_value=MockResponse('bar')
+        ) as post:
+            results = http_async.bulk_request(
+                ['http://localhost:8000', ('post', 'http://localhost:8001', {'json': {'foo': 'bar'}})]
+            )
+
+        assert [result.method for result in results] == ['get', 'post']
+        get.assert_called_once()
+        post.assert_called_once()
+        assert post.call_args.kwargs['json'] == {'foo': 'bar'}
+
+    def test_wrapper_options(self):
+        http_async = get_async_http({'username': 'user', 'password': 'pass', 'timeout': 3})
+
+        with mock.patch('requests.get', return_value=MockResponse('')) as get:
+            http_async.bulk_get(['http://localhost:8000', 'http://localhost:8001'], headers={'X-Foo': 'bar'})
+
+        for call in get.call_args_list:
+            assert call.kwargs['auth'] == ('user', 'pass')
+            assert call.kwargs['timeout'] == (3, 3)
+            assert call.kwargs['headers'] == {'X-Foo': 'bar'}
+
+
+class TestAsyncRequestsWrapper:
+    def test_request(self):
+        import asyncio
+
+        http_async = get_async_http()
+
+        # No coroutine syntax so that this module can be collected on Python 2
+        with mock.patch('requests.get', return_value=MockResponse('foo')), mock.patch(
+            'requests.post', return_value=MockResponse('bar')
+        ):
+            responses = [
+                asyncio.run(http_async.get('http://localhost:8000')),
+                asyncio.run(http_async.post('http://localhost:8001')),
+            ]
+
+        assert [response.content for response in responses] == [b'foo', b'bar']
+
+    def test_request_error(self):
+        import asyncio
+
+        http_async = get_async_http()
+
+        with mock.patch('requests.get', side_effect=Exception('foo')):
+            with pytest.raises(Exception, match='^foo$'):
+                asyncio.run(http_async.get('http://localhost:8000'))
+
+    def test_lazy(self):
+        check = AgentCheck('test', {}, [{}])
+
+        assert check.http_async is check.http_async
+        assert check.http_async.http is check.http
+        assert check.http_async._executor is None
+
+    def test_init_config(self):
+        http_async = get_async_http(init_config={'max_concurrent_requests': 5})
+
+        assert http_async.max_concurrent_requests == 5
+
+    def test_instance_override(self):
+        http_async = get_async_http({'max_concurrent_requests': 3}, {'max_concurrent_requests': 5})
+
+        assert http_async.max_concurrent_requests == 3
+
+    def test_close(self):
+        from datadog_checks.base.utils.http_async import AsyncRequestsWrapper
+
+        http_async = AsyncRequestsWrapper(RequestsWrapper({}, {}))
+        executor = http_async.executor
+        http_async.close()
+
+        assert http_async._executor is None
+        assert http_async.executor is not executor
+
+    def test_thread_sessions(self):
+        http_async = get_async_http({'persist_connections': True})
+        sessions = set()
+        lock = threading.Lock()
+
+        def get(session, url, **kwargs):
+            with lock:
+                sessions.add(session)
+
+            time.sleep(0.05)
+            return MockResponse(url)
+
+        with mock.patch('requests.Session.get', autospec=True, side_effect=get):
+            results = http_async.bulk_get(['http://localhost:{}'.format(port) for port in range(8000, 8004)])
+
+        assert all(result.ok for result in results)
+        assert len(sessions) == 4
+        assert http_async.http._session is None
+
+        with mock.patch('requests.Session.close', autospec=True) as close:
+            http_async.close()
+
+        assert set(call.args[0] for call in close.call_args_list) == sessions
+
+    def test_thread_counters(self):
+        http_async = get_async_http()
+
+        def request(wrapper, method, url, options):
+            wrapper.shared_connection_pool_hits += 1
+            return MockResponse(url)
+
+        with mock.patch.object(RequestsWrapper, '_request', autospec=True, side_effect=request):
+            http_async.bulk_get(['http://localhost:{}'.format(port) for port in range(8000, 8004)])
+
+        assert http_async.http.shared_connection_pool_hits == 4
+
+    def test_cancel(self):
+        check = AgentCheck('test', {}, [{}])
+        http_async = check.http_async
+        http_async.executor
+
+        check.cancel()
+
+        assert http_async._executor is None
+
+    @pytest.mark.parametrize('max_concurrent_requests', [0, '2', None])
+    def test_invalid(self, max_concurrent_requests):
+        with pytest.raises(ConfigurationError, match='^Setting `max_concurrent_requests` must be a positive integer$'):
+            get_async_http({'max_concurrent_requests': max_concurrent_requests})
@@ -5,8 +5,14 @@ import logging
 
 import mock
 import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import SSLError
 
-from datadog_checks.base.utils.http import RequestsWrapper
+from datadog_checks.base import AgentCheck
+from datadog_checks.base.utils.http import INTERMEDIATE_CERTS, RequestsWrapper
+from datadog_checks.base.utils.network import CertAdapter
+from datadog_checks.base.utils.time import get_precise_time
 
 pytestmark = [pytest.mark.unit]
 
@@ -207,3 +213,166 @@ class TestAIAChasing:
         with caplog.at_level(logging.ERROR), pytest.raises(Exception):
             http.get("https://incomplete-chain.badssl.com/")
             assert "Protocol version `TLSv1.2` not in the allowed list ['TLSv1.1']" in caplog.text
+
+
+class TestIntermediateCertCache:
+    URL = 'https://incomplete-chain.example.com/metrics'
+
+    @staticmethod
+    def fake_send(adapter, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b''
+        response.request = request
+        response.url = request.url
+        return response
+
+    @pytest.fixture(autouse=True)
+    def cert_adapter_send(self):
+        with mock.patch.object(CertAdapter, 'init_poolmanager'), mock.patch.object(
+            CertAdapter, 'send', autospec=True, side_effect=self.fake_send
+        ) as send:
+            yield send
+
+        INTERMEDIATE_CERTS.clear()
+
+    @pytest.fixture
+    def fetch_intermediate_certs(self):
+        with mock.patch.object(RequestsWrapper, 'fetch_intermediate_certs', return_value=[b'cert']) as fetch:
+            yield fetch
+
+    def test_reused_across_wrappers(self, cert_adapter_send, fetch_intermediate_certs):
+        http1 = RequestsWrapper({}, {})
+        http2 = RequestsWrapper({}, {})
+
+        with mock.patch('requests.get', side_effect=SSLError('incomplete chain')) as get:
+            assert http1.get(self.URL).status_code == 200
+            assert http2.get(self.URL).status_code == 200
+            assert http1.get(self.URL).status_code == 200
+
+        # Only the first request attempted the handshake with the default trust store
+        get.assert_called_once()
+        fetch_intermediate_certs.assert_called_once_with('incomplete-chain.example.com')
+        assert cert_adapter_send.call_count == 3
+
+        # The certificates are shared, but not the adapters trusting them
+        adapters = [call.args[0] for call in cert_adapter_send.call_args_list]
+        assert adapters[0] is adapters[2]
+        assert adapters[0] is not adapters[1]
+        assert adapters[0].certs == adapters[1].certs == (b'cert',)
+        assert http1.get_aia_chasing_stats() == (1, 1, 1)
+        assert http2.get_aia_chasing_stats() == (0, 1, 1)
+
+    def test_mounted_for_host(self, cert_adapter_send, fetch_intermediate_certs):
+        http = RequestsWrapper({'persist_connections': True}, {})
+
+        with mock.patch.object(HTTPAdapter, 'send', side_effect=SSLError('incomplete chain')) as send:
+            http.get(self.URL)
+            http.get('https://incomplete-chain.example.com/other')
+
+        send.assert_called_once()
+
+        adapter = http.session.get_adapter('https://incomplete-chain.example.com/other')
+        assert isinstance(adapter, CertAdapter)
+        assert adapter is cert_adapter_send.call_args.args[0]
+
+    def test_no_certs_found(self, cert_adapter_send, fetch_intermediate_certs):
+        fetch_intermediate_certs.return_value = []
+        http = RequestsWrapper({}, {})
+
+        with mock.patch('requests.get', side_effect=SSLError('incomplete chain')) as get:
+            for _ in range(2):
+                with pytest.raises(SSLError):
+                    http.get(self.URL)
+
+        assert get.call_count == 2
+        fetch_intermediate_certs.assert_called_once()
+        cert_adapter_send.assert_not_called()
+        assert http.get_aia_chasing_stats() == (1, 1, 1)
+
+    def test_expiration(self, cert_adapter_send, fetch_intermediate_certs):
+        http = RequestsWrapper({}, {})
+
+        with mock.patch.object(INTERMEDIATE_CERTS, 'ttl', 0), mock.patch(
+            'requests.get', side_effect=SSLError('incomplete chain')
+        ) as get:
+            http.get(self.URL)
+            http.get(self.URL)
+
+        assert get.call_count == 2
+        assert fetch_intermediate_certs.call_count == 2
+        assert http.get_aia_chasing_stats() == (2, 0, 1)
+
+    def test_temporary_session_closed(self, cert_adapter_send, fetch_intermediate_certs):
+        http = RequestsWrapper({}, {})
+
+        with mock.patch('requests.get', side_effect=SSLError('incomplete chain')), mock.patch.object(
+            requests.Session, 'close', autospec=True
+        ) as close, mock.patch.object(CertAdapter, 'close') as adapter_close:
+            http.get(self.URL)
+            http.get(self.URL)
+
+        assert close.call_count == 2
+        adapter_close.assert_not_called()
+        assert http._session is None
+        for call in close.call_args_list:
+            assert 'https://incomplete-chain.example.com/' not in call.args[0].adapters
+
+    def test_no_certs_found_expiration(self, cert_adapter_send, fetch_intermediate_certs):
+        fetch_intermediate_certs.return_value = []
+        http = RequestsWrapper({}, {})
+
+        with mock.patch.object(INTERMEDIATE_CERTS, 'negative_ttl', 0), mock.patch(
+            'requests.get', side_effect=SSLError('incomplete chain')
+        ):
+            for _ in range(2):
+                with pytest.raises(SSLError):
+                    http.get(self.URL)
+
+        assert fetch_intermediate_certs.call_count == 2
+        assert http.get_aia_chasing_stats() == (2, 0, 1)
+
+    def test_no_certs_found_expires_first(self):
+        INTERMEDIATE_CERTS.set('host1.example.com', [])
+        INTERMEDIATE_CERTS.set('host2.example.com', [b'cert'])
+
+        with mock.patch('datadog_checks.base.utils.http.get_precise_time', return_value=get_precise_time() + 120):
+            assert INTERMEDIATE_CERTS.get('host1.example.com') == (False, None)
+            assert INTERMEDIATE_CERTS.get('host2.example.com') == (True, (b'cert',))
+
+    def test_expired_hosts_pruned(self):
+        with mock.patch.object(INTERMEDIATE_CERTS, 'negative_ttl', 0):
+            INTERMEDIATE_CERTS.set('host1.example.com', [])
+            INTERMEDIATE_CERTS.set('host2.example.com', [])
+
+        assert len(INTERMEDIATE_CERTS) == 1
+
+        INTERMEDIATE_CERTS.set('host3.example.com', [])
+        assert len(INTERMEDIATE_CERTS) == 1
+        assert INTERMEDIATE_CERTS.get('host3.example.com') == (True, None)
+
+    def test_unverified_requests_not_affected(self, cert_adapter_send, fetch_intermediate_certs):
+        INTERMEDIATE_CERTS.set('incomplete-chain.example.com', [b'cert'])
+        http = RequestsWrapper({'tls_verify': False, 'tls_ignore_warning': True}, {})
+
+        with mock.patch('requests.get') as get:
+            http.get(self.URL)
+
+        get.assert_called_once()
+        cert_adapter_send.assert_not_called()
+
+    def test_debug_metrics(self, aggregator, dd_run_check, fetch_intermediate_certs):
+        class HTTPCheck(AgentCheck):
+            def check(self, _):
+                self.http.get(TestIntermediateCertCache.URL)
+                self.http.get(TestIntermediateCertCache.URL)
+
+        check = HTTPCheck('test', {}, [{'debug_metrics': {'aia_chasing': True}}])
+        with mock.patch('requests.get', side_effect=SSLError('incomplete chain')):
+            dd_run_check(check)
+
+        tags = ['check_name:test', 'check_version:0.0.0']
+        aggregator.assert_metric('datadog.agent.metrics.http.aia_chasing.attempts', 1, tags=tags)
+        aggregator.assert_metric('datadog.agent.metrics.http.aia_chasing.cache_hits', 1, tags=tags)
+        aggregator.assert_metric('datadog.agent.metrics.http.aia_chasing.cache_size', 1, tags=tags)
+        aggregator.assert_all_metrics_covered()
@@ -0,0 +1,73 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from io import BytesIO
+
+import pytest
+
+from datadog_checks.base.utils.common import to_native_string
+from datadog_checks.base.utils.replay.protocol import MessageWriter, read_frame
+from datadog_checks.base.utils.serialization import json
+from datadog_checks.dev.testing import requires_py3
+
+pytestmark = [requires_py3]
+
+NUM_METRICS = 50000
+MESSAGE_INDICATOR = '0123456789abcdef'
+
+
+def get_submissions():
+    return [
+        ('test:123', 0, 'metric.{}'.format(i % 100), float(i), ['foo:bar', 'index:{}'.format(i % 10)], '', False)
+        for i in range(NUM_METRICS)
+    ]
+
+
+def json_lines(submissions, submit_metric):
+    # The protocol used before frames, one JSON line per message
+    stream = BytesIO()
+    for args in submissions:
+        stream.write(
+            '{}:aggregator:{}\n'.format(
+                MESSAGE_INDICATOR,
+                to_native_string(json.dumps({'method': 'submit_metric', 'args': list(args), 'kwargs': {}})),
+            ).encode('utf-8')
+        )
+
+    stream.seek(0)
+    for line in iter(stream.readline, b''):
+        indicator, _, procedure = line.rstrip().decode('utf-8').partition(':')
+        message_type, _, message = procedure.partition(':')
+        message = json.loads(message)
+        submit_metric(*message['args'], **message['kwargs'])
+
+
+def frames(submissions, submit_metric):
+    stream = BytesIO()
+    writer = MessageWriter(stream)
+    for args in submissions:
+        writer.send('aggregator', 'submit_metric', args, {})
+
+    writer.flush()
+
+    stream.seek(0)
+    while True:
+        messages = read_frame(stream)
+        if messages is None:
+            break
+
+        for _, _, args, kwargs in messages:
+            submit_metric(*args, **kwargs)
+
+
+@pytest.mark.parametrize('protocol', [json_lines, frames], ids=['json_lines', 'frames'])
+def test_protocol(benchmark, protocol):
+    submissions = get_submissions()
+    submitted = []
+
+    def submit_metric(*args, **kwargs):
+        submitted.append(args)
+
+    benchmark(protocol, submissions, submit_metric)
+
+    assert [tuple(args) for args in submitted[:NUM_METRICS]] == submissions
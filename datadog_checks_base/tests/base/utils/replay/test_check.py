@@ -2,6 +2,9 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import logging
+import os
+import threading
+import time
 
 import pytest
 
@@ -23,6 +26,11 @@ class ReplayCheck(AgentCheck):
         self.tags.extend(self.instance.get('tags', []))
         self.tags.extend(self.init_config.get('tags', []))
 
+        self.runs = 0
+
+        if self.instance.get('error_on_init') and self.redirecting:
+            raise Exception('Unable to create the check')
+
         self.check_initializations.append(self.initialize)
 
     def initialize(self):
@@ -30,7 +38,22 @@ class ReplayCheck(AgentCheck):
         self.log.debug('Initializing - %s - %s', self.name, self.check_id)
 
     def check(self, _):
+        self.runs += 1
+        if self.instance.get('exit_on_run') == self.runs:
+            os._exit(1)
+
+        time.sleep(self.instance.get('sleep', 0))
+
         self.gauge('metric', 0, tags=self.tags)
+        self.gauge('runs', self.runs, tags=self.tags)
+        for i in range(self.instance.get('extra_metrics', 0)):
+            self.gauge('extra', i, tags=self.tags)
+
+        if self.instance.get('print'):
+            print('Printed - {}'.format(self.check_id))
+        self.submit_batch(
+            ['gauge', 'count'], ['batch', 'batch'], [1, 2], [self.register_tags(self.tags)] * 2, [None] * 2
+        )
         self.service_check('sc', ServiceCheck.OK if self.redirecting else ServiceCheck.CRITICAL, tags=self.tags)
 
 
@@ -56,6 +79,9 @@ def test_replay_all(caplog, dd_run_check, aggregator, datadog_agent, init_config
 
     aggregator.assert_metric('replay.initialize', 0, count=1, tags=expected_tags)
     aggregator.assert_metric('replay.metric', 0, count=1, tags=expected_tags)
+    aggregator.assert_metric('replay.runs', 1, count=1, tags=expected_tags)
+    aggregator.assert_metric('replay.batch', 1, count=1, metric_type=aggregator.GAUGE, tags=expected_tags)
+    aggregator.assert_metric('replay.batch', 2, count=1, metric_type=aggregator.COUNT, tags=expected_tags)
     aggregator.assert_service_check('replay.sc', ServiceCheck.OK, count=1, tags=expected_tags)
     aggregator.assert_all_metrics_covered()
 
@@ -65,3 +91,192 @@ def test_replay_all(caplog, dd_run_check, aggregator, datadog_agent, init_config
             break
     else:
         raise AssertionError('Expected DEBUG log with message: {}'.format(expected_message))
+
+
+def test_batches(dd_run_check, aggregator, datadog_agent, mocker):
+    check = ReplayCheck('replay', {}, [{'process_isolation': True, 'extra_metrics': 2500}])
+    check.check_id = 'test:123'
+    get_config = mocker.spy(datadog_agent, 'get_config')
+
+    dd_run_check(check)
+
+    expected_tags = ['redirecting:true']
+    aggregator.assert_metric('replay.metric', 0, count=1, tags=expected_tags)
+    assert len(aggregator.metrics('replay.extra')) == 2500
+    for i in (0, 999, 1000, 2499):
+        aggregator.assert_metric('replay.extra', i, count=1, tags=expected_tags)
+
+    # Static getters are only requested once by the isolated process
+    requested_options = [call.args[0] for call in get_config.call_args_list]
+    assert 'log_level' in requested_options
+    assert len(requested_options) == len(set(requested_options))
+
+
+def test_output_does_not_interfere(caplog, dd_run_check, aggregator, datadog_agent):
+    datadog_agent._config['log_level'] = 'debug'
+
+    check = ReplayCheck('replay', {}, [{'process_isolation': True, 'print': True}])
+    check.check_id = 'test:123'
+
+    with caplog.at_level(logging.DEBUG):
+        dd_run_check(check)
+
+    aggregator.assert_metric('replay.metric', 0, count=1, tags=['redirecting:true'])
+    assert 'Printed - test:123' in [message for _, level, message in caplog.record_tuples if level == logging.DEBUG]
+
+
+class TestPersistentWorker:
+    def test_check_kept_alive(self, dd_run_check, aggregator):
+        check = ReplayCheck('replay', {}, [{'process_isolation': True, 'process_isolation_persistent': True}])
+        check.check_id = 'test:123'
+
+        try:
+            dd_run_check(check)
+            pid = check._isolated_worker.process.pid
+            dd_run_check(check)
+            dd_run_check(check)
+
+            assert check._isolated_worker.process.pid == pid
+            assert check._isolated_worker.runs == 3
+        finally:
+            check._isolated_worker.stop()
+
+        expected_tags = ['redirecting:true']
+        aggregator.assert_metric('replay.initialize', 0, count=1, tags=expected_tags)
+        aggregator.assert_metric('replay.metric', 0, count=3, tags=expected_tags)
+        for runs in (1, 2, 3):
+            aggregator.assert_metric('replay.runs', runs, count=1, tags=expected_tags)
+
+    def test_exits_when_stdin_closed(self, dd_run_check):
+        check = ReplayCheck('replay', {}, [{'process_isolation': True, 'process_isolation_persistent': True}])
+        check.check_id = 'test:123'
+        dd_run_check(check)
+
+        check._isolated_worker.stop()
+
+        assert check._isolated_worker.process is None
+        assert check._isolated_worker.process_exit_code == 0
+
+    @pytest.mark.parametrize(
+        'option, value',
+        [
+            pytest.param('process_isolation_max_age', 0.000001, id='age'),
+            pytest.param('process_isolation_max_memory', 1, id='memory'),
+        ],
+    )
+    def test_recycle(self, dd_run_check, aggregator, option, value):
+        check = ReplayCheck(
+            'replay', {}, [{'process_isolation': True, 'process_isolation_persistent': True, option: value}]
+        )
+        check.check_id = 'test:123'
+
+        dd_run_check(check)
+        assert check._isolated_worker.process is None
+        dd_run_check(check)
+        assert check._isolated_worker.process is None
+
+        expected_tags = ['redirecting:true']
+        aggregator.assert_metric('replay.initialize', 0, count=2, tags=expected_tags)
+        aggregator.assert_metric('replay.runs', 1, count=2, tags=expected_tags)
+
+    def test_restart_after_crash(self, dd_run_check, aggregator):
+        check = ReplayCheck(
+            'replay', {}, [{'process_isolation': True, 'process_isolation_persistent': True, 'exit_on_run': 2}]
+        )
+        check.check_id = 'test:123'
+
+        try:
+            dd_run_check(check)
+            with pytest.raises(Exception, match='The isolated process exited with code 1 during the check run'):
+                dd_run_check(check)
+            dd_run_check(check)
+        finally:
+            check._isolated_worker.stop()
+
+        expected_tags = ['redirecting:true']
+        aggregator.assert_metric('replay.initialize', 0, count=2, tags=expected_tags)
+        aggregator.assert_metric('replay.runs', 1, count=2, tags=expected_tags)
+
+    def test_cancel(self, dd_run_check):
+        check = ReplayCheck('replay', {}, [{'process_isolation': True, 'process_isolation_persistent': True}])
+        check.check_id = 'test:123'
+        dd_run_check(check)
+        process = check._isolated_worker.process
+
+        check.cancel()
+
+        assert check._isolated_worker.process is None
+        assert process.poll() == 0
+        with pytest.raises(Exception, match='The isolated process was stopped because the check was unscheduled'):
+            dd_run_check(check)
+
+    def test_cancel_during_run(self, dd_run_check):
+        check = ReplayCheck(
+            'replay', {}, [{'process_isolation': True, 'process_isolation_persistent': True, 'sleep': 30}]
+        )
+        check.check_id = 'test:123'
+        cancel = threading.Timer(2, check.cancel)
+        cancel.start()
+
+        start_time = time.time()
+        try:
+            with pytest.raises(Exception, match='The isolated process exited with code -?\\d+ during the check run'):
+                dd_run_check(check)
+        finally:
+            cancel.join()
+
+        assert time.time() - start_time < 20
+        assert check._isolated_worker.process is None
+
+    def test_fatal_error(self, dd_run_check, caplog):
+        check = ReplayCheck(
+            'replay', {}, [{'process_isolation': True, 'process_isolation_persistent': True, 'error_on_init': True}]
+        )
+        check.check_id = 'test:123'
+
+        with pytest.raises(
+            Exception, match='The isolated process exited with code 1 before the check could be created'
+        ):
+            dd_run_check(check)
+
+        assert 'Unable to create the check' in caplog.text
+
+    def test_debug_metrics(self, dd_run_check, aggregator):
+        check = ReplayCheck(
+            'test',
+            {},
+            [
+                {
+                    'process_isolation': True,
+                    'process_isolation_persistent': True,
+                    'debug_metrics': {'process_isolation': True},
+                }
+            ],
+        )
+        check.check_id = 'test:123'
+
+        try:
+            dd_run_check(check)
+            tags = ['check_name:test', 'check_version:0.0.0']
+            aggregator.assert_metric('datadog.agent.metrics.process_isolation.startup_time', count=1, tags=tags)
+            aggregator.assert_metric('datadog.agent.metrics.process_isolation.run_time', count=1, tags=tags)
+            aggregator.assert_metric('datadog.agent.metrics.process_isolation.runs', 1, count=1, tags=tags)
+            if os.name != 'nt':
+                aggregator.assert_metric('datadog.agent.metrics.process_isolation.memory', count=1, tags=tags)
+
+            aggregator.reset()
+            dd_run_check(check)
+            aggregator.assert_metric('datadog.agent.metrics.process_isolation.startup_time', count=0)
+            aggregator.assert_metric('datadog.agent.metrics.process_isolation.run_time', count=1, tags=tags)
+            aggregator.assert_metric('datadog.agent.metrics.process_isolation.runs', 2, count=1, tags=tags)
+        finally:
+            check._isolated_worker.stop()
+
+    @pytest.mark.parametrize('option', ['process_isolation_max_age', 'process_isolation_max_memory'])
+    @pytest.mark.parametrize('value', [-1, '1', True])
+    def test_invalid(self, dd_run_check, option, value):
+        check = ReplayCheck('replay', {}, [{'process_isolation': True, option: value}])
+        check.check_id = 'test:123'
+
+        with pytest.raises(Exception, match='^Setting `{}` must be a non-negative number$'.format(option)):
+            dd_run_check(check, extract_message=True)
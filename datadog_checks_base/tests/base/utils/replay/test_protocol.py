@@ -0,0 +1,53 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from io import BytesIO
+
+import pytest
+
+from datadog_checks.base.utils.replay.protocol import MessageWriter, read_frame, write_frame
+from datadog_checks.dev.testing import requires_py3
+
+pytestmark = [requires_py3]
+
+
+def test_frames():
+    stream = BytesIO()
+    write_frame(stream, [('aggregator', 'submit_metric', ('test:123', 0, 'foo', 1.5, ['foo:bar'], ''), {})])
+    write_frame(stream, {'value': None})
+    stream.seek(0)
+
+    assert read_frame(stream) == [('aggregator', 'submit_metric', ('test:123', 0, 'foo', 1.5, ['foo:bar'], ''), {})]
+    assert read_frame(stream) == {'value': None}
+    assert read_frame(stream) is None
+
+
+def test_truncated_frame():
+    stream = BytesIO()
+    write_frame(stream, ['foo'])
+
+    with pytest.raises(EOFError):
+        read_frame(BytesIO(stream.getvalue()[:-1]))
+
+
+def test_message_writer_batches():
+    stream = BytesIO()
+    writer = MessageWriter(stream, batch_size=3)
+
+    for i in range(7):
+        writer.send('log', 'debug', [str(i)])
+
+    writer.flush()
+    writer.flush()
+    stream.seek(0)
+
+    frames = []
+    while True:
+        frame = read_frame(stream)
+        if frame is None:
+            break
+
+        frames.append(frame)
+
+    assert [len(frame) for frame in frames] == [3, 3, 1]
+    assert [message[2] for frame in frames for message in frame] == [[str(i)] for i in range(7)]
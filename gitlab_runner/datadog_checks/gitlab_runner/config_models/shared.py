@@ -35,6 +35,7 @@ class SharedConfig(BaseModel):
     allowed_metrics: Sequence[str]
     proxy: Optional[Proxy]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
     skip_proxy: Optional[bool]
     timeout: Optional[float]
 
@@ -147,6 +147,9 @@ class InstanceConfig(BaseModel):
     label_to_hostname: Optional[str]
     labels_mapper: Optional[Mapping[str, Any]]
     log_requests: Optional[bool]
+    max_concurrent_scrapes: Optional[int]
+    max_payload_size: Optional[int]
+    max_samples: Optional[int]
     metric_patterns: Optional[MetricPatterns]
     metrics: Optional[Sequence[Union[str, Mapping[str, Union[str, Metric]]]]]
     min_collection_interval: Optional[float]
@@ -174,7 +177,11 @@ class InstanceConfig(BaseModel):
     services_exclude: Optional[Sequence[str]]
     services_include: Optional[Sequence[str]]
     share_labels: Optional[Mapping[str, Union[bool, ShareLabel]]]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     skip_proxy: Optional[bool]
+    skip_unchanged_payload: Optional[bool]
     startup_grace_seconds: Optional[float]
     status_check: Optional[bool]
     tag_by_endpoint: Optional[bool]
@@ -192,6 +199,8 @@ class InstanceConfig(BaseModel):
     tls_verify: Optional[bool]
     type_overrides: Optional[Mapping[str, Any]]
     url: Optional[str]
+    use_conditional_requests: Optional[bool]
+    use_fast_parser: Optional[bool]
     use_latest_spec: Optional[bool]
     use_legacy_auth_encoding: Optional[bool]
     use_openmetrics: Optional[bool]
@@ -39,6 +39,7 @@ class SharedConfig(BaseModel):
     proxy: Optional[Proxy]
     service: Optional[str]
     service_check_prefix: Optional[str]
+    shared_connection_pool: Optional[bool]
     skip_proxy: Optional[bool]
     timeout: Optional[float]
 
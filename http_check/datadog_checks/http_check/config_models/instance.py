@@ -90,6 +90,9 @@ class InstanceConfig(BaseModel):
     seconds_critical: Optional[int]
     seconds_warning: Optional[int]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     skip_proxy: Optional[bool]
     ssl_server_name: Optional[str]
     stream: Optional[bool]
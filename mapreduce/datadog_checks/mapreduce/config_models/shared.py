@@ -36,6 +36,7 @@ class SharedConfig(BaseModel):
     job_specific_counters: Optional[Sequence[Mapping[str, Any]]]
     proxy: Optional[Proxy]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
     skip_proxy: Optional[bool]
     timeout: Optional[float]
 
@@ -78,6 +78,9 @@ class InstanceConfig(BaseModel):
     request_size: Optional[float]
     resource_filters: Optional[Sequence[Mapping[str, Any]]]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     skip_proxy: Optional[bool]
     tags: Optional[Sequence[str]]
     timeout: Optional[float]
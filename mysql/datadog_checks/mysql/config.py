@@ -4,6 +4,7 @@
 from datadog_checks.base import ConfigurationError, is_affirmative
 from datadog_checks.base.log import get_check_logger
 from datadog_checks.base.utils.aws import rds_parse_tags_from_endpoint
+from datadog_checks.base.utils.db.utils import DEFAULT_STATEMENT_CACHE_MAX_BYTES
 
 DEFAULT_MAX_CUSTOM_QUERIES = 20
 
@@ -38,6 +39,7 @@ class MySQLConfig(object):
         self.full_statement_text_samples_per_hour_per_query = instance.get(
             'full_statement_text_samples_per_hour_per_query', 1
         )
+        self.statement_cache_max_bytes = instance.get('statement_cache_max_bytes', DEFAULT_STATEMENT_CACHE_MAX_BYTES)
         self.statement_samples_config = instance.get('query_samples', instance.get('statement_samples', {})) or {}
         self.statement_metrics_config = instance.get('query_metrics', {}) or {}
         self.activity_config = instance.get('query_activity', {}) or {}
@@ -15,6 +15,7 @@ from six import PY3, iteritems, itervalues
 
 from datadog_checks.base import AgentCheck, is_affirmative
 from datadog_checks.base.utils.db import QueryExecutor, QueryManager
+from datadog_checks.base.utils.db.utils import StatementCache
 from datadog_checks.base.utils.db.utils import resolve_db_host as agent_host_resolver
 
 from .activity import MySQLActivity
@@ -110,6 +111,12 @@ class MySql(AgentCheck):
         self.userstat_enabled = None
         self.events_wait_current_enabled = None
         self._warnings_by_code = {}
+        # Obfuscated statements and full query text events, shared by the statement metrics, samples and activity jobs
+        self.statement_cache = StatementCache(
+            max_bytes=self._config.statement_cache_max_bytes,
+            fqt_ttl=60 * 60 / self._config.full_statement_text_samples_per_hour_per_query,
+            fqt_max_size=self._config.full_statement_text_cache_max_size,
+        )
         self._statement_metrics = MySQLStatementMetrics(self, self._config, self._get_connection_args())
         self._statement_samples = MySQLStatementSamples(self, self._config, self._get_connection_args())
         self._query_activity = MySQLActivity(self, self._config, self._get_connection_args())
@@ -19,12 +19,7 @@ except ImportError:
 from datadog_checks.base import is_affirmative
 from datadog_checks.base.utils.common import to_native_string
 from datadog_checks.base.utils.db.sql import compute_exec_plan_signature, compute_sql_signature
-from datadog_checks.base.utils.db.utils import (
-    DBMAsyncJob,
-    RateLimitingTTLCache,
-    default_json_event_encoding,
-    obfuscate_sql_with_metadata,
-)
+from datadog_checks.base.utils.db.utils import DBMAsyncJob, RateLimitingTTLCache, default_json_event_encoding
 from datadog_checks.base.utils.serialization import json
 from datadog_checks.base.utils.tracking import tracked_method
 
@@ -368,8 +363,8 @@ class MySQLStatementSamples(DBMAsyncJob):
         # - `resource_hash` - hash computed off the raw sql text to match apm resources
         # - `query_signature` - hash computed from the digest text to match query metrics
         try:
-            statement = obfuscate_sql_with_metadata(row['sql_text'], self._obfuscate_options)
-            statement_digest_text = obfuscate_sql_with_metadata(row['digest_text'], self._obfuscate_options)
+            statement = self._check.statement_cache.obfuscate(row['sql_text'], self._obfuscate_options)
+            statement_digest_text = self._check.statement_cache.obfuscate(row['digest_text'], self._obfuscate_options)
         except Exception as e:
             # do not log raw sql_text to avoid leaking sensitive data into logs unless log_unobfuscated_queries is set
             # digest_text is safe as parameters are obfuscated by the database
@@ -7,14 +7,13 @@ from contextlib import closing
 from typing import Any, Callable, Dict, List, Tuple
 
 import pymysql
-from cachetools import TTLCache
 
 from datadog_checks.base import is_affirmative
 from datadog_checks.base.log import get_check_logger
 from datadog_checks.base.utils.common import to_native_string
 from datadog_checks.base.utils.db.sql import compute_sql_signature
 from datadog_checks.base.utils.db.statement_metrics import StatementMetrics
-from datadog_checks.base.utils.db.utils import DBMAsyncJob, default_json_event_encoding, obfuscate_sql_with_metadata
+from datadog_checks.base.utils.db.utils import DBMAsyncJob, default_json_event_encoding
 from datadog_checks.base.utils.serialization import json
 from datadog_checks.base.utils.tracking import tracked_method
 
@@ -87,11 +86,6 @@ class MySQLStatementMetrics(DBMAsyncJob):
         self.log = get_check_logger()
         self._state = StatementMetrics()
         self._obfuscate_options = to_native_string(json.dumps(self._config.obfuscator_options))
-        # full_statement_text_cache: limit the ingestion rate of full statement text events per query_signature
-        self._full_statement_text_cache = TTLCache(
-            maxsize=self._config.full_statement_text_cache_max_size,
-            ttl=60 * 60 / self._config.full_statement_text_samples_per_hour_per_query,
-        )  # type: TTLCache
 
     def _get_db_connection(self):
         """
@@ -165,6 +159,18 @@ class MySQLStatementMetrics(DBMAsyncJob):
         monotonic_rows = self._query_summary_per_statement()
         monotonic_rows = self._normalize_queries(monotonic_rows)
         rows = self._state.compute_derivative_rows(monotonic_rows, METRICS_COLUMNS, key=_row_key)
+        self._check.gauge(
+            "dd.mysql.collect_per_statement_metrics.state_memory_usage",
+            self._state.memory_usage(),
+            tags=self._tags + self._check._get_debug_tags(),
+            hostname=self._check.resolved_hostname,
+        )
+        self._check.statement_cache.submit_telemetry(
+            self._check,
+            'mysql',
+            tags=self._tags + self._check._get_debug_tags(),
+            hostname=self._check.resolved_hostname,
+        )
         return rows
 
     def _query_summary_per_statement(self):
@@ -208,7 +214,7 @@ class MySQLStatementMetrics(DBMAsyncJob):
         for row in rows:
             normalized_row = dict(copy.copy(row))
             try:
-                statement = obfuscate_sql_with_metadata(row['digest_text'], self._obfuscate_options)
+                statement = self._check.statement_cache.obfuscate(row['digest_text'], self._obfuscate_options)
                 obfuscated_statement = statement['query'] if row['digest_text'] is not None else None
             except Exception as e:
                 self.log.warning("Failed to obfuscate query=[%s] | err=[%s]", row['digest_text'], e)
@@ -225,10 +231,9 @@ class MySQLStatementMetrics(DBMAsyncJob):
 
     def _rows_to_fqt_events(self, rows):
         for row in rows:
-            query_cache_key = _row_key(row)
-            if query_cache_key in self._full_statement_text_cache:
+            # limit the ingestion rate of full statement text events per query_signature
+            if not self._check.statement_cache.acquire_fqt(_row_key(row)):
                 continue
-            self._full_statement_text_cache[query_cache_key] = True
             row_tags = self._tags + ["schema:{}".format(row['schema_name'])] if row['schema_name'] else self._tags
             yield {
                 "timestamp": time.time() * 1000,
@@ -12,6 +12,7 @@ from six import iteritems
 
 from datadog_checks.base import AgentCheck
 from datadog_checks.base.utils.db import QueryExecutor
+from datadog_checks.base.utils.db.utils import StatementCache
 from datadog_checks.base.utils.db.utils import resolve_db_host as agent_host_resolver
 from datadog_checks.postgres.metrics_cache import PostgresMetricsCache
 from datadog_checks.postgres.relationsmanager import INDEX_BLOAT, RELATION_METRICS, TABLE_BLOAT, RelationsManager
@@ -68,6 +69,12 @@ class PostgreSql(AgentCheck):
         self.pg_settings = {}
         self._warnings_by_code = {}
         self.metrics_cache = PostgresMetricsCache(self._config)
+        # Obfuscated statements and full query text events, shared by the statement metrics and samples jobs
+        self.statement_cache = StatementCache(
+            max_bytes=self._config.statement_cache_max_bytes,
+            fqt_ttl=60 * 60 / self._config.full_statement_text_samples_per_hour_per_query,
+            fqt_max_size=self._config.full_statement_text_cache_max_size,
+        )
         self.statement_metrics = PostgresStatementMetrics(self, self._config, shutdown_callback=self._close_db_pool)
         self.statement_samples = PostgresStatementSamples(self, self._config, shutdown_callback=self._close_db_pool)
         self._relations_manager = RelationsManager(self._config.relations)
@@ -20,12 +20,7 @@ except ImportError:
 from datadog_checks.base import is_affirmative
 from datadog_checks.base.utils.common import to_native_string
 from datadog_checks.base.utils.db.sql import compute_exec_plan_signature, compute_sql_signature
-from datadog_checks.base.utils.db.utils import (
-    DBMAsyncJob,
-    RateLimitingTTLCache,
-    default_json_event_encoding,
-    obfuscate_sql_with_metadata,
-)
+from datadog_checks.base.utils.db.utils import DBMAsyncJob, RateLimitingTTLCache, default_json_event_encoding
 from datadog_checks.base.utils.serialization import json
 from datadog_checks.base.utils.time import get_timestamp
 from datadog_checks.base.utils.tracking import tracked_method
@@ -360,7 +355,7 @@ class PostgresStatementSamples(DBMAsyncJob):
                 obfuscated_query = backend_type
                 normalized_row['query_signature'] = compute_sql_signature(backend_type)
             else:
-                statement = obfuscate_sql_with_metadata(row['query'], self._obfuscate_options)
+                statement = self._check.statement_cache.obfuscate(row['query'], self._obfuscate_options)
                 obfuscated_query = statement['query']
                 metadata = statement['metadata']
                 normalized_row['query_signature'] = compute_sql_signature(obfuscated_query)
@@ -8,13 +8,12 @@ import time
 
 import psycopg2
 import psycopg2.extras
-from cachetools import TTLCache
 
 from datadog_checks.base import is_affirmative
 from datadog_checks.base.utils.common import to_native_string
 from datadog_checks.base.utils.db.sql import compute_sql_signature
 from datadog_checks.base.utils.db.statement_metrics import StatementMetrics
-from datadog_checks.base.utils.db.utils import DBMAsyncJob, default_json_event_encoding, obfuscate_sql_with_metadata
+from datadog_checks.base.utils.db.utils import DBMAsyncJob, default_json_event_encoding
 from datadog_checks.base.utils.serialization import json
 from datadog_checks.base.utils.tracking import tracked_method
 
@@ -135,11 +134,6 @@ class PostgresStatementMetrics(DBMAsyncJob):
         self._stat_column_cache = []
         self._track_io_timing_cache = None
         self._obfuscate_options = to_native_string(json.dumps(self._config.obfuscator_options))
-        # full_statement_text_cache: limit the ingestion rate of full statement text events per query_signature
-        self._full_statement_text_cache = TTLCache(
-            maxsize=config.full_statement_text_cache_max_size,
-            ttl=60 * 60 / config.full_statement_text_samples_per_hour_per_query,
-        )
 
     def _execute_query(self, cursor, query, params=()):
         try:
@@ -389,6 +383,18 @@ class PostgresStatementMetrics(DBMAsyncJob):
             tags=self._tags + self._check._get_debug_tags(),
             hostname=self._check.resolved_hostname,
         )
+        self._check.gauge(
+            'dd.postgres.queries.state_memory_usage',
+            self._state.memory_usage(),
+            tags=self._tags + self._check._get_debug_tags(),
+            hostname=self._check.resolved_hostname,
+        )
+        self._check.statement_cache.submit_telemetry(
+            self._check,
+            'postgres',
+            tags=self._tags + self._check._get_debug_tags(),
+            hostname=self._check.resolved_hostname,
+        )
         return rows
 
     def _normalize_queries(self, rows):
@@ -396,7 +402,7 @@ class PostgresStatementMetrics(DBMAsyncJob):
         for row in rows:
             normalized_row = dict(copy.copy(row))
             try:
-                statement = obfuscate_sql_with_metadata(row['query'], self._obfuscate_options)
+                statement = self._check.statement_cache.obfuscate(row['query'], self._obfuscate_options)
             except Exception as e:
                 if self._config.log_unobfuscated_queries:
                     self._log.warning("Failed to obfuscate query=[%s] | err=[%s]", row['query'], e)
@@ -416,10 +422,9 @@ class PostgresStatementMetrics(DBMAsyncJob):
 
     def _rows_to_fqt_events(self, rows):
         for row in rows:
-            query_cache_key = _row_key(row)
-            if query_cache_key in self._full_statement_text_cache:
+            # limit the ingestion rate of full statement text events per query_signature
+            if not self._check.statement_cache.acquire_fqt(_row_key(row)):
                 continue
-            self._full_statement_text_cache[query_cache_key] = True
             row_tags = self._tags_no_db + [
                 "db:{}".format(row['datname']),
                 "rolname:{}".format(row['rolname']),
@@ -0,0 +1,324 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+"""
+Poll SNMP devices concurrently from an asyncio event loop.
+
+This module requires Python 3, and is only imported by the check when `use_asyncio` is enabled.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyasn1.type.univ import Null
+from pysnmp.hlapi.varbinds import CommandGeneratorVarBinds
+from pysnmp.proto import errind
+
+from datadog_checks.base.errors import CheckException
+
+from .commands import BulkWalk, _handle_error
+from .config import InstanceConfig
+from .exceptions import PySnmpError
+from .pysnmp_types import ObjectIdentity, ObjectType
+from .snmp import reply_invalid
+from .utils import OIDPrinter, batches
+
+# sysObjectID, see http://oidref.com/1.3.6.1.2.1.1.2
+SYS_OBJECT_OID = (1, 3, 6, 1, 2, 1, 1, 2, 0)
+
+
+def _load_hlapi():
+    # type: () -> Any
+    # `pysnmp.hlapi.asyncio` creates its transports on import, only load it once the poller is used.
+    from pysnmp.hlapi import asyncio as hlapi
+
+    return hlapi
+
+
+class PrefetchedDevice(object):
+    """
+    The responses received by the `AsyncioPoller` for a device.
+
+    It is passed to `SnmpCheck._check_device` in place of the check, so that the metrics are built from the
+    responses instead of sending new requests.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self.sys_object_oid = None  # type: Optional[str]
+        self.binds = []  # type: List[Any]
+        self.error = None  # type: Optional[str]
+        self.exception = None  # type: Optional[Exception]
+
+    def fetch_sysobject_oid(self, config):
+        # type: (InstanceConfig) -> str
+        if self.exception is not None:
+            raise self.exception
+        if self.sys_object_oid is None:
+            raise RuntimeError('No sysObjectID was fetched for {}'.format(config.device))  # pragma: no cover
+        return self.sys_object_oid
+
+    def fetch_binds(self, config, fetch_id):
+        # type: (InstanceConfig, str) -> Tuple[List[Any], Optional[str]]
+        if self.exception is not None:
+            raise self.exception
+        return self.binds, self.error
+
+
+class AsyncioPoller(object):
+    """
+    Send the SNMP requests of many devices concurrently from a single thread.
+
+    At most `max_concurrent_requests` requests are in flight at any time, and at most
+    `max_concurrent_requests_per_device` for a given device.
+    """
+
+    def __init__(self, snmp_engine, max_concurrent_requests, max_concurrent_requests_per_device):
+        # type: (Any, int, int) -> None
+        self._snmp_engine = snmp_engine
+        self._var_binds_processor = CommandGeneratorVarBinds()
+        self.max_concurrent_requests = max_concurrent_requests
+        self.max_concurrent_requests_per_device = max_concurrent_requests_per_device
+
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None  # type: Optional[asyncio.Semaphore]
+        self._transport_targets = {}  # type: Dict[Tuple[str, int], Any]
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def close(self):
+        # type: () -> None
+        if not self._loop.is_closed():
+            self._loop.close()
+
+    def poll(self, check, configs):
+        # type: (Any, List[InstanceConfig]) -> List[Tuple[Optional[str], List[str], float]]
+        """
+        Fetch the metrics of all devices concurrently, then submit them with `check`.
+
+        Return the error, tags and poll duration of each device, in the order of `configs`.
+        """
+        self.peak_in_flight = 0
+        addresses = {(config.device.ip, config.device.port) for config in configs if config.device is not None}
+        for address in list(self._transport_targets):
+            if address not in addresses:
+                del self._transport_targets[address]
+
+        return self._loop.run_until_complete(self._poll(check, configs))
+
+    async def _poll(self, check, configs):
+        # type: (Any, List[InstanceConfig]) -> List[Tuple[Optional[str], List[str], float]]
+        if self._semaphore is None:
+            # Created from the loop so that it's bound to it
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+
+        return await asyncio.gather(*(self._poll_device(check, config) for config in configs))
+
+    async def _poll_device(self, check, config):
+        # type: (Any, InstanceConfig) -> Tuple[Optional[str], List[str], float]
+        start_time = time.time()
+        device_semaphore = asyncio.Semaphore(self.max_concurrent_requests_per_device)
+        prefetched = PrefetchedDevice()
+
+        if config.oid_config.should_reset():
+            config.oid_config.reset()
+
+        try:
+            if not config.oid_config.has_oids():
+                prefetched.sys_object_oid = await self.fetch_sysobject_oid(check, config, device_semaphore)
+                try:
+                    check._refresh_with_sysobject_oid(config, prefetched.sys_object_oid)
+                except Exception:
+                    # Reported by `_check_device`
+                    pass
+
+            if config.oid_config.has_oids():
+                config.add_uptime_metric()
+                fetch_id = check._get_next_fetch_id()
+                prefetched.binds, prefetched.error = await self.fetch_binds(check, config, fetch_id, device_semaphore)
+        except Exception as e:
+            prefetched.exception = e
+
+        poll_duration = time.time() - start_time
+        error, tags = check._check_device(config, prefetched)
+        return error, tags, poll_duration
+
+    async def fetch_sysobject_oid(self, check, config, device_semaphore):
+        # type: (Any, InstanceConfig, asyncio.Semaphore) -> str
+        oid = ObjectType(ObjectIdentity(SYS_OBJECT_OID))
+        check.log.debug('Running SNMP command on OID: %s', OIDPrinter((oid,), with_values=False))
+        var_binds = await self.snmp_get(config, [oid], False, device_semaphore)
+        check.log.debug('Returned vars: %s', OIDPrinter(var_binds, with_values=True))
+        return var_binds[0][1].prettyPrint()
+
+    async def fetch_binds(self, check, config, fetch_id, device_semaphore):
+        # type: (Any, InstanceConfig, str, asyncio.Semaphore) -> Tuple[List[Any], Optional[str]]
+        """
+        Same as `SnmpCheck.fetch_binds`, except that the batches of OIDs are requested concurrently.
+        """
+        enforce_constraints = config.enforce_constraints
+        scalar_oids = [oid.as_object_type() for oid in config.oid_config.scalar_oids]
+        next_oids = [oid.as_object_type() for oid in config.oid_config.next_oids]
+        errors = []  # type: List[str]
+
+        async def run(command, description, oids):
+            # type: (Any, str, List[Any]) -> List[Any]
+            try:
+                check.log.debug(
+                    '[%s] Running SNMP command %s on OIDS: %s',
+                    fetch_id,
+                    description,
+                    OIDPrinter(oids, with_values=False),
+                )
+                binds = await command
+                check.log.debug('[%s] Returned vars: %s', fetch_id, OIDPrinter(binds, with_values=True))
+                return binds
+            except (PySnmpError, CheckException) as e:
+                message = '[{}] Failed to collect some metrics: {}'.format(fetch_id, e)
+                errors.append(message)
+                check.warning(message)
+                return []
+
+        all_binds = []
+
+        scalar_batches = list(batches(scalar_oids, size=check.oid_batch_size))
+        for var_binds in await asyncio.gather(
+            *(
+                run(self.snmp_get(config, batch, enforce_constraints, device_semaphore), 'get', batch)
+                for batch in scalar_batches
+            )
+        ):
+            for var in var_binds:
+                result_oid, value = var
+                if reply_invalid(value):
+                    # If we didn't catch the metric using snmpget, try snmpnext
+                    next_oids.append(ObjectType(ObjectIdentity(result_oid.asTuple())))
+                else:
+                    all_binds.append(var)
+
+        next_batches = list(batches(next_oids, size=check.oid_batch_size))
+        walks = [
+            run(
+                self.snmp_getnext(config, batch, enforce_constraints, check.ignore_nonincreasing_oid, device_semaphore),
+                'getNext',
+                batch,
+            )
+            for batch in next_batches
+        ]
+
+        async def walk_table(oid):
+            # type: (Any) -> List[Any]
+            walk = await self.snmp_bulk(
+                config,
+                oid,
+                check._NON_REPEATERS,
+                check._MAX_REPETITIONS,
+                enforce_constraints,
+                check.ignore_nonincreasing_oid,
+                device_semaphore,
+            )
+            return check.table_walk_result(config, walk, fetch_id)
+
+        bulk_oids = [oid.as_object_type() for oid in config.oid_config.bulk_oids]
+        walks.extend(run(walk_table(oid), 'getBulk', [oid]) for oid in bulk_oids)
+        for binds in await asyncio.gather(*walks):
+            all_binds.extend(binds)
+
+        return all_binds, errors[0] if errors else None
+
+    def _get_transport_target(self, config):
+        # type: (InstanceConfig) -> Any
+        address = (config.device.ip, config.device.port)
+        transport_target = self._transport_targets.get(address)
+        if transport_target is None:
+            hlapi = _load_hlapi()
+            transport_target = hlapi.UdpTransportTarget(address, timeout=config.timeout, retries=config.retries)
+            self._transport_targets[address] = transport_target
+        return transport_target
+
+    async def _send(self, command, config, device_semaphore, *args, **options):
+        # type: (Any, InstanceConfig, asyncio.Semaphore, *Any, **Any) -> Tuple[Any, Any, Any, Any]
+        if config.device is None:
+            raise RuntimeError('No device set')  # pragma: no cover
+
+        transport_target = self._get_transport_target(config)
+        async with device_semaphore:
+            async with self._semaphore:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                try:
+                    return await command(
+                        self._snmp_engine, config._auth_data, transport_target, config._context_data, *args, **options
+                    )
+                finally:
+                    self.in_flight -= 1
+
+    async def snmp_get(self, config, oids, lookup_mib, device_semaphore):
+        # type: (InstanceConfig, list, bool, asyncio.Semaphore) -> list
+        """Call SNMP GET on a list of oids."""
+        hlapi = _load_hlapi()
+        error_indication, _, _, var_binds = await self._send(
+            hlapi.getCmd, config, device_semaphore, *oids, lookupMib=lookup_mib
+        )
+        _handle_error({'error': error_indication}, config)
+        return var_binds
+
+    async def snmp_getnext(self, config, oids, lookup_mib, ignore_nonincreasing_oid, device_semaphore):
+        # type: (InstanceConfig, list, bool, bool, asyncio.Semaphore) -> list
+        """Call SNMP GETNEXT on a list of oids, and iterate on the results as long as they're under the same prefix."""
+        hlapi = _load_hlapi()
+        initial_vars = [x[0] for x in self._var_binds_processor.makeVarBinds(self._snmp_engine, oids)]
+        var_binds = oids
+        results = []
+
+        while True:
+            error_indication, _, _, var_bind_table = await self._send(
+                hlapi.nextCmd, config, device_semaphore, *var_binds, lookupMib=lookup_mib
+            )
+            if ignore_nonincreasing_oid and isinstance(error_indication, errind.OidNotIncreasing):
+                error_indication = None
+            _handle_error({'error': error_indication}, config)
+
+            var_binds = []
+            new_initial_vars = []
+            for col, var_bind in enumerate(var_bind_table[0] if var_bind_table else []):
+                name, val = var_bind
+                if not isinstance(val, Null) and initial_vars[col].isPrefixOf(name):
+                    var_binds.append(var_bind)
+                    new_initial_vars.append(initial_vars[col])
+                    results.append(var_bind)
+            if not var_binds:
+                return results
+            initial_vars = new_initial_vars
+
+    async def snmp_bulk(
+        self, config, oid, non_repeaters, max_repetitions, lookup_mib, ignore_nonincreasing_oid, device_semaphore
+    ):
+        # type: (InstanceConfig, Any, int, int, bool, bool, asyncio.Semaphore) -> BulkWalk
+        """Walk the table under an oid with GETBULK requests, use `BulkWalk.result` to get the results."""
+        hlapi = _load_hlapi()
+        walk = BulkWalk(oid, non_repeaters, max_repetitions, lookup_mib, ignore_nonincreasing_oid)
+        initial_var = walk.start(self._snmp_engine, config)
+        var_bind = oid
+        start_time = time.time()
+
+        try:
+            while var_bind is not None:
+                walk.requests += 1
+                error_indication, error_status, _, var_bind_table = await self._send(
+                    hlapi.bulkCmd,
+                    config,
+                    device_semaphore,
+                    non_repeaters,
+                    walk.max_repetitions,
+                    var_bind,
+                    lookupMib=lookup_mib,
+                )
+                var_bind = walk.process_response(initial_var, error_indication, error_status, var_bind_table, var_bind)
+        except Exception as e:
+            walk.exception = e
+
+        walk.duration = time.time() - start_time
+        walk.done = True
+        return walk
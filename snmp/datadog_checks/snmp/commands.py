@@ -1,7 +1,10 @@
 # (C) Datadog, Inc. 2020-present
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
-from typing import Any, Dict, Generator
+import functools
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Generator, List, Optional, Tuple
 
 from pyasn1.type.univ import Null
 from pysnmp import hlapi
@@ -13,6 +16,10 @@ from pysnmp.proto.rfc1905 import endOfMibView
 from datadog_checks.base.errors import CheckException
 
 from .config import InstanceConfig
+from .exceptions import PySnmpError
+
+# See https://tools.ietf.org/html/rfc3416#section-3
+TOO_BIG = 1
 
 
 def _handle_error(ctx, config):
@@ -112,51 +119,209 @@ def snmp_getnext(config, oids, lookup_mib, ignore_nonincreasing_oid):
         initial_vars = new_initial_vars
 
 
-def snmp_bulk(config, oid, non_repeaters, max_repetitions, lookup_mib, ignore_nonincreasing_oid):
-    # type: (InstanceConfig, hlapi.ObjectType, int, int, bool, bool) -> Generator
-    """Call SNMP GETBULK on an oid."""
-
-    if config.device is None:
-        raise RuntimeError('No device set')  # pragma: no cover
-
-    def callback(  # type: ignore
-        snmpEngine, sendRequestHandle, errorIndication, errorStatus, errorIndex, varBindTable, cbCtx
-    ):
-        var_bind_table = [vbProcessor.unmakeVarBinds(snmpEngine, row, lookup_mib) for row in varBindTable]
-        if ignore_nonincreasing_oid and errorIndication and isinstance(errorIndication, errind.OidNotIncreasing):
-            errorIndication = None
-        cbCtx['error'] = errorIndication
-        cbCtx['var_bind_table'] = var_bind_table
-
-    ctx = {}  # type: Dict[str, Any]
-
-    var_binds = [oid]
-    initial_var = vbProcessor.makeVarBinds(config._snmp_engine, var_binds)[0][0]
-
-    gen = cmdgen.BulkCommandGenerator()
-
-    while True:
-        gen.sendVarBinds(
+class PipelinedRequest(object):
+    """
+    An SNMP request sent with `snmp_pipeline`, that stores its response.
+    """
+
+    def __init__(self, lookup_mib):
+        # type: (bool) -> None
+        self.lookup_mib = lookup_mib
+        self.var_binds = []  # type: list
+        self.error = None  # type: Any
+        self.exception = None  # type: Optional[Exception]
+        self.done = False
+
+    def send(self, config, done):
+        # type: (InstanceConfig, Callable[[], None]) -> None
+        """
+        Send the request, and call `done` from the dispatcher once the response is processed.
+        """
+        raise NotImplementedError
+
+    def result(self, config):
+        # type: (InstanceConfig) -> list
+        """
+        Return the received var binds, or raise the error of the request.
+        """
+        if self.exception is not None:
+            raise self.exception
+        _handle_error({'error': self.error}, config)
+        return self.var_binds
+
+
+class GetRequest(PipelinedRequest):
+    """
+    A GET of a list of oids.
+    """
+
+    def __init__(self, oids, lookup_mib):
+        # type: (list, bool) -> None
+        super(GetRequest, self).__init__(lookup_mib)
+        self.oids = oids
+
+    def send(self, config, done):
+        # type: (InstanceConfig, Callable[[], None]) -> None
+        def callback(  # type: ignore
+            snmpEngine, sendRequestHandle, errorIndication, errorStatus, errorIndex, varBinds, cbCtx
+        ):
+            try:
+                self.error = errorIndication
+                self.var_binds = vbProcessor.unmakeVarBinds(snmpEngine, varBinds, self.lookup_mib)
+            except Exception as e:
+                self.exception = e
+            done()
+
+        cmdgen.GetCommandGenerator().sendVarBinds(
             config._snmp_engine,
             config.device.target,
             config._context_data.contextEngineId,
             config._context_data.contextName,
-            non_repeaters,
-            max_repetitions,
-            vbProcessor.makeVarBinds(config._snmp_engine, var_binds),
+            vbProcessor.makeVarBinds(config._snmp_engine, self.oids),
             callback,
-            ctx,
+            None,
         )
 
-        config._snmp_engine.transportDispatcher.runDispatcher()
 
-        _handle_error(ctx, config)
+class BulkWalk(PipelinedRequest):
+    """
+    A walk of the table under an oid, with GETBULK requests sent one after another.
+
+    `max_repetitions` is only used for tables that were never walked for the device, see `BulkMaxRepetitions`.
+    When the device answers `tooBig`, the request is sent again for half as many rows, and `response_limit`
+    is set to the number of rows of the next request. Any other error status fails the walk.
+    """
+
+    def __init__(self, oid, non_repeaters, max_repetitions, lookup_mib, ignore_nonincreasing_oid):
+        # type: (hlapi.ObjectType, int, int, bool, bool) -> None
+        super(BulkWalk, self).__init__(lookup_mib)
+        self.oid = oid
+        self.non_repeaters = non_repeaters
+        self.max_repetitions = max_repetitions
+        self.ignore_nonincreasing_oid = ignore_nonincreasing_oid
+
+        self.table_oid = None  # type: Optional[Tuple[int, ...]]
+        self.requests = 0
+        self.duration = 0.0
+        self.response_limit = None  # type: Optional[int]
+
+    def start(self, snmp_engine, config):
+        # type: (Any, InstanceConfig) -> Any
+        """
+        Return the var bind of the table, whose max-repetitions is then the one tuned for it.
+        """
+        initial_var = vbProcessor.makeVarBinds(snmp_engine, [self.oid])[0][0]
+        self.table_oid = tuple(initial_var)
+        self.max_repetitions = config.bulk_max_repetitions.get(self.table_oid, self.max_repetitions)
+        return initial_var
+
+    def send(self, config, done):
+        # type: (InstanceConfig, Callable[[], None]) -> None
+        snmp_engine = config._snmp_engine
+        initial_var = self.start(snmp_engine, config)
+        generator = cmdgen.BulkCommandGenerator()
+        start_time = time.time()
+
+        def send_request(var_bind):
+            # type: (Any) -> None
+            self.requests += 1
+            generator.sendVarBinds(
+                snmp_engine,
+                config.device.target,
+                config._context_data.contextEngineId,
+                config._context_data.contextName,
+                self.non_repeaters,
+                self.max_repetitions,
+                vbProcessor.makeVarBinds(snmp_engine, [var_bind]),
+                callback,
+                var_bind,
+            )
+
+        def callback(  # type: ignore
+            snmpEngine, sendRequestHandle, errorIndication, errorStatus, errorIndex, varBindTable, cbCtx
+        ):
+            try:
+                var_bind_table = [vbProcessor.unmakeVarBinds(snmpEngine, row, self.lookup_mib) for row in varBindTable]
+                next_var_bind = self.process_response(initial_var, errorIndication, errorStatus, var_bind_table, cbCtx)
+                if next_var_bind is not None:
+                    send_request(next_var_bind)
+                    return
+            except Exception as e:
+                self.exception = e
+            self.duration = time.time() - start_time
+            done()
+
+        send_request(self.oid)
+
+    def process_response(self, initial_var, error_indication, error_status, var_bind_table, var_bind):
+        # type: (Any, Any, Any, list, Any) -> Any
+        """
+        Store the rows of a response to the request for `var_bind`, and return the var bind to continue the walk
+        from, if any.
+        """
+        if self.ignore_nonincreasing_oid and error_indication and isinstance(error_indication, errind.OidNotIncreasing):
+            error_indication = None
+        if error_indication:
+            self.error = error_indication
+            return None
+
+        if error_status == TOO_BIG and self.max_repetitions > 1:
+            self.max_repetitions //= 2
+            self.response_limit = self.max_repetitions
+            return var_bind
+        if error_status:
+            self.error = error_status.prettyPrint()
+            return None
+
+        next_var_bind = None
+        for row in var_bind_table:
+            name, value = row[0]
+            if endOfMibView.isSameTypeWith(value) or not initial_var.isPrefixOf(name):
+                return None
+            next_var_bind = (name, value)
+            self.var_binds.append(next_var_bind)
+
+        return next_var_bind
+
+
+def snmp_pipeline(config, requests, window):
+    # type: (InstanceConfig, List[PipelinedRequest], int) -> None
+    """
+    Send requests to a device without waiting for the previous responses, with at most `window` of them in flight.
+
+    The responses are stored on the requests, use `PipelinedRequest.result` to get them.
+    """
+    if config.device is None:
+        raise RuntimeError('No device set')  # pragma: no cover
 
-        for var_binds in ctx['var_bind_table']:
-            name, value = var_binds[0]
-            if endOfMibView.isSameTypeWith(value):
-                return
-            if initial_var.isPrefixOf(name):
-                yield var_binds[0]
+    queue = deque(requests)  # type: Deque[PipelinedRequest]
+    in_flight = [0]
+
+    def send_requests():
+        # type: () -> None
+        while queue and in_flight[0] < window:
+            request = queue.popleft()
+            try:
+                request.send(config, functools.partial(request_done, request))
+            except Exception as e:
+                request.exception = e
+                request.done = True
             else:
-                return
+                in_flight[0] += 1
+
+    def request_done(request):
+        # type: (PipelinedRequest) -> None
+        request.done = True
+        in_flight[0] -= 1
+        send_requests()
+
+    send_requests()
+    if not in_flight[0]:
+        return
+
+    try:
+        config._snmp_engine.transportDispatcher.runDispatcher()
+    except PySnmpError as e:
+        for request in requests:
+            if not request.done:
+                request.exception = e
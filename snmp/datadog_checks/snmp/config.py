@@ -13,6 +13,7 @@ from datadog_checks.base import ConfigurationError, is_affirmative
 from .mibs import MIBLoader
 from .models import OID, Device
 from .parsing import ParsedMetric, ParsedSymbolMetric, SymbolTag, parse_metrics, parse_symbol_metric_tags
+from .profiles import CompiledProfile
 from .pysnmp_types import (
     CommunityData,
     ContextData,
@@ -39,6 +40,9 @@ class InstanceConfig:
     DEFAULT_ALLOWED_FAILURES = 3
     DEFAULT_BULK_THRESHOLD = 0
     DEFAULT_WORKERS = 5
+    DEFAULT_DISCOVERY_WORKERS = 5
+    DEFAULT_MAX_CONCURRENT_REQUESTS = 500
+    DEFAULT_MAX_CONCURRENT_REQUESTS_PER_DEVICE = 1
     DEFAULT_REFRESH_OIDS_CACHE_INTERVAL = 0  # `0` means disabled
 
     AUTH_PROTOCOL_MAPPING = {
@@ -106,14 +110,30 @@ class InstanceConfig:
         self.failing_instances = defaultdict(int)  # type: DefaultDict[str, int]
         self.allowed_failures = int(instance.get('discovery_allowed_failures', self.DEFAULT_ALLOWED_FAILURES))
         self.workers = int(instance.get('workers', self.DEFAULT_WORKERS))
+        self.discovery_workers = int(instance.get('discovery_workers', self.DEFAULT_DISCOVERY_WORKERS))
+        if self.discovery_workers < 1:
+            raise ConfigurationError('`discovery_workers` must be a positive integer')
+
+        self.use_asyncio = is_affirmative(instance.get('use_asyncio', False))
+        self.max_concurrent_requests = int(
+            instance.get('max_concurrent_requests', self.DEFAULT_MAX_CONCURRENT_REQUESTS)
+        )
+        self.max_concurrent_requests_per_device = int(
+            instance.get('max_concurrent_requests_per_device', self.DEFAULT_MAX_CONCURRENT_REQUESTS_PER_DEVICE)
+        )
+        if self.max_concurrent_requests < 1 or self.max_concurrent_requests_per_device < 1:
+            raise ConfigurationError(
+                '`max_concurrent_requests` and `max_concurrent_requests_per_device` must be positive integers'
+            )
 
         self.bulk_threshold = int(instance.get('bulk_threshold', self.DEFAULT_BULK_THRESHOLD))
+        self.bulk_max_repetitions = BulkMaxRepetitions(is_affirmative(instance.get('tune_bulk_max_repetitions', True)))
 
         self._auth_data = self.get_auth_data(instance)
         self._context_data = ContextData(*self.get_context_data(instance))
 
-        timeout = int(instance.get('timeout', self.DEFAULT_TIMEOUT))
-        retries = int(instance.get('retries', self.DEFAULT_RETRIES))
+        self.timeout = int(instance.get('timeout', self.DEFAULT_TIMEOUT))
+        self.retries = int(instance.get('retries', self.DEFAULT_RETRIES))
 
         ip_address = instance.get('ip_address')
         network_address = instance.get('network_address')
@@ -130,8 +150,8 @@ class InstanceConfig:
             target = register_device_target(
                 ip_address,
                 port,
-                timeout=timeout,
-                retries=retries,
+                timeout=self.timeout,
+                retries=self.retries,
                 engine=self._snmp_engine,
                 auth_data=self._auth_data,
                 context_data=self._context_data,
@@ -178,13 +198,24 @@ class InstanceConfig:
         # type: (OID) -> OIDMatch
         return self._resolver.resolve_oid(oid)
 
-    def refresh_with_profile(self, profile):
-        # type: (Dict[str, Any]) -> None
+    def resolve_var_bind_oid(self, result_oid):
+        # type: (Any) -> OIDMatch
+        return self._resolver.resolve_var_bind_oid(result_oid)
+
+    def refresh_with_profile(self, profile, compiled_profile=None):
+        # type: (Dict[str, Any], Optional[CompiledProfile]) -> None
+        """
+        Add the metrics and tags of a profile, using its parsed metrics from the profile index if given.
+        """
+        compiled_metrics = compiled_metric_tags = None
+        if compiled_profile is not None:
+            compiled_metrics, compiled_metric_tags = compiled_profile
+
         metrics = profile['definition'].get('metrics', [])
-        scalar_oids, next_oids, bulk_oids, parsed_metrics = self.parse_metrics(metrics)
+        scalar_oids, next_oids, bulk_oids, parsed_metrics = self.parse_metrics(metrics, compiled_metrics)
 
         metric_tags = profile['definition'].get('metric_tags', [])
-        tag_oids, parsed_metric_tags = self.parse_metric_tags(metric_tags)
+        tag_oids, parsed_metric_tags = self.parse_metric_tags(metric_tags, compiled_metric_tags)
 
         device = profile['definition'].get('device', {})
         self.add_device_tags(device)
@@ -294,18 +325,26 @@ class InstanceConfig:
 
             yield host
 
-    def parse_metrics(self, metrics):
-        # type: (list) -> Tuple[List[OID], List[OID], List[OID], List[ParsedMetric]]
+    def parse_metrics(self, metrics, compiled_metrics=None):
+        # type: (list, Optional[list]) -> Tuple[List[OID], List[OID], List[OID], List[ParsedMetric]]
         """Parse configuration and returns data to be used for SNMP queries."""
         # Use bulk for SNMP version > 1 only.
         bulk_threshold = self.bulk_threshold if self._auth_data.mpModel else 0
-        result = parse_metrics(metrics, resolver=self._resolver, logger=self.logger(), bulk_threshold=bulk_threshold)
+        result = parse_metrics(
+            metrics,
+            resolver=self._resolver,
+            logger=self.logger(),
+            bulk_threshold=bulk_threshold,
+            compiled_metrics=compiled_metrics,
+        )
         return result['oids'], result['next_oids'], result['bulk_oids'], result['parsed_metrics']
 
-    def parse_metric_tags(self, metric_tags):
-        # type: (list) -> Tuple[List[OID], List[SymbolTag]]
+    def parse_metric_tags(self, metric_tags, compiled_metric_tags=None):
+        # type: (list, Optional[list]) -> Tuple[List[OID], List[SymbolTag]]
         """Parse configuration for global metric_tags."""
-        result = parse_symbol_metric_tags(metric_tags, resolver=self._resolver)
+        result = parse_symbol_metric_tags(
+            metric_tags, resolver=self._resolver, compiled_metric_tags=compiled_metric_tags
+        )
         return result['oids'], result['parsed_symbol_tags']
 
     def add_uptime_metric(self):
@@ -382,16 +421,18 @@ class OIDConfig(object):
         return self._refresh_interval_sec > 0
 
     def update_scalar_oids(self, new_scalar_oids):
-        # type: (List[OID]) -> None
+        # type: (List[Any]) -> None
         """
         Use only scalar oids for following snmp calls.
+
+        `new_scalar_oids` are the OIDs of the var binds received from the device.
         """
         if not self._is_cache_enabled():
             return
         # Do not update if we are already using scalar oids cache.
         if self._use_scalar_oids_cache:
             return
-        self._all_scalar_oids = new_scalar_oids
+        self._all_scalar_oids = [OID(oid) for oid in new_scalar_oids]
         self._use_scalar_oids_cache = True
         self._last_ts = time.time()
 
@@ -412,3 +453,53 @@ class OIDConfig(object):
         """
         self._all_scalar_oids = []
         self._use_scalar_oids_cache = False
+
+
+class BulkMaxRepetitions(object):
+    """
+    Tunes the max-repetitions of the GETBULK walk of each table from the number of rows of its previous walk,
+    so that a table is usually walked with a single request.
+
+    When disabled, or for a table whose walk failed with more than the default max-repetitions, e.g. because
+    the device dropped responses that were too large, the default is used.
+    """
+
+    LIMIT = 100
+
+    def __init__(self, enabled=True):
+        # type: (bool) -> None
+        self.enabled = enabled
+        self._limit = self.LIMIT
+        self._by_table = {}  # type: Dict[Tuple[int, ...], int]
+        self._table_limits = {}  # type: Dict[Tuple[int, ...], int]
+
+    def get(self, table_oid, default):
+        # type: (Tuple[int, ...], int) -> int
+        if not self.enabled:
+            return default
+        return min(self._by_table.get(table_oid, default), self._table_limit(table_oid))
+
+    def update(self, table_oid, rows, response_limit=None):
+        # type: (Tuple[int, ...], int, Optional[int]) -> None
+        """
+        Record the number of rows of a walk, and the largest number of rows the device could answer with if
+        it answered `tooBig`.
+        """
+        if not self.enabled:
+            return
+        if response_limit is not None:
+            self._limit = max(1, min(self._limit, response_limit))
+        # Ask for the end of the table as well, and leave some room for new rows
+        self._by_table[table_oid] = max(1, min(rows + rows // 10 + 1, self._table_limit(table_oid)))
+
+    def failed(self, table_oid, max_repetitions, default):
+        # type: (Tuple[int, ...], int, int) -> None
+        """
+        Record that a walk with `max_repetitions` failed, the table is then never walked with more than `default`.
+        """
+        if self.enabled and max_repetitions > default:
+            self._by_table[table_oid] = self._table_limits[table_oid] = default
+
+    def _table_limit(self, table_oid):
+        # type: (Tuple[int, ...]) -> int
+        return min(self._table_limits.get(table_oid, self._limit), self._limit)
@@ -5,7 +5,8 @@
 import json
 import time
 import weakref
-from typing import TYPE_CHECKING
+from concurrent import futures
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Set
 
 from datadog_checks.base import ConfigurationError
 
@@ -15,6 +16,9 @@ from .config import InstanceConfig
 if TYPE_CHECKING:
     from .snmp import SnmpCheck
 
+# Minimum number of seconds between two writes of the persistent cache while a subnet is scanned
+CACHE_WRITE_INTERVAL = 30
+
 
 def discover_instances(config, interval, check_ref):
     # type: (InstanceConfig, float, weakref.ref[SnmpCheck]) -> None
@@ -24,47 +28,135 @@ def discover_instances(config, interval, check_ref):
     the check instance. This way if the agent unschedules the check and deletes
     the reference to the instance, the check is garbage collected properly and
     that function can stop.
+
+    Up to `discovery_workers` hosts are probed concurrently. Hosts that were discovered before but
+    are no longer monitored are probed first, so that devices that stopped answering are picked up
+    again quickly. Monitored devices come next, so that changes of their sysObjectID are picked up.
     """
+    seen_hosts = set(config.discovered_instances)  # type: Set[str]
 
     while True:
         start_time = time.time()
-        for host in config.network_hosts():
-            check = check_ref()
-            if check is None or not check._running:
-                return
-
-            host_config = check._build_autodiscovery_config(config.instance, host)
-
-            try:
-                sys_object_oid = check.fetch_sysobject_oid(host_config)
-            except Exception as e:
-                check.log.debug("Error scanning host %s: %s", host, e)
-                del check
-                continue
-
-            try:
-                profile = check._profile_for_sysobject_oid(sys_object_oid)
-            except ConfigurationError:
-                if not host_config.oid_config.has_oids():
-                    check.log.warning("Host %s didn't match a profile for sysObjectID %s", host, sys_object_oid)
-                    del check
-                    continue
-            else:
-                host_config.refresh_with_profile(check.profiles[profile])
-                host_config.add_profile_tag(profile)
-
-            config.discovered_instances[host] = host_config
 
-            write_persistent_cache(check.check_id, json.dumps(list(config.discovered_instances)))
-            del check
+        executor = futures.ThreadPoolExecutor(max_workers=config.discovery_workers)
+        try:
+            hosts_probed = _scan_network(config, check_ref, executor, seen_hosts)
+        finally:
+            executor.shutdown(wait=False)
 
         check = check_ref()
-        if check is None:
+        if hosts_probed is None or check is None:
             return
         # Write again at the end of the loop, in case some host have been removed since last
         write_persistent_cache(check.check_id, json.dumps(list(config.discovered_instances)))
-        del check
 
         time_elapsed = time.time() - start_time
+        check._last_discovery_stats = (time_elapsed, hosts_probed)
+        del check
+
         if interval - time_elapsed > 0:
             time.sleep(interval - time_elapsed)
+
+
+def _scan_network(config, check_ref, executor, seen_hosts):
+    # type: (InstanceConfig, weakref.ref[SnmpCheck], futures.Executor, Set[str]) -> Optional[int]
+    """
+    Probe the hosts of the network with `executor`, and add the devices found to the discovered instances.
+
+    Return the number of probed hosts, or `None` if the check was unscheduled in the meantime.
+    """
+    pending = {}  # type: Dict[futures.Future, str]
+    hosts_probed = 0
+    last_write = time.time()
+    unsaved_hosts = False
+
+    for host in _hosts_to_probe(config, sorted(seen_hosts)):
+        if len(pending) >= config.discovery_workers:
+            done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                hosts_probed += 1
+                if _add_discovered_host(config, pending.pop(future), future, seen_hosts):
+                    unsaved_hosts = True
+
+        check = check_ref()
+        if check is None or not check._running:
+            # Keep the devices that were already found
+            for future in pending:
+                future.cancel()
+            for future in futures.as_completed(list(pending)):
+                if not future.cancelled():
+                    _add_discovered_host(config, pending[future], future, seen_hosts)
+            return None
+
+        if unsaved_hosts and time.time() - last_write >= CACHE_WRITE_INTERVAL:
+            write_persistent_cache(check.check_id, json.dumps(list(config.discovered_instances)))
+            last_write = time.time()
+            unsaved_hosts = False
+        del check
+
+        pending[executor.submit(_probe_host, config, check_ref, host)] = host
+
+    for future in futures.as_completed(list(pending)):
+        hosts_probed += 1
+        _add_discovered_host(config, pending.pop(future), future, seen_hosts)
+
+    return hosts_probed
+
+
+def _hosts_to_probe(config, seen_hosts):
+    # type: (InstanceConfig, list) -> Iterator[str]
+    """
+    Yield the hosts of the network, starting with the ones that were seen before but are no longer monitored,
+    then the monitored ones.
+    """
+    for host in seen_hosts:
+        if host not in config.discovered_instances and host not in config.ignored_ip_addresses:
+            yield host
+
+    # Their configuration is built again, in case the device or its profile changed
+    for host in seen_hosts:
+        if host in config.discovered_instances:
+            yield host
+
+    seen = set(seen_hosts)
+    for host in config.network_hosts():
+        if host not in seen:
+            yield host
+
+
+def _add_discovered_host(config, host, future, seen_hosts):
+    # type: (InstanceConfig, str, futures.Future, Set[str]) -> bool
+    host_config = future.result()
+    if host_config is None:
+        return False
+
+    config.discovered_instances[host] = host_config
+    seen_hosts.add(host)
+    return True
+
+
+def _probe_host(config, check_ref, host):
+    # type: (InstanceConfig, weakref.ref[SnmpCheck], str) -> Optional[InstanceConfig]
+    """
+    Return the configuration of the device at `host`, or `None` if it's not a device that can be monitored.
+    """
+    check = check_ref()
+    if check is None or not check._running:
+        return None
+
+    host_config = check._build_autodiscovery_config(config.instance, host)
+
+    try:
+        sys_object_oid = check.fetch_sysobject_oid(host_config)
+    except Exception as e:
+        check.log.debug("Error scanning host %s: %s", host, e)
+        return None
+
+    try:
+        check._refresh_with_sysobject_oid(host_config, sys_object_oid)
+    except ConfigurationError:
+        if not host_config.oid_config.has_oids():
+            check.log.warning("Host %s didn't match a profile for sysObjectID %s", host, sys_object_oid)
+            return None
+
+    return host_config
@@ -1,11 +1,13 @@
 # (C) Datadog, Inc. 2010-present
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
-from .metric_tags import ParsedSymbolTagsResult, SymbolTag, parse_symbol_metric_tags
-from .metrics import ColumnTag, IndexTag, parse_metrics
+from .metric_tags import ParsedSymbolTagsResult, SymbolTag, compile_symbol_metric_tags, parse_symbol_metric_tags
+from .metrics import ColumnTag, IndexTag, compile_metrics, parse_metrics
 from .parsed_metrics import ParsedMetric, ParsedMetricTag, ParsedSymbolMetric, ParsedTableMetric
 
 __all__ = [
+    'compile_metrics',
+    'compile_symbol_metric_tags',
     'parse_metrics',
     'parse_symbol_metric_tags',
     'ParsedMetric',
@@ -5,7 +5,7 @@
 Helpers to parse the `metric_tags` section of a config file.
 """
 import re
-from typing import Dict, List, NamedTuple, TypedDict
+from typing import Dict, List, NamedTuple, Optional, TypedDict
 
 from datadog_checks.base import ConfigurationError
 
@@ -19,20 +19,38 @@ SymbolTag = NamedTuple('SymbolTag', [('parsed_metric_tag', ParsedMetricTag), ('s
 ParsedSymbolTagsResult = TypedDict('ParsedSymbolTagsResult', {'oids': List[OID], 'parsed_symbol_tags': List[SymbolTag]})
 
 
-def parse_symbol_metric_tags(metric_tags, resolver):
-    # type: (List[MetricTag], OIDResolver) -> ParsedSymbolTagsResult
+def compile_symbol_metric_tags(metric_tags):
+    # type: (List[MetricTag]) -> List[MetricTagParseResult]
     """
-    Parse the symbol based `metric_tags` section of a config file, and return OIDs to fetch and metric tags to submit.
+    Parse the symbol based `metric_tags` section of a config file, independently of any instance.
+
+    The result is read-only, so that it can be passed to `parse_symbol_metric_tags` by many instances.
     """
-    oids = []  # type: List[OID]
-    parsed_symbol_tags = []  # type: List[SymbolTag]
+    results = []
 
     for metric_tag in metric_tags:
         if 'symbol' not in metric_tag:
             raise ConfigurationError('A metric tag must specify a symbol: {}'.format(metric_tag))
 
-        result = _parse_symbol_metric_tag(metric_tag)
+        results.append(_parse_symbol_metric_tag(metric_tag))
+
+    return results
+
+
+def parse_symbol_metric_tags(metric_tags, resolver, compiled_metric_tags=None):
+    # type: (List[MetricTag], OIDResolver, Optional[List[MetricTagParseResult]]) -> ParsedSymbolTagsResult
+    """
+    Parse the symbol based `metric_tags` section of a config file, and return OIDs to fetch and metric tags to submit.
+
+    `compiled_metric_tags` is the result of `compile_symbol_metric_tags` for the same `metric_tags`, if it's available.
+    """
+    oids = []  # type: List[OID]
+    parsed_symbol_tags = []  # type: List[SymbolTag]
+
+    if compiled_metric_tags is None:
+        compiled_metric_tags = compile_symbol_metric_tags(metric_tags)
 
+    for result in compiled_metric_tags:
         for name, oid in result.oids_to_resolve.items():
             resolver.register(oid, name)
 
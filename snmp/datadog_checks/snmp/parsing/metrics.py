@@ -34,19 +34,32 @@ ParseMetricsResult = TypedDict(
 )
 
 
-def parse_metrics(metrics, resolver, logger, bulk_threshold=0):
-    # type: (List[Metric], OIDResolver, Optional[Logger], int) -> ParseMetricsResult
+def compile_metrics(metrics, logger):
+    # type: (List[Metric], Optional[Logger]) -> List[MetricParseResult]
+    """
+    Parse the `metrics` section of a config file, independently of any instance.
+
+    The result is read-only, so that it can be passed to `parse_metrics` by many instances.
+    """
+    return [_parse_metric(metric, logger) for metric in metrics]
+
+
+def parse_metrics(metrics, resolver, logger, bulk_threshold=0, compiled_metrics=None):
+    # type: (List[Metric], OIDResolver, Optional[Logger], int, Optional[List[MetricParseResult]]) -> ParseMetricsResult
     """
     Parse the `metrics` section of a config file, and return OIDs to fetch and metrics to submit.
+
+    `compiled_metrics` is the result of `compile_metrics` for the same `metrics`, if it's available.
     """
     oids = []
     next_oids = []
     bulk_oids = []
     parsed_metrics = []  # type: List[ParsedMetric]
 
-    for metric in metrics:
-        result = _parse_metric(metric, logger)
+    if compiled_metrics is None:
+        compiled_metrics = compile_metrics(metrics, logger)
 
+    for result in compiled_metrics:
         for oid in result.oids_to_fetch:
             oids.append(oid)
 
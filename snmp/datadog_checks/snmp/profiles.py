@@ -0,0 +1,258 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+"""
+Compiled index of SNMP profiles, built once per process and shared by the instances of the check.
+"""
+import fnmatch
+import hashlib
+import logging
+import marshal
+import os
+import sys
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from datadog_checks.base import ConfigurationError
+
+from .compat import get_config
+from .parsing import compile_metrics, compile_symbol_metric_tags
+from .utils import (
+    _iter_default_profile_file_paths,
+    _load_default_profiles,
+    get_default_profiles,
+    get_profile_definition,
+    oid_pattern_specificity,
+    recursively_expand_base_profiles,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the format of the persisted index changes
+PROFILE_INDEX_FORMAT_VERSION = 1
+PROFILE_INDEX_CACHE_FILENAME = 'snmp_profile_index'
+
+_GLOB_CHARACTERS = ('*', '?', '[')
+
+CompiledProfile = NamedTuple('CompiledProfile', [('metrics', List[Any]), ('metric_tags', List[Any])])
+
+
+class ProfileIndex(object):
+    """
+    A set of expanded profiles, with a sysObjectID lookup and the parsed definitions of their metrics.
+
+    - Profiles are matched with a trie of the literal prefixes of the sysObjectID patterns,
+      instead of trying every pattern.
+    - The metrics and metric tags of a profile are parsed once, the first time a device uses it.
+      The parsed OIDs are shared by all the devices using the profile, and must not be modified.
+    """
+
+    def __init__(self, profiles):
+        # type: (Dict[str, Dict[str, Any]]) -> None
+        self.profiles = profiles
+        self.profiles_by_oid = _get_profiles_mapping(profiles)
+
+        self._patterns = {}  # type: Dict[Any, Any]
+        for pattern in self.profiles_by_oid:
+            node = self._patterns
+            for part in _literal_prefix(pattern):
+                node = node.setdefault(part, {})
+            node.setdefault(None, []).append(pattern)
+
+        self._matches = {}  # type: Dict[str, Optional[str]]
+        self._compiled_profiles = {}  # type: Dict[str, CompiledProfile]
+        self._lock = threading.Lock()
+
+    def match(self, sys_object_oid):
+        # type: (str) -> str
+        """
+        Return the most specific profile that matches the given sysObjectID.
+        """
+        try:
+            name = self._matches[sys_object_oid]
+        except KeyError:
+            name = self._matches[sys_object_oid] = self._match(sys_object_oid)
+
+        if name is None:
+            raise ConfigurationError('No profile matching sysObjectID {}'.format(sys_object_oid))
+
+        return name
+
+    def _match(self, sys_object_oid):
+        # type: (str) -> Optional[str]
+        candidates = []  # type: List[str]
+        node = self._patterns
+        candidates.extend(node.get(None, []))
+        for part in sys_object_oid.lstrip('.').split('.'):
+            node = node.get(part)
+            if node is None:
+                break
+            candidates.extend(node.get(None, []))
+
+        matched = [pattern for pattern in candidates if fnmatch.fnmatch(sys_object_oid, pattern)]
+        if not matched:
+            return None
+
+        return self.profiles_by_oid[max(matched, key=oid_pattern_specificity)]
+
+    def compile(self, name, log=None):
+        # type: (str, Optional[logging.Logger]) -> CompiledProfile
+        """
+        Return the parsed metrics and metric tags of a profile.
+        """
+        compiled = self._compiled_profiles.get(name)
+        if compiled is not None:
+            return compiled
+
+        with self._lock:
+            compiled = self._compiled_profiles.get(name)
+            if compiled is None:
+                definition = self.profiles[name]['definition']
+                compiled = CompiledProfile(
+                    metrics=compile_metrics(definition.get('metrics', []), log or logger),
+                    metric_tags=compile_symbol_metric_tags(definition.get('metric_tags', [])),
+                )
+                self._compiled_profiles[name] = compiled
+
+        return compiled
+
+
+def _get_profiles_mapping(profiles):
+    # type: (Dict[str, Dict[str, Any]]) -> Dict[str, str]
+    """
+    Get the mapping from sysObjectID to profile.
+    """
+    profiles_by_oid = {}  # type: Dict[str, str]
+    for name, profile in profiles.items():
+        sys_object_oids = profile['definition'].get('sysobjectid')
+        if sys_object_oids is None:
+            continue
+        if isinstance(sys_object_oids, str):
+            sys_object_oids = [sys_object_oids]
+        for sys_object_oid in sys_object_oids:
+            profile_match = profiles_by_oid.get(sys_object_oid)
+            if profile_match:
+                raise ConfigurationError(
+                    "Profile {} has the same sysObjectID ({}) as {}".format(name, sys_object_oid, profile_match)
+                )
+            else:
+                profiles_by_oid[sys_object_oid] = name
+    return profiles_by_oid
+
+
+def _literal_prefix(pattern):
+    # type: (str) -> List[str]
+    """
+    Return the parts of an OID pattern that any matching sysObjectID starts with.
+    """
+    prefix = []
+    for part in pattern.lstrip('.').split('.'):
+        if any(c in part for c in _GLOB_CHARACTERS):
+            break
+        prefix.append(part)
+    return prefix
+
+
+_default_index = None  # type: Optional[ProfileIndex]
+_default_index_lock = threading.Lock()
+
+
+def get_profile_index(configured_profiles=None, persist=False):
+    # type: (Optional[Dict[str, Any]], bool) -> ProfileIndex
+    """
+    Return the index of the given profiles configuration, or of the profiles installed on the system.
+
+    The index of the profiles installed on the system is built once per process. With `persist`, the expanded
+    profiles are also stored in the run path of the Agent, and loaded from there by the next processes as long
+    as the profile files don't change.
+    """
+    global _default_index
+
+    if configured_profiles is not None:
+        return ProfileIndex(_load_configured_profiles(configured_profiles))
+
+    with _default_index_lock:
+        if _default_index is None:
+            profiles = _load_persisted_default_profiles() if persist else get_default_profiles()
+            _default_index = ProfileIndex(profiles)
+
+    return _default_index
+
+
+def _load_configured_profiles(configured_profiles):
+    # type: (Dict[str, Any]) -> Dict[str, Dict[str, Any]]
+    profiles = {}
+
+    for name, profile in configured_profiles.items():
+        try:
+            definition = get_profile_definition(profile)
+        except Exception as exc:
+            raise ConfigurationError("Couldn't read profile '{}': {}".format(name, exc))
+
+        try:
+            recursively_expand_base_profiles(definition)
+        except Exception as exc:
+            raise ConfigurationError("Failed to expand base profiles in profile '{}': {}".format(name, exc))
+
+        profiles[name] = {'definition': definition}
+
+    return profiles
+
+
+def _get_persisted_index_path():
+    # type: () -> Optional[str]
+    run_path = get_config('run_path')
+    if not run_path:
+        return None
+    return os.path.join(run_path, PROFILE_INDEX_CACHE_FILENAME)
+
+
+def _get_default_profiles_hash():
+    # type: () -> str
+    """
+    Return a hash of the profile files installed on the system, and of the format of the persisted index.
+    """
+    digest = hashlib.sha256()
+    digest.update('{}:{}'.format(PROFILE_INDEX_FORMAT_VERSION, sys.version).encode('utf-8'))
+    for path in sorted(_iter_default_profile_file_paths()):
+        digest.update(path.encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _load_persisted_default_profiles():
+    # type: () -> Dict[str, Dict[str, Any]]
+    """
+    Load the profiles installed on the system from the persisted index, or build and persist it.
+
+    The index is stored with `marshal`, which is much faster to load than YAML and can only contain
+    builtin values. It's rebuilt whenever any profile file changes.
+    """
+    path = _get_persisted_index_path()
+    if path is None:
+        return get_default_profiles()
+
+    profiles_hash = _get_default_profiles_hash()
+
+    try:
+        with open(path, 'rb') as f:
+            persisted_hash, profiles = marshal.load(f)
+        if persisted_hash == profiles_hash:
+            return profiles
+    except Exception as e:
+        logger.debug('Could not load the persisted profile index from %s: %s', path, e)
+
+    profiles = _load_default_profiles()
+
+    temp_path = '{}.tmp'.format(path)
+    try:
+        with open(temp_path, 'wb') as f:
+            marshal.dump((profiles_hash, profiles), f)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+    except Exception as e:
+        logger.debug('Could not persist the profile index to %s: %s', path, e)
+
+    return profiles
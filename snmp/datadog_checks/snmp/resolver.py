@@ -3,11 +3,12 @@
 # Licensed under Simplified BSD License (see LICENSE)
 
 from collections import defaultdict
-from typing import DefaultDict, Dict, List, Optional, Tuple
+from typing import Any, DefaultDict, Dict, List, Optional, Tuple
 
 from .models import OID
 from .pysnmp_types import MibViewController
 from .types import OIDMatch
+from .utils import parse_as_oid_tuple
 
 
 class OIDTreeNode(object):
@@ -85,12 +86,16 @@ class OIDResolver(object):
     ```
     """
 
+    # Resolutions of received OIDs kept by `resolve_var_bind_oid`
+    MAX_CACHED_MATCHES = 100000
+
     def __init__(self, mib_view_controller, enforce_constraints):
         # type: (MibViewController, bool) -> None
         self._mib_view_controller = mib_view_controller
         self._resolver = OIDTrie()
         self._index_resolvers = defaultdict(dict)  # type: DefaultDict[str, Dict[int, Dict[int, str]]]
         self._enforce_constraints = enforce_constraints
+        self._matches = {}  # type: Dict[Tuple[int, ...], OIDMatch]
 
     def register(self, oid, name):
         # type: (OID, str) -> None
@@ -99,6 +104,7 @@ class OIDResolver(object):
         Corresponds to XXX(1) and XXX(2) in the summary listing.
         """
         self._resolver.set(oid.as_tuple(), name)
+        self._matches.clear()
 
     def register_index(self, tag, index, mapping):
         # type: (str, int, Dict[int, str]) -> None
@@ -107,6 +113,7 @@ class OIDResolver(object):
         Corresponds to XXX(3) in the summary listing.
         """
         self._index_resolvers[tag][index] = mapping
+        self._matches.clear()
 
     def _resolve_from_mibs(self, oid):
         # type: (OID) -> OIDMatch
@@ -166,3 +173,19 @@ class OIDResolver(object):
 
         tag_index = self._resolve_tag_index(tail, name=name)
         return OIDMatch(name=name, indexes=tag_index)
+
+    def resolve_var_bind_oid(self, result_oid):
+        # type: (Any) -> OIDMatch
+        """Resolve the OID of a var bind received from the device, see `resolve_oid`.
+
+        The same OIDs are received at every check run, so resolutions are cached by OID until the registered
+        OIDs or index mappings change, e.g. when a profile is added.
+        """
+        parts = parse_as_oid_tuple(result_oid)
+        match = self._matches.get(parts)
+        if match is None:
+            if len(self._matches) >= self.MAX_CACHED_MATCHES:
+                # Indexes of some tables keep changing, don't let them grow the cache forever.
+                self._matches.clear()
+            match = self._matches[parts] = self.resolve_oid(OID(result_oid))
+        return match
@@ -0,0 +1,128 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+"""
+Storage of the values received from a device during a check run.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class ResultColumn(object):
+    """
+    The values of a column of a table, or of a scalar, in the order they were received.
+
+    `rows[i]` is the row of `data[i]`, see `Results.indexes`.
+    """
+
+    __slots__ = ('_results', 'rows', 'data', '_positions')
+
+    def __init__(self, results):
+        # type: (Results) -> None
+        self._results = results
+        self.rows = []  # type: List[int]
+        self.data = []  # type: List[Any]
+        self._positions = None  # type: Optional[Dict[int, int]]
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        # type: (Tuple[str, ...]) -> Any
+        position = self.position(self._results.row(index))
+        if position is None:
+            raise KeyError(index)
+        return self.data[position]
+
+    def items(self):
+        # type: () -> Iterator[Tuple[Tuple[str, ...], Any]]
+        indexes = self._results.indexes
+        for row, value in zip(self.rows, self.data):
+            yield indexes[row], value
+
+    def position(self, row, hint=None):
+        # type: (Optional[int], Optional[int]) -> Optional[int]
+        """
+        Return the position of the value of a row in the column, if any.
+
+        `hint` is the expected position, which is usually right for the columns of the same table.
+        """
+        if row is None:
+            return None
+        if hint is not None and hint < len(self.rows) and self.rows[hint] == row:
+            return hint
+        if self._positions is None:
+            self._positions = {row: position for position, row in enumerate(self.rows)}
+        return self._positions.get(row)
+
+    def _deduplicate(self):
+        # type: () -> None
+        if len(set(self.rows)) == len(self.rows):
+            return
+
+        # Same OID received several times: keep the last value, in the order of the first one.
+        rows = []  # type: List[int]
+        positions = {}  # type: Dict[int, int]
+        for position, row in enumerate(self.rows):
+            if row not in positions:
+                rows.append(row)
+            positions[row] = position
+        self.data = [self.data[positions[row]] for row in rows]
+        self.rows = rows
+        self._positions = None
+
+
+class Results(object):
+    """
+    The values received from a device during a check run, stored by column.
+
+    Rows are numbered in the order they were first received, and the index of each row is stored once in
+    `indexes`, no matter how many columns have a value for it. Scalars have a single row, with an empty index.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self.indexes = []  # type: List[Tuple[str, ...]]
+        self._rows = {}  # type: Dict[Tuple[str, ...], int]
+        self._columns = {}  # type: Dict[str, ResultColumn]
+
+    def add(self, name, index, value):
+        # type: (str, Tuple[str, ...], Any) -> None
+        row = self._rows.get(index)
+        if row is None:
+            row = self._rows[index] = len(self.indexes)
+            self.indexes.append(index)
+
+        column = self._columns.get(name)
+        if column is None:
+            column = self._columns[name] = ResultColumn(self)
+        column.rows.append(row)
+        column.data.append(value)
+
+    def freeze(self):
+        # type: () -> None
+        """
+        Called once all the values are added, before reading them.
+        """
+        for column in self._columns.values():
+            column._deduplicate()
+
+    def row(self, index):
+        # type: (Tuple[str, ...]) -> Optional[int]
+        return self._rows.get(index)
+
+    def __contains__(self, name):
+        # type: (str) -> bool
+        return name in self._columns
+
+    def __getitem__(self, name):
+        # type: (str) -> ResultColumn
+        return self._columns[name]
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._columns)
+
+    def items(self):
+        # type: () -> Iterator[Tuple[str, ResultColumn]]
+        return iter(self._columns.items())
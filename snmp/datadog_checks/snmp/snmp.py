@@ -2,7 +2,6 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 import copy
-import fnmatch
 import functools
 import ipaddress
 import json
@@ -10,17 +9,16 @@ import re
 import threading
 import time
 import weakref
-from collections import defaultdict
 from concurrent import futures
-from typing import Any, DefaultDict, Dict, List, Optional, Pattern, Tuple
+from typing import Any, Dict, List, Optional, Pattern, Tuple
 
-from six import iteritems
+from six import PY3
 
 from datadog_checks.base import AgentCheck, ConfigurationError, is_affirmative
 from datadog_checks.base.errors import CheckException
 from datadog_checks.snmp.utils import extract_value
 
-from .commands import snmp_bulk, snmp_get, snmp_getnext
+from .commands import BulkWalk, GetRequest, snmp_get, snmp_getnext, snmp_pipeline
 from .compat import read_persistent_cache, write_persistent_cache
 from .config import InstanceConfig
 from .discovery import discover_instances
@@ -29,16 +27,10 @@ from .metrics import as_metric_with_forced_type, as_metric_with_inferred_type, t
 from .mibs import MIBLoader
 from .models import OID
 from .parsing import ColumnTag, IndexTag, ParsedMetric, ParsedTableMetric, SymbolTag
+from .profiles import get_profile_index
 from .pysnmp_types import ObjectIdentity, ObjectType, noSuchInstance, noSuchObject
-from .utils import (
-    OIDPrinter,
-    batches,
-    get_default_profiles,
-    get_profile_definition,
-    oid_pattern_specificity,
-    recursively_expand_base_profiles,
-    transform_index,
-)
+from .results import Results
+from .utils import OIDPrinter, batches, format_as_oid_string, transform_index
 
 DEFAULT_OID_BATCH_SIZE = 10
 LOADER_TAG = 'loader:python'
@@ -57,6 +49,8 @@ class SnmpCheck(AgentCheck):
     _running = True
     _thread = None
     _executor = None
+    _poller = None
+    _last_discovery_stats = None  # type: Optional[Tuple[float, int]]
     _NON_REPEATERS = 0
     _MAX_REPETITIONS = 25
     _thread_factory = threading.Thread  # Store as an attribute for easier mocking.
@@ -78,11 +72,18 @@ class SnmpCheck(AgentCheck):
             self.init_config.get('refresh_oids_cache_interval', InstanceConfig.DEFAULT_REFRESH_OIDS_CACHE_INTERVAL)
         )
 
-        self.profiles = self._load_profiles()
-        self.profiles_by_oid = self._get_profiles_mapping()
+        self.profile_index = get_profile_index(
+            self.init_config.get('profiles'),
+            persist=is_affirmative(self.init_config.get('persist_profile_index', False)),
+        )
+        self.profiles = self.profile_index.profiles
+        self.profiles_by_oid = self.profile_index.profiles_by_oid
 
         self._config = self._build_config(self.instance)
 
+        if self._config.use_asyncio:
+            self._poller = self._create_poller(self._config)
+
         self._last_fetch_number = 0
 
         self._submitted_metrics = 0
@@ -102,59 +103,12 @@ class SnmpCheck(AgentCheck):
         # Include check ID to avoid conflicts between concurrent instances of the check.
         return '{}-{}'.format(self.check_id, self._last_fetch_number)
 
-    def _load_profiles(self):
-        # type: () -> Dict[str, Dict[str, Any]]
-        """
-        Load the configured SNMP profiles.
-        """
-        configured_profiles = self.init_config.get('profiles')
-
-        if configured_profiles is None:
-            return get_default_profiles()
-
-        profiles = {}
-
-        for name, profile in configured_profiles.items():
-            try:
-                definition = get_profile_definition(profile)
-            except Exception as exc:
-                raise ConfigurationError("Couldn't read profile '{}': {}".format(name, exc))
-
-            try:
-                recursively_expand_base_profiles(definition)
-            except Exception as exc:
-                raise ConfigurationError("Failed to expand base profiles in profile '{}': {}".format(name, exc))
-
-            profiles[name] = {'definition': definition}
-
-        return profiles
-
-    def _get_profiles_mapping(self):
-        # type: () -> Dict[str, str]
-        """
-        Get the mapping from sysObjectID to profile.
-        """
-        profiles_by_oid = {}  # type: Dict[str, str]
-        for name, profile in self.profiles.items():
-            sys_object_oids = profile['definition'].get('sysobjectid')
-            if sys_object_oids is None:
-                continue
-            if isinstance(sys_object_oids, str):
-                sys_object_oids = [sys_object_oids]
-            for sys_object_oid in sys_object_oids:
-                profile_match = profiles_by_oid.get(sys_object_oid)
-                if profile_match:
-                    raise ConfigurationError(
-                        "Profile {} has the same sysObjectID ({}) as {}".format(name, sys_object_oid, profile_match)
-                    )
-                else:
-                    profiles_by_oid[sys_object_oid] = name
-        return profiles_by_oid
+    def _get_mib_loader(self):
+        # type: () -> MIBLoader
+        return MIBLoader.shared_instance() if self.optimize_mib_memory_usage else MIBLoader()
 
     def _build_config(self, instance):
         # type: (dict) -> InstanceConfig
-        loader = MIBLoader.shared_instance() if self.optimize_mib_memory_usage else MIBLoader()
-
         return InstanceConfig(
             instance,
             global_metrics=self.init_config.get('global_metrics', []),
@@ -162,10 +116,24 @@ class SnmpCheck(AgentCheck):
             refresh_oids_cache_interval=self.refresh_oids_cache_interval,
             profiles=self.profiles,
             profiles_by_oid=self.profiles_by_oid,
-            loader=loader,
+            loader=self._get_mib_loader(),
             logger=self.log,
         )
 
+    def _create_poller(self, config):
+        # type: (InstanceConfig) -> Any
+        if not PY3:
+            raise ConfigurationError('The `use_asyncio` option requires Python 3')
+
+        # The asyncio support of PySNMP is only imported when enabled
+        from .aio import AsyncioPoller
+
+        return AsyncioPoller(
+            self._get_mib_loader().create_snmp_engine(self.mibs_path),
+            max_concurrent_requests=config.max_concurrent_requests,
+            max_concurrent_requests_per_device=config.max_concurrent_requests_per_device,
+        )
+
     def _build_autodiscovery_config(self, source_instance, ip_address):
         # type: (dict, str) -> InstanceConfig
         instance = copy.deepcopy(source_instance)
@@ -194,64 +162,116 @@ class SnmpCheck(AgentCheck):
             return None
 
     def fetch_results(
-        self, config  # type: InstanceConfig
+        self,
+        config,  # type: InstanceConfig
+        fetcher=None,  # type: Any
     ):
-        # type: (...) -> Tuple[Dict[str, Dict[Tuple[str, ...], Any]], List[OID], Optional[str]]
+        # type: (...) -> Tuple[Results, List[Any], Optional[str]]
         """
         Perform a snmpwalk on the domain specified by the oids, on the device
         configured in instance.
 
-        Returns a dictionary:
-        dict[oid/metric_name][row index] = value
-        In case of scalar objects, the row index is just 0
+        The responses are fetched with `fetcher.fetch_binds`, which defaults to `self.fetch_binds`.
+
+        Returns the results, stored by column:
+        results[oid/metric_name][row index] = value
+        In case of scalar objects, the row index is empty
         """
-        results = defaultdict(dict)  # type: DefaultDict[str, Dict[Tuple[str, ...], Any]]
-        enforce_constraints = config.enforce_constraints
+        results = Results()
         fetch_id = self._get_next_fetch_id()
 
+        if fetcher is None:
+            fetcher = self
+        all_binds, error = fetcher.fetch_binds(config, fetch_id)
+
+        for result_oid, value in all_binds:
+            match = config.resolve_var_bind_oid(result_oid)
+            results.add(match.name, match.indexes, value)
+        # Freeze the result
+        results.freeze()
+        self.log.debug('[%s] Raw results: %s', fetch_id, OIDPrinter(results, with_values=False))
+        return results, [result_oid for result_oid, _ in all_binds], error
+
+    def fetch_binds(self, config, fetch_id):
+        # type: (InstanceConfig, str) -> Tuple[List[Any], Optional[str]]
+        """
+        Fetch the scalar, next and bulk OIDs of the device, and return the received var binds and the first error.
+
+        The GET batches and the GETBULK walks don't depend on each other, they are sent without waiting for
+        the previous responses, with at most `max_concurrent_requests_per_device` requests in flight.
+        """
+        enforce_constraints = config.enforce_constraints
+        scalar_oids = [oid.as_object_type() for oid in config.oid_config.scalar_oids]
+
+        get_requests = [
+            GetRequest(batch, enforce_constraints) for batch in batches(scalar_oids, size=self.oid_batch_size)
+        ]
+        for request in get_requests:
+            self.log.debug(
+                '[%s] Running SNMP command get on OIDS: %s', fetch_id, OIDPrinter(request.oids, with_values=False)
+            )
+
+        walks = []
+        for oid in config.oid_config.bulk_oids:
+            walk = BulkWalk(
+                oid.as_object_type(),
+                self._NON_REPEATERS,
+                self._MAX_REPETITIONS,
+                enforce_constraints,
+                self.ignore_nonincreasing_oid,
+            )
+            self.log.debug(
+                '[%s] Running SNMP command getBulk on OID %s', fetch_id, OIDPrinter((walk.oid,), with_values=False)
+            )
+            walks.append(walk)
+
+        snmp_pipeline(config, get_requests + walks, config.max_concurrent_requests_per_device)
+
         all_binds, error = self.fetch_oids(
             config,
-            config.oid_config.scalar_oids,
+            get_requests,
             config.oid_config.next_oids,
             enforce_constraints=enforce_constraints,
             fetch_id=fetch_id,
         )
-        for oid in config.oid_config.bulk_oids:
+        for walk in walks:
             try:
-                oid_object_type = oid.as_object_type()
-                self.log.debug(
-                    '[%s] Running SNMP command getBulk on OID %s',
-                    fetch_id,
-                    OIDPrinter((oid_object_type,), with_values=False),
-                )
-                binds = snmp_bulk(
-                    config,
-                    oid_object_type,
-                    self._NON_REPEATERS,
-                    self._MAX_REPETITIONS,
-                    enforce_constraints,
-                    self.ignore_nonincreasing_oid,
-                )
-                all_binds.extend(binds)
+                all_binds.extend(self.table_walk_result(config, walk, fetch_id))
             except (PySnmpError, CheckException) as e:
                 message = '[{}] Failed to collect some metrics: {}'.format(fetch_id, e)
                 if not error:
                     error = message
                 self.warning(message)
 
-        scalar_oids = []
-        for result_oid, value in all_binds:
-            oid = OID(result_oid)
-            scalar_oids.append(oid)
-            match = config.resolve_oid(oid)
-            results[match.name][match.indexes] = value
-        self.log.debug('[%s] Raw results: %s', fetch_id, OIDPrinter(results, with_values=False))
-        # Freeze the result
-        results.default_factory = None  # type: ignore
-        return results, scalar_oids, error
+        return all_binds, error
+
+    def table_walk_result(self, config, walk, fetch_id):
+        # type: (InstanceConfig, BulkWalk, str) -> List[Any]
+        """
+        Return the rows of a table walk, or raise its error, and tune the max-repetitions of the table accordingly.
+        """
+        try:
+            binds = walk.result(config)
+        except (PySnmpError, CheckException):
+            # The device may drop the responses to requests for too many rows instead of answering `tooBig`
+            if walk.table_oid is not None:
+                config.bulk_max_repetitions.failed(walk.table_oid, walk.max_repetitions, self._MAX_REPETITIONS)
+            raise
+
+        self.log.debug(
+            '[%s] Walked %s rows of table %s in %s requests (max repetitions: %s)',
+            fetch_id,
+            len(binds),
+            format_as_oid_string(walk.table_oid),
+            walk.requests,
+            walk.max_repetitions,
+        )
+        config.bulk_max_repetitions.update(walk.table_oid, len(binds), walk.response_limit)
+        self.submit_table_walk_duration(config, walk.table_oid, walk.duration)
+        return binds
 
-    def fetch_oids(self, config, scalar_oids, next_oids, enforce_constraints, fetch_id):
-        # type: (InstanceConfig, List[OID], List[OID], bool, str) -> Tuple[List[Any], Optional[str]]
+    def fetch_oids(self, config, get_requests, next_oids, enforce_constraints, fetch_id):
+        # type: (InstanceConfig, List[GetRequest], List[OID], bool, str) -> Tuple[List[Any], Optional[str]]
         # UPDATE: We used to perform only a snmpgetnext command to fetch metric values.
         # It returns the wrong value when the OID passed is referring to a specific leaf.
         # For example:
@@ -259,17 +279,12 @@ class SnmpCheck(AgentCheck):
         # iso.3.6.1.2.1.25.4.2.1.7.224 = INTEGER: 2
         # SOLUTION: perform a snmpget command and fallback with snmpgetnext if not found
         error = None
-        scalar_oids = [oid.as_object_type() for oid in scalar_oids]
         next_oids = [oid.as_object_type() for oid in next_oids]
         all_binds = []
 
-        for oids_batch in batches(scalar_oids, size=self.oid_batch_size):
+        for request in get_requests:
             try:
-                self.log.debug(
-                    '[%s] Running SNMP command get on OIDS: %s', fetch_id, OIDPrinter(oids_batch, with_values=False)
-                )
-
-                var_binds = snmp_get(config, oids_batch, lookup_mib=enforce_constraints)
+                var_binds = request.result(config)
                 self.log.debug('[%s] Returned vars: %s', fetch_id, OIDPrinter(var_binds, with_values=True))
 
                 missing_results = []
@@ -331,16 +346,16 @@ class SnmpCheck(AgentCheck):
         """
         Return the most specific profile that matches the given sysObjectID.
         """
-        matched_profiles_by_oid = {
-            oid: self.profiles_by_oid[oid] for oid in self.profiles_by_oid if fnmatch.fnmatch(sys_object_oid, oid)
-        }
+        return self.profile_index.match(sys_object_oid)
 
-        if not matched_profiles_by_oid:
-            raise ConfigurationError('No profile matching sysObjectID {}'.format(sys_object_oid))
-
-        oid = max(matched_profiles_by_oid.keys(), key=lambda oid: oid_pattern_specificity(oid))
-
-        return matched_profiles_by_oid[oid]
+    def _refresh_with_sysobject_oid(self, config, sys_object_oid):
+        # type: (InstanceConfig, str) -> None
+        """
+        Add the metrics of the profile matching the given sysObjectID to the configuration.
+        """
+        profile = self._profile_for_sysobject_oid(sys_object_oid)
+        config.refresh_with_profile(self.profiles[profile], self.profile_index.compile(profile, self.log))
+        config.add_profile_tag(profile)
 
     def _start_discovery(self):
         # type: () -> None
@@ -368,7 +383,13 @@ class SnmpCheck(AgentCheck):
         )
         self._thread.daemon = True
         self._thread.start()
-        self._executor = futures.ThreadPoolExecutor(max_workers=self._config.workers)
+        if self._poller is None:
+            self._executor = futures.ThreadPoolExecutor(max_workers=self._config.workers)
+
+    def cancel(self):
+        # type: () -> None
+        if self._poller is not None:
+            self._poller.close()
 
     def check(self, _):
         # type: (Dict[str, Any]) -> None
@@ -380,26 +401,48 @@ class SnmpCheck(AgentCheck):
             if self._thread is None:
                 self._start_discovery()
 
-            executor = self._executor
-            if executor is None:
-                raise RuntimeError("Expected executor be set")
+            if self._poller is not None:
+                discovered_instances = list(config.discovered_instances.items())
+                polled = self._poll_devices([discovered for _, discovered in discovered_instances])
+                for (host, _), (error, _) in zip(discovered_instances, polled):
+                    self._update_failing_instances(host, error)
+            else:
+                executor = self._executor
+                if executor is None:
+                    raise RuntimeError("Expected executor be set")
 
-            sent = []
-            for host, discovered in list(config.discovered_instances.items()):
-                future = executor.submit(self._check_device, discovered)  # type: Any
-                sent.append(future)
-                future.add_done_callback(functools.partial(self._on_check_device_done, host))
-            futures.wait(sent)
+                sent = []
+                for host, discovered in list(config.discovered_instances.items()):
+                    future = executor.submit(self._check_device, discovered)  # type: Any
+                    sent.append(future)
+                    future.add_done_callback(functools.partial(self._on_check_device_done, host))
+                futures.wait(sent)
 
             tags = ['network:{}'.format(config.ip_network), 'autodiscovery_subnet:{}'.format(config.ip_network)]
             tags.extend(config.tags)
             self.gauge('snmp.discovered_devices_count', len(config.discovered_instances), tags=tags)
+            self.submit_discovery_metrics(tags)
+        elif self._poller is not None:
+            [(error, tags)] = self._poll_devices([config])
         else:
             error, tags = self._check_device(config)
             # no need to handle error here since it's already handled inside `self._check_device`
 
         self.submit_telemetry_metrics(start_time, tags)
 
+    def _poll_devices(self, configs):
+        # type: (List[InstanceConfig]) -> List[Tuple[Optional[str], List[str]]]
+        """
+        Check the devices from the event loop of the asyncio poller, and return the error and tags of each device.
+        """
+        polled = self._poller.poll(self, configs)
+
+        results = []
+        for error, tags, poll_duration in polled:
+            self.gauge('datadog.snmp.device_poll_duration', poll_duration, tags=tags + [LOADER_TAG])
+            results.append((error, tags))
+        return results
+
     def submit_telemetry_metrics(self, start_time, tags):
         # type: (float, List[str]) -> None
         telemetry_tags = tags + [LOADER_TAG]
@@ -410,11 +453,40 @@ class SnmpCheck(AgentCheck):
         self.monotonic_count('datadog.snmp.check_interval', time.time(), tags=telemetry_tags)
         self.gauge('datadog.snmp.check_duration', check_duration, tags=telemetry_tags)
         self.gauge('datadog.snmp.submitted_metrics', self._submitted_metrics, tags=telemetry_tags)
+        if self._poller is not None:
+            self.gauge('datadog.snmp.peak_requests_in_flight', self._poller.peak_in_flight, tags=telemetry_tags)
+
+    def submit_table_walk_duration(self, config, table_oid, duration):
+        # type: (InstanceConfig, Tuple[int, ...], float) -> None
+        tags = config.tags + ['table:{}'.format(format_as_oid_string(table_oid)), LOADER_TAG]
+        self.gauge('datadog.snmp.table_walk_duration', duration, tags=tags)
+
+    def submit_discovery_metrics(self, tags):
+        # type: (List[str]) -> None
+        """
+        Submit the performance metrics of the last discovery scan, once it's done.
+        """
+        stats = self._last_discovery_stats
+        if stats is None:
+            return
+        self._last_discovery_stats = None
+
+        discovery_duration, hosts_probed = stats
+        telemetry_tags = tags + [LOADER_TAG]
+        self.gauge('datadog.snmp.discovery_duration', discovery_duration, tags=telemetry_tags)
+        if discovery_duration > 0:
+            self.gauge(
+                'datadog.snmp.discovery_hosts_probed_per_second', hosts_probed / discovery_duration, tags=telemetry_tags
+            )
 
     def _on_check_device_done(self, host, future):
         # type: (str, futures.Future) -> None
-        config = self._config
         error, _ = future.result()
+        self._update_failing_instances(host, error)
+
+    def _update_failing_instances(self, host, error):
+        # type: (str, Optional[str]) -> None
+        config = self._config
         if error:
             config.failing_instances[host] += 1
             if config.failing_instances[host] >= config.allowed_failures:
@@ -426,8 +498,17 @@ class SnmpCheck(AgentCheck):
             # Reset the counter if not's failing
             config.failing_instances.pop(host, None)
 
-    def _check_device(self, config):
-        # type: (InstanceConfig) -> Tuple[Optional[str], List[str]]
+    def _check_device(self, config, fetcher=None):
+        # type: (InstanceConfig, Any) -> Tuple[Optional[str], List[str]]
+        """
+        Collect and submit the metrics of a device.
+
+        SNMP requests are sent through `fetcher`, which defaults to the check itself. The asyncio poller
+        passes the responses it already received instead.
+        """
+        if fetcher is None:
+            fetcher = self
+
         # Reset errors
         if config.device is None:
             raise RuntimeError('No device set')  # pragma: no cover
@@ -439,15 +520,13 @@ class SnmpCheck(AgentCheck):
             config.oid_config.reset()
         try:
             if not config.oid_config.has_oids():
-                sys_object_oid = self.fetch_sysobject_oid(config)
-                profile = self._profile_for_sysobject_oid(sys_object_oid)
-                config.refresh_with_profile(self.profiles[profile])
-                config.add_profile_tag(profile)
+                sys_object_oid = fetcher.fetch_sysobject_oid(config)
+                self._refresh_with_sysobject_oid(config, sys_object_oid)
 
             if config.oid_config.has_oids():
                 self.log.debug('Querying %s', config.device)
                 config.add_uptime_metric()
-                results, scalar_oids, error = self.fetch_results(config)
+                results, scalar_oids, error = self.fetch_results(config, fetcher)
                 config.oid_config.update_scalar_oids(scalar_oids)
                 tags = self.extract_metric_tags(config.parsed_metric_tags, results)
                 tags.extend(config.tags)
@@ -477,13 +556,13 @@ class SnmpCheck(AgentCheck):
         return error, tags
 
     def extract_metric_tags(self, metric_tags, results):
-        # type: (List[SymbolTag], Dict[str, dict]) -> List[str]
+        # type: (List[SymbolTag], Results) -> List[str]
         extracted_tags = []  # type: List[str]
         for tag in metric_tags:
             if tag.symbol not in results:
                 self.log.debug('Ignoring tag %s', tag.symbol)
                 continue
-            tag_values = list(results[tag.symbol].values())
+            tag_values = results[tag.symbol].data
             if len(tag_values) > 1:
                 raise CheckException(
                     'You are trying to use a table column (OID `{}`) as a metric tag. This is not supported as '
@@ -498,7 +577,7 @@ class SnmpCheck(AgentCheck):
     def report_metrics(
         self,
         metrics,  # type: List[ParsedMetric]
-        results,  # type: Dict[str, Dict[Tuple[str, ...], Any]]
+        results,  # type: Results
         tags,  # type: List[str]
     ):
         # type: (...) -> None
@@ -513,21 +592,25 @@ class SnmpCheck(AgentCheck):
             if name not in results:
                 self.log.debug('Ignoring metric %s', name)
                 continue
+            column = results[name]
             if isinstance(metric, ParsedTableMetric):
-                for index, val in iteritems(results[name]):
-                    metric_tags = tags + self.get_index_tags(index, results, metric.index_tags, metric.column_tags)
+                indexes = results.indexes
+                for position, (row, val) in enumerate(zip(column.rows, column.data)):
+                    index = indexes[row]
+                    metric_tags = tags + self.get_index_tags(
+                        index, results, metric.index_tags, metric.column_tags, row=row, position=position
+                    )
                     self.submit_metric(
                         name, val, metric.forced_type, metric_tags, metric.options, metric.extract_value_pattern
                     )
                     self.try_submit_bandwidth_usage_metric_if_bandwidth_metric(name, index, results, metric_tags)
             else:
-                result = list(results[name].items())
-                if len(result) > 1:
+                if len(column) > 1:
                     self.log.warning('Several rows corresponding while the metric is supposed to be a scalar')
                     if metric.enforce_scalar:
                         # For backward compatibility reason, we publish the first value for OID.
                         continue
-                val = result[0][1]
+                val = column.data[0]
                 metric_tags = tags + metric.tags
                 self.submit_metric(
                     name, val, metric.forced_type, metric_tags, metric.options, metric.extract_value_pattern
@@ -547,7 +630,7 @@ class SnmpCheck(AgentCheck):
         self,
         name,  # type: str
         index,  # type: Tuple[str, ...]
-        results,  # type: Dict[str, Dict[Tuple[str, ...], Any]]
+        results,  # type: Results
         tags,  # type: List[str]
     ):
         # type: (...) -> None
@@ -567,7 +650,7 @@ class SnmpCheck(AgentCheck):
         self,
         name,  # type: str
         index,  # type: Tuple[str, ...]
-        results,  # type: Dict[str, Dict[Tuple[str, ...], Any]]
+        results,  # type: Results
         tags,  # type: List[str]
     ):
         # type: (...) -> None
@@ -639,9 +722,11 @@ class SnmpCheck(AgentCheck):
     def get_index_tags(
         self,
         index,  # type: Tuple[str, ...]
-        results,  # type: Dict[str, dict]
+        results,  # type: Results
         index_tags,  # type: List[IndexTag]
         column_tags,  # type: List[ColumnTag]
+        row=None,  # type: Optional[int]
+        position=None,  # type: Optional[int]
     ):
         # type: (...) -> List[str]
         """
@@ -654,6 +739,9 @@ class SnmpCheck(AgentCheck):
          - Those specified in column_tags contain the name of a column, which
            could be a potential result, to use as a tag
            cf. ifDescr in the IF-MIB::ifTable for example
+
+        `row` is the row of `index` in `results`, and `position` the position of the value of the metric in its
+        column, if known. The values of the columns of the same table are usually at the same position.
         """
         tags = []  # type: List[str]
 
@@ -673,18 +761,25 @@ class SnmpCheck(AgentCheck):
             )
             if column_tag.index_slices:
                 new_index = transform_index(index, column_tag.index_slices)
+                new_row = None if new_index is None else results.row(new_index)
+                hint = None
             else:
                 new_index = index
+                new_row = results.row(index) if row is None else row
+                hint = position
             self.log.trace('Processing column tag: new_index=%s old_index=%s', new_index, index)
             if new_index is None:
                 continue
-            try:
-                column_value = results[raw_column_value][new_index]
-            except KeyError:
+            value_position = None
+            if raw_column_value in results:
+                column = results[raw_column_value]
+                value_position = column.position(new_row, hint)
+            if value_position is None:
                 self.log.debug(
                     'Column `%s not present in the table, skipping this tag. index=%s', raw_column_value, new_index
                 )
                 continue
+            column_value = column.data[value_position]
             if reply_invalid(column_value):
                 self.log.warning("Can't deduct tag from column %s", column_tag.column)
                 continue
@@ -20,6 +20,7 @@ from .pysnmp_types import (
     lcd,
     noSuchInstance,
 )
+from .results import Results
 from .types import T
 
 logger = logging.getLogger(__name__)
@@ -153,12 +154,15 @@ def _load_default_profiles():
     return profiles
 
 
-_default_profiles = _load_default_profiles()
+_default_profiles = None  # type: Optional[Dict[str, Any]]
 
 
 def get_default_profiles():
     # type: () -> Dict[str, Any]
-    """Return all the profiles installed on the system."""
+    """Return all the profiles installed on the system, loading them on first use."""
+    global _default_profiles
+    if _default_profiles is None:
+        _default_profiles = _load_default_profiles()
     return _default_profiles
 
 
@@ -327,7 +331,7 @@ class OIDPrinter(object):
 
     def __str__(self):
         # type: () -> str
-        if isinstance(self.oids, dict):
+        if isinstance(self.oids, (dict, Results)):
             return '{{{}}}'.format(', '.join(self.oid_dict(key, value) for (key, value) in self.oids.items()))
         if self.with_values:
             return '{{{}}}'.format(', '.join(self.oid_str_value(oid) for oid in self.oids))
@@ -5,6 +5,7 @@
 import os
 import shutil
 import socket
+import sys
 from copy import deepcopy
 
 import pytest
@@ -36,6 +37,11 @@ E2E_METADATA = {
 
 EXPECTED_AUTODISCOVERY_CHECKS = 6
 
+# The asyncio engine is only available on Python 3, don't load its tests at all on Python 2
+collect_ignore_glob = []
+if sys.version_info[0] < 3:
+    collect_ignore_glob.append("test_aio.py")
+
 
 @pytest.fixture(scope='session')
 def dd_environment():
@@ -0,0 +1,167 @@
+# (C) Datadog, Inc. 2023-present
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import asyncio
+
+import mock
+import pytest
+from pysnmp.hlapi.varbinds import CommandGeneratorVarBinds
+from pysnmp.proto.rfc1902 import Counter32, Integer32, ObjectName
+from pysnmp.proto.rfc1905 import endOfMibView, errorStatus
+
+from datadog_checks.snmp import SnmpCheck
+
+from . import common
+
+pytestmark = [pytest.mark.unit, common.snmp_integration_only]
+
+
+def _fake_hlapi(in_flight_values):
+    in_flight = []
+
+    async def get_cmd(snmp_engine, auth_data, transport_target, context_data, *var_binds, **options):
+        in_flight.append(None)
+        in_flight_values.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        resolved = CommandGeneratorVarBinds().makeVarBinds(snmp_engine, var_binds)
+        return None, 0, 0, [(object_identity.getOid(), Integer32(42)) for object_identity, _ in resolved]
+
+    return mock.Mock(getCmd=get_cmd, UdpTransportTarget=mock.Mock())
+
+
+def test_asyncio_poller(aggregator):
+    instance = common.generate_instance_config(
+        [{'OID': '1.3.6.1.2.1.2.{}.0'.format(i), 'name': 'foo{}'.format(i)} for i in range(4)]
+    )
+    instance['use_asyncio'] = True
+    instance['max_concurrent_requests_per_device'] = 2
+
+    check = SnmpCheck('snmp', {'oid_batch_size': 1}, [instance])
+    in_flight_values = []
+    with mock.patch('datadog_checks.snmp.aio._load_hlapi', return_value=_fake_hlapi(in_flight_values)):
+        check.check(instance)
+    check.cancel()
+
+    for i in range(4):
+        aggregator.assert_metric('snmp.foo{}'.format(i), value=42)
+    aggregator.assert_metric('snmp.sysUpTimeInstance', value=42)
+    aggregator.assert_metric('datadog.snmp.device_poll_duration', count=1)
+    aggregator.assert_metric('datadog.snmp.peak_requests_in_flight', value=2)
+    assert max(in_flight_values) == 2
+    aggregator.assert_service_check('snmp.can_check', status=SnmpCheck.OK)
+
+
+def test_asyncio_poller_max_concurrent_requests(aggregator):
+    instance = common.generate_instance_config(
+        [{'OID': '1.3.6.1.2.1.2.{}.0'.format(i), 'name': 'foo{}'.format(i)} for i in range(4)]
+    )
+    instance['use_asyncio'] = True
+    instance['max_concurrent_requests'] = 3
+    instance['max_concurrent_requests_per_device'] = 4
+
+    check = SnmpCheck('snmp', {'oid_batch_size': 1}, [instance])
+    in_flight_values = []
+    with mock.patch('datadog_checks.snmp.aio._load_hlapi', return_value=_fake_hlapi(in_flight_values)):
+        check.check(instance)
+    check.cancel()
+
+    aggregator.assert_metric('datadog.snmp.peak_requests_in_flight', value=3)
+    assert max(in_flight_values) == 3
+
+
+def test_asyncio_poller_error(aggregator):
+    async def get_cmd(snmp_engine, auth_data, transport_target, context_data, *var_binds, **options):
+        return 'No SNMP response received before timeout', 0, 0, []
+
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    instance['use_asyncio'] = True
+
+    check = SnmpCheck('snmp', {}, [instance])
+    with mock.patch('datadog_checks.snmp.aio._load_hlapi', return_value=mock.Mock(getCmd=get_cmd)):
+        check.check(instance)
+    check.cancel()
+
+    assert 'Failed to collect some metrics: No SNMP response received before timeout' in check.warnings[0]
+    aggregator.assert_service_check('snmp.can_check', status=SnmpCheck.CRITICAL)
+
+
+IF_TABLE = (1, 3, 6, 1, 2, 1, 2, 2)
+IF_TABLE_METRICS = [
+    {
+        'MIB': 'IF-MIB',
+        'table': {'OID': '1.3.6.1.2.1.2.2', 'name': 'ifTable'},
+        'symbols': [
+            {'OID': '1.3.6.1.2.1.2.2.1.10', 'name': 'ifInOctets'},
+            {'OID': '1.3.6.1.2.1.2.2.1.16', 'name': 'ifOutOctets'},
+        ],
+        'metric_tags': [{'tag': 'interface', 'index': 1}],
+    }
+]
+
+
+def _fake_bulk_hlapi(bulk_response):
+    rows = sorted(IF_TABLE + (1, column, index) for column in (10, 16) for index in range(1, 6))
+    max_repetitions_values = []
+
+    async def bulk_cmd(
+        snmp_engine, auth_data, transport_target, context_data, non_repeaters, max_repetitions, var_bind, **options
+    ):
+        max_repetitions_values.append(max_repetitions)
+        error = bulk_response(max_repetitions)
+        if error:
+            return None, error, 0, []
+
+        start = tuple(CommandGeneratorVarBinds().makeVarBinds(snmp_engine, [var_bind])[0][0])
+        table = [[(ObjectName(oid), Counter32(oid[-1]))] for oid in rows if oid > start][:max_repetitions]
+        if len(table) < max_repetitions:
+            table.append([(ObjectName(IF_TABLE[:-1] + (3,)), endOfMibView)])
+        return None, 0, 0, table
+
+    hlapi = _fake_hlapi([])
+    hlapi.bulkCmd = bulk_cmd
+    return hlapi, max_repetitions_values
+
+
+def test_asyncio_poller_table_too_big(aggregator):
+    instance = common.generate_instance_config(IF_TABLE_METRICS)
+    instance['use_asyncio'] = True
+    instance['bulk_threshold'] = 1
+
+    check = SnmpCheck('snmp', {}, [instance])
+    # The device can't answer with more than 4 rows
+    hlapi, max_repetitions_values = _fake_bulk_hlapi(
+        lambda max_repetitions: errorStatus.clone('tooBig') if max_repetitions > 4 else None
+    )
+    with mock.patch('datadog_checks.snmp.aio._load_hlapi', return_value=hlapi):
+        check.check(instance)
+    check.cancel()
+
+    # The request is sent again for fewer rows until the device can answer it
+    assert max_repetitions_values[:4] == [25, 12, 6, 3]
+    assert set(max_repetitions_values[4:]) == {3}
+    for index in range(1, 6):
+        aggregator.assert_metric(
+            'snmp.ifInOctets', value=index, tags=common.CHECK_TAGS + ['interface:{}'.format(index)]
+        )
+    aggregator.assert_metric('datadog.snmp.table_walk_duration', count=1)
+    aggregator.assert_service_check('snmp.can_check', status=SnmpCheck.OK)
+    assert check._config.bulk_max_repetitions.get(IF_TABLE, check._MAX_REPETITIONS) == 3
+
+
+def test_asyncio_poller_table_error(aggregator):
+    instance = common.generate_instance_config(IF_TABLE_METRICS)
+    instance['use_asyncio'] = True
+    instance['bulk_threshold'] = 1
+
+    check = SnmpCheck('snmp', {}, [instance])
+    hlapi, max_repetitions_values = _fake_bulk_hlapi(lambda max_repetitions: errorStatus.clone('genErr'))
+    with mock.patch('datadog_checks.snmp.aio._load_hlapi', return_value=hlapi):
+        check.check(instance)
+    check.cancel()
+
+    assert max_repetitions_values == [25]
+    assert any('Failed to collect some metrics: genErr' in warning for warning in check.warnings)
+    aggregator.assert_metric('snmp.ifInOctets', count=0)
+    aggregator.assert_metric('datadog.snmp.table_walk_duration', count=0)
+    assert check._config.bulk_max_repetitions.get(IF_TABLE, check._MAX_REPETITIONS) == check._MAX_REPETITIONS
@@ -583,6 +583,15 @@ def test_bulk_table(aggregator, caplog):
         aggregator.assert_metric_has_tag(metric_name, common.CHECK_TAGS[0], at_least=1)
     aggregator.assert_metric('snmp.sysUpTimeInstance', count=1)
 
+    # ifTable and ipSystemStatsTable are walked with GETBULK
+    for table_oid in ('1.3.6.1.2.1.2.2', '1.3.6.1.2.1.4.31.1'):
+        aggregator.assert_metric(
+            'datadog.snmp.table_walk_duration',
+            metric_type=aggregator.GAUGE,
+            tags=common.CHECK_TAGS + ['table:{}'.format(table_oid), 'loader:python'],
+            count=1,
+        )
+
     # Test service check
     aggregator.assert_service_check("snmp.can_check", status=SnmpCheck.OK, tags=common.CHECK_TAGS, at_least=1)
 
@@ -590,6 +599,25 @@ def test_bulk_table(aggregator, caplog):
     aggregator.all_metrics_asserted()
 
 
+def test_bulk_table_pipelined(aggregator):
+    instance = common.generate_instance_config(common.BULK_TABULAR_OBJECTS)
+    instance['bulk_threshold'] = 5
+    instance['max_concurrent_requests_per_device'] = 4
+    check = common.create_check(instance)
+
+    for _ in range(2):
+        check.check(instance)
+
+        for table in common.BULK_TABULAR_OBJECTS:
+            for symbol in table['symbols']:
+                aggregator.assert_metric("snmp." + symbol, at_least=1)
+        aggregator.assert_service_check("snmp.can_check", status=SnmpCheck.OK, tags=common.CHECK_TAGS, at_least=1)
+        aggregator.reset()
+
+        # The next walks of ifTable ask for all its rows at once
+        assert check._config.bulk_max_repetitions.get((1, 3, 6, 1, 2, 1, 2, 2), 0) > check._MAX_REPETITIONS
+
+
 def test_invalid_metric(aggregator):
     """
     Invalid metrics raise a Warning and a critical service check
@@ -3,8 +3,10 @@
 # Licensed under Simplified BSD License (see LICENSE)
 
 import copy
+import fnmatch
 import logging
 import os
+import threading
 import time
 import weakref
 from concurrent import futures
@@ -15,12 +17,24 @@ import pytest
 import yaml
 
 from datadog_checks.base import ConfigurationError
+from datadog_checks.base.errors import CheckException
 from datadog_checks.dev import temp_dir
 from datadog_checks.snmp import SnmpCheck
-from datadog_checks.snmp.config import InstanceConfig
-from datadog_checks.snmp.discovery import discover_instances
+from datadog_checks.snmp.commands import BulkWalk, PipelinedRequest, snmp_pipeline
+from datadog_checks.snmp.config import BulkMaxRepetitions, InstanceConfig
+from datadog_checks.snmp.discovery import _hosts_to_probe, _scan_network, discover_instances
+from datadog_checks.snmp.exceptions import PySnmpError
+from datadog_checks.snmp.models import OID
 from datadog_checks.snmp.parsing import ParsedSymbolMetric, ParsedTableMetric
-from datadog_checks.snmp.resolver import OIDTrie
+from datadog_checks.snmp.profiles import (
+    PROFILE_INDEX_CACHE_FILENAME,
+    ProfileIndex,
+    _load_persisted_default_profiles,
+    get_profile_index,
+)
+from datadog_checks.snmp.pysnmp_types import ObjectName
+from datadog_checks.snmp.resolver import OIDResolver, OIDTrie
+from datadog_checks.snmp.results import Results
 from datadog_checks.snmp.utils import (
     _load_default_profiles,
     batches,
@@ -402,6 +416,81 @@ def test_cache_building(write_mock, read_mock):
     write_mock.assert_called_once_with('', '["192.168.0.1"]')
 
 
+def test_discovery_probes_seen_hosts_first():
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    instance.pop('ip_address')
+    instance['network_address'] = '192.168.0.0/29'
+    instance['ignored_ip_addresses'] = ['192.168.0.6']
+
+    check = SnmpCheck('snmp', {}, [instance])
+    config = check._config
+    config.discovered_instances['192.168.0.1'] = mock.Mock()
+
+    hosts = list(_hosts_to_probe(config, ['192.168.0.1', '192.168.0.5']))
+
+    # Devices that stopped being monitored first, then the monitored ones, then the rest of the network
+    assert hosts == ['192.168.0.5', '192.168.0.1', '192.168.0.2', '192.168.0.3', '192.168.0.4']
+
+
+def test_discovery_probes_hosts_concurrently():
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    instance.pop('ip_address')
+    instance['network_address'] = '192.168.0.0/28'
+    instance['discovery_workers'] = 3
+
+    check = SnmpCheck('snmp', {}, [instance])
+    lock = threading.Lock()
+    in_flight = []
+    in_flight_values = []
+
+    def fetch_sysobject_oid(config):
+        with lock:
+            in_flight.append(config.device.ip)
+            in_flight_values.append(len(in_flight))
+        time.sleep(0.05)
+        with lock:
+            in_flight.remove(config.device.ip)
+        if config.device.ip == '192.168.0.3':
+            raise CheckException('No SNMP response received before timeout')
+        return '1.3.6.1.4.1.8072.3.2.10'
+
+    check.fetch_sysobject_oid = fetch_sysobject_oid
+    seen_hosts = set()
+    with futures.ThreadPoolExecutor(max_workers=3) as executor:
+        hosts_probed = _scan_network(check._config, weakref.ref(check), executor, seen_hosts)
+
+    assert hosts_probed == 14
+    assert max(in_flight_values) == 3
+    assert len(check._config.discovered_instances) == 13
+    assert '192.168.0.3' not in check._config.discovered_instances
+    assert seen_hosts == set(check._config.discovered_instances)
+
+
+def test_discovery_metrics(aggregator):
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    instance.pop('ip_address')
+    instance['network_address'] = '192.168.0.0/29'
+
+    check = SnmpCheck('snmp', {}, [instance])
+    check._start_discovery = lambda: None
+    check._executor = futures.ThreadPoolExecutor(max_workers=1)
+    check._last_discovery_stats = (2.0, 6)
+    check.check(instance)
+
+    tags = [
+        'network:192.168.0.0/29',
+        'autodiscovery_subnet:192.168.0.0/29',
+        'loader:python',
+    ]
+    aggregator.assert_metric('datadog.snmp.discovery_duration', value=2.0, tags=tags, count=1)
+    aggregator.assert_metric('datadog.snmp.discovery_hosts_probed_per_second', value=3.0, tags=tags, count=1)
+
+    # The metrics of a scan are only sent once
+    aggregator.reset()
+    check.check(instance)
+    aggregator.assert_metric('datadog.snmp.discovery_duration', count=0)
+
+
 def test_trie():
     trie = OIDTrie()
     trie.set((1, 2), 'bar')
@@ -413,6 +502,51 @@ def test_trie():
     assert trie.match((2, 3, 4)) == ((), None)
 
 
+def test_resolve_var_bind_oid_cache():
+    resolver = OIDResolver(mock.Mock(), enforce_constraints=True)
+    resolver.register(OID('1.3.6.1.2.1.2.2.1.10'), 'ifInOctets')
+    resolver.resolve_oid = mock.Mock(wraps=resolver.resolve_oid)
+
+    match = resolver.resolve_var_bind_oid(ObjectName('1.3.6.1.2.1.2.2.1.10.4'))
+    assert match == ('ifInOctets', ('4',))
+    assert resolver.resolve_var_bind_oid(ObjectName('1.3.6.1.2.1.2.2.1.10.4')) is match
+    assert resolver.resolve_oid.call_count == 1
+
+    # New mappings, e.g. from a profile, apply to the next resolutions
+    resolver.register_index('ifInOctets', 1, {4: 'four'})
+    assert resolver.resolve_var_bind_oid(ObjectName('1.3.6.1.2.1.2.2.1.10.4')) == ('ifInOctets', ('four',))
+    assert resolver.resolve_oid.call_count == 2
+
+
+def test_results():
+    results = Results()
+    results.add('ifInOctets', ('1',), 10)
+    results.add('ifDescr', ('1',), 'eth0')
+    results.add('ifInOctets', ('2',), 20)
+    results.add('sysUpTimeInstance', (), 42)
+    # The same OID received twice: the last value is kept
+    results.add('ifInOctets', ('1',), 11)
+    results.freeze()
+
+    assert len(results) == 3
+    assert 'ifDescr' in results
+    assert 'ifOutOctets' not in results
+    assert results.indexes == [('1',), ('2',), ()]
+    assert results['sysUpTimeInstance'].data == [42]
+
+    in_octets = results['ifInOctets']
+    assert list(in_octets.items()) == [(('1',), 11), (('2',), 20)]
+    assert in_octets[('2',)] == 20
+    with pytest.raises(KeyError):
+        in_octets[('3',)]
+
+    descr = results['ifDescr']
+    assert descr.position(results.row(('1',)), hint=0) == 0
+    assert descr.position(results.row(('2',)), hint=1) is None
+    with pytest.raises(KeyError):
+        descr[('2',)]
+
+
 @pytest.mark.parametrize(
     'oids, expected',
     [
@@ -499,6 +633,95 @@ def test_profile_override():
             assert profiles['generic-router'] == {'definition': profile}
 
 
+def test_profile_index_match():
+    index = ProfileIndex(
+        {
+            'generic': {'definition': {'sysobjectid': '1.3.6.1.4.1.*'}},
+            'vendor': {'definition': {'sysobjectid': ['1.3.6.1.4.1.9.*', '1.3.6.1.4.1.10.1']}},
+            'model': {'definition': {'sysobjectid': '1.3.6.1.4.1.9.1.*'}},
+            'fallback': {'definition': {'sysobjectid': '*'}},
+        }
+    )
+
+    assert index.match('1.3.6.1.4.1.9.1.5') == 'model'
+    assert index.match('1.3.6.1.4.1.9.2') == 'vendor'
+    assert index.match('1.3.6.1.4.1.10.1') == 'vendor'
+    assert index.match('1.3.6.1.4.1.10.12') == 'generic'
+    assert index.match('1.2.3') == 'fallback'
+
+
+def test_profile_index_matches_default_profiles_like_fnmatch():
+    index = get_profile_index()
+
+    for pattern in index.profiles_by_oid:
+        sys_object_oid = pattern.replace('*', '1')
+        expected = max(
+            (oid for oid in index.profiles_by_oid if fnmatch.fnmatch(sys_object_oid, oid)),
+            key=oid_pattern_specificity,
+        )
+        assert index.match(sys_object_oid) == index.profiles_by_oid[expected]
+
+
+def test_profile_index_no_match():
+    index = ProfileIndex({'generic': {'definition': {'sysobjectid': '1.3.6.1.4.1.*'}}})
+
+    with pytest.raises(ConfigurationError, match='No profile matching sysObjectID 1.3.6.1.2'):
+        index.match('1.3.6.1.2')
+
+
+def test_profile_index_is_shared():
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    check = SnmpCheck('snmp', {}, [instance])
+    other_check = SnmpCheck('snmp', {}, [instance])
+
+    assert check.profile_index is other_check.profile_index
+    assert check.profile_index.compile('generic-router') is other_check.profile_index.compile('generic-router')
+
+
+def test_compiled_profile():
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    check = SnmpCheck('snmp', {}, [instance])
+
+    config = check._config
+    compiled_config = check._build_config(instance)
+    profile = check.profiles['generic-router']
+    config.refresh_with_profile(profile)
+    compiled_config.refresh_with_profile(profile, check.profile_index.compile('generic-router'))
+
+    for oids in ('scalar_oids', 'next_oids', 'bulk_oids'):
+        assert [oid.as_tuple() for oid in getattr(compiled_config.oid_config, oids)] == [
+            oid.as_tuple() for oid in getattr(config.oid_config, oids)
+        ]
+    assert [metric.name for metric in compiled_config.parsed_metrics] == [
+        metric.name for metric in config.parsed_metrics
+    ]
+    assert [tag.symbol for tag in compiled_config.parsed_metric_tags] == [
+        tag.symbol for tag in config.parsed_metric_tags
+    ]
+
+
+def test_persisted_profile_index():
+    with temp_dir() as tmp:
+        with mock_profiles_confd_root(tmp), mock.patch('datadog_checks.snmp.profiles.get_config', return_value=tmp):
+            profile_file = os.path.join(tmp, 'profile.yaml')
+            with open(profile_file, 'wb') as f:
+                f.write(yaml.safe_dump({'sysobjectid': '1.2.3', 'metrics': []}))
+
+            profiles = _load_persisted_default_profiles()
+            assert profiles['profile'] == {'definition': {'sysobjectid': '1.2.3', 'metrics': []}}
+            assert os.path.isfile(os.path.join(tmp, PROFILE_INDEX_CACHE_FILENAME))
+
+            # The YAML files are not parsed again
+            with mock.patch('datadog_checks.snmp.profiles._load_default_profiles') as load_profiles:
+                assert _load_persisted_default_profiles() == profiles
+                load_profiles.assert_not_called()
+
+            # The index is rebuilt when a profile changes
+            with open(profile_file, 'wb') as f:
+                f.write(yaml.safe_dump({'sysobjectid': '1.2.4', 'metrics': []}))
+            assert _load_persisted_default_profiles()['profile']['definition']['sysobjectid'] == '1.2.4'
+
+
 def test_discovery_tags():
     """When specifying a tag on discovery, it doesn't make tags leaks between instances."""
     instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
@@ -506,6 +729,8 @@ def test_discovery_tags():
 
     instance['network_address'] = '192.168.0.0/29'
     instance['tags'] = ['test:check']
+    # Probe the hosts one by one, so that they get the sysObjectIDs in order
+    instance['discovery_workers'] = 1
 
     check = SnmpCheck('snmp', {}, [instance])
 
@@ -686,3 +911,120 @@ def test_try_submit_bandwidth_usage_metric_if_bandwidth_metric_errors(results, m
     check.rate.assert_not_called()
     for msg in error_messages:
         assert msg in caplog.text
+
+
+@pytest.mark.parametrize('option', ['max_concurrent_requests', 'max_concurrent_requests_per_device'])
+def test_max_concurrent_requests_must_be_strictly_positive(option):
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    instance[option] = 0
+
+    with pytest.raises(ConfigurationError):
+        SnmpCheck('snmp', {}, [instance])
+
+
+class FakePipelinedRequest(PipelinedRequest):
+    def __init__(self, pending):
+        super(FakePipelinedRequest, self).__init__(lookup_mib=False)
+        self.pending = pending
+
+    def send(self, config, done):
+        self.pending.append(done)
+        self.in_flight = len(self.pending)
+
+
+def test_snmp_pipeline_window():
+    pending = []
+
+    def run_dispatcher():
+        while pending:
+            pending.pop(0)()
+
+    config = mock.Mock()
+    config._snmp_engine.transportDispatcher.runDispatcher.side_effect = run_dispatcher
+    requests = [FakePipelinedRequest(pending) for _ in range(5)]
+
+    snmp_pipeline(config, requests, 2)
+
+    assert config._snmp_engine.transportDispatcher.runDispatcher.call_count == 1
+    assert all(request.done for request in requests)
+    assert [request.in_flight for request in requests] == [1, 2, 2, 2, 2]
+
+
+def test_snmp_pipeline_dispatcher_error():
+    pending = []
+
+    def run_dispatcher():
+        pending.pop(0)()
+        raise PySnmpError('poll error')
+
+    config = mock.Mock()
+    config._snmp_engine.transportDispatcher.runDispatcher.side_effect = run_dispatcher
+    requests = [FakePipelinedRequest(pending) for _ in range(3)]
+
+    snmp_pipeline(config, requests, 1)
+
+    assert requests[0].result(config) == []
+    for request in requests[1:]:
+        with pytest.raises(PySnmpError):
+            request.result(config)
+
+
+def test_bulk_max_repetitions():
+    max_repetitions = BulkMaxRepetitions()
+    table = (1, 3, 6, 1, 2, 1, 2, 2)
+
+    assert max_repetitions.get(table, 25) == 25
+
+    # Ask for all the rows, the end of the table, and some room for new rows.
+    max_repetitions.update(table, 40)
+    assert max_repetitions.get(table, 25) == 45
+    max_repetitions.update(table, 0)
+    assert max_repetitions.get(table, 25) == 1
+
+    # Large tables are walked in several requests.
+    max_repetitions.update(table, 1000)
+    assert max_repetitions.get(table, 25) == BulkMaxRepetitions.LIMIT
+
+    # The device answered `tooBig`: never ask for more rows than it could answer with.
+    max_repetitions.update(table, 1000, response_limit=30)
+    assert max_repetitions.get(table, 25) == 30
+    assert max_repetitions.get((1, 3, 6, 1, 2, 1, 31, 1, 1), 50) == 30
+
+    # The walk failed, e.g. because the device dropped the responses: fall back to the default for good.
+    max_repetitions.failed(table, 30, 25)
+    assert max_repetitions.get(table, 25) == 25
+    max_repetitions.update(table, 1000)
+    assert max_repetitions.get(table, 25) == 25
+
+    # Failures with no more than the default are not caused by the tuning.
+    other_table = (1, 3, 6, 1, 2, 1, 31, 1, 1)
+    max_repetitions.failed(other_table, 25, 25)
+    max_repetitions.update(other_table, 1000)
+    assert max_repetitions.get(other_table, 25) == 30
+
+
+def test_bulk_max_repetitions_disabled():
+    max_repetitions = BulkMaxRepetitions(enabled=False)
+    table = (1, 3, 6, 1, 2, 1, 2, 2)
+
+    max_repetitions.update(table, 40)
+    assert max_repetitions.get(table, 25) == 25
+
+
+def test_table_walk_failure_not_tuned(aggregator):
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    check = SnmpCheck('snmp', {}, [instance])
+    config = check._config
+    table = (1, 3, 6, 1, 2, 1, 2, 2)
+    config.bulk_max_repetitions.update(table, 80)
+
+    walk = BulkWalk(None, check._NON_REPEATERS, check._MAX_REPETITIONS, False, False)
+    walk.table_oid = table
+    walk.max_repetitions = config.bulk_max_repetitions.get(table, check._MAX_REPETITIONS)
+    walk.error = 'No SNMP response received before timeout'
+
+    with pytest.raises(CheckException, match='No SNMP response received before timeout'):
+        check.table_walk_result(config, walk, 'fetch_id')
+
+    assert config.bulk_max_repetitions.get(table, check._MAX_REPETITIONS) == check._MAX_REPETITIONS
+    aggregator.assert_metric('datadog.snmp.table_walk_duration', count=0)
@@ -94,6 +94,9 @@ class InstanceConfig(BaseModel):
     rmi_connection_timeout: Optional[float]
     rmi_registry_ssl: Optional[bool]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     skip_proxy: Optional[bool]
     tags: Optional[Sequence[str]]
     timeout: Optional[float]
@@ -10,7 +10,7 @@ import time
 from datadog_checks.base import is_affirmative
 from datadog_checks.base.utils.common import to_native_string
 from datadog_checks.base.utils.db.sql import compute_sql_signature
-from datadog_checks.base.utils.db.utils import DBMAsyncJob, default_json_event_encoding, obfuscate_sql_with_metadata
+from datadog_checks.base.utils.db.utils import DBMAsyncJob, default_json_event_encoding
 from datadog_checks.base.utils.serialization import json
 from datadog_checks.base.utils.tracking import tracked_method
 from datadog_checks.sqlserver.utils import is_statement_proc
@@ -214,12 +214,12 @@ class SqlserverActivity(DBMAsyncJob):
         if 'statement_text' not in row:
             return row
         try:
-            statement = obfuscate_sql_with_metadata(row['statement_text'], self.check.obfuscator_options)
+            statement = self.check.statement_cache.obfuscate(row['statement_text'], self.check.obfuscator_options)
             procedure_statement = None
             # sqlserver doesn't have a boolean data type so convert integer to boolean
             row['is_proc'], procedure_name = is_statement_proc(row['text'])
             if row['is_proc'] and 'text' in row:
-                procedure_statement = obfuscate_sql_with_metadata(row['text'], self.check.obfuscator_options)
+                procedure_statement = self.check.statement_cache.obfuscate(row['text'], self.check.obfuscator_options)
             obfuscated_statement = statement['query']
             metadata = statement['metadata']
             row['dd_commands'] = metadata.get('commands', None)
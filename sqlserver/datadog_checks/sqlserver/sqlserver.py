@@ -14,7 +14,7 @@ from datadog_checks.base import AgentCheck, ConfigurationError
 from datadog_checks.base.config import is_affirmative
 from datadog_checks.base.utils.common import to_native_string
 from datadog_checks.base.utils.db import QueryExecutor, QueryManager
-from datadog_checks.base.utils.db.utils import resolve_db_host
+from datadog_checks.base.utils.db.utils import DEFAULT_STATEMENT_CACHE_MAX_BYTES, StatementCache, resolve_db_host
 from datadog_checks.base.utils.serialization import json
 from datadog_checks.sqlserver.activity import SqlserverActivity
 from datadog_checks.sqlserver.statements import SqlserverStatementMetrics
@@ -117,6 +117,12 @@ class SQLServer(AgentCheck):
         # DBM
         self.dbm_enabled = self.instance.get('dbm', False)
         self.statement_metrics_config = self.instance.get('query_metrics', {}) or {}
+        # Obfuscated statements and full query text events, shared by the statement metrics and activity jobs
+        self.statement_cache = StatementCache(
+            max_bytes=self.instance.get('statement_cache_max_bytes', DEFAULT_STATEMENT_CACHE_MAX_BYTES),
+            fqt_ttl=60 * 60 / self.instance.get('full_statement_text_samples_per_hour_per_query', 1),
+            fqt_max_size=self.instance.get('full_statement_text_cache_max_size', 10000),
+        )
         self.statement_metrics = SqlserverStatementMetrics(self)
         self.activity_config = self.instance.get('query_activity', {}) or {}
         self.activity = SqlserverActivity(self)
@@ -6,7 +6,6 @@ import binascii
 import math
 import time
 
-from cachetools import TTLCache
 from lxml import etree as ET
 
 from datadog_checks.base import is_affirmative
@@ -219,12 +218,6 @@ class SqlserverStatementMetrics(DBMAsyncJob):
         self._last_stats_query_time = None
 
     def _init_caches(self):
-        # full_statement_text_cache: limit the ingestion rate of full statement text events per query_signature
-        self._full_statement_text_cache = TTLCache(
-            maxsize=self.check.instance.get('full_statement_text_cache_max_size', 10000),
-            ttl=60 * 60 / self.check.instance.get('full_statement_text_samples_per_hour_per_query', 1),
-        )
-
         # seen_plans_ratelimiter: limit the ingestion rate per unique plan.
         # plans, we only really need them once per hour
         self._seen_plans_ratelimiter = RateLimitingTTLCache(
@@ -287,11 +280,13 @@ class SqlserverStatementMetrics(DBMAsyncJob):
         normalized_rows = []
         for row in rows:
             try:
-                statement = obfuscate_sql_with_metadata(row['statement_text'], self.check.obfuscator_options)
+                statement = self.check.statement_cache.obfuscate(row['statement_text'], self.check.obfuscator_options)
                 procedure_statement = None
                 row['is_proc'], procedure_name = is_statement_proc(row['text'])
                 if row['is_proc']:
-                    procedure_statement = obfuscate_sql_with_metadata(row['text'], self.check.obfuscator_options)
+                    procedure_statement = self.check.statement_cache.obfuscate(
+                        row['text'], self.check.obfuscator_options
+                    )
             except Exception as e:
                 if self.check.log_unobfuscated_queries:
                     raw_query_text = row['text'] if row.get('is_proc', False) else row['statement_text']
@@ -330,6 +325,9 @@ class SqlserverStatementMetrics(DBMAsyncJob):
             return []
         metric_columns = [c for c in rows[0].keys() if c.startswith("total_") or c == 'execution_count']
         rows = self._state.compute_derivative_rows(rows, metric_columns, key=_row_key)
+        self.check.gauge(
+            "dd.sqlserver.statements.state_memory_usage", self._state.memory_usage(), **self.check.debug_stats_kwargs()
+        )
         return rows
 
     @staticmethod
@@ -391,16 +389,18 @@ class SqlserverStatementMetrics(DBMAsyncJob):
         )
         self.check.gauge(
             "dd.sqlserver.statements.fqt_cache.len",
-            len(self._full_statement_text_cache),
+            self.check.statement_cache.fqt_entries,
             **self.check.debug_stats_kwargs()
         )
+        self.check.statement_cache.submit_telemetry(
+            self.check, 'sqlserver', tags=self.check.debug_tags(), hostname=self.check.resolved_hostname
+        )
 
     def _rows_to_fqt_events(self, rows):
         for row in rows:
-            query_cache_key = _row_key(row)
-            if query_cache_key in self._full_statement_text_cache:
+            # limit the ingestion rate of full statement text events per query_signature
+            if not self.check.statement_cache.acquire_fqt(_row_key(row)):
                 continue
-            self._full_statement_text_cache[query_cache_key] = True
             tags = list(self.check.tags)
             if 'database_name' in row:
                 tags += ["db:{}".format(row['database_name'])]
@@ -35,6 +35,7 @@ class SharedConfig(BaseModel):
     global_custom_queries: Optional[Sequence[Mapping[str, Any]]]
     proxy: Optional[Proxy]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
     skip_proxy: Optional[bool]
     timeout: Optional[float]
 
@@ -102,6 +102,9 @@ class RestApiOptions(BaseModel):
     proxy: Optional[Proxy]
     read_timeout: Optional[float]
     request_size: Optional[float]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     skip_proxy: Optional[bool]
     timeout: Optional[float]
     tls_ca_cert: Optional[str]
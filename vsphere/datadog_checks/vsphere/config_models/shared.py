@@ -33,6 +33,7 @@ class RestApiOptions(BaseModel):
         allow_mutation = False
 
     proxy: Optional[Proxy]
+    shared_connection_pool: Optional[bool]
     skip_proxy: Optional[bool]
     timeout: Optional[float]
 
@@ -90,6 +90,9 @@ class InstanceConfig(BaseModel):
     request_size: Optional[float]
     resourcemanager_uri: Optional[str]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
+    shared_connection_pool_idle_timeout: Optional[float]
+    shared_connection_pool_size: Optional[int]
     skip_proxy: Optional[bool]
     split_yarn_application_tags: Optional[bool]
     tags: Optional[Sequence[str]]
@@ -40,6 +40,7 @@ class SharedConfig(BaseModel):
     ]
     proxy: Optional[Proxy]
     service: Optional[str]
+    shared_connection_pool: Optional[bool]
     skip_proxy: Optional[bool]
     timeout: Optional[float]
 